@@ -0,0 +1,127 @@
+"""Cold start time: importing the app and running the startup event
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--target-ms 1500] [--importtime]
+
+Every run is a fresh interpreter (so nothing is cached in sys.modules) that
+measures three phases against a throw-away database:
+
+    import     import src.main (module-level construction included)
+    first      startup event on an empty database (create tables + config)
+    restart    startup event again on the now current database
+
+The medians are printed; the exit status is 1 when import + restart (what a
+container restart or a new autoscaled replica pays) exceeds --target-ms.
+--importtime lists the slowest modules from `python -X importtime`.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_TARGET_MS = 1500.0
+
+
+def child():
+    """Runs inside the fresh interpreter; prints one JSON line with phase timings"""
+    sys.path.insert(0, str(ROOT))
+    timings = {}
+    # Startup persists the API key to setting.toml (re-dumping the file); put it back afterwards
+    setting_path = ROOT / "config" / "setting.toml"
+    setting_bytes = setting_path.read_bytes()
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        import src.main as app_main
+        timings["import"] = (time.perf_counter() - started) * 1000
+
+        with tempfile.TemporaryDirectory() as tmp:
+            app_main.db.db_path = os.path.join(tmp, "bench.db")
+
+            async def run():
+                for phase in ("first", "restart"):
+                    phase_started = time.perf_counter()
+                    await app_main.startup_event()
+                    timings[phase] = (time.perf_counter() - phase_started) * 1000
+                    await app_main.shutdown_event()
+
+            try:
+                asyncio.run(run())
+            finally:
+                setting_path.write_bytes(setting_bytes)
+    print(json.dumps(timings))
+
+
+def run_once(verbose: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, __file__, "--child"],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if verbose or result.returncode != 0:
+        sys.stderr.write(result.stderr)
+    if result.returncode != 0:
+        raise SystemExit(f"startup run failed with exit code {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 15):
+    """(cumulative µs, module) of the slowest imports of src.main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.main"],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure application cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="Budget for import + restart (median)")
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's startup output")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    runs = [run_once(args.verbose) for _ in range(max(1, args.runs))]
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in ("import", "first", "restart")}
+    for phase, value in medians.items():
+        print(f"{phase:<10}{value:>10.1f} ms")
+    cold_start = medians["import"] + medians["restart"]
+    print(f"{'cold start':<10}{cold_start:>10.1f} ms  (target {args.target_ms:.0f} ms, {len(runs)} runs)")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for micros, module in slowest_imports():
+            print(f"  {micros / 1000:>8.1f} ms  {module}")
+
+    if cold_start > args.target_ms:
+        print("FAIL: cold start over target")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Chunks per second per core: legacy _format_stream_chunk vs StreamChunkEncoder
+
+Usage:
+    python benchmarks/bench_stream_chunk.py [--seconds 1.0]
+
+CPU time (time.process_time) is used, so the figures are per core. Mixes a
+progress chunk, a final chunk and a chunk with extra delta fields.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.config import config
+from src.services.stream_encoder import stream_encoder, orjson_available
+
+
+def legacy_format_stream_chunk(content: str = None, reasoning_content: str = None,
+                               finish_reason: str = None, is_first: bool = False,
+                               extra: dict = None) -> str:
+    """The implementation replaced by StreamChunkEncoder (kept for comparison)"""
+    chunk_id = f"chatcmpl-{int(datetime.now().timestamp() * 1000)}"
+    delta = {}
+    if is_first:
+        delta["role"] = "assistant"
+    delta["content"] = content
+    delta["reasoning_content"] = reasoning_content
+    delta["tool_calls"] = None
+    if extra:
+        for k, v in extra.items():
+            delta[k] = v
+    response = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(datetime.now().timestamp()),
+        "model": "sora",
+        "choices": [{
+            "index": 0,
+            "delta": delta,
+            "finish_reason": finish_reason,
+            "native_finish_reason": finish_reason
+        }],
+        "usage": {
+            "prompt_tokens": 0
+        }
+    }
+    if finish_reason:
+        response["usage"]["completion_tokens"] = 1
+        response["usage"]["total_tokens"] = 1
+    return f'data: {json.dumps(response)}\n\n'
+
+
+CASES = (
+    {"reasoning_content": "**Video Generation Progress**: 42% (running)\n"},
+    {"content": "```html\n<video src='http://127.0.0.1:8000/tmp/abc.mp4' controls></video>\n```",
+     "finish_reason": "STOP"},
+    {"reasoning_content": "Uploading...\n", "extra": {"task_id": "task_01k9btrqrnen792yvt703dp0tq", "output": []}},
+)
+
+
+def measure(fn, seconds: float) -> float:
+    """Chunks per CPU second"""
+    count = 0
+    start = time.process_time()
+    deadline = start + seconds
+    while True:
+        for kwargs in CASES:
+            fn(**kwargs)
+        count += len(CASES)
+        if count % 300 == 0 and time.process_time() >= deadline:
+            break
+    return count / (time.process_time() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SSE chunk encoding")
+    parser.add_argument("--seconds", type=float, default=1.0, help="CPU seconds per variant")
+    args = parser.parse_args(argv)
+
+    # Sanity check: both produce the same payload modulo id/created/whitespace
+    for kwargs in CASES:
+        old = json.loads(legacy_format_stream_chunk(**kwargs)[6:])
+        new = json.loads(stream_encoder.encode(**kwargs)[6:])
+        for data in (old, new):
+            data.pop("id"), data.pop("created")
+        if not config.stream_omit_null_fields:
+            assert old == new, (old, new)
+
+    results = {"legacy": measure(legacy_format_stream_chunk, args.seconds)}
+    token = stream_encoder.begin_stream()
+    try:
+        results["encoder"] = measure(stream_encoder.encode, args.seconds)
+    finally:
+        stream_encoder.end_stream(token)
+
+    print(f"orjson: {'yes' if orjson_available else 'no'}, omit_null_fields: {config.stream_omit_null_fields}")
+    for name, rate in results.items():
+        print(f"{name:<8} {rate:>12,.0f} chunks/s/core")
+    print(f"speedup  {results['encoder'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
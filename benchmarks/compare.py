@@ -0,0 +1,79 @@
+"""Compare two micro_bench.py result files and flag regressions
+
+Usage:
+    python benchmarks/compare.py benchmarks/baselines/baseline.json current.json
+    python benchmarks/compare.py old.json new.json --threshold 15 --metric min
+
+Exits with status 1 when any benchmark is slower than the baseline by more
+than --threshold percent, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+
+def load_results(path: str) -> Dict[str, Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("benchmarks", data)
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], metric: str = "median",
+            threshold: float = 10.0) -> Tuple[List[Dict], List[str], List[str]]:
+    """Return (rows, missing, added); rows carry change_pct and a status"""
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        old = baseline[name][metric]
+        new = current[name][metric]
+        change = (new - old) / old * 100 if old else 0.0
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({"name": name, "old": old, "new": new, "change_pct": change, "status": status})
+    missing = sorted(set(baseline) - set(current))
+    added = sorted(set(current) - set(baseline))
+    return rows, missing, added
+
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} µs"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare micro-benchmark results against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent")
+    parser.add_argument("--metric", default="median", choices=("median", "mean", "min"))
+    args = parser.parse_args(argv)
+
+    rows, missing, added = compare(load_results(args.baseline), load_results(args.current),
+                                   args.metric, args.threshold)
+    marks = {"regression": "❌", "improvement": "✅", "ok": "  "}
+    width = max((len(r["name"]) for r in rows), default=10)
+    for row in rows:
+        print(f"{marks[row['status']]} {row['name']:<{width}}  {_format_time(row['old']):>12} -> "
+              f"{_format_time(row['new']):>12}  {row['change_pct']:+7.1f}%")
+    for name in missing:
+        print(f"⚠️  {name}: missing from current results")
+    for name in added:
+        print(f"ℹ️  {name}: new benchmark (no baseline)")
+
+    regressions = [r for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:g}% ({args.metric})")
+        return 1
+    print(f"\nNo regressions above {args.threshold:g}% ({args.metric})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
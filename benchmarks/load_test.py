@@ -0,0 +1,384 @@
+"""End-to-end load test against /v1/chat/completions
+
+Drives N concurrent streaming clients through the proxy and reports latency
+percentiles, upstream requests per task (from the mock's counters) and the
+proxy's CPU time / RSS sampled from /proc.
+
+Typical run (starts the mock upstream and the proxy itself):
+    python benchmarks/load_test.py --spawn --seed-tokens 20 --clients 50 --requests 200
+
+Against an already running proxy (pointed at the mock via SORA_BASE_URL):
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --pid <proxy pid> \\
+        --mock-url http://127.0.0.1:9000
+
+Seeded tokens are written to the proxy's database (data/hancat.db) and removed
+again at the end of the run unless --keep-tokens is given. Do not run against a
+database holding real accounts while the proxy points at the real upstream.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from curl_cffi.requests import AsyncSession
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for an empty list)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# ==================== Process sampling ====================
+
+def _read_cpu_seconds(pid: int) -> Optional[float]:
+    """utime + stime of a process from /proc/<pid>/stat"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the command name (which may contain spaces)
+    fields = stat[stat.rfind(")") + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+
+
+def _read_rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of the proxy process while the test runs"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_samples: List[int] = []
+        self._cpu_start: Optional[float] = None
+        self._cpu_end: Optional[float] = None
+        self._wall_start = 0.0
+        self._wall_end = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            rss = _read_rss_bytes(self.pid)
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if not self.pid:
+            return
+        self._cpu_start = _read_cpu_seconds(self.pid)
+        self._wall_start = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._cpu_end = _read_cpu_seconds(self.pid)
+        self._wall_end = time.perf_counter()
+
+    def report(self) -> Dict:
+        if not self.pid or self._cpu_start is None or self._cpu_end is None:
+            return {}
+        cpu = self._cpu_end - self._cpu_start
+        wall = max(self._wall_end - self._wall_start, 1e-9)
+        return {
+            "pid": self.pid,
+            "cpu_seconds": round(cpu, 3),
+            "cpu_percent": round(cpu / wall * 100, 1),
+            "rss_peak_mb": round(max(self.rss_samples) / 1024 ** 2, 1) if self.rss_samples else None,
+            "rss_avg_mb": round(sum(self.rss_samples) / len(self.rss_samples) / 1024 ** 2, 1) if self.rss_samples else None,
+        }
+
+
+# ==================== Token seeding ====================
+
+async def seed_tokens(count: int) -> List[int]:
+    """Insert mock tokens into the proxy database, returns their IDs"""
+    from src.core.database import Database
+    from src.core.models import Token
+
+    db = Database()
+    await db.init_db()
+    ids = []
+    for i in range(count):
+        token = Token(
+            token=f"mock-{i}-{os.urandom(12).hex()}",
+            email=f"loadtest{i}@mock.local",
+            name=f"loadtest-{i}",
+            remark="loadtest",
+            sora2_supported=True,
+            sora2_total_count=9999,
+            sora2_remaining_count=9999,
+        )
+        ids.append(await db.add_token(token))
+    return ids
+
+
+async def remove_tokens(token_ids: List[int]):
+    from src.core.database import Database
+
+    db = Database()
+    for token_id in token_ids:
+        await db.delete_token(token_id)
+
+
+# ==================== Spawned servers ====================
+
+async def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with AsyncSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                await session.get(url, timeout=2)
+                return
+            except Exception:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout:.0f}s")
+
+
+def spawn_mock(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, str(ROOT / "benchmarks" / "mock_sora_server.py"),
+        "--port", str(args.mock_port),
+        "--video-seconds", str(args.video_seconds),
+        "--image-seconds", str(args.image_seconds),
+        "--failure-rate", str(args.failure_rate),
+        "--rate-429", str(args.rate_429),
+        "--media-bytes", str(args.media_bytes),
+    ]
+    return subprocess.Popen(cmd, cwd=str(ROOT))
+
+
+def spawn_proxy(mock_url: str) -> subprocess.Popen:
+    env = dict(os.environ, SORA_BASE_URL=f"{mock_url}/backend")
+    return subprocess.Popen([sys.executable, "main.py"], cwd=str(ROOT), env=env,
+                            stdout=subprocess.DEVNULL)
+
+
+# ==================== Load generation ====================
+
+async def fetch_mock_stats(session: AsyncSession, mock_url: Optional[str]) -> Optional[Dict]:
+    if not mock_url:
+        return None
+    try:
+        response = await session.get(f"{mock_url}/_mock/stats", timeout=5)
+        return response.json()
+    except Exception:
+        return None
+
+
+async def run_one(session: AsyncSession, args) -> Dict:
+    """One streaming chat completion; returns timing and outcome"""
+    payload = {
+        "model": args.model,
+        "messages": [{"role": "user", "content": args.prompt}],
+        "stream": True,
+    }
+    headers = {"Authorization": f"Bearer {args.api_key}"}
+    start = time.perf_counter()
+    first_chunk = None
+    outcome = "failed"
+    error = None
+    try:
+        async with session.stream("POST", f"{args.url}/v1/chat/completions", json=payload,
+                                  headers=headers, timeout=args.timeout) as response:
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}"
+            else:
+                async for line in response.aiter_lines():
+                    if not line or not line.startswith(b"data: "):
+                        continue
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    data = line[6:]
+                    if data == b"[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        error = chunk["error"].get("message")
+                        break
+                    content = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if content and ("<video" in content or "![Generated" in content):
+                        outcome = "ok"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "latency": time.perf_counter() - start,
+        "first_chunk": first_chunk,
+        "outcome": outcome,
+        "error": error,
+    }
+
+
+async def run_load(args) -> Dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+    results: List[Dict] = []
+
+    async def client():
+        async with AsyncSession() as session:
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results.append(await run_one(session, args))
+
+    async with AsyncSession() as control:
+        before = await fetch_mock_stats(control, args.mock_url)
+        sampler = ProcessSampler(args.pid)
+        sampler.start()
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.clients)))
+        wall = time.perf_counter() - wall_start
+        await sampler.stop()
+        after = await fetch_mock_stats(control, args.mock_url)
+
+    latencies = [r["latency"] for r in results if r["outcome"] == "ok"]
+    first_chunks = [r["first_chunk"] for r in results if r["first_chunk"] is not None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"][:120]] = errors.get(r["error"][:120], 0) + 1
+
+    report = {
+        "model": args.model,
+        "clients": args.clients,
+        "requests": len(results),
+        "ok": len(latencies),
+        "failed": len(results) - len(latencies),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 3) if wall else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "first_chunk_p50": percentile(first_chunks, 50),
+        "first_chunk_p99": percentile(first_chunks, 99),
+        "errors": errors,
+        "process": sampler.report(),
+    }
+    if before and after:
+        upstream = after["requests_total"] - before["requests_total"]
+        tasks = sum(after["tasks_created"].values()) - sum(before["tasks_created"].values())
+        report["upstream_requests"] = upstream
+        report["upstream_tasks"] = tasks
+        report["upstream_requests_per_task"] = round(upstream / tasks, 2) if tasks else None
+        report["upstream_by_endpoint"] = {
+            k: v - before["requests"].get(k, 0) for k, v in sorted(after["requests"].items())
+        }
+    return report
+
+
+def _print_report(report: Dict):
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}s"
+
+    print(f"\n📊 {report['requests']} requests ({report['ok']} ok, {report['failed']} failed) "
+          f"with {report['clients']} clients in {report['wall_seconds']}s")
+    print(f"   latency       p50 {fmt(report['latency_p50'])}  p99 {fmt(report['latency_p99'])}")
+    print(f"   first chunk   p50 {fmt(report['first_chunk_p50'])}  p99 {fmt(report['first_chunk_p99'])}")
+    if report.get("upstream_requests_per_task") is not None:
+        print(f"   upstream      {report['upstream_requests']} requests / {report['upstream_tasks']} tasks "
+              f"= {report['upstream_requests_per_task']} per task")
+    process = report.get("process")
+    if process:
+        print(f"   proxy         cpu {process['cpu_seconds']}s ({process['cpu_percent']}%)  "
+              f"rss peak {process['rss_peak_mb']} MB")
+    for message, count in report["errors"].items():
+        print(f"   ❌ {count}x {message}")
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the proxy against the mock Sora backend")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Proxy base URL")
+    parser.add_argument("--api-key", default="han1234")
+    parser.add_argument("--model", default="sora-video-10s")
+    parser.add_argument("--prompt", default="A cat walking on the beach at sunset")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent streaming clients")
+    parser.add_argument("--requests", type=int, default=50, help="Total requests")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--pid", type=int, help="Proxy PID for CPU/RSS sampling")
+    parser.add_argument("--mock-url", help="Mock backend URL for upstream request counts")
+    parser.add_argument("--seed-tokens", type=int, default=0, help="Insert N mock tokens before the run")
+    parser.add_argument("--keep-tokens", action="store_true", help="Keep seeded tokens after the run")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    spawn = parser.add_argument_group("spawned servers")
+    spawn.add_argument("--spawn", action="store_true", help="Start the mock backend and the proxy")
+    spawn.add_argument("--mock-port", type=int, default=9000)
+    spawn.add_argument("--video-seconds", type=float, default=20.0)
+    spawn.add_argument("--image-seconds", type=float, default=5.0)
+    spawn.add_argument("--failure-rate", type=float, default=0.0)
+    spawn.add_argument("--rate-429", type=float, default=0.0)
+    spawn.add_argument("--media-bytes", type=int, default=512 * 1024)
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = _parse_args(argv)
+    processes: List[subprocess.Popen] = []
+    seeded: List[int] = []
+    try:
+        if args.spawn:
+            args.mock_url = args.mock_url or f"http://127.0.0.1:{args.mock_port}"
+            processes.append(spawn_mock(args))
+            await _wait_ready(f"{args.mock_url}/_mock/stats")
+
+        if args.seed_tokens:
+            seeded = await seed_tokens(args.seed_tokens)
+            print(f"✅ Seeded {len(seeded)} mock tokens")
+
+        if args.spawn:
+            proxy = spawn_proxy(args.mock_url)
+            processes.append(proxy)
+            args.pid = args.pid or proxy.pid
+            await _wait_ready(f"{args.url}/v1/models")
+
+        report = await run_load(args)
+        _print_report(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if seeded and not args.keep_tokens:
+            await remove_tokens(seeded)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,475 @@
+"""Micro-benchmarks for hot-path components
+
+Each benchmark is a factory registered with @benchmark. It receives a
+BenchContext (scratch directory, cleanup hooks) plus its parameter and returns
+the callable to time (sync or async). The runner calibrates the number of
+calls per round so each round takes at least --min-time, then reports per-call
+statistics.
+
+Usage:
+    python benchmarks/micro_bench.py                      # run everything, print table
+    python benchmarks/micro_bench.py -k select_token      # substring filter
+    python benchmarks/micro_bench.py --save baseline      # write benchmarks/baselines/baseline.json
+    python benchmarks/micro_bench.py --output current.json
+    python benchmarks/compare.py benchmarks/baselines/baseline.json current.json
+
+The checked-in baselines/baseline.json is a reference run; its "meta" block
+records the commit, Python version and machine it came from. Timings only
+compare on the same machine, so re-save the baseline locally before gating
+changes with compare.py.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+_REGISTRY: List[Dict[str, Any]] = []
+
+
+def benchmark(name: str, params: Sequence[Any] = (None,)):
+    """Register a benchmark factory, once per parameter value"""
+    def decorator(factory: Callable):
+        for param in params:
+            label = name if param is None else f"{name}[{param}]"
+            _REGISTRY.append({"name": label, "factory": factory, "param": param})
+        return factory
+    return decorator
+
+
+class BenchContext:
+    """Per-benchmark scratch space"""
+
+    def __init__(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="sora2api-bench-"))
+        self._cleanups: List[Callable] = []
+
+    def add_cleanup(self, fn: Callable):
+        self._cleanups.append(fn)
+
+    async def close(self):
+        for fn in reversed(self._cleanups):
+            result = fn()
+            if inspect.isawaitable(result):
+                await result
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+# ==================== Helpers ====================
+
+async def _make_db(ctx: BenchContext, tokens: int = 0):
+    from src.core.database import Database
+    from src.core.models import Token
+
+    db = Database(db_path=str(ctx.tmp_dir / "bench.db"))
+    await db.init_db()
+    for i in range(tokens):
+        await db.add_token(Token(
+            token=f"bench-{i}-{os.urandom(8).hex()}",
+            email=f"bench{i}@example.com",
+            sora2_supported=True,
+            sora2_remaining_count=100,
+        ))
+    return db
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    payload = os.urandom(256 * 1024)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_media_server(ctx: BenchContext) -> str:
+    """Local HTTP server for cold FileCache downloads"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MediaHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    ctx.add_cleanup(stop)
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ==================== Load balancing / locking ====================
+
+@benchmark("load_balancer.select_token", params=(10, 100, 1000))
+async def bench_select_token(ctx: BenchContext, n: int):
+    from src.services.token_manager import TokenManager
+    from src.services.load_balancer import LoadBalancer
+    from src.services.concurrency_manager import ConcurrencyManager
+
+    db = await _make_db(ctx, tokens=n)
+    token_manager = TokenManager(db)
+    concurrency_manager = ConcurrencyManager()
+    await concurrency_manager.initialize(await db.get_all_tokens())
+    load_balancer = LoadBalancer(token_manager, concurrency_manager)
+
+    async def run():
+        await load_balancer.select_token(for_video_generation=True)
+    return run
+
+
+@benchmark("token_lock.contention", params=(1, 10, 100))
+async def bench_token_lock(ctx: BenchContext, tasks: int):
+    """`tasks` coroutines acquiring/releasing locks over 10 tokens"""
+    from src.services.token_lock import TokenLock
+
+    lock = TokenLock(lock_timeout=300)
+
+    async def worker(i: int):
+        token_id = i % 10
+        if await lock.acquire_lock(token_id):
+            await lock.release_lock(token_id)
+
+    async def run():
+        await asyncio.gather(*(worker(i) for i in range(tasks)))
+    return run
+
+
+@benchmark("coordination.lock_cycle", params=("memory", "sqlite"))
+async def bench_coordination_lock(ctx: BenchContext, backend_name: str):
+    """acquire + exists + release of one flag on a coordination backend"""
+    from src.services.coordination import InProcessBackend, SQLiteBackend
+
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(str(ctx.tmp_dir / "coordination.db"))
+        ctx.add_cleanup(backend.close)
+    else:
+        backend = InProcessBackend()
+
+    async def run():
+        await backend.acquire("lock:image:1", 300, "bench")
+        await backend.exists("lock:image:1")
+        await backend.release("lock:image:1", "bench")
+    return run
+
+
+@benchmark("concurrency_manager.contention", params=(1, 10, 100))
+async def bench_concurrency_manager(ctx: BenchContext, tasks: int):
+    """`tasks` coroutines doing can_use/acquire/release over 10 limited tokens"""
+    from src.services.concurrency_manager import ConcurrencyManager
+
+    manager = ConcurrencyManager()
+    for token_id in range(10):
+        await manager.reset_token(token_id, image_concurrency=5, video_concurrency=5)
+
+    async def worker(i: int):
+        token_id = i % 10
+        if await manager.can_use_video(token_id) and await manager.acquire_video(token_id):
+            await manager.release_video(token_id)
+
+    async def run():
+        await asyncio.gather(*(worker(i) for i in range(tasks)))
+    return run
+
+
+# ==================== Database ====================
+
+@benchmark("db.add_token")
+async def bench_db_add_token(ctx: BenchContext, _):
+    from src.core.models import Token
+
+    db = await _make_db(ctx)
+    counter = iter(range(10 ** 9))
+
+    async def run():
+        i = next(counter)
+        await db.add_token(Token(token=f"t-{i}", email=f"t{i}@example.com"))
+    return run
+
+
+@benchmark("db.get_token")
+async def bench_db_get_token(ctx: BenchContext, _):
+    db = await _make_db(ctx, tokens=100)
+
+    async def run():
+        await db.get_token(50)
+    return run
+
+
+@benchmark("db.get_active_tokens", params=(10, 100, 1000))
+async def bench_db_get_active_tokens(ctx: BenchContext, n: int):
+    db = await _make_db(ctx, tokens=n)
+
+    async def run():
+        await db.get_active_tokens()
+    return run
+
+
+@benchmark("db.update_token_usage")
+async def bench_db_update_token_usage(ctx: BenchContext, _):
+    db = await _make_db(ctx, tokens=10)
+
+    async def run():
+        await db.update_token_usage(5)
+    return run
+
+
+@benchmark("db.create_task")
+async def bench_db_create_task(ctx: BenchContext, _):
+    from src.core.models import Task
+
+    db = await _make_db(ctx, tokens=1)
+    counter = iter(range(10 ** 9))
+
+    async def run():
+        await db.create_task(Task(task_id=f"task_{next(counter)}", token_id=1, model="sora-video-10s", prompt="bench"))
+    return run
+
+
+@benchmark("db.update_task")
+async def bench_db_update_task(ctx: BenchContext, _):
+    from src.core.models import Task
+
+    db = await _make_db(ctx, tokens=1)
+    await db.create_task(Task(task_id="task_bench", token_id=1, model="sora-video-10s", prompt="bench"))
+
+    async def run():
+        await db.update_task("task_bench", "processing", 42.0)
+    return run
+
+
+@benchmark("db.get_task")
+async def bench_db_get_task(ctx: BenchContext, _):
+    from src.core.models import Task
+
+    db = await _make_db(ctx, tokens=1)
+    await db.create_task(Task(task_id="task_bench", token_id=1, model="sora-video-10s", prompt="bench"))
+
+    async def run():
+        await db.get_task("task_bench")
+    return run
+
+
+@benchmark("db.log_request")
+async def bench_db_log_request(ctx: BenchContext, _):
+    from src.core.models import RequestLog
+
+    db = await _make_db(ctx, tokens=1)
+    log = RequestLog(token_id=1, operation="generate_video", request_body='{"prompt": "bench"}',
+                     response_body='{"task_id": "task_bench"}', status_code=200, duration=1.5)
+
+    async def run():
+        await db.log_request(log)
+    return run
+
+
+@benchmark("db.get_character_cards_by_usernames", params=(10, 1000))
+async def bench_character_cards(ctx: BenchContext, n: int):
+    """Lookup of 3 names among n stored cards"""
+    from src.core.models import CharacterCard
+
+    db = await _make_db(ctx, tokens=1)
+    for i in range(n):
+        await db.create_character_card(CharacterCard(
+            token_id=1, username=f"user.{i}", display_name=f"Display {i}", character_id=f"ch_{i}"))
+    names = [f"user.{n // 2}", f"Display {n - 1}", "missing.name"]
+
+    async def run():
+        await db.get_character_cards_by_usernames(names)
+    return run
+
+
+# ==================== Generation pipeline ====================
+
+async def _make_generation_handler(ctx: BenchContext):
+    from src.services.sora_client import SoraClient
+    from src.services.token_manager import TokenManager
+    from src.services.load_balancer import LoadBalancer
+    from src.services.proxy_manager import ProxyManager
+    from src.services.generation_handler import GenerationHandler
+
+    db = await _make_db(ctx)
+    proxy_manager = ProxyManager(db)
+    token_manager = TokenManager(db)
+    return GenerationHandler(SoraClient(proxy_manager), token_manager, LoadBalancer(token_manager), db, proxy_manager)
+
+
+@benchmark("generation._format_stream_chunk", params=("progress", "final"))
+async def bench_format_stream_chunk(ctx: BenchContext, kind: str):
+    handler = await _make_generation_handler(ctx)
+    if kind == "progress":
+        def run():
+            handler._format_stream_chunk(reasoning_content="**Video Generation Progress**: 42% (running)\n")
+    else:
+        def run():
+            handler._format_stream_chunk(
+                content="```html\n<video src='http://127.0.0.1:8000/tmp/abc.mp4' controls></video>\n```",
+                finish_reason="STOP",
+            )
+    return run
+
+
+@benchmark("sora_client.format_storyboard_prompt", params=(1, 10))
+async def bench_format_storyboard_prompt(ctx: BenchContext, shots: int):
+    from src.services.sora_client import SoraClient
+
+    prompt = "A rainy neon city at night. " + " ".join(
+        f"[5.0s] Shot {i}: the camera slowly pans across the street." for i in range(shots)
+    )
+
+    def run():
+        SoraClient.format_storyboard_prompt(prompt)
+    return run
+
+
+@benchmark("file_cache.download_and_cache", params=("warm", "cold"))
+async def bench_file_cache(ctx: BenchContext, mode: str):
+    from src.services.file_cache import FileCache
+
+    cache = FileCache(cache_dir=str(ctx.tmp_dir / "cache"), default_timeout=3600)
+    base_url = _start_media_server(ctx)
+    if mode == "warm":
+        url = f"{base_url}/video.mp4"
+        await cache.download_and_cache(url, "video")
+
+        async def run():
+            await cache.download_and_cache(url, "video")
+    else:
+        counter = iter(range(10 ** 9))
+
+        async def run():
+            await cache.download_and_cache(f"{base_url}/video.mp4?n={next(counter)}", "video")
+    return run
+
+
+# ==================== Runner ====================
+
+async def _time_calls(fn: Callable, is_async: bool, number: int) -> float:
+    start = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await fn()
+    else:
+        for _ in range(number):
+            fn()
+    return time.perf_counter() - start
+
+
+async def run_benchmark(entry: Dict[str, Any], rounds: int, min_time: float, max_number: int) -> Dict[str, Any]:
+    ctx = BenchContext()
+    try:
+        fn = await entry["factory"](ctx, entry["param"])
+        is_async = inspect.iscoroutinefunction(fn)
+
+        # Warm-up, then calibrate calls per round
+        await _time_calls(fn, is_async, 1)
+        number = 1
+        while number < max_number:
+            elapsed = await _time_calls(fn, is_async, number)
+            if elapsed >= min_time:
+                break
+            number = min(max_number, number * 10 if elapsed < min_time / 10 else number * 2)
+
+        samples = [await _time_calls(fn, is_async, number) / number for _ in range(rounds)]
+    finally:
+        await ctx.close()
+
+    return {
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "max": max(samples),
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} µs"
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run hot-path micro-benchmarks")
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this string")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--max-number", type=int, default=100000, help="Upper bound of calls per round")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--save", metavar="NAME", help=f"Write results to {BASELINE_DIR.name}/NAME.json")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    entries = [e for e in _REGISTRY if not args.filter or args.filter in e["name"]]
+    if args.list:
+        for entry in entries:
+            print(entry["name"])
+        return
+
+    results: Dict[str, Dict[str, Any]] = {}
+    width = max((len(e["name"]) for e in entries), default=10)
+    for entry in entries:
+        result = await run_benchmark(entry, args.rounds, args.min_time, args.max_number)
+        results[entry["name"]] = result
+        print(f"{entry['name']:<{width}}  median {_format_time(result['median']):>12}  "
+              f"± {_format_time(result['stdev']):>10}  ({result['rounds']}x{result['number']})")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rounds": args.rounds,
+            "min_time": args.min_time,
+        },
+        "benchmarks": results,
+    }
+    paths = []
+    if args.output:
+        paths.append(Path(args.output))
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        paths.append(BASELINE_DIR / f"{args.save}.json")
+    for path in paths:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,436 @@
+"""Offline stand-in for the Sora backend used by SoraClient
+
+Implements the subset of endpoints the proxy calls (generation, polling,
+uploads, publishing, cameo flow) with configurable timing, failure and 429
+rates, and serves fake media files so the cache/download path is exercised.
+
+Usage:
+    python benchmarks/mock_sora_server.py --port 9000 --video-seconds 20
+    SORA_BASE_URL=http://127.0.0.1:9000/backend python main.py
+
+Stats for the load test:
+    GET  /_mock/stats   request counts per endpoint, tasks created/finished
+    POST /_mock/reset   clear tasks and counters
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+@dataclass
+class MockSettings:
+    """Behaviour of the mock upstream (all durations in seconds)"""
+    video_seconds: float = 20.0       # Time for a video task to reach 100%
+    image_seconds: float = 5.0        # Time for an image task to succeed
+    cameo_seconds: float = 5.0        # Time for an uploaded cameo to finish processing
+    queued_seconds: float = 1.0       # Initial period where progress_pct is null
+    jitter: float = 0.2               # +/- fraction applied to each task duration
+    failure_rate: float = 0.0         # Fraction of tasks ending as content violation / failed
+    rate_429: float = 0.0             # Fraction of backend requests answered with 429
+    retry_after: float = 1.0          # Retry-After sent with 429 responses
+    error_rate: float = 0.0           # Fraction of backend requests answered with 500
+    latency_ms: float = 0.0           # Added latency per backend request
+    media_bytes: int = 512 * 1024     # Size of served fake media files
+    drafts_limit: int = 15            # Items returned by /project_y/profile/drafts
+
+
+@dataclass
+class MockTask:
+    id: str
+    token: str
+    kind: str                 # video / image
+    created: float
+    duration: float
+    fail: bool
+    generation_id: str = field(default_factory=lambda: f"gen_{os.urandom(13).hex()}")
+
+    def elapsed(self, now: float) -> float:
+        return now - self.created
+
+    def done(self, now: float) -> bool:
+        return self.elapsed(now) >= self.duration
+
+
+# Concrete IDs become {id} so stats stay aggregated per endpoint
+_ID_SEGMENT = re.compile(r"/(?:task_|gen_|s_|cameo_|ch_|media_|file_)[^/?]+|/[0-9a-f]{16,}")
+
+
+def _endpoint_label(method: str, path: str) -> str:
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+class MockSoraState:
+    """Tasks, cameos and request counters (single event loop, no locking)"""
+
+    def __init__(self, settings: MockSettings):
+        self.settings = settings
+        self.reset()
+
+    def reset(self):
+        self.tasks: Dict[str, MockTask] = {}
+        self.tasks_by_token: Dict[str, List[str]] = {}
+        self.cameos: Dict[str, MockTask] = {}
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.tasks_created = Counter()
+        self.started = time.time()
+        self._media = os.urandom(min(self.settings.media_bytes, 64 * 1024))
+
+    def _duration(self, base: float) -> float:
+        jitter = self.settings.jitter
+        return max(0.0, base * random.uniform(1 - jitter, 1 + jitter))
+
+    def create_task(self, token: str, kind: str) -> MockTask:
+        base = self.settings.video_seconds if kind == "video" else self.settings.image_seconds
+        task = MockTask(
+            id=f"task_{os.urandom(13).hex()}",
+            token=token,
+            kind=kind,
+            created=time.time(),
+            duration=self._duration(base),
+            fail=random.random() < self.settings.failure_rate,
+        )
+        self.tasks[task.id] = task
+        self.tasks_by_token.setdefault(token, []).append(task.id)
+        self.tasks_created[kind] += 1
+        return task
+
+    def create_cameo(self, token: str) -> MockTask:
+        cameo = MockTask(
+            id=f"cameo_{os.urandom(13).hex()}",
+            token=token,
+            kind="cameo",
+            created=time.time(),
+            duration=self._duration(self.settings.cameo_seconds),
+            fail=random.random() < self.settings.failure_rate,
+        )
+        self.cameos[cameo.id] = cameo
+        return cameo
+
+    def token_tasks(self, token: str, kind: str) -> List[MockTask]:
+        """Tasks of one account, newest first"""
+        ids = self.tasks_by_token.get(token, [])
+        return [self.tasks[i] for i in reversed(ids) if self.tasks[i].kind == kind]
+
+    def media_chunks(self):
+        """Yield media_bytes of filler data"""
+        remaining = self.settings.media_bytes
+        while remaining > 0:
+            chunk = self._media[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+
+    def stats(self) -> dict:
+        now = time.time()
+        finished = sum(1 for t in self.tasks.values() if t.done(now))
+        return {
+            "uptime_seconds": round(now - self.started, 3),
+            "requests_total": sum(self.requests.values()),
+            "requests": dict(self.requests),
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+            "tasks_created": dict(self.tasks_created),
+            "tasks_finished": finished,
+        }
+
+
+def _bearer(request: Request) -> str:
+    auth = request.headers.get("authorization", "")
+    return auth[7:] if auth.startswith("Bearer ") else auth
+
+
+def create_app(settings: Optional[MockSettings] = None) -> FastAPI:
+    """Build the mock app (settings can be changed at runtime via the state object)"""
+    state = MockSoraState(settings or MockSettings())
+    app = FastAPI(title="Mock Sora backend")
+    app.state.mock = state
+
+    def media_url(request: Request, name: str) -> str:
+        return f"{str(request.base_url).rstrip('/')}/media/{name}"
+
+    @app.middleware("http")
+    async def upstream_behaviour(request: Request, call_next):
+        path = request.url.path
+        if not path.startswith("/backend"):
+            return await call_next(request)
+
+        s = state.settings
+        state.requests[_endpoint_label(request.method, path[len("/backend"):])] += 1
+        if s.latency_ms > 0:
+            await asyncio.sleep(s.latency_ms / 1000)
+
+        if s.rate_429 > 0 and random.random() < s.rate_429:
+            response = JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Too many requests", "type": "rate_limit", "code": "too_many_requests"}},
+                headers={"Retry-After": f"{s.retry_after:g}"},
+            )
+        elif s.error_rate > 0 and random.random() < s.error_rate:
+            response = JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Internal server error", "type": "server_error"}},
+            )
+        else:
+            response = await call_next(request)
+        state.statuses[response.status_code] += 1
+        return response
+
+    # ==================== Account ====================
+
+    @app.get("/backend/me")
+    async def me(request: Request):
+        token = _bearer(request)
+        return {"id": f"user-{token[-8:]}", "email": f"{token[-8:]}@mock.local", "username": f"mock_{token[-6:]}"}
+
+    @app.get("/backend/nf/check")
+    async def nf_check():
+        return {"rate_limit_and_credit_balance": {
+            "estimated_num_videos_remaining": 9999,
+            "rate_limit_reached": False,
+            "access_resets_in_seconds": 0,
+        }}
+
+    @app.get("/backend/billing/subscriptions")
+    async def subscriptions():
+        return {"data": [{"plan": {"id": "chatgpt_team", "title": "Mock Plan"}, "end_ts": "2099-01-01T00:00:00Z"}]}
+
+    @app.post("/backend/project_y/profile/username/check")
+    async def username_check():
+        return {"available": True}
+
+    @app.post("/backend/project_y/profile/username/set")
+    async def username_set(request: Request):
+        body = await request.json()
+        return {"username": body.get("username")}
+
+    # ==================== Uploads ====================
+
+    @app.post("/backend/uploads")
+    async def uploads(request: Request):
+        await request.body()
+        return {"id": f"media_{os.urandom(13).hex()}"}
+
+    @app.post("/backend/project_y/file/upload")
+    async def file_upload(request: Request):
+        await request.body()
+        return {"asset_pointer": f"sediment://file_{os.urandom(13).hex()}"}
+
+    # ==================== Generation ====================
+
+    @app.post("/backend/video_gen")
+    async def video_gen(request: Request):
+        await request.body()
+        task = state.create_task(_bearer(request), "image")
+        return {"id": task.id}
+
+    @app.post("/backend/nf/create")
+    async def nf_create(request: Request):
+        await request.body()
+        task = state.create_task(_bearer(request), "video")
+        return {"id": task.id}
+
+    @app.post("/backend/nf/create/storyboard")
+    async def nf_create_storyboard(request: Request):
+        await request.body()
+        task = state.create_task(_bearer(request), "video")
+        return {"id": task.id}
+
+    # ==================== Polling ====================
+
+    @app.get("/backend/nf/pending")
+    async def nf_pending(request: Request):
+        now = time.time()
+        pending = []
+        for task in state.token_tasks(_bearer(request), "video"):
+            if task.done(now):
+                continue
+            elapsed = task.elapsed(now)
+            progress = None
+            if elapsed >= state.settings.queued_seconds:
+                progress = round(min(elapsed / task.duration, 0.99), 4) if task.duration else 0.99
+            pending.append({
+                "id": task.id,
+                "status": "queued" if progress is None else "running",
+                "progress_pct": progress,
+            })
+        return pending
+
+    @app.get("/backend/project_y/profile/drafts")
+    async def drafts(request: Request, limit: int = 15):
+        now = time.time()
+        items = []
+        for task in state.token_tasks(_bearer(request), "video"):
+            if not task.done(now):
+                continue
+            if task.fail:
+                items.append({
+                    "id": task.generation_id,
+                    "task_id": task.id,
+                    "kind": "sora_content_violation",
+                    "reason_str": "This content may violate our guardrails (mock)",
+                    "url": None,
+                    "downloadable_url": None,
+                })
+            else:
+                url = media_url(request, f"{task.generation_id}.mp4")
+                items.append({
+                    "id": task.generation_id,
+                    "task_id": task.id,
+                    "kind": "sora_draft",
+                    "reason_str": None,
+                    "url": url,
+                    "downloadable_url": url,
+                })
+            if len(items) >= min(limit, state.settings.drafts_limit):
+                break
+        return {"items": items, "cursor": None}
+
+    @app.get("/backend/v2/recent_tasks")
+    async def recent_tasks(request: Request, limit: int = 20):
+        now = time.time()
+        responses = []
+        for task in state.token_tasks(_bearer(request), "image")[:limit]:
+            if not task.done(now):
+                progress = min(task.elapsed(now) / task.duration, 0.99) if task.duration else 0.99
+                responses.append({"id": task.id, "status": "running", "progress_pct": round(progress, 4), "generations": []})
+            elif task.fail:
+                responses.append({"id": task.id, "status": "failed", "progress_pct": 1.0, "generations": []})
+            else:
+                responses.append({
+                    "id": task.id,
+                    "status": "succeeded",
+                    "progress_pct": 1.0,
+                    "generations": [{"id": task.generation_id, "url": media_url(request, f"{task.generation_id}.png")}],
+                })
+        return {"task_responses": responses}
+
+    # ==================== Publishing ====================
+
+    @app.post("/backend/project_y/post")
+    async def create_post(request: Request):
+        await request.body()
+        return {"post": {"id": f"s_{os.urandom(16).hex()}"}}
+
+    @app.delete("/backend/project_y/post/{post_id}")
+    async def delete_post(post_id: str):
+        return Response(status_code=204)
+
+    # ==================== Cameo / character ====================
+
+    @app.post("/backend/characters/upload")
+    async def characters_upload(request: Request):
+        await request.body()
+        cameo = state.create_cameo(_bearer(request))
+        return {"id": cameo.id}
+
+    @app.get("/backend/project_y/cameos/in_progress/{cameo_id}")
+    async def cameo_status(request: Request, cameo_id: str):
+        cameo = state.cameos.get(cameo_id)
+        if cameo is None:
+            return JSONResponse(status_code=404, content={"error": {"message": "Cameo not found"}})
+        now = time.time()
+        if not cameo.done(now):
+            return {"id": cameo_id, "status": "processing", "status_message": "Processing"}
+        if cameo.fail:
+            return {"id": cameo_id, "status": "failed", "status_message": "Upload may violate our policies (mock)"}
+        suffix = cameo_id[-6:]
+        return {
+            "id": cameo_id,
+            "status": "finalized",
+            "status_message": "Completed",
+            "display_name_hint": f"Mock {suffix}",
+            "username_hint": f"mock.{suffix}",
+            "profile_asset_url": media_url(request, f"{cameo_id}.webp"),
+            "instruction_set_hint": None,
+        }
+
+    @app.post("/backend/characters/finalize")
+    async def characters_finalize(request: Request):
+        await request.body()
+        return {"character": {"character_id": f"ch_{os.urandom(13).hex()}"}}
+
+    @app.post("/backend/project_y/cameos/by_id/{cameo_id}/update_v2")
+    async def cameo_update(cameo_id: str, request: Request):
+        await request.body()
+        return {"id": cameo_id}
+
+    @app.delete("/backend/project_y/characters/{character_id}")
+    async def delete_character(character_id: str):
+        return Response(status_code=204)
+
+    # ==================== Media ====================
+
+    @app.get("/media/{name}")
+    async def media(name: str):
+        if name.endswith(".mp4"):
+            media_type = "video/mp4"
+        elif name.endswith(".webp"):
+            media_type = "image/webp"
+        else:
+            media_type = "image/png"
+        body = b"".join(state.media_chunks())
+        return Response(content=body, media_type=media_type)
+
+    # ==================== Mock control ====================
+
+    @app.get("/_mock/stats")
+    async def stats():
+        return state.stats()
+
+    @app.post("/_mock/reset")
+    async def reset():
+        state.reset()
+        return {"success": True}
+
+    return app
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    defaults = MockSettings()
+    parser = argparse.ArgumentParser(description="Mock Sora backend for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--video-seconds", type=float, default=defaults.video_seconds)
+    parser.add_argument("--image-seconds", type=float, default=defaults.image_seconds)
+    parser.add_argument("--cameo-seconds", type=float, default=defaults.cameo_seconds)
+    parser.add_argument("--queued-seconds", type=float, default=defaults.queued_seconds)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate)
+    parser.add_argument("--rate-429", type=float, default=defaults.rate_429)
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--media-bytes", type=int, default=defaults.media_bytes)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    settings = MockSettings(
+        video_seconds=args.video_seconds,
+        image_seconds=args.image_seconds,
+        cameo_seconds=args.cameo_seconds,
+        queued_seconds=args.queued_seconds,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        latency_ms=args.latency_ms,
+        media_bytes=args.media_bytes,
+    )
+    print(f"🧪 Mock Sora backend: http://{args.host}:{args.port}/backend")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,21 @@
 """Admin routes - Management endpoints"""
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
-import asyncio
 import re
 import secrets
-import zipfile
-from urllib.parse import urlparse
+from urllib.parse import urlparse, quote
 from pathlib import Path
 from pydantic import BaseModel
 from ..core.auth import AuthManager
 from ..core.config import config
+from ..core.tracing import tracer
 from ..services.token_manager import TokenManager
 from ..services.proxy_manager import ProxyManager
 from ..services.concurrency_manager import ConcurrencyManager
+from ..services.zip_stream import ZipEntry, register_archive, load_archive, parse_range
+from ..services.character_directory import character_directory
 from ..core.database import Database
 from ..core.models import Token, AdminConfig, ProxyConfig
 
@@ -230,7 +232,9 @@ async def get_tokens(token: str = Depends(verify_admin_token)) -> List[dict]:
             "video_enabled": token.video_enabled,
             # 并发限制
             "image_concurrency": token.image_concurrency,
-            "video_concurrency": token.video_concurrency
+            "video_concurrency": token.video_concurrency,
+            # 熔断状态
+            "circuit_breaker": token_manager.circuit_breaker.snapshot(token.id)
         })
 
     return result
@@ -734,6 +738,24 @@ async def get_logs(limit: int = 100, token: str = Depends(verify_admin_token)):
         "created_at": log.get("created_at")
     } for log in logs]
 
+# Tracing endpoints
+@router.get("/api/traces")
+async def list_traces(limit: int = 50, token: str = Depends(verify_admin_token)):
+    """List recently finished request traces (newest first)"""
+    return {
+        "enabled": config.tracing_enabled,
+        "sample_rate": config.tracing_sample_rate,
+        "traces": tracer.list_traces(limit)
+    }
+
+@router.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str, token: str = Depends(verify_admin_token)):
+    """Get all spans of one trace"""
+    trace = tracer.get_trace(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
 # Download endpoints
 def _sanitize_filename_component(name: str, fallback: str = "download") -> str:
     """Sanitize for Windows/macOS/Linux safe filenames (no path traversal, no reserved chars)."""
@@ -781,11 +803,14 @@ def _extract_tmp_relpath(url: str) -> Optional[str]:
 
 @router.post("/api/download/batch-zip")
 async def create_batch_zip(request: BatchZipRequest, token: str = Depends(verify_admin_token)):
-    """Create a ZIP bundle from existing /tmp cached files and return its /tmp URL.
+    """Plan a ZIP bundle of existing /tmp cached files and return its download URL.
 
     Notes:
     - Only allows bundling files under /tmp (static mount), never arbitrary filesystem paths.
-    - Uses ZIP_STORED (no compression) for speed, videos are already compressed.
+    - Nothing is built here: the archive is streamed from the cached files when the
+      URL is fetched (ZIP_STORED, videos are already compressed), so no ZIP is written to disk.
+    - The URL is unguessable and expires after an hour; it does not need the admin token
+      so the browser can download it directly.
     """
     items = request.items if request and isinstance(request.items, list) else []
     if not items:
@@ -807,87 +832,129 @@ async def create_batch_zip(request: BatchZipRequest, token: str = Depends(verify
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     rand = secrets.token_urlsafe(8).replace("-", "").replace("_", "")
     zip_filename = f"{title}_{ts}_{rand}.zip"
-    zip_path = (tmp_root / zip_filename)
-
-    def _build_zip_sync() -> dict:
-        added = 0
-        skipped = 0
-        used_names = set()
-
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
-            for it in items:
-                rel = _extract_tmp_relpath(getattr(it, "url", None))
-                if not rel:
-                    skipped += 1
-                    continue
-                fs_path = (root_dir / rel).resolve()
-                # Must stay within tmp root
-                if tmp_root_resolved not in fs_path.parents and fs_path != tmp_root_resolved:
-                    skipped += 1
-                    continue
-                if not fs_path.exists() or not fs_path.is_file():
-                    skipped += 1
-                    continue
-
-                desired = getattr(it, "filename", None)
-                arc = _sanitize_filename_component(desired, fallback=fs_path.name)
-                # Strip any directories just in case
-                arc = Path(arc).name
-                # Ensure unique names inside zip
-                stem = Path(arc).stem
-                ext = Path(arc).suffix
-                candidate = arc
-                k = 2
-                while candidate in used_names:
-                    candidate = f"{stem}_{k}{ext}"
-                    k += 1
-                arc = candidate
-                used_names.add(arc)
-
-                zf.write(fs_path, arcname=arc)
-                added += 1
-
-        return {"added": added, "skipped": skipped}
-
-    try:
-        result = await asyncio.to_thread(_build_zip_sync)
-    except Exception as e:
-        # Best-effort cleanup
-        try:
-            if zip_path.exists():
-                zip_path.unlink()
-        except Exception:
-            pass
-        raise HTTPException(status_code=500, detail=f"Failed to create zip: {str(e)}")
 
-    if not result.get("added"):
+    entries: List[ZipEntry] = []
+    skipped = 0
+    used_names = set()
+    storage = generation_handler.file_cache.storage if generation_handler else None
+    for it in items:
+        url = getattr(it, "url", None)
+        rel = _extract_tmp_relpath(url)
+        if not rel and storage and url:
+            # Object store URL ([storage] s3/tiered): bundle the local copy
+            key = storage.key_for_url(url)
+            rel = f"tmp/{key}" if key else None
+        if not rel:
+            skipped += 1
+            continue
+        fs_path = (root_dir / rel).resolve()
+        # Must stay within tmp root
+        if tmp_root_resolved not in fs_path.parents and fs_path != tmp_root_resolved:
+            skipped += 1
+            continue
+        if storage and storage.remote and fs_path.parent == tmp_root_resolved and not fs_path.is_file():
+            # Not (or no longer) in the local hot tier
+            try:
+                await generation_handler.file_cache.local_copy(fs_path.name)
+            except Exception:
+                pass
         try:
-            if zip_path.exists():
-                zip_path.unlink()
-        except Exception:
-            pass
+            stat = fs_path.stat()
+        except OSError:
+            skipped += 1
+            continue
+        if not fs_path.is_file():
+            skipped += 1
+            continue
+
+        desired = getattr(it, "filename", None)
+        arc = _sanitize_filename_component(desired, fallback=fs_path.name)
+        # Strip any directories just in case
+        arc = Path(arc).name
+        # Ensure unique names inside zip
+        stem = Path(arc).stem
+        ext = Path(arc).suffix
+        candidate = arc
+        k = 2
+        while candidate in used_names:
+            candidate = f"{stem}_{k}{ext}"
+            k += 1
+        arc = candidate
+        used_names.add(arc)
+
+        entries.append(ZipEntry(arc, str(fs_path), stat.st_size, stat.st_mtime))
+
+    if not entries:
         raise HTTPException(status_code=400, detail="No valid /tmp files found for bundling")
 
+    zip_id = await register_archive(zip_filename, entries)
+
     return {
         "success": True,
-        "url": f"/tmp/{zip_filename}",
+        "url": f"/api/download/batch-zip/{zip_id}/{zip_filename}",
         "filename": zip_filename,
-        "count": int(result.get("added") or 0),
-        "skipped": int(result.get("skipped") or 0)
+        "count": len(entries),
+        "skipped": skipped
+    }
+
+@router.get("/api/download/batch-zip/{zip_id}/{filename}")
+async def download_batch_zip(zip_id: str, filename: str, range_header: Optional[str] = Header(None, alias="Range"),
+                             if_range: Optional[str] = Header(None, alias="If-Range")):
+    """Stream a planned ZIP bundle (supports Range for resumed downloads)"""
+    archive = await load_archive(zip_id)
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Download expired or unknown")
+    zip_filename, zip_stream = archive
+
+    etag = f'"{zip_id}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(zip_filename)}",
+        "Cache-Control": "private, no-transform",
     }
+    byte_range = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, zip_stream.size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{zip_stream.size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(zip_stream.size)
+        return StreamingResponse(zip_stream.iter_range(), media_type="application/zip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{zip_stream.size}"
+    return StreamingResponse(zip_stream.iter_range(start, end), status_code=206,
+                             media_type="application/zip", headers=headers)
 
 # Character card endpoints
 @router.get("/api/characters", response_model=List[CharacterCardResponse])
-async def get_characters(token: str = Depends(verify_admin_token)):
-    """List stored character cards"""
-    cards = await db.list_character_cards()
+async def get_characters(response: Response, limit: int = 200, offset: int = 0, token_id: Optional[int] = None,
+                         token: str = Depends(verify_admin_token)):
+    """List stored character cards (newest first); X-Total-Count carries the total for paging"""
+    cards, total = await character_directory.page(
+        db, offset=max(0, offset), limit=min(max(1, limit), 1000), token_id=token_id
+    )
+    response.headers["X-Total-Count"] = str(total)
     return cards
 
+@router.get("/api/characters/search", response_model=List[CharacterCardResponse])
+async def search_characters(prefix: str = "", limit: int = 10, token_id: Optional[int] = None,
+                            token: str = Depends(verify_admin_token)):
+    """Character cards whose username or display_name starts with prefix (@mention autocomplete)"""
+    return await character_directory.search(db, prefix.lstrip("@"), limit=min(max(1, limit), 100),
+                                            token_id=token_id)
+
 @router.delete("/api/characters/{card_id}")
 async def delete_character_card(card_id: int, token: str = Depends(verify_admin_token)):
     """Delete a stored character card (and its avatar file if exists)"""
     try:
         avatar_path = await db.delete_character_card(card_id)
+        await character_directory.removed(card_id)
         if avatar_path:
             # avatar_path starts with /tmp/..., map to filesystem
             static_path = Path(__file__).parent.parent.parent / avatar_path.lstrip("/")
@@ -934,6 +1001,7 @@ async def update_character_display_name(card_id: int, request: UpdateCharacterNa
         if not new_name:
             raise HTTPException(status_code=400, detail="display_name cannot be empty")
         await db.update_character_card_display_name(card_id, new_name)
+        await character_directory.renamed(card_id, new_name)
         return {"success": True, "display_name": new_name}
     except HTTPException:
         raise
@@ -1,16 +1,25 @@
 """API routes - OpenAI compatible endpoints"""
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse, JSONResponse
 from datetime import datetime
 from typing import List
 import json
-import re
 from ..core.auth import verify_api_key_header
-from ..core.models import ChatCompletionRequest
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..core.models import ChatCompletionRequest, BatchRequest
 from ..services.generation_handler import GenerationHandler, MODEL_CONFIG
+from ..services.task_event_hub import task_event_hub
+from ..services.prompt_analyzer import prompt_analyzer
+from ..services.batch_runner import BatchRunner, stream_with_errors
+from ..services.cluster import cluster, FORWARDED_HEADER, ForwardError
+from ..services.upload_spool import upload_spool, is_upload_ref, UnknownUploadError, UploadTooLargeError, CHUNK_SIZE
 
 router = APIRouter()
 
+# Boundaries and part headers a multipart upload may add on top of max_bytes
+_MULTIPART_OVERHEAD = 64 * 1024
+
 # Dependency injection will be set up in main.py
 generation_handler: GenerationHandler = None
 
@@ -35,24 +44,20 @@ def _extract_remix_id(text: str) -> str:
     if not text:
         return ""
 
-    # Match Sora share link format: s_[a-f0-9]{32}
-    match = re.search(r's_[a-f0-9]{32}', text)
-    if match:
-        return match.group(0)
-
-    return ""
+    # Match Sora share link format: s_[a-f0-9]{32} (parsed prompts are cached)
+    return prompt_analyzer.analyze(text).remix_id
 
 @router.get("/v1/models")
 async def list_models(api_key: str = Depends(verify_api_key_header)):
     """List available models"""
     models = []
     
-    for model_id, config in MODEL_CONFIG.items():
-        description = f"{config['type'].capitalize()} generation"
-        if config['type'] == 'image':
-            description += f" - {config['width']}x{config['height']}"
+    for model_id, model_cfg in MODEL_CONFIG.items():
+        description = f"{model_cfg['type'].capitalize()} generation"
+        if model_cfg['type'] == 'image':
+            description += f" - {model_cfg['width']}x{model_cfg['height']}"
         else:
-            description += f" - {config['orientation']}"
+            description += f" - {model_cfg['orientation']}"
         
         models.append({
             "id": model_id,
@@ -66,9 +71,43 @@ async def list_models(api_key: str = Depends(verify_api_key_header)):
         "data": models
     }
 
+async def _forward_chat_completion(peer, request: ChatCompletionRequest, authorization: str):
+    """Relay a chat completion to a cluster peer
+
+    Raises:
+        ForwardError: The peer did not take the request (try another one)
+    """
+    payload = request.model_dump(exclude_none=True)
+    if request.stream:
+        status_code, content_type, body = await cluster.forward_stream(
+            peer, "/v1/chat/completions", payload, authorization)
+        if not 200 <= status_code < 300:
+            # Rejected by the peer: pass its status and error body through
+            try:
+                content = b"".join([chunk async for chunk in body])
+            except Exception as e:
+                raise ForwardError(f"{peer.node_id} dropped the connection: {str(e)}") from e
+            return Response(content=content, status_code=status_code, media_type=content_type,
+                            headers={"X-Sora-Node": peer.node_id})
+        # A peer failing mid-stream ends the stream with an error event + [DONE]
+        return StreamingResponse(
+            stream_with_errors(body),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no",
+                "X-Sora-Node": peer.node_id
+            }
+        )
+    status_code, body = await cluster.forward_json(peer, "/v1/chat/completions", payload, authorization)
+    return JSONResponse(status_code=status_code, content=body, headers={"X-Sora-Node": peer.node_id})
+
+
 @router.post("/v1/chat/completions")
 async def create_chat_completion(
     request: ChatCompletionRequest,
+    http_request: Request,
     api_key: str = Depends(verify_api_key_header)
 ):
     """Create chat completion (unified endpoint for image and video generation)"""
@@ -111,26 +150,16 @@ async def create_chat_completion(
                     # Extract base64 image from data URI
                     image_url = item.get("image_url", {})
                     url = image_url.get("url", "")
-                    if url.startswith("data:image"):
-                        # Extract base64 data from data URI
-                        if "base64," in url:
-                            image_data = url.split("base64,", 1)[1]
-                        else:
-                            image_data = url
+                    if url.startswith("data:image") or is_upload_ref(url):
+                        # Data URI (decoded incrementally by the upload spool) or upload://<id>
+                        image_data = url
 
                 elif item_type == "video_url":
                     # Extract video from video_url
                     video_url = item.get("video_url", {})
                     url = video_url.get("url", "")
-                    if url.startswith("data:video") or url.startswith("data:application"):
-                        # Extract base64 data from data URI
-                        if "base64," in url:
-                            video_data = url.split("base64,", 1)[1]
-                        else:
-                            video_data = url
-                    else:
-                        # It's a URL, pass it as-is (will be downloaded in generation_handler)
-                        video_data = url
+                    # Data URI, upload://<id> or URL: passed as-is (decoded / downloaded in generation_handler)
+                    video_data = url
 
             if text_parts:
                 prompt = " ".join(text_parts)
@@ -144,10 +173,30 @@ async def create_chat_completion(
         if request.model not in MODEL_CONFIG:
             raise HTTPException(status_code=400, detail=f"Invalid model: {request.model}")
 
+        # Fail fast on unknown / expired upload references
+        for ref in (image_data, video_data):
+            if is_upload_ref(ref):
+                try:
+                    upload_spool.resolve(ref)
+                except UnknownUploadError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+
         # Check if this is a video model
         model_config = MODEL_CONFIG[request.model]
         is_video_model = model_config["type"] == "video"
 
+        # Cluster mode: hand the request to a peer when no owned token is free here
+        # (upload:// references live in this node's spool and cannot be forwarded)
+        if (cluster.enabled and FORWARDED_HEADER not in http_request.headers
+                and not any(is_upload_ref(ref) for ref in (image_data, video_data))
+                and not await generation_handler.check_token_availability(not is_video_model, is_video_model)):
+            for peer in cluster.pick_peers():
+                try:
+                    return await _forward_chat_completion(peer, request, http_request.headers.get("Authorization", ""))
+                except ForwardError as e:
+                    debug_logger.log_info("Forwarding to %s failed, trying the next node: %s", peer.node_id, str(e))
+            # No peer took it: handle locally
+
         # For video models with video parameter, we need streaming
         if is_video_model and (video_data or remix_target_id):
             if not request.stream:
@@ -181,34 +230,20 @@ async def create_chat_completion(
 
         # Handle streaming
         if request.stream:
-            async def generate():
-                import json as json_module  # Import inside function to avoid scope issues
-                try:
-                    async for chunk in generation_handler.handle_generation(
-                        model=request.model,
-                        prompt=prompt,
-                        image=image_data,
-                        video=video_data,
-                        remix_target_id=remix_target_id,
-                        stream=True
-                    ):
-                        yield chunk
-                except Exception as e:
-                    # Return OpenAI-compatible error format
-                    error_response = {
-                        "error": {
-                            "message": str(e),
-                            "type": "server_error",
-                            "param": None,
-                            "code": None
-                        }
-                    }
-                    error_chunk = f'data: {json_module.dumps(error_response)}\n\n'
-                    yield error_chunk
-                    yield 'data: [DONE]\n\n'
+            # Errors become an OpenAI-compatible error event followed by [DONE]
+            generate = stream_with_errors(generation_handler.handle_generation(
+                model=request.model,
+                prompt=prompt,
+                image=image_data,
+                video=video_data,
+                remix_target_id=remix_target_id,
+                stream=True
+            ))
 
+            # Generation runs as its own task; this response is one subscriber
+            topic_id = task_event_hub.start(generate)
             return StreamingResponse(
-                generate(),
+                task_event_hub.subscribe(topic_id),
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
@@ -261,6 +296,202 @@ async def create_chat_completion(
         )
 
 
+@router.post("/v1/uploads")
+async def create_upload(
+    request: Request,
+    filename: str = None,
+    api_key: str = Depends(verify_api_key_header),
+):
+    """Upload an image or video without base64 encoding
+
+    The body is streamed to a spool file; reference the result as
+    `upload://<id>` in `image`, `video`, `image_url.url` or `video_url.url`.
+
+    Accepts either a raw body (Content-Type: image/png, video/mp4, ...) or
+    multipart/form-data with a `file` field. The raw body is the zero-copy
+    path: it is written to the spool as it arrives. A multipart body is first
+    parsed into a temporary file by Starlette and then copied into the spool.
+
+    A Content-Length above [upload] max_bytes is rejected before the body is read.
+    """
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    is_multipart = content_type.startswith("multipart/form-data")
+    max_bytes = config.upload_max_bytes
+    length = request.headers.get("content-length", "")
+    if max_bytes and length.isdigit() and int(length) > max_bytes + (_MULTIPART_OVERHEAD if is_multipart else 0):
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+    try:
+        if is_multipart:
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "read"):
+                raise HTTPException(status_code=400, detail="Missing 'file' field")
+
+            async def chunks():
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+            try:
+                spooled = await upload_spool.save_stream(
+                    chunks(),
+                    upload.content_type or "application/octet-stream",
+                    filename or upload.filename
+                )
+            finally:
+                await form.close()
+        else:
+            spooled = await upload_spool.save_stream(
+                request.stream(),
+                content_type.split(";", 1)[0].strip(),
+                filename or request.headers.get("x-filename")
+            )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if spooled.size == 0:
+        upload_spool.delete(spooled.ref)
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    return spooled.to_dict()
+
+
+@router.post("/v1/batches")
+async def create_batch(
+    request: BatchRequest,
+    api_key: str = Depends(verify_api_key_header)
+):
+    """Run several generations in one call
+
+    Items are scheduled across the available tokens (at most [batch] max_concurrency
+    at a time). With stream=true the response is the multiplexed event stream;
+    otherwise the batch ID is returned at once and the batch keeps running in the
+    background, results are read from /v1/batches/{batch_id}/events.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(request.items) > config.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {config.batch_max_items} items")
+
+    for index, item in enumerate(request.items):
+        if item.model not in MODEL_CONFIG:
+            raise HTTPException(status_code=400, detail=f"Invalid model in item {index}: {item.model}")
+        if not item.remix_target_id:
+            item.remix_target_id = _extract_remix_id(item.prompt) or None
+        for ref in (item.image, item.video):
+            if is_upload_ref(ref):
+                try:
+                    upload_spool.resolve(ref)
+                except UnknownUploadError as e:
+                    raise HTTPException(status_code=400, detail=f"Item {index}: {e}")
+
+    runner = BatchRunner(generation_handler, request.items, MODEL_CONFIG)
+    topic_id = task_event_hub.start(runner.run(), topic_id=runner.batch_id, keep_alive=not request.stream)
+    if not request.stream:
+        return JSONResponse(status_code=202, content={
+            "id": runner.batch_id,
+            "object": "batch",
+            "status": "running",
+            "items": len(request.items),
+            "events_url": f"/v1/batches/{runner.batch_id}/events"
+        })
+
+    return StreamingResponse(
+        task_event_hub.subscribe(topic_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.get("/v1/batches/{batch_id}/events")
+async def stream_batch_events(
+    batch_id: str,
+    api_key: str = Depends(verify_api_key_header),
+):
+    """Event stream of a batch, starting with every result delivered so far"""
+    if not batch_id.startswith("batch_"):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    stream = task_event_hub.subscribe(batch_id, replay=True)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Batch not found or expired")
+
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.get("/v1/tasks/{task_id}")
+async def get_task_status(
+    task_id: str,
+    api_key: str = Depends(verify_api_key_header),
+):
+    """Stored state of a generation, including its Google Drive offload"""
+    if not generation_handler:
+        raise HTTPException(status_code=500, detail="Generation handler not initialized")
+
+    task = await generation_handler.db.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    drive = None
+    if task.drive_status:
+        drive = {
+            "status": task.drive_status,
+            "urls": json.loads(task.drive_urls) if task.drive_urls else [],
+            "error": task.drive_error,
+            "uploads": await generation_handler.db.get_drive_uploads(task_id)
+        }
+
+    return {
+        "id": task.task_id,
+        "object": "task",
+        "model": task.model,
+        "status": task.status,
+        "progress": task.progress,
+        "result_urls": json.loads(task.result_urls) if task.result_urls else [],
+        "error": task.error_message,
+        "created_at": task.created_at.isoformat() if task.created_at else None,
+        "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+        "drive": drive
+    }
+
+
+@router.get("/v1/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    api_key: str = Depends(verify_api_key_header),
+):
+    """Attach to a running (or recently finished) generation as an extra SSE viewer
+
+    Starts with the latest progress chunk; does not trigger any upstream polling.
+    """
+    stream = task_event_hub.subscribe(task_id, replay=True)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Task not found or no longer streaming")
+
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.post("/v1/tasks/{task_id}/watermark/cancel")
 async def cancel_watermark_wait(
     task_id: str,
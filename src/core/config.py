@@ -45,6 +45,10 @@ class Config:
 
     @property
     def sora_base_url(self) -> str:
+        # 环境变量优先（例如压测时指向 benchmarks/mock_sora_server.py）
+        env_base_url = os.getenv("SORA_BASE_URL")
+        if env_base_url:
+            return env_base_url.rstrip("/")
         return self._config["sora"]["base_url"]
     
     @property
@@ -87,6 +91,14 @@ class Config:
     def debug_mask_token(self) -> bool:
         return self._config.get("debug", {}).get("mask_token", True)
 
+    @property
+    def debug_log_max_bytes(self) -> int:
+        return self._config.get("debug", {}).get("log_max_bytes", 10 * 1024 * 1024)
+
+    @property
+    def debug_log_backup_count(self) -> int:
+        return self._config.get("debug", {}).get("log_backup_count", 3)
+
     # Mutable properties for runtime updates
     @property
     def api_key(self) -> str:
@@ -247,11 +259,302 @@ class Config:
         # 否则从配置文件读取
         return self._config.get("google_drive", {}).get("password", "")
 
+    @property
+    def google_drive_workers(self) -> int:
+        """Concurrent Drive uploads per process"""
+        return int(self._config.get("google_drive", {}).get("workers", 2))
+
+    @property
+    def google_drive_max_attempts(self) -> int:
+        """Attempts per file before the upload is marked failed"""
+        return int(self._config.get("google_drive", {}).get("max_attempts", 5))
+
+    @property
+    def google_drive_retry_base_seconds(self) -> float:
+        """First retry delay; doubles with every failed attempt"""
+        return float(self._config.get("google_drive", {}).get("retry_base_seconds", 10))
+
+    @property
+    def google_drive_retry_max_seconds(self) -> float:
+        """Upper bound of the retry delay"""
+        return float(self._config.get("google_drive", {}).get("retry_max_seconds", 600))
+
+    @property
+    def google_drive_upload_timeout(self) -> float:
+        """Timeout of a single upload call to the Space"""
+        return float(self._config.get("google_drive", {}).get("upload_timeout", 600))
+
+    @property
+    def google_drive_poll_interval(self) -> float:
+        """How often idle workers look for due (retried / other node's) uploads"""
+        return float(self._config.get("google_drive", {}).get("poll_interval", 5))
+
     def set_google_drive_enabled(self, enabled: bool):
         """Set Google Drive upload enabled/disabled"""
         if "google_drive" not in self._config:
             self._config["google_drive"] = {}
         self._config["google_drive"]["enabled"] = enabled
 
+    # 熔断器配置属性
+    @property
+    def circuit_breaker_window_seconds(self) -> int:
+        """Sliding window used to score token failures"""
+        return self._config.get("circuit_breaker", {}).get("window_seconds", 120)
+
+    @property
+    def circuit_breaker_trip_score(self) -> float:
+        """Accumulated failure weight within the window that opens the breaker"""
+        return self._config.get("circuit_breaker", {}).get("trip_score", 3.0)
+
+    @property
+    def circuit_breaker_open_seconds(self) -> int:
+        """Initial cooldown of an open breaker (doubles on repeated trips)"""
+        return self._config.get("circuit_breaker", {}).get("open_seconds", 30)
+
+    @property
+    def circuit_breaker_max_open_seconds(self) -> int:
+        """Upper bound for the open cooldown backoff"""
+        return self._config.get("circuit_breaker", {}).get("max_open_seconds", 900)
+
+    @property
+    def circuit_breaker_half_open_max_probes(self) -> int:
+        """Concurrent probe requests allowed while half-open"""
+        return self._config.get("circuit_breaker", {}).get("half_open_max_probes", 1)
+
+    @property
+    def circuit_breaker_probe_timeout(self) -> int:
+        """Seconds after which an unanswered half-open probe is released"""
+        return self._config.get("circuit_breaker", {}).get("probe_timeout", 600)
+
+    # 上游限流配置属性
+    @property
+    def rate_limit_enabled(self) -> bool:
+        """Get upstream rate limiter enabled status"""
+        return self._config.get("rate_limit", {}).get("enabled", True)
+
+    @property
+    def rate_limit_min_rate_factor(self) -> float:
+        """Lowest fraction of the configured rate a bucket may back off to after 429s"""
+        return self._config.get("rate_limit", {}).get("min_rate_factor", 0.1)
+
+    @property
+    def rate_limit_max_retry_after(self) -> float:
+        """Cap (seconds) for honouring upstream Retry-After"""
+        return self._config.get("rate_limit", {}).get("max_retry_after", 120)
+
+    def get_rate_limit(self, endpoint_class: str) -> tuple:
+        """Get (requests per second, burst) for an endpoint class"""
+        defaults = {
+            "generate": (0.5, 2),
+            "poll": (2.0, 5),
+            "publish": (0.5, 2),
+            "upload": (1.0, 3),
+        }
+        rate, burst = defaults.get(endpoint_class, (2.0, 5))
+        section = self._config.get("rate_limit", {}).get(endpoint_class, {})
+        return float(section.get("rate", rate)), int(section.get("burst", burst))
+
+    # 链路追踪配置属性
+    @property
+    def tracing_enabled(self) -> bool:
+        """Get request tracing enabled status"""
+        return self._config.get("tracing", {}).get("enabled", False)
+
+    @property
+    def tracing_sample_rate(self) -> float:
+        """Fraction of generation requests that get traced"""
+        return self._config.get("tracing", {}).get("sample_rate", 1.0)
+
+    @property
+    def tracing_buffer_size(self) -> int:
+        """Number of finished traces kept in memory for the admin API"""
+        return self._config.get("tracing", {}).get("buffer_size", 200)
+
+    @property
+    def tracing_otlp_file(self) -> str:
+        """Append finished traces as OTLP/JSON lines to this file (empty: disabled)"""
+        return self._config.get("tracing", {}).get("otlp_file", "")
+
+    @property
+    def metrics_public(self) -> bool:
+        """Serve /metrics without the API key"""
+        return bool(self._config.get("metrics", {}).get("public", False))
+
+    @property
+    def stream_omit_null_fields(self) -> bool:
+        """Drop null content/reasoning_content/tool_calls from streaming chunks (off for client compatibility)"""
+        return self._config.get("stream", {}).get("omit_null_fields", False)
+
+    @property
+    def stream_subscriber_buffer(self) -> int:
+        """Chunks buffered per SSE subscriber before progress chunks are dropped"""
+        return int(self._config.get("stream", {}).get("subscriber_buffer", 64))
+
+    @property
+    def stream_heartbeat_seconds(self) -> float:
+        """Idle time after which an SSE keepalive comment is sent (0: disabled)"""
+        return float(self._config.get("stream", {}).get("heartbeat_seconds", 15))
+
+    @property
+    def stream_detach_grace_seconds(self) -> float:
+        """How long a generation keeps running after its last subscriber left"""
+        return float(self._config.get("stream", {}).get("detach_grace_seconds", 10))
+
+    @property
+    def stream_retention_seconds(self) -> float:
+        """How long finished generations stay attachable via /v1/tasks/{id}/events"""
+        return float(self._config.get("stream", {}).get("retention_seconds", 300))
+
+    @property
+    def upload_max_bytes(self) -> int:
+        """Largest accepted upload (0: unlimited)"""
+        return int(self._config.get("upload", {}).get("max_bytes", 200 * 1024 * 1024))
+
+    @property
+    def upload_spool_ttl(self) -> int:
+        """Seconds a spooled upload stays referenceable as upload://<id>"""
+        return int(self._config.get("upload", {}).get("spool_ttl", 3600))
+
+    @property
+    def upload_url_timeout(self) -> int:
+        """Timeout in seconds for streaming a remote video_url into the spool"""
+        return int(self._config.get("upload", {}).get("url_timeout", 300))
+
+    @property
+    def batch_max_items(self) -> int:
+        """Largest number of items accepted by /v1/batches"""
+        return int(self._config.get("batch", {}).get("max_items", 50))
+
+    @property
+    def batch_max_concurrency(self) -> int:
+        """Items of one batch that run at the same time"""
+        return int(self._config.get("batch", {}).get("max_concurrency", 8))
+
+    @property
+    def batch_token_wait_seconds(self) -> float:
+        """How long a batch item waits for a free token before starting anyway"""
+        return float(self._config.get("batch", {}).get("token_wait_seconds", 300))
+
+    @property
+    def coordination_backend(self) -> str:
+        """Shared state backend: memory, sqlite or resp"""
+        return os.getenv("COORDINATION_BACKEND") or self._config.get("coordination", {}).get("backend", "memory")
+
+    @property
+    def coordination_sqlite_path(self) -> str:
+        """SQLite file used by the sqlite backend (relative to the project root)"""
+        path = self._config.get("coordination", {}).get("sqlite_path", "data/coordination.db")
+        return str(Path(__file__).parent.parent.parent / path)
+
+    @property
+    def coordination_resp_url(self) -> str:
+        """redis://[:password@]host:port/db of the resp backend"""
+        return os.getenv("COORDINATION_RESP_URL") or self._config.get("coordination", {}).get(
+            "resp_url", "redis://127.0.0.1:6379/0")
+
+    @property
+    def coordination_key_prefix(self) -> str:
+        """Key prefix on the resp backend (several deployments can share one server)"""
+        return self._config.get("coordination", {}).get("key_prefix", "sora2api:")
+
+    @property
+    def coordination_poll_interval(self) -> float:
+        """How often shared cancellation flags are polled (sqlite/resp)"""
+        return float(self._config.get("coordination", {}).get("poll_interval", 1.0))
+
+    @property
+    def cluster_enabled(self) -> bool:
+        """Shard the token pool across nodes"""
+        return bool(self._config.get("cluster", {}).get("enabled", False))
+
+    @property
+    def cluster_node_id(self) -> str:
+        """This node's ID in the cluster (empty: hostname-pid)"""
+        return os.getenv("CLUSTER_NODE_ID") or self._config.get("cluster", {}).get("node_id", "")
+
+    @property
+    def cluster_advertise_url(self) -> str:
+        """Base URL peers use to forward requests to this node"""
+        return os.getenv("CLUSTER_ADVERTISE_URL") or self._config.get("cluster", {}).get("advertise_url", "")
+
+    @property
+    def cluster_heartbeat_seconds(self) -> float:
+        """Heartbeat interval; a node is dropped after three missed heartbeats"""
+        return float(self._config.get("cluster", {}).get("heartbeat_seconds", 5))
+
+    @property
+    def cluster_vnodes(self) -> int:
+        """Virtual nodes per node on the hash ring"""
+        return int(self._config.get("cluster", {}).get("vnodes", 64))
+
+    @property
+    def upload_cache_enabled(self) -> bool:
+        """Reuse upstream media IDs for identical uploads"""
+        return bool(self._config.get("upload_cache", {}).get("enabled", True))
+
+    @property
+    def upload_cache_ttl_seconds(self) -> float:
+        """How long a cached media_id / cameo_id is reused"""
+        return float(self._config.get("upload_cache", {}).get("ttl_seconds", 21600))
+
+    @property
+    def upload_cache_max_entries(self) -> int:
+        """Upper bound of cached (token, content hash) entries"""
+        return int(self._config.get("upload_cache", {}).get("max_entries", 2048))
+
+    # 媒体存储配置属性
+    @property
+    def storage_backend(self) -> str:
+        """Where cached media lives: local, s3, tiered or passthrough"""
+        return os.getenv("STORAGE_BACKEND") or self._config.get("storage", {}).get("backend", "local")
+
+    def _storage_s3(self) -> dict:
+        return self._config.get("storage", {}).get("s3", {})
+
+    @property
+    def storage_s3_endpoint(self) -> str:
+        return os.getenv("S3_ENDPOINT") or self._storage_s3().get("endpoint", "")
+
+    @property
+    def storage_s3_region(self) -> str:
+        return self._storage_s3().get("region", "us-east-1")
+
+    @property
+    def storage_s3_bucket(self) -> str:
+        return os.getenv("S3_BUCKET") or self._storage_s3().get("bucket", "")
+
+    @property
+    def storage_s3_access_key(self) -> str:
+        return os.getenv("S3_ACCESS_KEY_ID") or self._storage_s3().get("access_key", "")
+
+    @property
+    def storage_s3_secret_key(self) -> str:
+        return os.getenv("S3_SECRET_ACCESS_KEY") or self._storage_s3().get("secret_key", "")
+
+    @property
+    def storage_s3_prefix(self) -> str:
+        """Key prefix of the cached files inside the bucket"""
+        return self._storage_s3().get("prefix", "media/")
+
+    @property
+    def storage_s3_addressing_style(self) -> str:
+        """path (endpoint/bucket/key) or virtual (bucket.endpoint/key)"""
+        return self._storage_s3().get("addressing_style", "path")
+
+    @property
+    def storage_s3_public_base_url(self) -> str:
+        """Public bucket / CDN URL; empty: clients get presigned URLs"""
+        return self._storage_s3().get("public_base_url", "")
+
+    @property
+    def storage_s3_presign_expires(self) -> int:
+        """Validity of presigned URLs in seconds"""
+        return int(self._storage_s3().get("presign_expires", 86400))
+
+    @property
+    def storage_s3_part_size(self) -> int:
+        """Multipart upload part size in bytes (S3 minimum: 5 MiB)"""
+        return max(5, int(self._storage_s3().get("part_size_mb", 8))) * 1024 * 1024
+
 # Global config instance
 config = Config()
@@ -4,6 +4,8 @@ import json
 from datetime import datetime
 from typing import Optional, List
 from pathlib import Path
+from .tracing import tracer
+from . import migrations
 from .models import (
     Token,
     TokenStats,
@@ -42,14 +44,44 @@ class Database:
         result = await cursor.fetchone()
         return result is not None
 
-    async def _column_exists(self, db, table_name: str, column_name: str) -> bool:
-        """Check if a column exists in a table"""
+    async def _table_columns(self, db, table_name: str) -> set:
+        """Column names of a table (one PRAGMA per table instead of one per column)"""
         try:
             cursor = await db.execute(f"PRAGMA table_info({table_name})")
-            columns = await cursor.fetchall()
-            return any(col[1] == column_name for col in columns)
+            return {col[1] for col in await cursor.fetchall()}
         except:
-            return False
+            return set()
+
+    async def _column_exists(self, db, table_name: str, column_name: str) -> bool:
+        """Check if a column exists in a table"""
+        return column_name in await self._table_columns(db, table_name)
+
+    async def _add_missing_columns(self, db, table_name: str, columns_to_add: list):
+        """ALTER TABLE ADD COLUMN for every (name, type) not present yet
+
+        Errors propagate so the surrounding migration rolls back instead of
+        recording a version whose columns are missing.
+        """
+        existing = await self._table_columns(db, table_name)
+        for col_name, col_type in columns_to_add:
+            if col_name in existing:
+                continue
+            await db.execute(f"ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}")
+            print(f"  ✓ Added column '{col_name}' to {table_name} table")
+
+    async def migrate(self, config_dict: dict = None) -> tuple:
+        """Apply pending schema migrations (a single version read when up to date)
+
+        Args:
+            config_dict: Configuration dictionary from setting.toml (optional)
+                        Used to initialize config rows created by the migration
+
+        Returns:
+            (schema version before, schema version after)
+        """
+        # timeout: concurrent workers wait for the one holding the migration lock
+        async with aiosqlite.connect(self.db_path, timeout=30) as db:
+            return await migrations.migrate(self, db, config_dict)
 
     async def _ensure_config_rows(self, db, config_dict: dict = None):
         """Ensure all config tables have their default rows
@@ -185,309 +217,9 @@ class Database:
             """, (at_auto_refresh_enabled,))
 
 
-    async def check_and_migrate_db(self, config_dict: dict = None):
-        """Check database integrity and perform migrations if needed
-
-        Args:
-            config_dict: Configuration dictionary from setting.toml (optional)
-                        Used to initialize new tables with values from setting.toml
-        """
-        async with aiosqlite.connect(self.db_path) as db:
-            print("Checking database integrity and performing migrations...")
-
-            # Check and add missing columns to tokens table
-            if await self._table_exists(db, "tokens"):
-                columns_to_add = [
-                    ("sora2_supported", "BOOLEAN"),
-                    ("sora2_invite_code", "TEXT"),
-                    ("sora2_redeemed_count", "INTEGER DEFAULT 0"),
-                    ("sora2_total_count", "INTEGER DEFAULT 0"),
-                    ("sora2_remaining_count", "INTEGER DEFAULT 0"),
-                    ("sora2_cooldown_until", "TIMESTAMP"),
-                    ("image_enabled", "BOOLEAN DEFAULT 1"),
-                    ("video_enabled", "BOOLEAN DEFAULT 1"),
-                    ("image_concurrency", "INTEGER DEFAULT -1"),
-                    ("video_concurrency", "INTEGER DEFAULT -1"),
-                    ("client_id", "TEXT"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "tokens", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE tokens ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to tokens table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to token_stats table
-            if await self._table_exists(db, "token_stats"):
-                columns_to_add = [
-                    ("consecutive_error_count", "INTEGER DEFAULT 0"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "token_stats", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE token_stats ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to token_stats table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to admin_config table
-            if await self._table_exists(db, "admin_config"):
-                columns_to_add = [
-                    ("admin_username", "TEXT DEFAULT 'admin'"),
-                    ("admin_password", "TEXT DEFAULT 'admin'"),
-                    ("api_key", "TEXT DEFAULT 'han1234'"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "admin_config", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE admin_config ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to admin_config table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to watermark_free_config table
-            if await self._table_exists(db, "watermark_free_config"):
-                columns_to_add = [
-                    ("parse_method", "TEXT DEFAULT 'third_party'"),
-                    ("custom_parse_url", "TEXT"),
-                    ("custom_parse_token", "TEXT"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "watermark_free_config", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE watermark_free_config ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to watermark_free_config table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Ensure character_cards table exists (new feature)
-            if not await self._table_exists(db, "character_cards"):
-                await db.execute("""
-                    CREATE TABLE character_cards (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        token_id INTEGER,
-                        username TEXT NOT NULL,
-                        display_name TEXT NOT NULL,
-                        description TEXT,
-                        character_id TEXT,
-                        cameo_id TEXT,
-                        avatar_path TEXT,
-                        source_video TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (token_id) REFERENCES tokens(id)
-                    )
-                """)
-                print("  ✓ Created table 'character_cards'")
-            else:
-                # Backfill new columns for existing table
-                if not await self._column_exists(db, "character_cards", "description"):
-                    try:
-                        await db.execute("ALTER TABLE character_cards ADD COLUMN description TEXT")
-                        print("  ✓ Added column 'description' to character_cards")
-                    except Exception as e:
-                        print(f"  ✗ Failed to add column 'description' to character_cards: {e}")
-
-            # Ensure all config tables have their default rows
-            # Pass config_dict if available to initialize from setting.toml
-            await self._ensure_config_rows(db, config_dict)
-
-            await db.commit()
-            print("Database migration check completed.")
-
     async def init_db(self):
         """Initialize database tables - creates all tables and ensures data integrity"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Tokens table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tokens (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token TEXT UNIQUE NOT NULL,
-                    email TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    st TEXT,
-                    rt TEXT,
-                    client_id TEXT,
-                    remark TEXT,
-                    expiry_time TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    cooled_until TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_used_at TIMESTAMP,
-                    use_count INTEGER DEFAULT 0,
-                    plan_type TEXT,
-                    plan_title TEXT,
-                    subscription_end TIMESTAMP,
-                    sora2_supported BOOLEAN,
-                    sora2_invite_code TEXT,
-                    sora2_redeemed_count INTEGER DEFAULT 0,
-                    sora2_total_count INTEGER DEFAULT 0,
-                    sora2_remaining_count INTEGER DEFAULT 0,
-                    sora2_cooldown_until TIMESTAMP,
-                    image_enabled BOOLEAN DEFAULT 1,
-                    video_enabled BOOLEAN DEFAULT 1,
-                    image_concurrency INTEGER DEFAULT -1,
-                    video_concurrency INTEGER DEFAULT -1
-                )
-            """)
-
-            # Token stats table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS token_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token_id INTEGER NOT NULL,
-                    image_count INTEGER DEFAULT 0,
-                    video_count INTEGER DEFAULT 0,
-                    error_count INTEGER DEFAULT 0,
-                    last_error_at TIMESTAMP,
-                    today_image_count INTEGER DEFAULT 0,
-                    today_video_count INTEGER DEFAULT 0,
-                    today_error_count INTEGER DEFAULT 0,
-                    today_date DATE,
-                    consecutive_error_count INTEGER DEFAULT 0,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Tasks table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    task_id TEXT UNIQUE NOT NULL,
-                    token_id INTEGER NOT NULL,
-                    model TEXT NOT NULL,
-                    prompt TEXT NOT NULL,
-                    status TEXT NOT NULL DEFAULT 'processing',
-                    progress FLOAT DEFAULT 0,
-                    result_urls TEXT,
-                    error_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Request logs table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS request_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token_id INTEGER,
-                    operation TEXT NOT NULL,
-                    request_body TEXT,
-                    response_body TEXT,
-                    status_code INTEGER NOT NULL,
-                    duration FLOAT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Admin config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS admin_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    admin_username TEXT DEFAULT 'admin',
-                    admin_password TEXT DEFAULT 'admin',
-                    api_key TEXT DEFAULT 'han1234',
-                    error_ban_threshold INTEGER DEFAULT 3,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Proxy config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS proxy_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    proxy_enabled BOOLEAN DEFAULT 0,
-                    proxy_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Watermark-free config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS watermark_free_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    watermark_free_enabled BOOLEAN DEFAULT 0,
-                    parse_method TEXT DEFAULT 'third_party',
-                    custom_parse_url TEXT,
-                    custom_parse_token TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Cache config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS cache_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    cache_enabled BOOLEAN DEFAULT 0,
-                    cache_timeout INTEGER DEFAULT 600,
-                    cache_base_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Generation config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS generation_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    image_timeout INTEGER DEFAULT 300,
-                    video_timeout INTEGER DEFAULT 1500,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Token refresh config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS token_refresh_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    at_auto_refresh_enabled BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Character cards table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS character_cards (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token_id INTEGER,
-                    username TEXT NOT NULL,
-                    display_name TEXT NOT NULL,
-                    character_id TEXT,
-                    cameo_id TEXT,
-                    avatar_path TEXT,
-                    source_video TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Create indexes
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_task_id ON tasks(task_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_task_status ON tasks(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_token_active ON tokens(is_active)")
-
-            # Migration: Add daily statistics columns if they don't exist
-            if not await self._column_exists(db, "token_stats", "today_image_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_image_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_video_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_video_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_error_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_error_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_date"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_date DATE")
-
-            await db.commit()
+        await self.migrate()
 
     async def init_config_from_toml(self, config_dict: dict, is_first_startup: bool = True):
         """
@@ -840,25 +572,27 @@ class Database:
     # Task operations
     async def create_task(self, task: Task) -> int:
         """Create a new task"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO tasks (task_id, token_id, model, prompt, status, progress)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (task.task_id, task.token_id, task.model, task.prompt, task.status, task.progress))
-            await db.commit()
-            return cursor.lastrowid
+        with tracer.span("db.create_task"):
+            async with aiosqlite.connect(self.db_path) as db:
+                cursor = await db.execute("""
+                    INSERT INTO tasks (task_id, token_id, model, prompt, status, progress)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (task.task_id, task.token_id, task.model, task.prompt, task.status, task.progress))
+                await db.commit()
+                return cursor.lastrowid
     
     async def update_task(self, task_id: str, status: str, progress: float, 
                          result_urls: Optional[str] = None, error_message: Optional[str] = None):
         """Update task status"""
-        async with aiosqlite.connect(self.db_path) as db:
-            completed_at = datetime.now() if status in ["completed", "failed"] else None
-            await db.execute("""
-                UPDATE tasks 
-                SET status = ?, progress = ?, result_urls = ?, error_message = ?, completed_at = ?
-                WHERE task_id = ?
-            """, (status, progress, result_urls, error_message, completed_at, task_id))
-            await db.commit()
+        with tracer.span("db.update_task"):
+            async with aiosqlite.connect(self.db_path) as db:
+                completed_at = datetime.now() if status in ["completed", "failed"] else None
+                await db.execute("""
+                    UPDATE tasks 
+                    SET status = ?, progress = ?, result_urls = ?, error_message = ?, completed_at = ?
+                    WHERE task_id = ?
+                """, (status, progress, result_urls, error_message, completed_at, task_id))
+                await db.commit()
     
     async def get_task(self, task_id: str) -> Optional[Task]:
         """Get task by ID"""
@@ -869,17 +603,121 @@ class Database:
             if row:
                 return Task(**dict(row))
             return None
+
+    # Google Drive upload queue operations
+    async def enqueue_drive_uploads(self, task_id: str, file_urls: List[str]):
+        """Queue Drive uploads for a task's results and mark the task pending"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                "INSERT INTO drive_uploads (task_id, file_url) VALUES (?, ?)",
+                [(task_id, url) for url in file_urls]
+            )
+            await db.execute(
+                "UPDATE tasks SET drive_status = 'pending', drive_urls = NULL, drive_error = NULL WHERE task_id = ?",
+                (task_id,)
+            )
+            await db.commit()
+
+    async def claim_drive_upload(self, now: float, lease_seconds: float) -> Optional[dict]:
+        """Atomically take the next due upload (safe across workers/processes)
+
+        The job is leased: if its worker dies, it becomes due again after
+        lease_seconds.
+        """
+        async with aiosqlite.connect(self.db_path, timeout=30) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("""
+                UPDATE drive_uploads
+                SET status = 'running', attempts = attempts + 1, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM drive_uploads
+                    WHERE status IN ('pending', 'running') AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id
+                    LIMIT 1
+                )
+                RETURNING id, task_id, file_url, attempts
+            """, (now + lease_seconds, now))
+            row = await cursor.fetchone()
+            await db.commit()
+            return dict(row) if row else None
+
+    async def finish_drive_upload(self, upload_id: int, drive_url: Optional[str], error: Optional[str] = None,
+                                  retry_at: Optional[float] = None):
+        """Record the outcome of an attempt
+
+        Args:
+            upload_id: drive_uploads row
+            drive_url: Drive link on success
+            error: Error message on failure
+            retry_at: Epoch time of the next attempt, None when giving up
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            if drive_url:
+                await db.execute("""
+                    UPDATE drive_uploads SET status = 'completed', drive_url = ?, last_error = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (drive_url, upload_id))
+            elif retry_at is not None:
+                await db.execute("""
+                    UPDATE drive_uploads SET status = 'pending', next_attempt_at = ?, last_error = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (retry_at, error, upload_id))
+            else:
+                await db.execute("""
+                    UPDATE drive_uploads SET status = 'failed', last_error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (error, upload_id))
+            await db.commit()
+
+    async def sync_task_drive_status(self, task_id: str) -> Optional[str]:
+        """Roll the task's uploads up into tasks.drive_status / drive_urls / drive_error"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "SELECT status, drive_url, last_error FROM drive_uploads WHERE task_id = ? ORDER BY id",
+                (task_id,)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return None
+            statuses = [row[0] for row in rows]
+            if any(status in ("pending", "running") for status in statuses):
+                drive_status = "pending"
+            elif all(status == "completed" for status in statuses):
+                drive_status = "completed"
+            else:
+                drive_status = "failed"
+            drive_urls = json.dumps([row[1] for row in rows])
+            errors = [row[2] for row in rows if row[0] == "failed" and row[2]]
+            await db.execute(
+                "UPDATE tasks SET drive_status = ?, drive_urls = ?, drive_error = ? WHERE task_id = ?",
+                (drive_status, drive_urls, "; ".join(errors) or None, task_id)
+            )
+            await db.commit()
+            return drive_status
+
+    async def get_drive_uploads(self, task_id: str) -> List[dict]:
+        """Upload jobs of a task (for task status)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("""
+                SELECT file_url, status, attempts, drive_url, last_error, updated_at
+                FROM drive_uploads WHERE task_id = ? ORDER BY id
+            """, (task_id,))
+            return [dict(row) for row in await cursor.fetchall()]
     
     # Request log operations
     async def log_request(self, log: RequestLog):
         """Log a request"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO request_logs (token_id, operation, request_body, response_body, status_code, duration)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (log.token_id, log.operation, log.request_body, log.response_body, 
-                  log.status_code, log.duration))
-            await db.commit()
+        with tracer.span("db.log_request"):
+            async with aiosqlite.connect(self.db_path) as db:
+                await db.execute("""
+                    INSERT INTO request_logs (token_id, operation, request_body, response_body, status_code, duration)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (log.token_id, log.operation, log.request_body, log.response_body, 
+                      log.status_code, log.duration))
+                await db.commit()
     
     async def get_recent_logs(self, limit: int = 100) -> List[dict]:
         """Get recent logs with token email"""
@@ -925,6 +763,22 @@ class Database:
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
+    async def get_all_character_cards(self) -> List[dict]:
+        """All character cards in insertion order (for the in-memory character directory)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM character_cards ORDER BY id")
+            rows = await cursor.fetchall()
+            return [dict(row) for row in rows]
+
+    async def get_character_card(self, card_id: int) -> Optional[dict]:
+        """Get a character card by ID"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM character_cards WHERE id = ?", (card_id,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
     async def get_character_cards_by_usernames(self, usernames: List[str], token_id: int = None) -> List[dict]:
         """
         Fetch character cards matching the given usernames or display_names.
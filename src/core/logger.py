@@ -1,62 +1,128 @@
 """Debug logger module for detailed API request/response logging"""
+import atexit
 import json
 import logging
+import logging.handlers
+import queue
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 from .config import config
 
+_TEXT_LIMIT = 2000
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that enqueues the raw record
+
+    The stock QueueHandler formats the message in the calling thread. Here all
+    formatting (including JSON encoding of bodies) is left to the listener
+    thread, so the event loop only pays for building the record.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _JsonEventFormatter(logging.Formatter):
+    """Render one log record as a single JSON line (runs in the listener thread)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, "event", None)
+        entry = {
+            "time": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            "level": record.levelname,
+        }
+        if event is not None:
+            entry.update(event)
+            for key in ("body", "response_text"):
+                if key in entry:
+                    entry[key] = self._normalize_body(entry[key])
+        else:
+            entry["type"] = "info"
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _normalize_body(body: Any) -> Any:
+        """Embed JSON text as an object, truncate long plain text"""
+        if isinstance(body, (bytes, bytearray)):
+            return f"<{len(body)} bytes>"
+        if isinstance(body, str):
+            try:
+                return json.loads(body)
+            except (ValueError, TypeError):
+                if len(body) > _TEXT_LIMIT:
+                    return f"{body[:_TEXT_LIMIT]}... (truncated)"
+                return body
+        return body
+
+
 class DebugLogger:
-    """Debug logger for API requests and responses"""
-    
+    """Debug logger for API requests and responses
+
+    Nothing is formatted unless debug mode is enabled. Records are handed to a
+    background thread (QueueHandler/QueueListener) that writes one JSON line per
+    event to a size-rotated log file.
+    """
+
     def __init__(self):
         self.log_file = Path("logs.txt")
+        self._listener: Optional[logging.handlers.QueueListener] = None
         self._setup_logger()
-    
+
     def _setup_logger(self):
-        """Setup file logger"""
+        """Setup queue-backed rotating file logger"""
         # Create logger
         self.logger = logging.getLogger("debug_logger")
         self.logger.setLevel(logging.DEBUG)
-        
+
         # Remove existing handlers
         self.logger.handlers.clear()
-        
-        # Create file handler
-        file_handler = logging.FileHandler(
-            self.log_file, 
-            mode='a', 
-            encoding='utf-8'
+
+        # File handler lives in the listener thread
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.log_file,
+            mode='a',
+            maxBytes=config.debug_log_max_bytes,
+            backupCount=config.debug_log_backup_count,
+            encoding='utf-8',
+            delay=True
         )
         file_handler.setLevel(logging.DEBUG)
-        
-        # Create formatter
-        formatter = logging.Formatter(
-            '%(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        file_handler.setFormatter(formatter)
-        
-        # Add handler
-        self.logger.addHandler(file_handler)
-        
+        file_handler.setFormatter(_JsonEventFormatter())
+
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(_DeferredQueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self.close)
+
         # Prevent propagation to root logger
         self.logger.propagate = False
-    
+
+    def close(self):
+        """Flush pending records and stop the background writer"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether debug logging is on (checked on every call, so runtime toggles apply)"""
+        return config.debug_enabled
+
     def _mask_token(self, token: str) -> str:
         """Mask token for logging (show first 6 and last 6 characters)"""
         if not config.debug_mask_token or len(token) <= 12:
             return token
         return f"{token[:6]}...{token[-6:]}"
-    
-    def _format_timestamp(self) -> str:
-        """Format current timestamp"""
-        return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-    
-    def _write_separator(self, char: str = "=", length: int = 100):
-        """Write separator line"""
-        self.logger.info(char * length)
-    
+
+    def _emit(self, level: int, event: Dict[str, Any]):
+        self.logger.log(level, event.get("type", ""), extra={"event": event})
+
     def log_request(
         self,
         method: str,
@@ -66,63 +132,40 @@ class DebugLogger:
         files: Optional[Dict] = None,
         proxy: Optional[str] = None
     ):
-        """Log API request details to log.txt"""
-        
+        """Log API request details to logs.txt"""
+        if not (config.debug_enabled and config.debug_log_requests):
+            return
+
         try:
-            self._write_separator()
-            self.logger.info(f"🔵 [REQUEST] {self._format_timestamp()}")
-            self._write_separator("-")
-            
-            # Basic info
-            self.logger.info(f"Method: {method}")
-            self.logger.info(f"URL: {url}")
-            
-            # Headers
-            self.logger.info("\n📋 Headers:")
             masked_headers = dict(headers)
-            if "Authorization" in masked_headers:
-                auth_value = masked_headers["Authorization"]
-                if auth_value.startswith("Bearer "):
-                    token = auth_value[7:]
-                    masked_headers["Authorization"] = f"Bearer {self._mask_token(token)}"
-            
-            for key, value in masked_headers.items():
-                self.logger.info(f"  {key}: {value}")
-            
-            # Body
+            auth_value = masked_headers.get("Authorization")
+            if auth_value and auth_value.startswith("Bearer "):
+                masked_headers["Authorization"] = f"Bearer {self._mask_token(auth_value[7:])}"
+
+            event = {
+                "type": "request",
+                "method": method,
+                "url": url,
+                "headers": masked_headers,
+            }
             if body is not None:
-                self.logger.info("\n📦 Request Body:")
-                if isinstance(body, (dict, list)):
-                    body_str = json.dumps(body, indent=2, ensure_ascii=False)
-                    self.logger.info(body_str)
-                else:
-                    self.logger.info(str(body))
-            
-            # Files
+                event["body"] = body
+
+            # Files (CurlMime objects are not safe to inspect from another thread)
             if files:
-                self.logger.info("\n📎 Files:")
-                try:
-                    # Handle both dict and CurlMime objects
-                    if hasattr(files, 'keys') and callable(getattr(files, 'keys', None)):
-                        for key in files.keys():
-                            self.logger.info(f"  {key}: <file data>")
-                    else:
-                        # CurlMime or other non-dict objects
-                        self.logger.info("  <multipart form data>")
-                except (AttributeError, TypeError):
-                    # Fallback for objects that don't support iteration
-                    self.logger.info("  <binary file data>")
-            
-            # Proxy
+                if hasattr(files, 'keys') and callable(getattr(files, 'keys', None)):
+                    event["files"] = list(files.keys())
+                else:
+                    event["files"] = "<multipart form data>"
+
             if proxy:
-                self.logger.info(f"\n🌐 Proxy: {proxy}")
-            
-            self._write_separator()
-            self.logger.info("")  # Empty line
-            
+                event["proxy"] = proxy
+
+            self._emit(logging.DEBUG, event)
+
         except Exception as e:
-            self.logger.error(f"Error logging request: {e}")
-    
+            self.logger.error("Error logging request: %s", e)
+
     def log_response(
         self,
         status_code: int,
@@ -130,97 +173,57 @@ class DebugLogger:
         body: Any,
         duration_ms: Optional[float] = None
     ):
-        """Log API response details to log.txt"""
-        
+        """Log API response details to logs.txt"""
+        if not (config.debug_enabled and config.debug_log_responses):
+            return
+
         try:
-            self._write_separator()
-            self.logger.info(f"🟢 [RESPONSE] {self._format_timestamp()}")
-            self._write_separator("-")
-            
-            # Status
-            status_emoji = "✅" if 200 <= status_code < 300 else "❌"
-            self.logger.info(f"Status: {status_code} {status_emoji}")
-            
-            # Duration
+            event = {
+                "type": "response",
+                "status": status_code,
+                "headers": dict(headers),
+                "body": body,
+            }
             if duration_ms is not None:
-                self.logger.info(f"Duration: {duration_ms:.2f}ms")
-            
-            # Headers
-            self.logger.info("\n📋 Response Headers:")
-            for key, value in headers.items():
-                self.logger.info(f"  {key}: {value}")
-            
-            # Body
-            self.logger.info("\n📦 Response Body:")
-            if isinstance(body, (dict, list)):
-                body_str = json.dumps(body, indent=2, ensure_ascii=False)
-                self.logger.info(body_str)
-            elif isinstance(body, str):
-                # Try to parse as JSON
-                try:
-                    parsed = json.loads(body)
-                    body_str = json.dumps(parsed, indent=2, ensure_ascii=False)
-                    self.logger.info(body_str)
-                except:
-                    # Not JSON, log as text (limit length)
-                    if len(body) > 2000:
-                        self.logger.info(f"{body[:2000]}... (truncated)")
-                    else:
-                        self.logger.info(body)
-            else:
-                self.logger.info(str(body))
-            
-            self._write_separator()
-            self.logger.info("")  # Empty line
-            
+                event["duration_ms"] = round(duration_ms, 2)
+            self._emit(logging.DEBUG, event)
+
         except Exception as e:
-            self.logger.error(f"Error logging response: {e}")
-    
+            self.logger.error("Error logging response: %s", e)
+
     def log_error(
         self,
         error_message: str,
         status_code: Optional[int] = None,
         response_text: Optional[str] = None
     ):
-        """Log API error details to log.txt"""
-        
+        """Log API error details to logs.txt"""
+        if not config.debug_enabled:
+            return
+
         try:
-            self._write_separator()
-            self.logger.info(f"🔴 [ERROR] {self._format_timestamp()}")
-            self._write_separator("-")
-            
+            event = {"type": "error", "message": error_message}
             if status_code:
-                self.logger.info(f"Status Code: {status_code}")
-            
-            self.logger.info(f"Error Message: {error_message}")
-            
+                event["status"] = status_code
             if response_text:
-                self.logger.info("\n📦 Error Response:")
-                # Try to parse as JSON
-                try:
-                    parsed = json.loads(response_text)
-                    body_str = json.dumps(parsed, indent=2, ensure_ascii=False)
-                    self.logger.info(body_str)
-                except:
-                    # Not JSON, log as text
-                    if len(response_text) > 2000:
-                        self.logger.info(f"{response_text[:2000]}... (truncated)")
-                    else:
-                        self.logger.info(response_text)
-            
-            self._write_separator()
-            self.logger.info("")  # Empty line
-            
+                event["response_text"] = response_text
+            self._emit(logging.ERROR, event)
+
         except Exception as e:
-            self.logger.error(f"Error logging error: {e}")
-    
-    def log_info(self, message: str):
-        """Log general info message to log.txt"""
+            self.logger.error("Error logging error: %s", e)
+
+    def log_info(self, message: str, *args):
+        """Log general info message to logs.txt
+
+        Pass values as %-style args (log_info("Task %s done", task_id)) so the
+        message is only built when debug logging is enabled.
+        """
+        if not config.debug_enabled:
+            return
         try:
-            self.logger.info(f"ℹ️  [{self._format_timestamp()}] {message}")
+            self.logger.info(message, *args)
         except Exception as e:
-            self.logger.error(f"Error logging info: {e}")
+            self.logger.error("Error logging info: %s", e)
 
 # Global debug logger instance
 debug_logger = DebugLogger()
-
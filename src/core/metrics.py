@@ -0,0 +1,240 @@
+"""In-process metrics registry rendered in Prometheus text format"""
+import abc
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) covering fast API calls up to long video jobs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LONG_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600)
+SIZE_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of this metric (without HELP / TYPE)"""
+
+
+class Counter(_Metric):
+    """Monotonic counter; label values are passed positionally"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in list(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge that is either updated directly or computed on scrape via a callback"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def total(self) -> float:
+        """Sum over all label combinations (directly updated gauges)"""
+        return sum(self._values.values())
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) value lazily at scrape time"""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return []
+            return [f"{self.name} {_format_value(value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in list(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is a bisect and two additions"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0]
+            self._series[labels] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, *labels) -> "_Timer":
+        """Context manager observing the elapsed time of a block"""
+        return _Timer(self, labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process (single event loop, so no locking)"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry
+metrics = MetricsRegistry()
+
+# ==================== Pipeline metrics ====================
+
+UPSTREAM_LATENCY = metrics.histogram(
+    "sora_upstream_request_seconds", "Latency of Sora backend calls", ("endpoint", "status"))
+TIME_TO_FIRST_PROGRESS = metrics.histogram(
+    "sora_time_to_first_progress_seconds", "Time from submission to the first progress update", ("model",), LONG_BUCKETS)
+TIME_TO_COMPLETION = metrics.histogram(
+    "sora_time_to_completion_seconds", "Time from submission to the final result", ("model", "outcome"), LONG_BUCKETS)
+CACHE_DOWNLOAD_SECONDS = metrics.histogram(
+    "sora_cache_download_seconds", "Duration of media downloads into the file cache", ("media_type",))
+CACHE_DOWNLOAD_BYTES = metrics.histogram(
+    "sora_cache_download_bytes", "Size of media downloaded into the file cache", ("media_type",), SIZE_BUCKETS)
+WATERMARK_WAIT_SECONDS = metrics.histogram(
+    "sora_watermark_free_wait_seconds", "Time spent obtaining the watermark-free video", ("outcome",), LONG_BUCKETS)
+TOKEN_SELECTION_SECONDS = metrics.histogram(
+    "sora_token_selection_seconds", "Load balancer token selection latency", ("kind",))
+PIPELINE_STAGE_SECONDS = metrics.histogram(
+    "sora_pipeline_stage_seconds", "Duration of flow stages run by StageGraph", ("flow", "stage"))
+
+INFLIGHT_TASKS = metrics.gauge(
+    "sora_inflight_tasks", "Upstream tasks currently being polled")
+QUEUED_REQUESTS = metrics.gauge(
+    "sora_queued_requests", "Generation requests not yet submitted upstream")
+LOCKED_TOKENS = metrics.gauge(
+    "sora_locked_tokens", "Tokens holding the image generation lock")
+CACHE_SIZE_BYTES = metrics.gauge(
+    "sora_cache_size_bytes", "Total size of files in the media cache")
+STREAM_SUBSCRIBERS = metrics.gauge(
+    "sora_stream_subscribers", "Attached SSE subscribers")
+DRIVE_UPLOADS_RUNNING = metrics.gauge(
+    "sora_drive_uploads_running", "Google Drive uploads in progress")
+
+POLLS_TOTAL = metrics.counter(
+    "sora_polls_total", "Status polls sent upstream", ("kind",))
+RETRIES_TOTAL = metrics.counter(
+    "sora_retries_total", "Retried operations", ("operation", "error_class"))
+ERRORS_TOTAL = metrics.counter(
+    "sora_errors_total", "Failed generation requests by error class", ("error_class",))
+STREAM_EVENTS_DROPPED = metrics.counter(
+    "sora_stream_events_dropped_total", "Progress chunks dropped for slow SSE subscribers")
+UPLOAD_CACHE_LOOKUPS = metrics.counter(
+    "sora_upload_cache_lookups_total", "Upload dedup cache lookups", ("kind", "result"))
+PROMPT_CACHE_LOOKUPS = metrics.counter(
+    "sora_prompt_cache_lookups_total", "Parsed prompt cache lookups", ("result",))
+DRIVE_UPLOAD_ATTEMPTS = metrics.counter(
+    "sora_drive_upload_attempts_total", "Google Drive upload attempts", ("outcome",))
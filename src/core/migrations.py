@@ -0,0 +1,329 @@
+"""Versioned schema migrations
+
+The schema version lives in the one-row `schema_version` table. Startup
+reads it (one query) and, when it is behind, applies the missing steps of
+MIGRATIONS in order inside a single BEGIN IMMEDIATE transaction: workers
+booting at the same time queue on the write lock, re-read the version once
+they hold it and find nothing left to do. SQLite DDL is transactional, so a
+failing step leaves the database at its previous version.
+
+Adding a schema change: append Migration(<last version + 1>, ...) and keep
+the step idempotent where it repairs older layouts (databases created before
+versioning start at version 0 and run every step).
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+import aiosqlite
+
+
+# (database, connection, setting.toml dict or None)
+StepFn = Callable[[object, aiosqlite.Connection, Optional[dict]], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: StepFn
+
+
+_BASELINE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token TEXT UNIQUE NOT NULL,
+        email TEXT NOT NULL,
+        username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        st TEXT,
+        rt TEXT,
+        client_id TEXT,
+        remark TEXT,
+        expiry_time TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        cooled_until TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP,
+        use_count INTEGER DEFAULT 0,
+        plan_type TEXT,
+        plan_title TEXT,
+        subscription_end TIMESTAMP,
+        sora2_supported BOOLEAN,
+        sora2_invite_code TEXT,
+        sora2_redeemed_count INTEGER DEFAULT 0,
+        sora2_total_count INTEGER DEFAULT 0,
+        sora2_remaining_count INTEGER DEFAULT 0,
+        sora2_cooldown_until TIMESTAMP,
+        image_enabled BOOLEAN DEFAULT 1,
+        video_enabled BOOLEAN DEFAULT 1,
+        image_concurrency INTEGER DEFAULT -1,
+        video_concurrency INTEGER DEFAULT -1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS token_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token_id INTEGER NOT NULL,
+        image_count INTEGER DEFAULT 0,
+        video_count INTEGER DEFAULT 0,
+        error_count INTEGER DEFAULT 0,
+        last_error_at TIMESTAMP,
+        today_image_count INTEGER DEFAULT 0,
+        today_video_count INTEGER DEFAULT 0,
+        today_error_count INTEGER DEFAULT 0,
+        today_date DATE,
+        consecutive_error_count INTEGER DEFAULT 0,
+        FOREIGN KEY (token_id) REFERENCES tokens(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id TEXT UNIQUE NOT NULL,
+        token_id INTEGER NOT NULL,
+        model TEXT NOT NULL,
+        prompt TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'processing',
+        progress FLOAT DEFAULT 0,
+        result_urls TEXT,
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        FOREIGN KEY (token_id) REFERENCES tokens(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token_id INTEGER,
+        operation TEXT NOT NULL,
+        request_body TEXT,
+        response_body TEXT,
+        status_code INTEGER NOT NULL,
+        duration FLOAT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (token_id) REFERENCES tokens(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        admin_username TEXT DEFAULT 'admin',
+        admin_password TEXT DEFAULT 'admin',
+        api_key TEXT DEFAULT 'han1234',
+        error_ban_threshold INTEGER DEFAULT 3,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS proxy_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        proxy_enabled BOOLEAN DEFAULT 0,
+        proxy_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS watermark_free_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        watermark_free_enabled BOOLEAN DEFAULT 0,
+        parse_method TEXT DEFAULT 'third_party',
+        custom_parse_url TEXT,
+        custom_parse_token TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cache_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        cache_enabled BOOLEAN DEFAULT 0,
+        cache_timeout INTEGER DEFAULT 600,
+        cache_base_url TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS generation_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        image_timeout INTEGER DEFAULT 300,
+        video_timeout INTEGER DEFAULT 1500,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS token_refresh_config (
+        id INTEGER PRIMARY KEY DEFAULT 1,
+        at_auto_refresh_enabled BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS character_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token_id INTEGER,
+        username TEXT NOT NULL,
+        display_name TEXT NOT NULL,
+        description TEXT,
+        character_id TEXT,
+        cameo_id TEXT,
+        avatar_path TEXT,
+        source_video TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (token_id) REFERENCES tokens(id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_task_id ON tasks(task_id)",
+    "CREATE INDEX IF NOT EXISTS idx_task_status ON tasks(status)",
+    "CREATE INDEX IF NOT EXISTS idx_token_active ON tokens(is_active)",
+)
+
+# Columns added to existing tables before versioning (pre-versioning
+# databases may lack any of them)
+_LEGACY_COLUMNS = {
+    "tokens": [
+        ("sora2_supported", "BOOLEAN"),
+        ("sora2_invite_code", "TEXT"),
+        ("sora2_redeemed_count", "INTEGER DEFAULT 0"),
+        ("sora2_total_count", "INTEGER DEFAULT 0"),
+        ("sora2_remaining_count", "INTEGER DEFAULT 0"),
+        ("sora2_cooldown_until", "TIMESTAMP"),
+        ("image_enabled", "BOOLEAN DEFAULT 1"),
+        ("video_enabled", "BOOLEAN DEFAULT 1"),
+        ("image_concurrency", "INTEGER DEFAULT -1"),
+        ("video_concurrency", "INTEGER DEFAULT -1"),
+        ("client_id", "TEXT"),
+    ],
+    "token_stats": [
+        ("today_image_count", "INTEGER DEFAULT 0"),
+        ("today_video_count", "INTEGER DEFAULT 0"),
+        ("today_error_count", "INTEGER DEFAULT 0"),
+        ("today_date", "DATE"),
+        ("consecutive_error_count", "INTEGER DEFAULT 0"),
+    ],
+    "admin_config": [
+        ("admin_username", "TEXT DEFAULT 'admin'"),
+        ("admin_password", "TEXT DEFAULT 'admin'"),
+        ("api_key", "TEXT DEFAULT 'han1234'"),
+    ],
+    "watermark_free_config": [
+        ("parse_method", "TEXT DEFAULT 'third_party'"),
+        ("custom_parse_url", "TEXT"),
+        ("custom_parse_token", "TEXT"),
+    ],
+    "character_cards": [
+        ("description", "TEXT"),
+    ],
+}
+
+
+async def _baseline(database, db: aiosqlite.Connection, config_dict: Optional[dict]):
+    """All tables, the columns added before versioning and the config rows"""
+    for statement in _BASELINE_TABLES:
+        await db.execute(statement)
+    for table_name, columns in _LEGACY_COLUMNS.items():
+        await database._add_missing_columns(db, table_name, columns)
+    # Only fills rows that are missing, so upgraded databases keep their settings
+    await database._ensure_config_rows(db, config_dict)
+
+
+async def _drive_upload_queue(database, db: aiosqlite.Connection, config_dict: Optional[dict]):
+    """Durable Google Drive upload queue + per-task Drive status"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS drive_uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT NOT NULL,
+            file_url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            drive_url TEXT,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_drive_uploads_due ON drive_uploads(status, next_attempt_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_drive_uploads_task ON drive_uploads(task_id)")
+    await database._add_missing_columns(db, "tasks", [
+        ("drive_status", "TEXT"),
+        ("drive_urls", "TEXT"),
+        ("drive_error", "TEXT"),
+    ])
+
+
+async def _character_card_indexes(database, db: aiosqlite.Connection, config_dict: Optional[dict]):
+    """Name and token lookups on character_cards (directory reloads, SQL fallbacks)"""
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_character_cards_username ON character_cards(username)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_character_cards_display_name ON character_cards(display_name)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_character_cards_token ON character_cards(token_id)")
+
+
+MIGRATIONS = (
+    Migration(1, "baseline schema", _baseline),
+    Migration(2, "drive_uploads queue and tasks.drive_* columns", _drive_upload_queue),
+    Migration(3, "character_cards indexes on username, display_name and token_id", _character_card_indexes),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def read_version(db: aiosqlite.Connection) -> int:
+    """Current schema version (0 for databases from before versioning / empty files)"""
+    try:
+        cursor = await db.execute("SELECT version FROM schema_version WHERE id = 1")
+    except aiosqlite.OperationalError:
+        return 0
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def _write_version(db: aiosqlite.Connection, version: int):
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("""
+        INSERT INTO schema_version (id, version) VALUES (1, ?)
+        ON CONFLICT(id) DO UPDATE SET version = excluded.version, updated_at = CURRENT_TIMESTAMP
+    """, (version,))
+
+
+async def migrate(database, db: aiosqlite.Connection, config_dict: Optional[dict] = None) -> Tuple[int, int]:
+    """Bring the schema up to SCHEMA_VERSION
+
+    Args:
+        database: Database instance (its helpers are used by the steps)
+        db: Open connection (must not be inside a transaction)
+        config_dict: setting.toml values for config rows created on the way
+
+    Returns:
+        (version before, version after)
+    """
+    current = await read_version(db)
+    if current >= SCHEMA_VERSION:
+        return current, current
+
+    # Take the write lock, then look again: another worker may have migrated meanwhile
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        current = await read_version(db)
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            print(f"  → Applying migration {migration.version}: {migration.description}")
+            await migration.apply(database, db, config_dict)
+        if current < SCHEMA_VERSION:
+            await _write_version(db, SCHEMA_VERSION)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    return current, max(current, SCHEMA_VERSION)
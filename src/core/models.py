@@ -65,6 +65,9 @@ class Task(BaseModel):
     error_message: Optional[str] = None
     created_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    drive_status: Optional[str] = None  # pending/completed/failed (Google Drive offload)
+    drive_urls: Optional[str] = None  # JSON array, same order as result_urls
+    drive_error: Optional[str] = None
 
 class RequestLog(BaseModel):
     """Request log model"""
@@ -149,12 +152,25 @@ class ChatMessage(BaseModel):
 class ChatCompletionRequest(BaseModel):
     model: str
     messages: List[ChatMessage]
-    image: Optional[str] = None
-    video: Optional[str] = None  # Base64 encoded video file
+    image: Optional[str] = None  # Base64 / data URI image or upload://<id>
+    video: Optional[str] = None  # Base64 encoded video file, URL or upload://<id>
     remix_target_id: Optional[str] = None  # Sora share link video ID for remix
     stream: bool = False
     max_tokens: Optional[int] = None
 
+class BatchItem(BaseModel):
+    """One generation of a batch request"""
+    model: str
+    prompt: str = ""
+    image: Optional[str] = None  # Base64 / data URI image or upload://<id>
+    video: Optional[str] = None  # Base64 encoded video file, URL or upload://<id>
+    remix_target_id: Optional[str] = None
+    id: Optional[str] = None  # Client reference, echoed in the batch events
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    stream: bool = True  # False: return the batch ID immediately, results via /v1/batches/{id}/events
+
 class ChatCompletionChoice(BaseModel):
     index: int
     message: Optional[dict] = None
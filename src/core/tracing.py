@@ -0,0 +1,243 @@
+"""Lightweight request tracing with contextvars-propagated spans
+
+Usage:
+    with tracer.start_trace("generation", model=model):
+        with tracer.span("token_select"):
+            ...
+
+Spans are only recorded inside a sampled trace. Outside of one (tracing
+disabled, not sampled, background work) `tracer.span()` returns a shared no-op
+object, so instrumented code pays a single ContextVar lookup.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from .config import config
+
+
+class _NoopSpan:
+    """Returned when the current request is not traced"""
+
+    __slots__ = ()
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_event(self, name: str, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """Spans belonging to one request"""
+
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", trace: _Trace, name: str,
+                 parent: Optional["Span"], attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self._trace = trace
+        self._token = None
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self._trace.trace_id
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None and not isinstance(exc, GeneratorExit):
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited from a different context (e.g. generator closed by another task)
+            pass
+        self._trace.spans.append(self)
+        if self.parent_id is None:
+            self._tracer._finish(self._trace)
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "events": self.events,
+            "error": self.error,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class Tracer:
+    """Creates spans and keeps finished traces in a ring buffer"""
+
+    def __init__(self):
+        self._buffer: deque = deque(maxlen=config.tracing_buffer_size)
+        self._export_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- span creation ----------
+
+    def start_trace(self, name: str, **attributes):
+        """Start a root span, subject to the sampling rate"""
+        if not config.tracing_enabled or _current_span.get() is not None:
+            return self.span(name, **attributes)
+        rate = config.tracing_sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return _NOOP_SPAN
+        trace = _Trace(os.urandom(16).hex())
+        return Span(self, trace, name, None, attributes)
+
+    def span(self, name: str, **attributes):
+        """Child span of the current span, or a no-op when not tracing"""
+        parent = _current_span.get()
+        if parent is None:
+            return _NOOP_SPAN
+        return Span(self, parent._trace, name, parent, attributes)
+
+    @staticmethod
+    def current_span():
+        """Current span (no-op object when not tracing)"""
+        return _current_span.get() or _NOOP_SPAN
+
+    # ---------- finished traces ----------
+
+    def _finish(self, trace: _Trace):
+        if self._buffer.maxlen != config.tracing_buffer_size:
+            self._buffer = deque(self._buffer, maxlen=config.tracing_buffer_size)
+        self._buffer.append(trace)
+        if config.tracing_otlp_file:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+            self._executor.submit(self._export_otlp, trace, config.tracing_otlp_file)
+
+    def list_traces(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries of the most recent traces (newest first)"""
+        result = []
+        for trace in reversed(self._buffer):
+            root = next((s for s in trace.spans if s.parent_id is None), None)
+            if root is None:
+                continue
+            result.append({
+                "trace_id": trace.trace_id,
+                "name": root.name,
+                "start_ns": root.start_ns,
+                "duration_ms": round(root.duration_ms, 3),
+                "span_count": len(trace.spans),
+                "error": root.error,
+                "attributes": root.attributes,
+            })
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Full span list of one trace, ordered by start time"""
+        for trace in self._buffer:
+            if trace.trace_id == trace_id:
+                spans = sorted(trace.spans, key=lambda s: s.start_ns)
+                return {"trace_id": trace_id, "spans": [s.to_dict() for s in spans]}
+        return None
+
+    def _export_otlp(self, trace: _Trace, path: str):
+        """Append the trace as one OTLP/JSON ExportTraceServiceRequest line"""
+        spans = []
+        for s in trace.spans:
+            span = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": _otlp_attributes(s.attributes),
+                "events": [
+                    {"name": e["name"], "timeUnixNano": str(e["time_ns"]), "attributes": _otlp_attributes(e["attributes"])}
+                    for e in s.events
+                ],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                span["parentSpanId"] = s.parent_id
+            spans.append(span)
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": "sora2api"})},
+                "scopeSpans": [{"scope": {"name": "sora2api.tracing"}, "spans": spans}],
+            }]
+        }
+        line = json.dumps(payload, ensure_ascii=False, default=str)
+        with self._export_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+# Global tracer instance
+tracer = Tracer()
@@ -1,20 +1,28 @@
 """Main application entry point"""
+import asyncio
+import time
 import uvicorn
-from fastapi import FastAPI
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 
 # Import modules
 from .core.config import config
+from .core.auth import AuthManager
 from .core.database import Database
+from .core.metrics import metrics, LOCKED_TOKENS, CACHE_SIZE_BYTES
 from .services.token_manager import TokenManager
 from .services.proxy_manager import ProxyManager
 from .services.load_balancer import LoadBalancer
 from .services.sora_client import SoraClient
 from .services.generation_handler import GenerationHandler
 from .services.concurrency_manager import ConcurrencyManager
+from .services.coordination import coordination
+from .services.character_directory import character_directory
+from .services.cluster import cluster
+from .services.media_storage import MediaStaticFiles
+from .services.static_assets import StaticAssets, PrecompressedStaticFiles
 from .api import routes as api_routes
 from .api import admin as admin_routes
 
@@ -47,6 +55,10 @@ generation_handler = GenerationHandler(sora_client, token_manager, load_balancer
 api_routes.set_generation_handler(generation_handler)
 admin_routes.set_dependencies(token_manager, proxy_manager, db, generation_handler, concurrency_manager)
 
+# Scrape-time gauges
+LOCKED_TOKENS.set_function(lambda: len(load_balancer.token_lock.get_locked_tokens()))
+CACHE_SIZE_BYTES.set_function(generation_handler.file_cache.get_cache_size)
+
 # Include routers
 app.include_router(api_routes.router)
 app.include_router(admin_routes.router)
@@ -54,7 +66,10 @@ app.include_router(admin_routes.router)
 # Static files
 static_dir = Path(__file__).parent.parent / "static"
 static_dir.mkdir(exist_ok=True)
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+# Built frontend (tools/build_assets.py) when current: hashed, precompressed, long-cached
+static_assets = StaticAssets(static_dir)
+static_files = PrecompressedStaticFiles(directory=str(static_dir))
+app.mount("/static", static_files, name="static")
 
 # Favicon
 @app.get("/favicon.ico", include_in_schema=False)
@@ -67,15 +82,29 @@ async def favicon():
     from fastapi import Response
     return Response(status_code=204)
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Expose in-process metrics in Prometheus text format
+
+    Requires the API key as a bearer token unless [metrics] public is set.
+    """
+    if not config.metrics_public:
+        scheme, _, api_key = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not AuthManager.verify_api_key(api_key):
+            raise HTTPException(status_code=401, detail="Invalid API key", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Chrome DevTools discovery 文件占位，避免 404 噪声
 @app.get("/.well-known/appspecific/com.chrome.devtools.json", include_in_schema=False)
 async def chrome_devtools_placeholder_exact():
     return JSONResponse(content={}, status_code=200)
 
-# Cache files (tmp directory)
+# Cache files (tmp directory); files that are only in the object store ([storage] s3/tiered) are redirected there
 tmp_dir = Path(__file__).parent.parent / "tmp"
 tmp_dir.mkdir(exist_ok=True)
-app.mount("/tmp", StaticFiles(directory=str(tmp_dir)), name="tmp")
+app.mount("/tmp", MediaStaticFiles(directory=str(tmp_dir), storage=lambda: generation_handler.file_cache.storage),
+          name="tmp")
 
 # Frontend routes
 @app.get("/", response_class=HTMLResponse)
@@ -94,70 +123,90 @@ async def root():
     """
 
 @app.get("/login", response_class=FileResponse)
-async def login_page():
+async def login_page(request: Request):
     """Serve login page"""
-    return FileResponse(str(static_dir / "login.html"))
+    return await static_files.get_response(static_assets.page("login.html"), request.scope)
 
 @app.get("/manage", response_class=FileResponse)
-async def manage_page():
+async def manage_page(request: Request):
     """Serve management page"""
-    return FileResponse(str(static_dir / "manage.html"))
+    return await static_files.get_response(static_assets.page("manage.html"), request.scope)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
+    started = time.perf_counter()
     # Get config from setting.toml
     config_dict = config.get_raw_config()
 
     # Check if database exists
     is_first_startup = not db.db_exists()
 
-    # Initialize database tables
-    await db.init_db()
-
-    # Handle database initialization based on startup type
+    # Create / migrate the schema (a single version read when already current)
+    from_version, to_version = await db.migrate(config_dict)
     if is_first_startup:
-        print("🎉 First startup detected. Initializing database and configuration from setting.toml...")
-        await db.init_config_from_toml(config_dict, is_first_startup=True)
-        print("✓ Database and configuration initialized successfully.")
+        print(f"🎉 First startup detected. Database initialized from setting.toml (schema v{to_version}).")
+    elif from_version != to_version:
+        print(f"✓ Database migrated from schema v{from_version} to v{to_version}.")
     else:
-        print("🔄 Existing database detected. Checking for missing tables and columns...")
-        await db.check_and_migrate_db(config_dict)
-        print("✓ Database migration check completed.")
+        print(f"✓ Database schema is up to date (v{to_version}).")
+
+    # Load the config rows and tokens in parallel (independent reads)
+    admin_config, cache_config, generation_config, token_refresh_config, all_tokens = await asyncio.gather(
+        db.get_admin_config(),
+        db.get_cache_config(),
+        db.get_generation_config(),
+        db.get_token_refresh_config(),
+        db.get_all_tokens(),
+    )
 
-    # Load admin credentials and API key from database
-    admin_config = await db.get_admin_config()
+    # Admin credentials and API key
     config.set_admin_username_from_db(admin_config.admin_username)
     config.set_admin_password_from_db(admin_config.admin_password)
     config.api_key = admin_config.api_key
 
-    # Load cache configuration from database
-    cache_config = await db.get_cache_config()
+    # Cache configuration
     config.set_cache_enabled(cache_config.cache_enabled)
     config.set_cache_timeout(cache_config.cache_timeout)
     config.set_cache_base_url(cache_config.cache_base_url or "")
 
-    # Load generation configuration from database
-    generation_config = await db.get_generation_config()
+    # Generation configuration
     config.set_image_timeout(generation_config.image_timeout)
     config.set_video_timeout(generation_config.video_timeout)
 
-    # Load token refresh configuration from database
-    token_refresh_config = await db.get_token_refresh_config()
+    # Token refresh configuration
     config.set_at_auto_refresh_enabled(token_refresh_config.at_auto_refresh_enabled)
 
     # Initialize concurrency manager with all tokens
-    all_tokens = await db.get_all_tokens()
     await concurrency_manager.initialize(all_tokens)
     print(f"✓ Concurrency manager initialized with {len(all_tokens)} tokens")
 
+    # Character cards in memory (@mentions, admin listing, autocomplete)
+    await character_directory.load(db)
+    print(f"✓ Character directory loaded ({len(character_directory)} cards)")
+
     # Start file cache cleanup task
     await generation_handler.file_cache.start_cleanup_task()
 
+    # Start the Google Drive offload workers (no-op unless [google_drive] enabled)
+    await generation_handler.drive_queue.start()
+    if generation_handler.drive_queue.running:
+        print(f"✓ Google Drive upload queue started ({config.google_drive_workers} workers)")
+
+    # Join the cluster (no-op unless [cluster] enabled)
+    await cluster.start(token_manager)
+    if cluster.enabled:
+        print(f"✓ Cluster node {cluster.node_id} joined ({len(cluster.ring.nodes)} nodes)")
+
+    print(f"✓ Startup completed in {time.perf_counter() - started:.2f}s")
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     await generation_handler.file_cache.stop_cleanup_task()
+    await generation_handler.drive_queue.stop()
+    await cluster.stop()
+    await coordination.close()
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,153 @@
+"""Batch generation: many prompts fanned out in one request
+
+Every item runs as its own generation (own TaskEventHub topic, so it can
+also be followed through /v1/tasks/{task_id}/events). At most
+[batch] max_concurrency items of a batch run at once, and an item only
+starts when the load balancer has a token for its model type, so
+per-token concurrency and quota limits keep being enforced by the usual
+token selection.
+
+The batch stream multiplexes the item streams. Each item chunk is wrapped
+without re-parsing:
+
+    data: {"batch_id":"batch_…","index":0,"id":"client-ref","chunk":{…chat.completion.chunk…}}
+
+followed by one {"batch_id","index","id","status":"succeeded"|"failed"} event per
+item, a final batch summary and `data: [DONE]`.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import AsyncGenerator, AsyncIterator, List
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..core.models import BatchItem
+from .stream_encoder import TerminalChunk, DONE_CHUNK
+from .task_event_hub import task_event_hub, HEARTBEAT
+
+_TOKEN_POLL_INTERVAL = 2.0
+
+
+def error_chunk(message: str) -> str:
+    """OpenAI-compatible error event"""
+    error_response = {
+        "error": {
+            "message": message,
+            "type": "server_error",
+            "param": None,
+            "code": None
+        }
+    }
+    return TerminalChunk(f'data: {json.dumps(error_response)}\n\n')
+
+
+async def stream_with_errors(source: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """Pass a generation stream through, turning an exception into an error event + [DONE]"""
+    try:
+        async for chunk in source:
+            yield chunk
+    except Exception as e:
+        yield error_chunk(str(e))
+        yield DONE_CHUNK
+
+
+class BatchRunner:
+    """Runs the items of one batch request and multiplexes their streams"""
+
+    def __init__(self, handler, items: List[BatchItem], model_config: dict):
+        """
+        Args:
+            handler: GenerationHandler
+            items: Validated batch items
+            model_config: MODEL_CONFIG (to tell image from video items)
+        """
+        self.handler = handler
+        self.items = items
+        self.model_config = model_config
+        self.batch_id = f"batch_{os.urandom(12).hex()}"
+        self.succeeded = 0
+        self.failed = 0
+
+    def _prefix(self, index: int) -> str:
+        item = self.items[index]
+        return (f'data: {{"batch_id":"{self.batch_id}","index":{index},'
+                f'"id":{json.dumps(item.id)},')
+
+    async def _wait_for_token(self, item: BatchItem):
+        """Hold the item back until a token for its model type is free (bounded wait)"""
+        is_image = self.model_config[item.model]["type"] == "image"
+        deadline = time.monotonic() + config.batch_token_wait_seconds
+        while not await self.handler.check_token_availability(is_image, not is_image):
+            if time.monotonic() >= deadline:
+                # Start anyway: the generation reports the usual "no available tokens" error
+                return
+            await asyncio.sleep(_TOKEN_POLL_INTERVAL)
+
+    async def _run_item(self, index: int, semaphore: asyncio.Semaphore, queue: asyncio.Queue):
+        item = self.items[index]
+        prefix = self._prefix(index)
+        failed = False
+        try:
+            async with semaphore:
+                await self._wait_for_token(item)
+                topic_id = task_event_hub.start(stream_with_errors(self.handler.handle_generation(
+                    model=item.model,
+                    prompt=item.prompt,
+                    image=item.image,
+                    video=item.video,
+                    remix_target_id=item.remix_target_id,
+                    stream=True
+                )))
+                stream = task_event_hub.subscribe(topic_id)
+                try:
+                    async for chunk in stream:
+                        if chunk == HEARTBEAT:
+                            continue
+                        if chunk == DONE_CHUNK:
+                            break
+                        payload = chunk[6:].rstrip("\n")
+                        if payload.startswith('{"error"'):
+                            failed = True
+                        event = f'{prefix}"chunk":{payload}}}\n\n'
+                        queue.put_nowait(TerminalChunk(event) if isinstance(chunk, TerminalChunk) else event)
+                finally:
+                    await stream.aclose()
+        except Exception as e:
+            failed = True
+            queue.put_nowait(TerminalChunk(f'{prefix}"chunk":{error_chunk(str(e))[6:].rstrip()}}}\n\n'))
+        finally:
+            if failed:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            status = "failed" if failed else "succeeded"
+            queue.put_nowait(TerminalChunk(f'{prefix}"status":"{status}"}}\n\n'))
+            queue.put_nowait(None)
+
+    async def run(self) -> AsyncGenerator[str, None]:
+        """Multiplexed event stream of all items"""
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(max(1, config.batch_max_concurrency))
+        yield TerminalChunk(f'data: {{"batch_id":"{self.batch_id}","object":"batch","status":"running",'
+                            f'"items":{len(self.items)}}}\n\n')
+        workers = [asyncio.create_task(self._run_item(i, semaphore, queue)) for i in range(len(self.items))]
+        try:
+            remaining = len(workers)
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                    continue
+                yield event
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        debug_logger.log_info("Batch %s finished: %s succeeded, %s failed in %.1fs", self.batch_id,
+                              self.succeeded, self.failed, time.monotonic() - started)
+        yield TerminalChunk(f'data: {{"batch_id":"{self.batch_id}","object":"batch","status":"completed",'
+                            f'"succeeded":{self.succeeded},"failed":{self.failed}}}\n\n')
+        yield DONE_CHUNK
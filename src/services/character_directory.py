@@ -0,0 +1,263 @@
+"""In-memory directory of the character cards
+
+Loaded at startup and kept in sync by the code paths that create, delete or
+rename cards, so @mention resolution, the admin listing and autocomplete
+never query character_cards:
+
+    lookup()   exact (or case-insensitive) username / display_name match,
+               same rows as Database.get_character_cards_by_usernames
+    search()   prefix search over both names (case-insensitive trie),
+               shortest names first, for mention autocomplete
+    page()     newest-first listing with offset / limit and total
+
+With a shared coordination backend every change also bumps a version value;
+the other workers reload when they see it change (checked at most every
+[coordination] poll_interval).
+"""
+import bisect
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from .coordination import coordination
+
+_VERSION_KEY = "character_cards:version"
+_VERSION_TTL = 30 * 24 * 3600
+# Autocomplete re-asks the same short prefixes; results are kept until the next change
+_SEARCH_CACHE_MAX = 256
+
+
+def _fold(name: str) -> str:
+    return name.casefold()
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[int] = set()
+
+
+class CharacterDirectory:
+    """Character cards by ID, exact name, folded name and name prefix"""
+
+    def __init__(self):
+        self._loaded = False
+        self._cards: Dict[int, dict] = {}
+        self._exact: Dict[str, Set[int]] = {}
+        self._folded: Dict[str, Set[int]] = {}
+        self._trie = _TrieNode()
+        self._order: List[int] = []  # card IDs, ascending
+        self._searches: "OrderedDict[tuple, List[dict]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        # Bumped by every local change; a load that raced with one is not kept
+        self._generation = 0
+
+    # ---------- index maintenance ----------
+
+    @staticmethod
+    def _names(card: dict) -> Set[str]:
+        return {name for name in (card.get("username"), card.get("display_name")) if name}
+
+    def _index(self, card: dict):
+        self._searches.clear()
+        card_id = card["id"]
+        self._cards[card_id] = card
+        bisect.insort(self._order, card_id)
+        for name in self._names(card):
+            self._exact.setdefault(name, set()).add(card_id)
+            folded = _fold(name)
+            self._folded.setdefault(folded, set()).add(card_id)
+            node = self._trie
+            for ch in folded:
+                node = node.children.setdefault(ch, _TrieNode())
+            node.ids.add(card_id)
+
+    def _unindex(self, card_id: int) -> Optional[dict]:
+        card = self._cards.pop(card_id, None)
+        if card is None:
+            return None
+        self._searches.clear()
+        position = bisect.bisect_left(self._order, card_id)
+        if position < len(self._order) and self._order[position] == card_id:
+            del self._order[position]
+        for name in self._names(card):
+            for mapping, key in ((self._exact, name), (self._folded, _fold(name))):
+                ids = mapping.get(key)
+                if ids is not None:
+                    ids.discard(card_id)
+                    if not ids:
+                        del mapping[key]
+            # Remove from the trie, pruning branches that became empty
+            path = [self._trie]
+            for ch in _fold(name):
+                node = path[-1].children.get(ch)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].ids.discard(card_id)
+                folded = _fold(name)
+                for depth in range(len(folded), 0, -1):
+                    node = path[depth]
+                    if node.ids or node.children:
+                        break
+                    del path[depth - 1].children[folded[depth - 1]]
+        return card
+
+    async def load(self, db):
+        """(Re)build the directory from the database"""
+        if coordination.shared:
+            try:
+                self._version = await coordination.get_value(_VERSION_KEY)
+            except Exception:
+                self._version = None
+            self._checked_at = time.monotonic()
+        generation = self._generation
+        cards = await db.get_all_character_cards()
+        if generation != self._generation:
+            # A card changed while loading: the next access loads again
+            return
+        self._cards, self._exact, self._folded, self._trie, self._order = {}, {}, {}, _TrieNode(), []
+        self._searches.clear()
+        for card in cards:
+            self._index(card)
+        self._loaded = True
+        debug_logger.log_info("Character directory loaded (%s cards)", len(cards))
+
+    async def _ensure(self, db):
+        if self._loaded and coordination.shared:
+            now = time.monotonic()
+            if now - self._checked_at >= config.coordination_poll_interval:
+                self._checked_at = now
+                try:
+                    if await coordination.get_value(_VERSION_KEY) != self._version:
+                        self._loaded = False
+                except Exception as e:
+                    debug_logger.log_info("Character card version check failed, keeping the directory: %s", str(e))
+        if not self._loaded:
+            await self.load(db)
+
+    async def _publish_change(self):
+        self._generation += 1
+        if coordination.shared:
+            version = secrets.token_hex(8)
+            try:
+                await coordination.set_value(_VERSION_KEY, version, _VERSION_TTL)
+                self._version = version
+            except Exception as e:
+                debug_logger.log_info("Could not publish character card change: %s", str(e))
+
+    # ---------- change notifications ----------
+
+    async def added(self, db, card_id: int):
+        """A card was created"""
+        card = await db.get_character_card(card_id)
+        if card is not None and self._loaded:
+            self._unindex(card_id)
+            self._index(card)
+        await self._publish_change()
+
+    async def removed(self, card_id: int):
+        """A card was deleted"""
+        self._unindex(card_id)
+        await self._publish_change()
+
+    async def renamed(self, card_id: int, display_name: str):
+        """A card's display_name changed"""
+        card = self._unindex(card_id)
+        if card is not None:
+            self._index({**card, "display_name": display_name})
+        await self._publish_change()
+
+    # ---------- queries ----------
+
+    async def lookup(self, db, names: Iterable[str], token_id: Optional[int] = None,
+                     case_insensitive: bool = False) -> List[dict]:
+        """Cards whose username or display_name is one of names
+
+        Args:
+            db: Database the directory is loaded from
+            names: Usernames / display names (e.g. @mentions of a prompt)
+            token_id: Only cards of this token (None: any token)
+            case_insensitive: Match names ignoring case
+        """
+        names = [name for name in names if name]
+        if not names:
+            return []
+        await self._ensure(db)
+        mapping = self._folded if case_insensitive else self._exact
+        ids: Set[int] = set()
+        for name in names:
+            ids |= mapping.get(_fold(name) if case_insensitive else name, set())
+        cards = [self._cards[card_id] for card_id in sorted(ids)]
+        if token_id is not None:
+            cards = [card for card in cards if card.get("token_id") == token_id]
+        return cards
+
+    async def search(self, db, prefix: str, limit: int = 10, token_id: Optional[int] = None) -> List[dict]:
+        """Cards with a username or display_name starting with prefix (case-insensitive)
+
+        Shorter names come first (an exact match before its extensions), then newer cards.
+        """
+        await self._ensure(db)
+        folded = _fold(prefix or "")
+        key = (folded, limit, token_id)
+        cached = self._searches.get(key)
+        if cached is not None:
+            self._searches.move_to_end(key)
+            return cached
+        results = self._search(folded, limit, token_id)
+        self._searches[key] = results
+        while len(self._searches) > _SEARCH_CACHE_MAX:
+            self._searches.popitem(last=False)
+        return results
+
+    def _search(self, folded: str, limit: int, token_id: Optional[int]) -> List[dict]:
+        node = self._trie
+        for ch in folded:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        results: List[dict] = []
+        seen: Set[int] = set()
+        level = [node]
+        while level and len(results) < limit:
+            ids = set()
+            for current in level:
+                ids |= current.ids
+            for card_id in sorted(ids - seen, reverse=True):
+                seen.add(card_id)
+                card = self._cards[card_id]
+                if token_id is None or card.get("token_id") == token_id:
+                    results.append(card)
+                    if len(results) >= limit:
+                        break
+            level = [child for current in level for child in current.children.values()]
+        return results
+
+    async def page(self, db, offset: int = 0, limit: int = 50,
+                   token_id: Optional[int] = None) -> Tuple[List[dict], int]:
+        """(cards, total) of a newest-first listing"""
+        await self._ensure(db)
+        if token_id is None:
+            total = len(self._order)
+            end = total - offset
+            start = max(0, end - limit)
+            ids = self._order[start:end][::-1] if end > 0 else []
+        else:
+            ids = [card_id for card_id in reversed(self._order) if self._cards[card_id].get("token_id") == token_id]
+            total = len(ids)
+            ids = ids[offset:offset + limit]
+        return [self._cards[card_id] for card_id in ids], total
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+
+# Global directory instance
+character_directory = CharacterDirectory()
@@ -0,0 +1,299 @@
+"""Per-token circuit breaker with error-class-aware health scoring"""
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from .sora_errors import (
+    AuthExpiredError, BadRequestError, ContentViolationError, RateLimitedError,
+    SoraAPIError, TaskFailedError, TransientNetworkError, UpstreamBlockedError, UpstreamServerError
+)
+
+# Breaker states
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Error classes
+ERROR_NETWORK = "network"
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_AUTH = "auth"
+ERROR_BLOCKED = "blocked"
+ERROR_BAD_REQUEST = "bad_request"
+ERROR_POLICY = "policy"
+ERROR_UPSTREAM = "upstream"
+ERROR_UNKNOWN = "unknown"
+
+# Health penalty per error class. Content policy violations are caused by the
+# prompt/input, not by the account, so they never count against the token.
+# Other rejected requests (4xx) count a little: a token that keeps getting
+# them is worth backing off, but one bad prompt must not trip it.
+ERROR_WEIGHTS = {
+    ERROR_NETWORK: 1.0,
+    ERROR_UPSTREAM: 1.0,
+    ERROR_UNKNOWN: 1.0,
+    ERROR_BAD_REQUEST: 0.5,
+    ERROR_RATE_LIMIT: 3.0,
+    ERROR_AUTH: 3.0,
+    ERROR_BLOCKED: 3.0,
+    ERROR_POLICY: 0.0,
+}
+
+# Half-open probes taken by the current request: (token_id, dispatched_at)
+_request_probes: ContextVar[Optional[List[Tuple[int, float]]]] = ContextVar("request_probes", default=None)
+
+_STATUS_RE = re.compile(r"\b([45]\d\d)\b")
+_NETWORK_KEYWORDS = (
+    "curl:", "failed to perform", "recv failure", "send failure",
+    "connection was reset", "connection closed", "could not connect",
+    "timed out", "timeout", "tls", "openssl",
+)
+
+
+def classify_error(err: Optional[BaseException]) -> str:
+    """Map an exception raised during generation to an error class"""
+    if err is None:
+        return ERROR_UNKNOWN
+    if isinstance(err, SoraAPIError):
+        if isinstance(err, TransientNetworkError):
+            return ERROR_NETWORK
+        if isinstance(err, RateLimitedError):
+            return ERROR_RATE_LIMIT
+        if isinstance(err, AuthExpiredError):
+            return ERROR_AUTH
+        if isinstance(err, UpstreamBlockedError):
+            # 403 without an API error: scored like auth, but not an expired
+            # token, so it does not count towards permanent disabling
+            return ERROR_BLOCKED
+        if isinstance(err, UpstreamServerError):
+            return ERROR_UPSTREAM
+        if isinstance(err, (ContentViolationError, TaskFailedError)):
+            # Rejected because of the prompt / result, not the account
+            return ERROR_POLICY
+        if isinstance(err, BadRequestError):
+            return ERROR_BAD_REQUEST
+        return ERROR_UNKNOWN
+
+    # Untyped errors (raised outside SoraClient)
+    msg = str(err) or ""
+    lower = msg.lower()
+    if "content policy violation" in lower or "sora_content_violation" in lower:
+        return ERROR_POLICY
+    if "token_expired" in lower or "token已过期" in lower:
+        return ERROR_AUTH
+
+    match = _STATUS_RE.search(msg)
+    if match:
+        status = int(match.group(1))
+        if status == 429:
+            return ERROR_RATE_LIMIT
+        if status == 401:
+            return ERROR_AUTH
+        if status == 403:
+            return ERROR_BLOCKED
+        if status >= 500:
+            return ERROR_UPSTREAM
+
+    if any(k in lower for k in _NETWORK_KEYWORDS):
+        return ERROR_NETWORK
+    return ERROR_UNKNOWN
+
+
+class _TokenCircuit:
+    """Mutable breaker state for a single token"""
+
+    __slots__ = ("state", "events", "open_until", "open_count", "probes", "consecutive_auth_failures")
+
+    def __init__(self):
+        self.state = STATE_CLOSED
+        self.events: Deque[Tuple[float, str]] = deque()  # (timestamp, error_class)
+        self.open_until = 0.0
+        self.open_count = 0  # consecutive trips, drives the open backoff
+        self.probes: Deque[float] = deque()  # dispatch timestamps of in-flight half-open probes
+        self.consecutive_auth_failures = 0
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker kept in memory for every token
+
+    - closed: traffic flows; failures are scored over a sliding window
+    - open: token is skipped by the load balancer until the cooldown expires
+    - half_open: a limited number of real requests are let through as probes;
+      a successful probe closes the breaker, a failed one re-opens it with a
+      longer cooldown
+    """
+
+    def __init__(self):
+        self._circuits: Dict[int, _TokenCircuit] = {}
+
+    def _get(self, token_id: int) -> _TokenCircuit:
+        circuit = self._circuits.get(token_id)
+        if circuit is None:
+            circuit = _TokenCircuit()
+            self._circuits[token_id] = circuit
+        return circuit
+
+    @staticmethod
+    def _prune(circuit: _TokenCircuit, now: float):
+        window_start = now - config.circuit_breaker_window_seconds
+        events = circuit.events
+        while events and events[0][0] < window_start:
+            events.popleft()
+        probe_start = now - config.circuit_breaker_probe_timeout
+        probes = circuit.probes
+        while probes and probes[0] < probe_start:
+            probes.popleft()
+
+    @staticmethod
+    def _score(circuit: _TokenCircuit) -> float:
+        return sum(ERROR_WEIGHTS.get(cls, 1.0) for _, cls in circuit.events)
+
+    def _trip(self, token_id: int, circuit: _TokenCircuit, now: float, reason: str):
+        circuit.open_count += 1
+        cooldown = min(
+            config.circuit_breaker_open_seconds * (2 ** (circuit.open_count - 1)),
+            config.circuit_breaker_max_open_seconds
+        )
+        circuit.state = STATE_OPEN
+        circuit.open_until = now + cooldown
+        circuit.probes.clear()
+        debug_logger.log_info("[CIRCUIT] Token %s opened for %.0fs (%s)", token_id, cooldown, reason)
+
+    @staticmethod
+    def _state_at(circuit: _TokenCircuit, now: float) -> str:
+        if circuit.state == STATE_OPEN and now >= circuit.open_until:
+            return STATE_HALF_OPEN
+        return circuit.state
+
+    def get_state(self, token_id: int) -> str:
+        """Current state (an open breaker whose cooldown has elapsed reads as half_open); read-only"""
+        circuit = self._circuits.get(token_id)
+        if circuit is None:
+            return STATE_CLOSED
+        return self._state_at(circuit, time.time())
+
+    def allow_request(self, token_id: int) -> bool:
+        """Whether the token may receive a new request right now (no side effects on closed tokens)
+
+        Promotes open -> half_open once the cooldown has elapsed.
+        """
+        circuit = self._circuits.get(token_id)
+        if circuit is None or circuit.state == STATE_CLOSED:
+            return True
+        now = time.time()
+        state = self._state_at(circuit, now)
+        if state == STATE_OPEN:
+            return False
+        if circuit.state == STATE_OPEN:
+            circuit.state = STATE_HALF_OPEN
+            circuit.probes.clear()
+            debug_logger.log_info("[CIRCUIT] Token %s half-open, accepting probe traffic", token_id)
+        self._prune(circuit, now)
+        return len(circuit.probes) < config.circuit_breaker_half_open_max_probes
+
+    def on_dispatch(self, token_id: int):
+        """Register a request sent to the token; counts as a probe while half-open"""
+        circuit = self._circuits.get(token_id)
+        if circuit is not None and circuit.state == STATE_HALF_OPEN:
+            dispatched_at = time.time()
+            circuit.probes.append(dispatched_at)
+            taken = _request_probes.get()
+            if taken is not None:
+                taken.append((token_id, dispatched_at))
+
+    def begin_request(self):
+        """Track the probes the current request takes, so end_request can hand them back
+
+        Usage (the generation handler)::
+
+            scope = circuit_breaker.begin_request()
+            try:
+                ... select tokens, generate, record_success / record_error ...
+            finally:
+                circuit_breaker.end_request(scope)
+        """
+        taken: List[Tuple[int, float]] = []
+        return taken, _request_probes.set(taken)
+
+    def end_request(self, scope):
+        """Release the half-open slots still held by the request's probes
+
+        A probe whose outcome was recorded is already gone (success and trip
+        clear them); this covers requests that ended without reporting one
+        (cancelled, failed before the upstream call), which would otherwise
+        hold the slot for the whole probe_timeout.
+        """
+        taken, context_token = scope
+        try:
+            _request_probes.reset(context_token)
+        except ValueError:
+            # Generator closed from a different context
+            pass
+        for token_id, dispatched_at in taken:
+            circuit = self._circuits.get(token_id)
+            if circuit is not None and dispatched_at in circuit.probes:
+                circuit.probes.remove(dispatched_at)
+
+    def record_success(self, token_id: int):
+        """Successful request: close the breaker and forget the backoff"""
+        circuit = self._circuits.get(token_id)
+        if circuit is None:
+            return
+        if circuit.state != STATE_CLOSED:
+            debug_logger.log_info("[CIRCUIT] Token %s recovered, closing breaker", token_id)
+        circuit.state = STATE_CLOSED
+        circuit.events.clear()
+        circuit.probes.clear()
+        circuit.open_count = 0
+        circuit.consecutive_auth_failures = 0
+
+    def record_failure(self, token_id: int, error_class: str):
+        """Record a failed request and trip the breaker when the health score is exhausted"""
+        now = time.time()
+        circuit = self._get(token_id)
+        self._prune(circuit, now)
+
+        if error_class == ERROR_AUTH:
+            circuit.consecutive_auth_failures += 1
+        elif error_class not in (ERROR_POLICY, ERROR_BLOCKED):
+            circuit.consecutive_auth_failures = 0
+
+        weight = ERROR_WEIGHTS.get(error_class, 1.0)
+        if weight <= 0:
+            # Content policy rejections say nothing about token health; a probe
+            # that ends this way still proves the token works.
+            if circuit.state == STATE_HALF_OPEN:
+                self.record_success(token_id)
+            return
+
+        circuit.events.append((now, error_class))
+
+        if circuit.state == STATE_HALF_OPEN:
+            self._trip(token_id, circuit, now, f"probe failed: {error_class}")
+        elif circuit.state == STATE_CLOSED and self._score(circuit) >= config.circuit_breaker_trip_score:
+            self._trip(token_id, circuit, now, f"health score exhausted, last error: {error_class}")
+
+    def consecutive_auth_failures(self, token_id: int) -> int:
+        """Number of back-to-back auth failures (401, 403 with an API error; used for permanent disabling)"""
+        circuit = self._circuits.get(token_id)
+        return circuit.consecutive_auth_failures if circuit else 0
+
+    def reset(self, token_id: int):
+        """Drop all breaker state for a token (e.g. manually re-enabled by admin)"""
+        self._circuits.pop(token_id, None)
+
+    def snapshot(self, token_id: int) -> dict:
+        """Breaker details for the admin UI (read-only: reports the computed state)"""
+        circuit = self._circuits.get(token_id)
+        if circuit is None:
+            return {"state": STATE_CLOSED, "score": 0.0, "open_until": None}
+        now = time.time()
+        state = self._state_at(circuit, now)
+        window_start = now - config.circuit_breaker_window_seconds
+        return {
+            "state": state,
+            "score": sum(ERROR_WEIGHTS.get(cls, 1.0) for ts, cls in circuit.events if ts >= window_start),
+            "open_until": circuit.open_until if state == STATE_OPEN else None,
+        }
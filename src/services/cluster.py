@@ -0,0 +1,273 @@
+"""Cluster mode: token-pool sharding across nodes
+
+Each node registers itself in the coordination backend (heartbeat with a
+TTL). All live nodes are placed on a consistent-hash ring, and a token is
+owned by the node its ID hashes to: only that node selects it, so polling
+for a token's tasks stays on one node. When nodes join or leave, only the
+tokens of the affected ring segments move.
+
+A request arriving at a node without a free owned token is forwarded to the
+peer that reports the most free capacity (owned tokens minus in-flight
+tasks). Forwarded requests carry X-Sora-Forwarded-By and are never forwarded
+again. An unreachable peer (or one answering with something other than the
+expected JSON) is skipped for the next one; when none is left the request is
+handled locally.
+
+Requires a shared coordination backend ([coordination] backend = resp for
+several hosts, sqlite for several processes on one host).
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Dict, Iterable, List, Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..core.metrics import INFLIGHT_TASKS
+from .coordination import CoordinationBackend, CoordinationError, coordination
+
+FORWARDED_HEADER = "X-Sora-Forwarded-By"
+_NODE_PREFIX = "cluster:node:"
+
+
+class ForwardError(Exception):
+    """Peer unreachable or its reply unusable (the request was not handled there)"""
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = max(1, vnodes)
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        self.rebuild(nodes)
+
+    def rebuild(self, nodes: Iterable[str]):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(self.vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+        self.nodes = sorted(set(nodes))
+
+    def owner(self, key) -> Optional[str]:
+        """Node owning `key` (None on an empty ring)"""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[index]
+
+
+@dataclass
+class NodeInfo:
+    node_id: str
+    url: str
+    tokens: int = 0
+    inflight: int = 0
+    updated: float = 0.0
+
+    @property
+    def free_capacity(self) -> int:
+        return self.tokens - self.inflight
+
+    def to_json(self) -> str:
+        return json.dumps({"node_id": self.node_id, "url": self.url, "tokens": self.tokens,
+                           "inflight": self.inflight, "updated": self.updated})
+
+    @classmethod
+    def from_json(cls, data: str) -> "NodeInfo":
+        raw = json.loads(data)
+        return cls(raw["node_id"], raw["url"], int(raw.get("tokens", 0)),
+                   int(raw.get("inflight", 0)), float(raw.get("updated", 0)))
+
+
+class ClusterNode:
+    """Membership, token ownership and peer selection of this node"""
+
+    def __init__(self, backend: Optional[CoordinationBackend] = None):
+        self.backend = backend or coordination
+        self.node_id = config.cluster_node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ring = HashRing([self.node_id], config.cluster_vnodes)
+        self.peers: Dict[str, NodeInfo] = {}
+        self._token_manager = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return config.cluster_enabled
+
+    @property
+    def url(self) -> str:
+        return (config.cluster_advertise_url
+                or f"http://{socket.gethostname()}:{config.server_port}").rstrip("/")
+
+    def owns_token(self, token_id: int) -> bool:
+        """Whether this node may use the token (always True outside cluster mode)"""
+        if not self.enabled:
+            return True
+        return self.ring.owner(token_id) == self.node_id
+
+    def pick_peer(self) -> Optional[NodeInfo]:
+        """Live peer with the most free capacity, None if nobody has any"""
+        candidates = self.pick_peers()
+        return candidates[0] if candidates else None
+
+    def pick_peers(self) -> List[NodeInfo]:
+        """Live peers with free capacity, most free capacity first"""
+        candidates = [peer for peer in self.peers.values() if peer.free_capacity > 0]
+        return sorted(candidates, key=lambda peer: peer.free_capacity, reverse=True)
+
+    # ---------- membership ----------
+
+    async def start(self, token_manager):
+        """Register this node and start the heartbeat loop (no-op when disabled)"""
+        if not self.enabled or self._task is not None:
+            return
+        if not self.backend.shared:
+            debug_logger.log_info("Cluster mode needs a shared [coordination] backend; "
+                                  "with the in-process backend this node only sees itself")
+        self._token_manager = token_manager
+        await self.heartbeat()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            # Leave right away instead of waiting for the TTL
+            await self.backend.delete_value(_NODE_PREFIX + self.node_id)
+        except CoordinationError:
+            pass
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(config.cluster_heartbeat_seconds)
+            try:
+                await self.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Cluster heartbeat failed: {str(e)}",
+                    status_code=0,
+                    response_text=str(e)
+                )
+
+    async def _owned_token_count(self) -> int:
+        if self._token_manager is None:
+            return 0
+        tokens = await self._token_manager.get_active_tokens()
+        return sum(1 for token in tokens if self.owns_token(token.id))
+
+    async def heartbeat(self):
+        """Publish this node's record and refresh the member list / ring"""
+        ttl = config.cluster_heartbeat_seconds * 3
+        me = NodeInfo(self.node_id, self.url, await self._owned_token_count(),
+                      int(INFLIGHT_TASKS.total()), time.time())
+        await self.backend.set_value(_NODE_PREFIX + self.node_id, me.to_json(), ttl)
+
+        members: Dict[str, NodeInfo] = {}
+        for value in (await self.backend.scan_values(_NODE_PREFIX)).values():
+            try:
+                info = NodeInfo.from_json(value)
+            except (ValueError, KeyError):
+                continue
+            members[info.node_id] = info
+        members[self.node_id] = me
+
+        if sorted(members) != self.ring.nodes:
+            previous = set(self.ring.nodes)
+            self.ring.rebuild(members)
+            joined = sorted(set(members) - previous)
+            left = sorted(previous - set(members))
+            debug_logger.log_info("Cluster membership changed (joined: %s, left: %s), %s nodes; rebalanced token ownership",
+                                  joined, left, len(members))
+            # Ownership moved: republish the owned token count
+            me.tokens = await self._owned_token_count()
+            await self.backend.set_value(_NODE_PREFIX + self.node_id, me.to_json(), ttl)
+        self.peers = {node_id: info for node_id, info in members.items() if node_id != self.node_id}
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "node_id": self.node_id,
+            "url": self.url,
+            "nodes": self.ring.nodes,
+            "peers": [{"node_id": p.node_id, "url": p.url, "tokens": p.tokens, "inflight": p.inflight,
+                       "free_capacity": p.free_capacity} for p in self.peers.values()],
+        }
+
+    # ---------- forwarding ----------
+
+    def _forward_headers(self, authorization: str) -> dict:
+        return {"Authorization": authorization, "Content-Type": "application/json",
+                FORWARDED_HEADER: self.node_id}
+
+    async def forward_stream(self, peer: NodeInfo, path: str, payload: dict,
+                             authorization: str) -> Tuple[int, str, AsyncGenerator[bytes, None]]:
+        """POST to a peer and open its (SSE) response
+
+        Returns:
+            (status code, content type, body chunks); the connection is released
+            once the body is exhausted or closed
+
+        Raises:
+            ForwardError: The peer could not be reached
+        """
+        from curl_cffi.requests import AsyncSession
+
+        session = AsyncSession()
+        try:
+            response = await session.request("POST", f"{peer.url}{path}", json=payload,
+                                             headers=self._forward_headers(authorization),
+                                             timeout=config.video_timeout, stream=True)
+        except Exception as e:
+            await session.close()
+            raise ForwardError(f"{peer.node_id} unreachable: {str(e)}") from e
+
+        async def body() -> AsyncGenerator[bytes, None]:
+            try:
+                async for chunk in response.aiter_content():
+                    yield chunk
+            finally:
+                await response.aclose()
+                await session.close()
+
+        content_type = response.headers.get("content-type") or "text/event-stream"
+        return response.status_code, content_type, body()
+
+    async def forward_json(self, peer: NodeInfo, path: str, payload: dict, authorization: str):
+        """POST to a peer, returns (status code, JSON body)
+
+        Raises:
+            ForwardError: The peer could not be reached or did not answer with JSON
+        """
+        from curl_cffi.requests import AsyncSession
+
+        try:
+            async with AsyncSession() as session:
+                response = await session.post(f"{peer.url}{path}", json=payload,
+                                              headers=self._forward_headers(authorization), timeout=60)
+                return response.status_code, response.json()
+        except ValueError as e:
+            raise ForwardError(f"{peer.node_id} sent a non-JSON reply: {str(e)}") from e
+        except Exception as e:
+            raise ForwardError(f"{peer.node_id} unreachable: {str(e)}") from e
+
+
+# Global cluster node
+cluster = ClusterNode()
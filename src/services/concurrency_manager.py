@@ -1,17 +1,34 @@
 """Concurrency manager for token-based rate limiting"""
-import asyncio
-from typing import Dict, Optional
+from typing import Optional
 from ..core.logger import debug_logger
+from .coordination import CoordinationBackend, coordination
+
+_PREFIX = "concurrency:"
 
 
 class ConcurrencyManager:
-    """Manages concurrent request limits for each token"""
+    """Manages concurrent request limits for each token
+
+    Remaining slots are counters in the coordination backend (a missing
+    counter means no limit), so limits hold across workers when a shared
+    backend is configured.
+    """
+
+    def __init__(self, backend: Optional[CoordinationBackend] = None):
+        """Initialize concurrency manager
 
-    def __init__(self):
-        """Initialize concurrency manager"""
-        self._image_concurrency: Dict[int, int] = {}  # token_id -> remaining image concurrency
-        self._video_concurrency: Dict[int, int] = {}  # token_id -> remaining video concurrency
-        self._lock = asyncio.Lock()  # Protect concurrent access
+        Args:
+            backend: Coordination backend (default: the configured global one)
+        """
+        self.backend = backend or coordination
+
+    @staticmethod
+    def _image_key(token_id: int) -> str:
+        return f"{_PREFIX}image:{token_id}"
+
+    @staticmethod
+    def _video_key(token_id: int) -> str:
+        return f"{_PREFIX}video:{token_id}"
 
     async def initialize(self, tokens: list):
         """
@@ -20,12 +37,12 @@ class ConcurrencyManager:
         Args:
             tokens: List of Token objects with image_concurrency and video_concurrency fields
         """
-        async with self._lock:
-            # 用户明确要求“去除并发限制”：这里直接禁用并发计数（视为无限制）
-            # 约定：dict 不包含 token_id => 不限流（见 can_use_* / acquire_* 的实现）
-            self._image_concurrency.clear()
-            self._video_concurrency.clear()
-            debug_logger.log_info(f"Concurrency manager initialized with {len(tokens)} tokens (limits disabled: unlimited)")
+        # 用户明确要求“去除并发限制”：这里直接禁用并发计数（视为无限制）
+        # 约定：backend 中不存在计数 => 不限流（见 can_use_* / acquire_* 的实现）
+        # 共享 backend 中的计数属于所有 worker：启动时清空会抹掉其他 worker 正在占用的槽位
+        if not self.backend.shared:
+            await self.backend.counter_clear(_PREFIX)
+        debug_logger.log_info("Concurrency manager initialized with %s tokens (limits disabled: unlimited)", len(tokens))
 
     async def can_use_image(self, token_id: int) -> bool:
         """
@@ -37,17 +54,12 @@ class ConcurrencyManager:
         Returns:
             True if token has available image concurrency, False if concurrency is 0
         """
-        async with self._lock:
-            # If not in dict, it means no limit (-1)
-            if token_id not in self._image_concurrency:
-                return True
-            
-            remaining = self._image_concurrency[token_id]
-            if remaining <= 0:
-                debug_logger.log_info(f"Token {token_id} image concurrency exhausted (remaining: {remaining})")
-                return False
-            
-            return True
+        remaining = await self.backend.counter_get(self._image_key(token_id))
+        # None means no limit (-1)
+        if remaining is not None and remaining <= 0:
+            debug_logger.log_info("Token %s image concurrency exhausted (remaining: %s)", token_id, remaining)
+            return False
+        return True
 
     async def can_use_video(self, token_id: int) -> bool:
         """
@@ -59,17 +71,12 @@ class ConcurrencyManager:
         Returns:
             True if token has available video concurrency, False if concurrency is 0
         """
-        async with self._lock:
-            # If not in dict, it means no limit (-1)
-            if token_id not in self._video_concurrency:
-                return True
-            
-            remaining = self._video_concurrency[token_id]
-            if remaining <= 0:
-                debug_logger.log_info(f"Token {token_id} video concurrency exhausted (remaining: {remaining})")
-                return False
-            
-            return True
+        remaining = await self.backend.counter_get(self._video_key(token_id))
+        # None means no limit (-1)
+        if remaining is not None and remaining <= 0:
+            debug_logger.log_info("Token %s video concurrency exhausted (remaining: %s)", token_id, remaining)
+            return False
+        return True
 
     async def acquire_image(self, token_id: int) -> bool:
         """
@@ -81,17 +88,7 @@ class ConcurrencyManager:
         Returns:
             True if acquired, False if not available
         """
-        async with self._lock:
-            if token_id not in self._image_concurrency:
-                # No limit
-                return True
-            
-            if self._image_concurrency[token_id] <= 0:
-                return False
-            
-            self._image_concurrency[token_id] -= 1
-            debug_logger.log_info(f"Token {token_id} acquired image slot (remaining: {self._image_concurrency[token_id]})")
-            return True
+        return await self.backend.counter_acquire(self._image_key(token_id))
 
     async def acquire_video(self, token_id: int) -> bool:
         """
@@ -103,17 +100,7 @@ class ConcurrencyManager:
         Returns:
             True if acquired, False if not available
         """
-        async with self._lock:
-            if token_id not in self._video_concurrency:
-                # No limit
-                return True
-            
-            if self._video_concurrency[token_id] <= 0:
-                return False
-            
-            self._video_concurrency[token_id] -= 1
-            debug_logger.log_info(f"Token {token_id} acquired video slot (remaining: {self._video_concurrency[token_id]})")
-            return True
+        return await self.backend.counter_acquire(self._video_key(token_id))
 
     async def release_image(self, token_id: int):
         """
@@ -122,10 +109,9 @@ class ConcurrencyManager:
         Args:
             token_id: Token ID
         """
-        async with self._lock:
-            if token_id in self._image_concurrency:
-                self._image_concurrency[token_id] += 1
-                debug_logger.log_info(f"Token {token_id} released image slot (remaining: {self._image_concurrency[token_id]})")
+        remaining = await self.backend.counter_release(self._image_key(token_id))
+        if remaining is not None:
+            debug_logger.log_info("Token %s released image slot (remaining: %s)", token_id, remaining)
 
     async def release_video(self, token_id: int):
         """
@@ -134,10 +120,9 @@ class ConcurrencyManager:
         Args:
             token_id: Token ID
         """
-        async with self._lock:
-            if token_id in self._video_concurrency:
-                self._video_concurrency[token_id] += 1
-                debug_logger.log_info(f"Token {token_id} released video slot (remaining: {self._video_concurrency[token_id]})")
+        remaining = await self.backend.counter_release(self._video_key(token_id))
+        if remaining is not None:
+            debug_logger.log_info("Token %s released video slot (remaining: %s)", token_id, remaining)
 
     async def get_image_remaining(self, token_id: int) -> Optional[int]:
         """
@@ -149,8 +134,7 @@ class ConcurrencyManager:
         Returns:
             Remaining count or None if no limit
         """
-        async with self._lock:
-            return self._image_concurrency.get(token_id)
+        return await self.backend.counter_get(self._image_key(token_id))
 
     async def get_video_remaining(self, token_id: int) -> Optional[int]:
         """
@@ -162,8 +146,7 @@ class ConcurrencyManager:
         Returns:
             Remaining count or None if no limit
         """
-        async with self._lock:
-            return self._video_concurrency.get(token_id)
+        return await self.backend.counter_get(self._video_key(token_id))
 
     async def reset_token(self, token_id: int, image_concurrency: int = -1, video_concurrency: int = -1):
         """
@@ -174,15 +157,6 @@ class ConcurrencyManager:
             image_concurrency: New image concurrency limit (-1 for no limit)
             video_concurrency: New video concurrency limit (-1 for no limit)
         """
-        async with self._lock:
-            if image_concurrency > 0:
-                self._image_concurrency[token_id] = image_concurrency
-            elif token_id in self._image_concurrency:
-                del self._image_concurrency[token_id]
-            
-            if video_concurrency > 0:
-                self._video_concurrency[token_id] = video_concurrency
-            elif token_id in self._video_concurrency:
-                del self._video_concurrency[token_id]
-            
-            debug_logger.log_info(f"Token {token_id} concurrency reset (image: {image_concurrency}, video: {video_concurrency})")
+        await self.backend.counter_set(self._image_key(token_id), image_concurrency if image_concurrency > 0 else None)
+        await self.backend.counter_set(self._video_key(token_id), video_concurrency if video_concurrency > 0 else None)
+        debug_logger.log_info("Token %s concurrency reset (image: %s, video: %s)", token_id, image_concurrency, video_concurrency)
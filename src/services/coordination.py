@@ -0,0 +1,510 @@
+"""Coordination backends for state shared between workers
+
+Image locks (TokenLock), concurrency counters (ConcurrencyManager) and
+watermark-wait cancellation are kept in a CoordinationBackend so that
+several uvicorn workers (or nodes) see the same state:
+
+    memory  In-process dicts (default, single worker)
+    sqlite  SQLite file in WAL mode, shared by the workers of one host
+    resp    Redis protocol server, shared across nodes
+
+Selected with [coordination] backend. Three primitives are offered:
+
+    flags     key with a TTL; acquire() only succeeds when the key is absent
+              (or expired), which makes it a lock; release() deletes it only
+              for the owner value it was acquired with
+    counters  remaining-slot counters; a missing counter means unlimited
+    values    small strings with a TTL, read by key or listed by prefix
+              (cluster registry, streaming ZIP manifests)
+"""
+import abc
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from ..core.config import config
+from ..core.logger import debug_logger
+
+
+class CoordinationError(Exception):
+    """Backend unreachable or returned an error"""
+
+
+class CoordinationBackend(abc.ABC):
+    """Interface of all backends (keys are passed without the global prefix)"""
+
+    # Whether other processes can change the state (polling needed for changes)
+    shared = False
+
+    @abc.abstractmethod
+    async def acquire(self, key: str, ttl: float, owner: str = "1") -> bool:
+        """Set flag `key` for `ttl` seconds unless it is already set
+
+        Args:
+            owner: Value identifying this holder, checked by release()
+        """
+
+    @abc.abstractmethod
+    async def release(self, key: str, owner: str) -> bool:
+        """Clear flag `key` if it is still held by `owner` (it may have expired and been
+        taken over by someone else), returns whether it was cleared"""
+
+    @abc.abstractmethod
+    async def put(self, key: str, ttl: float):
+        """Set flag `key` for `ttl` seconds (overwrites)"""
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether flag `key` is set and not expired"""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Clear flag `key`"""
+
+    @abc.abstractmethod
+    async def counter_set(self, key: str, value: Optional[int]):
+        """Set a counter, None removes it (unlimited)"""
+
+    @abc.abstractmethod
+    async def counter_get(self, key: str) -> Optional[int]:
+        """Current value of a counter, None when missing (unlimited)"""
+
+    @abc.abstractmethod
+    async def counter_acquire(self, key: str) -> bool:
+        """Take one slot: True if the counter is missing or was positive"""
+
+    @abc.abstractmethod
+    async def counter_release(self, key: str) -> Optional[int]:
+        """Give one slot back (no-op for a missing counter), returns the new value"""
+
+    @abc.abstractmethod
+    async def counter_clear(self, prefix: str):
+        """Remove all counters starting with prefix"""
+
+    @abc.abstractmethod
+    async def set_value(self, key: str, value: str, ttl: float):
+        """Store `value` under `key` for `ttl` seconds"""
+
+    @abc.abstractmethod
+    async def get_value(self, key: str) -> Optional[str]:
+        """Value of `key`, None when missing or expired"""
+
+    @abc.abstractmethod
+    async def delete_value(self, key: str):
+        """Remove value `key`"""
+
+    @abc.abstractmethod
+    async def scan_values(self, prefix: str) -> Dict[str, str]:
+        """All live values whose key starts with prefix"""
+
+    async def close(self):
+        pass
+
+
+class InProcessBackend(CoordinationBackend):
+    """Dicts in this process (previous behaviour)"""
+
+    def __init__(self):
+        self._flags: Dict[str, Tuple[float, str]] = {}  # key -> (expires_at, owner)
+        self._counters: Dict[str, int] = {}
+        self._values: Dict[str, Tuple[str, float]] = {}
+
+    def _alive(self, key: str) -> bool:
+        flag = self._flags.get(key)
+        if flag is None:
+            return False
+        if flag[0] <= time.monotonic():
+            del self._flags[key]
+            return False
+        return True
+
+    async def acquire(self, key: str, ttl: float, owner: str = "1") -> bool:
+        if self._alive(key):
+            return False
+        self._flags[key] = (time.monotonic() + ttl, owner)
+        return True
+
+    async def release(self, key: str, owner: str) -> bool:
+        if not self._alive(key) or self._flags[key][1] != owner:
+            return False
+        del self._flags[key]
+        return True
+
+    async def put(self, key: str, ttl: float):
+        self._flags[key] = (time.monotonic() + ttl, "1")
+
+    async def exists(self, key: str) -> bool:
+        return self._alive(key)
+
+    async def delete(self, key: str):
+        self._flags.pop(key, None)
+
+    async def counter_set(self, key: str, value: Optional[int]):
+        if value is None:
+            self._counters.pop(key, None)
+        else:
+            self._counters[key] = value
+
+    async def counter_get(self, key: str) -> Optional[int]:
+        return self._counters.get(key)
+
+    async def counter_acquire(self, key: str) -> bool:
+        remaining = self._counters.get(key)
+        if remaining is None:
+            return True
+        if remaining <= 0:
+            return False
+        self._counters[key] = remaining - 1
+        return True
+
+    async def counter_release(self, key: str) -> Optional[int]:
+        if key not in self._counters:
+            return None
+        self._counters[key] += 1
+        return self._counters[key]
+
+    async def counter_clear(self, prefix: str):
+        for key in [k for k in self._counters if k.startswith(prefix)]:
+            del self._counters[key]
+
+    async def set_value(self, key: str, value: str, ttl: float):
+        self._values[key] = (value, time.monotonic() + ttl)
+
+    async def get_value(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def delete_value(self, key: str):
+        self._values.pop(key, None)
+
+    async def scan_values(self, prefix: str) -> Dict[str, str]:
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._values.items() if expires_at <= now]:
+            del self._values[key]
+        return {k: v for k, (v, _) in self._values.items() if k.startswith(prefix)}
+
+
+class SQLiteBackend(CoordinationBackend):
+    """SQLite file shared by the worker processes of one host
+
+    Every state change is a single conditional statement, so concurrent
+    workers never both win the same lock or slot. Flag expiry uses
+    wall-clock time, which all processes share.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _conn(self):
+        if self._db is None:
+            async with self._connect_lock:
+                if self._db is None:
+                    import aiosqlite
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                    db = await aiosqlite.connect(self.path, timeout=10, isolation_level=None)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute("CREATE TABLE IF NOT EXISTS flags (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, "
+                                     "owner TEXT NOT NULL DEFAULT '')")
+                    async with db.execute("PRAGMA table_info(flags)") as cursor:
+                        columns = {row[1] for row in await cursor.fetchall()}
+                    if "owner" not in columns:
+                        # File created before flags had owners
+                        await db.execute("ALTER TABLE flags ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+                    await db.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                    await db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+                    self._db = db
+        return self._db
+
+    async def _execute(self, sql: str, params: Tuple = ()) -> int:
+        db = await self._conn()
+        cursor = await db.execute(sql, params)
+        rowcount = cursor.rowcount
+        await cursor.close()
+        return rowcount
+
+    async def _fetchone(self, sql: str, params: Tuple = ()):
+        db = await self._conn()
+        async with db.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def acquire(self, key: str, ttl: float, owner: str = "1") -> bool:
+        now = time.time()
+        changed = await self._execute(
+            "INSERT INTO flags (key, expires_at, owner) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at, owner = excluded.owner "
+            "WHERE flags.expires_at <= ?",
+            (key, now + ttl, owner, now))
+        return changed == 1
+
+    async def release(self, key: str, owner: str) -> bool:
+        changed = await self._execute("DELETE FROM flags WHERE key = ? AND owner = ? AND expires_at > ?",
+                                      (key, owner, time.time()))
+        return changed == 1
+
+    async def put(self, key: str, ttl: float):
+        await self._execute("INSERT OR REPLACE INTO flags (key, expires_at, owner) VALUES (?, ?, '1')",
+                            (key, time.time() + ttl))
+
+    async def exists(self, key: str) -> bool:
+        row = await self._fetchone("SELECT 1 FROM flags WHERE key = ? AND expires_at > ?", (key, time.time()))
+        return row is not None
+
+    async def delete(self, key: str):
+        await self._execute("DELETE FROM flags WHERE key = ?", (key,))
+
+    async def counter_set(self, key: str, value: Optional[int]):
+        if value is None:
+            await self._execute("DELETE FROM counters WHERE key = ?", (key,))
+        else:
+            await self._execute("INSERT OR REPLACE INTO counters (key, value) VALUES (?, ?)", (key, value))
+
+    async def counter_get(self, key: str) -> Optional[int]:
+        row = await self._fetchone("SELECT value FROM counters WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    async def counter_acquire(self, key: str) -> bool:
+        if await self._execute("UPDATE counters SET value = value - 1 WHERE key = ? AND value > 0", (key,)) == 1:
+            return True
+        # Not decremented: either exhausted or no limit at all
+        return await self.counter_get(key) is None
+
+    async def counter_release(self, key: str) -> Optional[int]:
+        await self._execute("UPDATE counters SET value = value + 1 WHERE key = ?", (key,))
+        return await self.counter_get(key)
+
+    async def counter_clear(self, prefix: str):
+        await self._execute("DELETE FROM counters WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    async def set_value(self, key: str, value: str, ttl: float):
+        await self._execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                            (key, value, time.time() + ttl))
+
+    async def get_value(self, key: str) -> Optional[str]:
+        row = await self._fetchone("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time()))
+        return row[0] if row else None
+
+    async def delete_value(self, key: str):
+        await self._execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    async def scan_values(self, prefix: str) -> Dict[str, str]:
+        now = time.time()
+        await self._execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+        db = await self._conn()
+        async with db.execute("SELECT key, value FROM kv WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+                              (len(prefix), prefix, now)) as cursor:
+            return {key: value for key, value in await cursor.fetchall()}
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+# Compare-and-delete of a flag held by ARGV[1]
+_RELEASE_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+
+
+class RespBackend(CoordinationBackend):
+    """Redis protocol (RESP2) client on a single connection
+
+    Uses only SET NX PX, GET, MGET, DEL, EXISTS, INCR, DECR and SCAN, so any
+    Redis-compatible server works (tools/resp_stub_server.py for local tests).
+    """
+
+    shared = True
+
+    def __init__(self, url: str, key_prefix: str = ""):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.key_prefix = key_prefix
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        # None until the first release() finds out whether EVAL works
+        self._eval_supported: Optional[bool] = None
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by RESP server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise CoordinationError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            count = int(body)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise CoordinationError(f"Unexpected RESP reply: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            self._writer.write(self._encode("AUTH", self.password))
+            await self._read_reply()
+        if self.db:
+            self._writer.write(self._encode("SELECT", self.db))
+            await self._read_reply()
+
+    async def _command(self, *args):
+        async with self._lock:
+            return await self._command_locked(*args)
+
+    async def _command_locked(self, *args):
+        """_command for a caller already holding self._lock"""
+        for attempt in range(2):
+            try:
+                if self._writer is None:
+                    await self._connect()
+                self._writer.write(self._encode(*args))
+                await self._writer.drain()
+                return await self._read_reply()
+            except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                # Stale connection (e.g. server restarted): reconnect once
+                self._drop_connection()
+                if attempt:
+                    raise CoordinationError(f"RESP server {self.host}:{self.port} unreachable: {e}") from e
+
+    def _drop_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    def _key(self, key: str) -> str:
+        return self.key_prefix + key
+
+    async def acquire(self, key: str, ttl: float, owner: str = "1") -> bool:
+        reply = await self._command("SET", self._key(key), owner, "NX", "PX", max(1, int(ttl * 1000)))
+        return reply == "OK"
+
+    async def release(self, key: str, owner: str) -> bool:
+        if self._eval_supported is not False:
+            try:
+                deleted = await self._command("EVAL", _RELEASE_SCRIPT, 1, self._key(key), owner)
+                self._eval_supported = True
+                return bool(deleted)
+            except CoordinationError as e:
+                if "unknown command" not in str(e).lower():
+                    raise
+                # Server without scripting: GET + DEL below
+                self._eval_supported = False
+        async with self._lock:
+            if await self._command_locked("GET", self._key(key)) != owner:
+                return False
+            return bool(await self._command_locked("DEL", self._key(key)))
+
+    async def put(self, key: str, ttl: float):
+        await self._command("SET", self._key(key), "1", "PX", max(1, int(ttl * 1000)))
+
+    async def exists(self, key: str) -> bool:
+        return bool(await self._command("EXISTS", self._key(key)))
+
+    async def delete(self, key: str):
+        await self._command("DEL", self._key(key))
+
+    async def counter_set(self, key: str, value: Optional[int]):
+        if value is None:
+            await self._command("DEL", self._key(key))
+        else:
+            await self._command("SET", self._key(key), value)
+
+    async def counter_get(self, key: str) -> Optional[int]:
+        value = await self._command("GET", self._key(key))
+        return int(value) if value is not None else None
+
+    async def counter_acquire(self, key: str) -> bool:
+        if await self.counter_get(key) is None:
+            return True
+        if await self._command("DECR", self._key(key)) >= 0:
+            return True
+        # Went below zero: give the slot back
+        await self._command("INCR", self._key(key))
+        return False
+
+    async def counter_release(self, key: str) -> Optional[int]:
+        if await self.counter_get(key) is None:
+            return None
+        return await self._command("INCR", self._key(key))
+
+    async def _scan(self, prefix: str) -> list:
+        """Full (prefixed) key names matching prefix"""
+        keys = []
+        cursor = "0"
+        while True:
+            cursor, page = await self._command("SCAN", cursor, "MATCH", self._key(prefix) + "*", "COUNT", 500)
+            keys.extend(page)
+            if cursor == "0":
+                return keys
+
+    async def counter_clear(self, prefix: str):
+        keys = await self._scan(prefix)
+        if keys:
+            await self._command("DEL", *keys)
+
+    async def set_value(self, key: str, value: str, ttl: float):
+        await self._command("SET", self._key(key), value, "PX", max(1, int(ttl * 1000)))
+
+    async def get_value(self, key: str) -> Optional[str]:
+        return await self._command("GET", self._key(key))
+
+    async def delete_value(self, key: str):
+        await self._command("DEL", self._key(key))
+
+    async def scan_values(self, prefix: str) -> Dict[str, str]:
+        keys = await self._scan(prefix)
+        if not keys:
+            return {}
+        values = await self._command("MGET", *keys)
+        strip = len(self.key_prefix)
+        return {key[strip:]: value for key, value in zip(keys, values) if value is not None}
+
+    async def close(self):
+        async with self._lock:
+            self._drop_connection()
+
+
+def create_backend(name: Optional[str] = None) -> CoordinationBackend:
+    """Build the backend selected by [coordination] backend"""
+    name = (name or config.coordination_backend).lower()
+    if name == "sqlite":
+        backend = SQLiteBackend(config.coordination_sqlite_path)
+    elif name in ("resp", "redis"):
+        backend = RespBackend(config.coordination_resp_url, config.coordination_key_prefix)
+    else:
+        if name not in ("memory", "inprocess"):
+            debug_logger.log_info("Unknown coordination backend %r, using in-process state", name)
+        backend = InProcessBackend()
+    return backend
+
+
+# Global backend instance
+coordination = create_backend()
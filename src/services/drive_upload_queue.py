@@ -0,0 +1,134 @@
+"""Durable Google Drive offload queue
+
+Finished generations are queued in the `drive_uploads` table (one row per
+result URL) when [google_drive] enabled is set. A fixed number of workers
+per process claim due rows atomically, so several processes can share the
+queue. A claimed row is leased for upload_timeout + a margin: if its worker
+dies the row becomes due again and is retried elsewhere.
+
+Failed attempts are retried with exponential backoff (retry_base_seconds,
+doubling, capped at retry_max_seconds, ±20% jitter) up to max_attempts.
+After every attempt the task row's drive_status / drive_urls / drive_error
+are updated, which is what GET /v1/tasks/{task_id} reports.
+"""
+import asyncio
+import random
+import time
+from typing import List, Optional
+from ..core.config import config
+from ..core.database import Database
+from ..core.logger import debug_logger
+from ..core.metrics import DRIVE_UPLOAD_ATTEMPTS, DRIVE_UPLOADS_RUNNING
+from .google_drive_uploader import GoogleDriveUploader, DriveUploadError
+
+_LEASE_MARGIN = 60.0
+
+
+class DriveUploadQueue:
+    """Workers draining the drive_uploads table"""
+
+    def __init__(self, db: Database, uploader: Optional[GoogleDriveUploader] = None):
+        self.db = db
+        self.uploader = uploader or GoogleDriveUploader()
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """Start the workers (no-op when Drive offload is disabled or already running)"""
+        if self._workers or not config.google_drive_enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, config.google_drive_workers))]
+        debug_logger.log_info("Google Drive upload queue started with %s workers", len(self._workers))
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def enqueue(self, task_id: str, file_urls: List[str]):
+        """Queue the results of a finished task (no-op when Drive offload is disabled)
+
+        Best effort: the generation already succeeded, so a failure to queue is
+        logged instead of raised.
+        """
+        if not config.google_drive_enabled or not file_urls:
+            return
+        try:
+            await self.db.enqueue_drive_uploads(task_id, file_urls)
+            # Enabled at runtime: start on first use
+            await self.start()
+            self._wakeup.set()
+        except Exception as e:
+            debug_logger.log_error(
+                error_message=f"Drive upload queue: queueing task {task_id} failed: {str(e)}",
+                status_code=0,
+                response_text=str(e)
+            )
+
+    @staticmethod
+    def _backoff(attempts: int) -> float:
+        delay = min(config.google_drive_retry_max_seconds,
+                    config.google_drive_retry_base_seconds * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _worker(self):
+        lease = config.google_drive_upload_timeout + _LEASE_MARGIN
+        while True:
+            try:
+                job = await self.db.claim_drive_upload(time.time(), lease)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Drive upload queue: claiming a job failed: {str(e)}",
+                    status_code=0,
+                    response_text=str(e)
+                )
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), config.google_drive_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The row stays leased and becomes due again when the lease runs out
+                debug_logger.log_error(
+                    error_message=f"Drive upload queue: processing job {job['id']} failed: {str(e)}",
+                    status_code=0,
+                    response_text=str(e)
+                )
+
+    async def _process(self, job: dict):
+        DRIVE_UPLOADS_RUNNING.inc()
+        try:
+            drive_url = await self.uploader.upload(job["file_url"])
+            await self.db.finish_drive_upload(job["id"], drive_url)
+            DRIVE_UPLOAD_ATTEMPTS.inc("success")
+        except DriveUploadError as e:
+            retry_at = None
+            if e.retryable and job["attempts"] < config.google_drive_max_attempts:
+                retry_at = time.time() + self._backoff(job["attempts"])
+            DRIVE_UPLOAD_ATTEMPTS.inc("retry" if retry_at else "failed")
+            debug_logger.log_info("Drive upload of %s failed (attempt %s/%s, %s): %s", job["file_url"],
+                                  job["attempts"], config.google_drive_max_attempts,
+                                  "retrying" if retry_at else "giving up", str(e))
+            await self.db.finish_drive_upload(job["id"], None, str(e), retry_at)
+        finally:
+            DRIVE_UPLOADS_RUNNING.dec()
+
+        status = await self.db.sync_task_drive_status(job["task_id"])
+        if status in ("completed", "failed"):
+            debug_logger.log_info("Drive offload of task %s %s", job["task_id"], status)
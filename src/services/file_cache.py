@@ -9,12 +9,17 @@ from datetime import datetime, timedelta
 from curl_cffi.requests import AsyncSession
 from ..core.config import config
 from ..core.logger import debug_logger
+from ..core.metrics import CACHE_DOWNLOAD_SECONDS, CACHE_DOWNLOAD_BYTES
+from ..core.tracing import tracer
+from .sora_errors import SoraAPIError, error_from_response, is_transport_error, wrap_transport_error
+from .media_storage import MediaStorage, LocalStorage
 
 
 class FileCache:
     """File caching service for images and videos"""
 
-    def __init__(self, cache_dir: str = "tmp", default_timeout: int = 7200, proxy_manager=None):
+    def __init__(self, cache_dir: str = "tmp", default_timeout: int = 7200, proxy_manager=None,
+                 storage: Optional[MediaStorage] = None):
         """
         Initialize file cache
 
@@ -22,12 +27,16 @@ class FileCache:
             cache_dir: Cache directory path
             default_timeout: Default cache timeout in seconds (default: 2 hours)
             proxy_manager: ProxyManager instance for downloading files
+            storage: Where cached files are published (default: the cache directory itself)
         """
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         self.default_timeout = default_timeout
         self.proxy_manager = proxy_manager
+        self.storage = storage or LocalStorage(lambda: "")
         self._cleanup_task = None
+        # Refreshed by the cleanup loop so metrics scrapes never walk the directory
+        self._cache_size = 0
         
     async def start_cleanup_task(self):
         """Start background cleanup task"""
@@ -46,10 +55,12 @@ class FileCache:
     
     async def _cleanup_loop(self):
         """Background task to clean up expired files"""
+        await self._refresh_cache_size()
         while True:
             try:
                 await asyncio.sleep(300)  # Check every 5 minutes
                 await self._cleanup_expired_files()
+                await self._refresh_cache_size()
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -73,7 +84,7 @@ class FileCache:
                         try:
                             file_path.unlink()
                             removed_count += 1
-                            debug_logger.log_info(f"Removed expired cache file: {file_path.name}")
+                            debug_logger.log_info("Removed expired cache file: %s", file_path.name)
                         except Exception as e:
                             debug_logger.log_error(
                                 error_message=f"Failed to remove file {file_path.name}: {str(e)}",
@@ -82,7 +93,7 @@ class FileCache:
                             )
             
             if removed_count > 0:
-                debug_logger.log_info(f"Cleanup completed: removed {removed_count} expired files")
+                debug_logger.log_info("Cleanup completed: removed %s expired files", removed_count)
                 
         except Exception as e:
             debug_logger.log_error(
@@ -113,6 +124,56 @@ class FileCache:
         
         return f"{url_hash}{ext}"
     
+    async def cache_media(self, url: str, media_type: str) -> str:
+        """
+        Cache a generated file in the configured storage
+
+        Args:
+            url: File URL to download
+            media_type: 'image' or 'video'
+
+        Returns:
+            URL to hand out to clients
+        """
+        storage = self.storage
+        if not storage.stores_files:
+            return url
+        filename = self._generate_cache_filename(url, media_type)
+        file_path = self.cache_dir / filename
+
+        # Another node may have stored it already
+        if storage.remote and not file_path.exists():
+            try:
+                if await storage.exists(filename):
+                    debug_logger.log_info("Storage hit: %s", filename)
+                    return storage.url_for(filename)
+            except Exception as e:
+                debug_logger.log_info("Storage lookup of %s failed, downloading: %s", filename, str(e))
+
+        cached_mtime = file_path.stat().st_mtime if file_path.exists() else None
+        filename = await self.download_and_cache(url, media_type)
+        # Publish fresh downloads only (a local cache hit was published when it was downloaded)
+        if storage.remote and file_path.stat().st_mtime != cached_mtime:
+            try:
+                with tracer.span("file_cache.publish", backend=storage.name):
+                    await storage.publish(filename, file_path)
+            except BaseException:
+                # Otherwise the next request takes the local copy for a published one
+                file_path.unlink(missing_ok=True)
+                raise
+            if not storage.keep_local:
+                file_path.unlink(missing_ok=True)
+        return storage.url_for(filename)
+
+    async def local_copy(self, filename: str) -> Optional[Path]:
+        """Path of a cached file on this node, fetched from the remote store if needed"""
+        file_path = self.cache_dir / filename
+        if file_path.is_file():
+            return file_path
+        if self.storage.remote and await self.storage.fetch(filename, file_path):
+            return file_path
+        return None
+
     async def download_and_cache(self, url: str, media_type: str) -> str:
         """
         Download file from URL and cache it locally
@@ -124,6 +185,10 @@ class FileCache:
         Returns:
             Local cache filename
         """
+        with tracer.span("file_cache.download", media_type=media_type):
+            return await self._download_and_cache(url, media_type)
+
+    async def _download_and_cache(self, url: str, media_type: str) -> str:
         filename = self._generate_cache_filename(url, media_type)
         file_path = self.cache_dir / filename
         
@@ -131,7 +196,8 @@ class FileCache:
         if file_path.exists():
             file_age = time.time() - file_path.stat().st_mtime
             if file_age < self.default_timeout:
-                debug_logger.log_info(f"Cache hit: {filename}")
+                tracer.current_span().set_attribute("cache_hit", True)
+                debug_logger.log_info("Cache hit: %s", filename)
                 return filename
             else:
                 # Remove expired file
@@ -141,7 +207,7 @@ class FileCache:
                     pass
         
         # Download file
-        debug_logger.log_info(f"Downloading file from: {url}")
+        debug_logger.log_info("Downloading file from: %s", url)
 
         try:
             # Get proxy if available
@@ -152,18 +218,21 @@ class FileCache:
                     proxy_url = proxy_config.proxy_url
 
             # Download with proxy support
+            download_start = time.perf_counter()
             async with AsyncSession() as session:
                 proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
                 response = await session.get(url, timeout=60, proxies=proxies)
 
                 if response.status_code != 200:
-                    raise Exception(f"Download failed: HTTP {response.status_code}")
+                    raise error_from_response(response.status_code, response.text[:200], prefix="Download failed")
                 
                 # Save to cache
                 with open(file_path, 'wb') as f:
                     f.write(response.content)
                 
-                debug_logger.log_info(f"File cached: {filename} ({len(response.content)} bytes)")
+                CACHE_DOWNLOAD_SECONDS.observe(time.perf_counter() - download_start, media_type)
+                CACHE_DOWNLOAD_BYTES.observe(len(response.content), media_type)
+                debug_logger.log_info("File cached: %s (%s bytes)", filename, len(response.content))
                 return filename
                 
         except Exception as e:
@@ -172,6 +241,10 @@ class FileCache:
                 status_code=0,
                 response_text=str(e)
             )
+            if isinstance(e, SoraAPIError):
+                raise
+            if is_transport_error(e):
+                raise wrap_transport_error(e) from e
             raise Exception(f"Failed to cache file: {str(e)}")
     
     def get_cache_path(self, filename: str) -> Path:
@@ -181,11 +254,29 @@ class FileCache:
     def set_timeout(self, timeout: int):
         """Set cache timeout in seconds"""
         self.default_timeout = timeout
-        debug_logger.log_info(f"Cache timeout updated to {timeout} seconds")
+        debug_logger.log_info("Cache timeout updated to %s seconds", timeout)
     
     def get_timeout(self) -> int:
         """Get current cache timeout"""
         return self.default_timeout
+
+    def get_cache_size(self) -> int:
+        """Total size in bytes of the cached files, as of the last cleanup pass"""
+        return self._cache_size
+
+    def _scan_cache_size(self) -> int:
+        total = 0
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    async def _refresh_cache_size(self):
+        try:
+            self._cache_size = await asyncio.to_thread(self._scan_cache_size)
+        except Exception as e:
+            debug_logger.log_info("Cache size scan failed: %s", str(e))
     
     async def clear_all(self):
         """Clear all cached files"""
@@ -199,7 +290,8 @@ class FileCache:
                     except Exception:
                         pass
             
-            debug_logger.log_info(f"Cache cleared: removed {removed_count} files")
+            await self._refresh_cache_size()
+            debug_logger.log_info("Cache cleared: removed %s files", removed_count)
             return removed_count
             
         except Exception as e:
@@ -1,10 +1,9 @@
 """Generation handling module"""
 import json
 import asyncio
-import base64
+import hashlib
 import time
 import random
-import re
 from pathlib import Path
 from typing import Optional, AsyncGenerator, Dict, Any
 from datetime import datetime
@@ -13,11 +12,31 @@ from .sora_client import SoraClient
 from .token_manager import TokenManager
 from .load_balancer import LoadBalancer
 from .file_cache import FileCache
+from .media_storage import create_storage
+from .drive_upload_queue import DriveUploadQueue
 from .concurrency_manager import ConcurrencyManager
+from .sora_errors import (
+    BadRequestError, InvalidCameoError, NotFoundError, TaskFailedError, TransientNetworkError, UnknownMediaError
+)
+from .retry_policy import RetryPolicy, DOWNLOAD_RETRY, TASK_POLL_RETRY, CAMEO_POLL_RETRY, WATERMARK_RETRY
+from .circuit_breaker import classify_error
+from .stream_encoder import stream_encoder, DONE_CHUNK
+from .task_event_hub import task_event_hub
+from .upload_spool import upload_spool, is_upload_ref
+from .upload_cache import upload_cache, KIND_IMAGE, KIND_CAMEO
+from .prompt_analyzer import prompt_analyzer, MENTION_RE, REMIX_URL_RE, REMIX_ID_RE
+from .character_directory import character_directory
+from .pipeline import StageGraph
+from .coordination import coordination, CoordinationError
 from ..core.database import Database
 from ..core.models import Task, RequestLog, CharacterCard
 from ..core.config import config
 from ..core.logger import debug_logger
+from ..core.tracing import tracer
+from ..core.metrics import (
+    INFLIGHT_TASKS, QUEUED_REQUESTS, RETRIES_TOTAL, TIME_TO_COMPLETION,
+    TIME_TO_FIRST_PROGRESS, WATERMARK_WAIT_SECONDS
+)
 
 # Model configuration
 MODEL_CONFIG = {
@@ -80,19 +99,25 @@ class GenerationHandler:
         self.token_manager = token_manager
         self.load_balancer = load_balancer
         self.db = db
+        self.proxy_manager = proxy_manager
         self.concurrency_manager = concurrency_manager
         self.file_cache = FileCache(
             cache_dir="tmp",
             default_timeout=config.cache_timeout,
-            proxy_manager=proxy_manager
+            proxy_manager=proxy_manager,
+            storage=create_storage(self._get_base_url)
         )
+        # Finished results are offloaded to Google Drive in the background ([google_drive] enabled)
+        self.drive_queue = DriveUploadQueue(db)
         self.tmp_dir = Path(__file__).parent.parent.parent / "tmp"
         self.tmp_dir.mkdir(exist_ok=True)
 
-        # Watermark-free waiting cancellation controls (in-memory).
-        # Keyed by Sora task_id. This is intentionally memory-only because it is
-        # a short-lived UI interaction (cancel the current waiting loop).
+        # Watermark-free waiting cancellation controls, keyed by Sora task_id.
+        # The local events drive the waiting loops; with a shared coordination
+        # backend the cancel request may arrive on another worker, so waiting is
+        # announced there and a cancel flag is polled (_watch_watermark_cancel).
         self._watermark_cancel_events: Dict[str, asyncio.Event] = {}
+        self._watermark_cancel_watchers: Dict[str, asyncio.Task] = {}
         self._watermark_cancel_lock = asyncio.Lock()
 
     def _get_base_url(self) -> str:
@@ -129,51 +154,31 @@ class GenerationHandler:
                 await asyncio.sleep(delay)
         raise Exception(f"Download not ready (last status {last_status}, last error {last_error})")
 
-    async def _download_with_retry(self, url: str, media_type: str, attempts: int = 15, delay: int = 10) -> str:
+    async def _download_with_retry(self, url: str, media_type: str, policy: RetryPolicy = DOWNLOAD_RETRY) -> str:
         """
         Wrap file cache download with retry, mainly to tolerate 404 until file is ready.
+
+        Returns:
+            URL of the cached file (see FileCache.cache_media)
         """
-        for i in range(attempts):
+        attempt = 0
+        while True:
             try:
-                return await self.file_cache.download_and_cache(url, media_type)
+                return await self.file_cache.cache_media(url, media_type)
             except Exception as e:
-                msg = str(e)
-                is_not_ready_404 = "404" in msg
-                is_transient_network = self._is_transient_network_error(e)
-
-                if i < attempts - 1 and (is_not_ready_404 or is_transient_network):
-                    # 404: file not ready yet (normal for watermark-free parsing)
-                    # network/TLS: transient, use exponential backoff to avoid hammering
-                    sleep_s = delay
-                    if is_transient_network and not is_not_ready_404:
-                        sleep_s = min(delay * (2 ** i), 30)
-                        sleep_s += random.uniform(0, 0.5)
-                        debug_logger.log_info(
-                            f"Transient network error while downloading {media_type}; retrying in {sleep_s:.1f}s "
-                            f"({i + 1}/{attempts}): {msg}"
-                        )
-                    await asyncio.sleep(sleep_s)
-                    continue
-                raise
-
-    def _is_transient_network_error(self, err: Exception) -> bool:
-        """
-        Best-effort detection of transient network/TLS errors (curl_cffi/libcurl style).
-
-        We only use this for "safe to retry" follow-up steps (watermark-free publish / download),
-        not for primary generation POST calls (to avoid accidental duplicate tasks).
-        """
-        msg = (str(err) or "").lower()
-        # curl_cffi raises errors like:
-        # - "Failed to perform, curl: (56) Recv failure: Connection was reset"
-        # - "curl: (28) Failed to connect ..."
-        # - "curl: (35) TLS connect error ..."
-        keywords = [
-            "curl:", "failed to perform", "recv failure", "send failure",
-            "connection was reset", "connection closed", "connection closed abruptly",
-            "could not connect", "timed out", "timeout", "tls", "openssl",
-        ]
-        return any(k in msg for k in keywords)
+                if not policy.should_retry(e, attempt):
+                    raise
+                # 404: file not ready yet (normal for watermark-free parsing), fixed delay
+                # network/TLS/5xx: transient, exponential backoff to avoid hammering
+                sleep_s = policy.delay_for(e, attempt)
+                RETRIES_TOTAL.inc("download", classify_error(e))
+                if not isinstance(e, NotFoundError):
+                    debug_logger.log_info(
+                        "Transient error while downloading %s; retrying in %.1fs (%s/%s): %s",
+                        media_type, sleep_s, attempt + 1, policy.max_attempts, e
+                    )
+                await asyncio.sleep(sleep_s)
+                attempt += 1
 
     async def cancel_watermark_wait(self, task_id: str) -> bool:
         """
@@ -187,10 +192,14 @@ class GenerationHandler:
             return False
         async with self._watermark_cancel_lock:
             ev = self._watermark_cancel_events.get(task_id)
-            if not ev:
-                return False
-            ev.set()
+            if ev:
+                ev.set()
+                return True
+        # Waiting on another worker: leave a flag for its watcher
+        if coordination.shared and await coordination.exists(f"watermark:waiting:{task_id}"):
+            await coordination.put(f"watermark:cancel:{task_id}", config.video_timeout)
             return True
+        return False
 
     async def _get_watermark_cancel_event(self, task_id: str) -> asyncio.Event:
         """Get (or create) the cancel event for the given Sora task_id."""
@@ -199,12 +208,31 @@ class GenerationHandler:
             if not ev:
                 ev = asyncio.Event()
                 self._watermark_cancel_events[task_id] = ev
+                if coordination.shared:
+                    await coordination.put(f"watermark:waiting:{task_id}", config.video_timeout)
+                    self._watermark_cancel_watchers[task_id] = asyncio.create_task(
+                        self._watch_watermark_cancel(task_id, ev))
             return ev
 
+    async def _watch_watermark_cancel(self, task_id: str, ev: asyncio.Event):
+        """Set the local cancel event once another worker flagged the task"""
+        while not ev.is_set():
+            await asyncio.sleep(config.coordination_poll_interval)
+            try:
+                if await coordination.exists(f"watermark:cancel:{task_id}"):
+                    ev.set()
+            except CoordinationError as e:
+                debug_logger.log_info("Watermark cancel flag check failed: %s", e)
+
     async def _cleanup_watermark_cancel_event(self, task_id: str):
         """Remove the cancel event for the task_id to avoid leaking memory."""
         async with self._watermark_cancel_lock:
             self._watermark_cancel_events.pop(task_id, None)
+            watcher = self._watermark_cancel_watchers.pop(task_id, None)
+        if watcher:
+            watcher.cancel()
+            await coordination.delete(f"watermark:waiting:{task_id}")
+            await coordination.delete(f"watermark:cancel:{task_id}")
 
     def _save_avatar_file(self, avatar_bytes: bytes, username: str) -> str:
         """Persist avatar image to /tmp/avatars and return relative URL path"""
@@ -254,19 +282,72 @@ class GenerationHandler:
 
         return name or "角色"
     
-    def _decode_base64_image(self, image_str: str) -> bytes:
-        """Decode base64 image"""
-        # Remove data URI prefix if present
-        if "," in image_str:
-            image_str = image_str.split(",", 1)[1]
-        return base64.b64decode(image_str)
-
-    def _decode_base64_video(self, video_str: str) -> bytes:
-        """Decode base64 video"""
-        # Remove data URI prefix if present
-        if "," in video_str:
-            video_str = video_str.split(",", 1)[1]
-        return base64.b64decode(video_str)
+    async def _upload_image_input(self, image: str, token_obj, use_cache: bool = True) -> tuple:
+        """Upload an image given as upload:// reference or base64, streaming from the spool file
+
+        Identical content uploaded with the same token before is served from
+        upload_cache instead.
+
+        Returns:
+            (media_id, content sha256, served from cache)
+        """
+        if is_upload_ref(image):
+            spooled = upload_spool.resolve(image)
+            owned = False
+        else:
+            spooled = await asyncio.to_thread(upload_spool.save_base64, image, "image/png")
+            owned = True
+        try:
+            if use_cache:
+                media_id = upload_cache.get(token_obj.id, KIND_IMAGE, spooled.sha256)
+                if media_id:
+                    return media_id, spooled.sha256, True
+            ext = {"image/jpeg": ".jpg", "image/webp": ".webp"}.get(spooled.content_type, ".png")
+            media_id = await self.sora_client.upload_image(
+                None, token_obj.token, filename=f"image{ext}", local_path=str(spooled.path))
+            upload_cache.put(token_obj.id, KIND_IMAGE, spooled.sha256, media_id)
+            return media_id, spooled.sha256, False
+        finally:
+            if owned:
+                upload_spool.delete(spooled.ref)
+
+    async def _upload_character_input(self, video_bytes: Optional[bytes], video_path: Optional[str],
+                                      digest: str, token_obj, use_cache: bool = True) -> tuple:
+        """Upload a character video, reusing a cached unfinalized cameo_id for the same content
+
+        Returns:
+            (cameo_id, served from cache)
+        """
+        if use_cache:
+            cameo_id = upload_cache.get(token_obj.id, KIND_CAMEO, digest)
+            if cameo_id:
+                return cameo_id, True
+        cameo_id = await self.sora_client.upload_character_video(video_bytes, token_obj.token, local_path=video_path)
+        upload_cache.put(token_obj.id, KIND_CAMEO, digest, cameo_id)
+        return cameo_id, False
+
+    async def _process_character_input(self, video_bytes: Optional[bytes], video_path: Optional[str],
+                                       digest: str, token_obj) -> tuple:
+        """Upload (or reuse) a cameo and wait for upstream processing
+
+        A cached cameo_id that upstream rejects is invalidated and the video
+        is uploaded again once.
+
+        Returns:
+            (cameo_id, cameo status)
+        """
+        cameo_id, cached = await self._upload_character_input(video_bytes, video_path, digest, token_obj)
+        debug_logger.log_info("Video uploaded, cameo_id: %s%s", cameo_id, " (cached)" if cached else "")
+        try:
+            return cameo_id, await self._poll_cameo_status(cameo_id, token_obj.token)
+        except (NotFoundError, BadRequestError, TaskFailedError) as e:
+            upload_cache.invalidate(token_obj.id, KIND_CAMEO, digest)
+            if not cached:
+                raise
+            debug_logger.log_info("Cached cameo %s rejected (%s), uploading again", cameo_id, e)
+        cameo_id, _ = await self._upload_character_input(video_bytes, video_path, digest, token_obj, use_cache=False)
+        debug_logger.log_info("Video uploaded, cameo_id: %s", cameo_id)
+        return cameo_id, await self._poll_cameo_status(cameo_id, token_obj.token)
 
     def _process_character_username(self, username_hint: str) -> str:
         """Process character username from API response
@@ -294,7 +375,7 @@ class GenerationHandler:
 
         # Return final username
         final_username = f"{base_username}{random_digits}"
-        debug_logger.log_info(f"Processed username: {username_hint} -> {final_username}")
+        debug_logger.log_info("Processed username: %s -> %s", username_hint, final_username)
 
         return final_username
 
@@ -315,15 +396,15 @@ class GenerationHandler:
             return prompt
 
         # Remove full URL format: https://sora.chatgpt.com/p/s_[a-f0-9]{32}
-        cleaned = re.sub(r'https://sora\.chatgpt\.com/p/s_[a-f0-9]{32}', '', prompt)
+        cleaned = REMIX_URL_RE.sub('', prompt)
 
         # Remove short ID format: s_[a-f0-9]{32}
-        cleaned = re.sub(r's_[a-f0-9]{32}', '', cleaned)
+        cleaned = REMIX_ID_RE.sub('', cleaned)
 
         # Clean up extra whitespace
         cleaned = ' '.join(cleaned.split())
 
-        debug_logger.log_info(f"Cleaned prompt: '{prompt}' -> '{cleaned}'")
+        debug_logger.log_info("Cleaned prompt: '%s' -> '%s'", prompt, cleaned)
 
         return cleaned
 
@@ -340,21 +421,20 @@ class GenerationHandler:
         if not prompt:
             return [], set(), set(), set()
 
-        # 支持字母/数字/下划线/点/短横线/中文昵称
-        usernames = {m.group(1) for m in re.finditer(r"@([A-Za-z0-9_\\.\\-\\u4e00-\\u9fa5]+)", prompt)}
+        usernames = set(prompt_analyzer.analyze(prompt).mentions)
         if not usernames:
             return [], set(), set(), set()
 
         try:
-            cards = await self.db.get_character_cards_by_usernames(list(usernames), token_id=token_id)
+            cards = await character_directory.lookup(self.db, usernames, token_id=token_id)
             matched = {c.get("username") for c in cards if c.get("username")}
             cameo_ids = [c.get("cameo_id") for c in cards if c.get("cameo_id")]
             token_ids = {c.get("token_id") for c in cards if c.get("token_id")}
             missing = usernames - matched
             if cameo_ids:
-                debug_logger.log_info(f"Resolved cameo_ids from prompt: {cameo_ids}")
+                debug_logger.log_info("Resolved cameo_ids from prompt: %s", cameo_ids)
             if missing:
-                debug_logger.log_info(f"Usernames not found in cards: {list(missing)}")
+                debug_logger.log_info("Usernames not found in cards: %s", list(missing))
             return cameo_ids, matched, missing, token_ids
         except Exception as e:
             debug_logger.log_error(f"Failed to resolve cameo ids: {e}")
@@ -364,37 +444,35 @@ class GenerationHandler:
         """移除 @username 提及，避免上游因缺少 cameo 报错"""
         if not prompt:
             return prompt
-        cleaned = re.sub(r"@([A-Za-z0-9_\\.\\-\\u4e00-\\u9fa5]+)", "", prompt)
+        cleaned = MENTION_RE.sub("", prompt)
         cleaned = " ".join(cleaned.split())
         return cleaned
 
-    async def _download_file(self, url: str) -> bytes:
-        """Download file from URL
+    async def _resolve_video_input(self, video_data: str):
+        """Spooled file for an upload:// reference or a remote video URL
 
-        Args:
-            url: File URL
-
-        Returns:
-            File bytes
+        URLs are streamed to disk (size-limited, content type checked) and
+        reused while the spool keeps them; URLs of our own media cache are
+        taken from the cache directory (or the object store behind it).
         """
-        from curl_cffi.requests import AsyncSession
-
-        proxy_url = await self.load_balancer.proxy_manager.get_proxy_url()
-
-        kwargs = {
-            "timeout": 30,
-            "impersonate": "chrome"
-        }
-
-        if proxy_url:
-            kwargs["proxy"] = proxy_url
+        if is_upload_ref(video_data):
+            return upload_spool.resolve(video_data)
+        # A video served from our own media storage is read locally
+        cache_key = self.file_cache.storage.key_for_url(video_data)
+        if cache_key:
+            try:
+                cached = await self.file_cache.local_copy(cache_key)
+            except Exception as e:
+                debug_logger.log_info("Reading %s from storage failed, downloading it: %s", cache_key, str(e))
+                cached = None
+            if cached:
+                spooled = upload_spool.lookup_url(video_data)
+                if spooled is None:
+                    spooled = await asyncio.to_thread(upload_spool.save_local, cached, None, video_data)
+                return spooled
+        proxy_url = await self.proxy_manager.get_proxy_url() if self.proxy_manager else None
+        return await upload_spool.save_url(video_data, expected_type="video/", proxy_url=proxy_url)
 
-        async with AsyncSession() as session:
-            response = await session.get(url, **kwargs)
-            if response.status_code != 200:
-                raise Exception(f"Failed to download file: {response.status_code}")
-            return response.content
-    
     async def check_token_availability(self, is_image: bool, is_video: bool) -> bool:
         """Check if tokens are available for the given model type
 
@@ -405,7 +483,8 @@ class GenerationHandler:
         Returns:
             True if available tokens exist, False otherwise
         """
-        token_obj = await self.load_balancer.select_token(for_image_generation=is_image, for_video_generation=is_video)
+        with tracer.span("token_select"):
+            token_obj = await self.load_balancer.select_token(for_image_generation=is_image, for_video_generation=is_video, reserve=False)
         return token_obj is not None
 
     async def handle_generation(self, model: str, prompt: str,
@@ -423,6 +502,21 @@ class GenerationHandler:
             remix_target_id: Sora share link video ID for remix
             stream: Whether to stream response
         """
+        with tracer.start_trace("generation", model=model, stream=stream,
+                                has_image=image is not None, has_video=video is not None,
+                                remix=bool(remix_target_id)):
+            stream_token = stream_encoder.begin_stream()
+            probe_scope = self.token_manager.circuit_breaker.begin_request()
+            try:
+                async for chunk in self._handle_generation(model, prompt, image, video, remix_target_id, stream):
+                    yield chunk
+            finally:
+                self.token_manager.circuit_breaker.end_request(probe_scope)
+                stream_encoder.end_stream(stream_token)
+
+    async def _handle_generation(self, model: str, prompt: str, image: Optional[str], video: Optional[str],
+                                 remix_target_id: Optional[str], stream: bool) -> AsyncGenerator[str, None]:
+        """Generation flow behind handle_generation"""
         start_time = time.time()
 
         # Validate model
@@ -454,29 +548,38 @@ class GenerationHandler:
         if is_video:
             # Remix flow: remix_target_id provided
             if remix_target_id:
-                async for chunk in self._handle_remix(remix_target_id, prompt, model_config):
+                async for chunk in self._handle_remix(remix_target_id, prompt, model_config, model=model):
                     yield chunk
                 return
 
             # Character creation flow: video provided
             if video:
-                # Decode video if it's base64
-                video_data = self._decode_base64_video(video) if video.startswith("data:") or not video.startswith("http") else video
-
-                # If no prompt, just create character and return
-                if not prompt:
-                    async for chunk in self._handle_character_creation_only(video_data, model_config):
-                        yield chunk
-                    return
+                # Base64 is decoded incrementally into the upload spool; uploads and URLs pass through
+                spooled = None
+                if is_upload_ref(video) or video.startswith("http"):
+                    video_data = video
                 else:
-                    # If prompt provided, create character and generate video
-                    async for chunk in self._handle_character_and_video_generation(video_data, prompt, model_config):
-                        yield chunk
-                    return
+                    spooled = await asyncio.to_thread(upload_spool.save_base64, video, "video/mp4")
+                    video_data = spooled.ref
+
+                try:
+                    # If no prompt, just create character and return
+                    if not prompt:
+                        async for chunk in self._handle_character_creation_only(video_data, model_config):
+                            yield chunk
+                    else:
+                        # If prompt provided, create character and generate video
+                        async for chunk in self._handle_character_and_video_generation(video_data, prompt, model_config, model=model):
+                            yield chunk
+                finally:
+                    if spooled:
+                        upload_spool.delete(spooled.ref)
+                return
 
         # Streaming mode: proceed with actual generation
         # Select token (with lock for image generation, Sora2 quota check for video generation)
-        token_obj = await self.load_balancer.select_token(for_image_generation=is_image, for_video_generation=is_video)
+        with tracer.span("token_select"):
+            token_obj = await self.load_balancer.select_token(for_image_generation=is_image, for_video_generation=is_video)
         if not token_obj:
             if is_image:
                 raise Exception("No available tokens for image generation. All tokens are either disabled, cooling down, locked, or expired.")
@@ -499,10 +602,9 @@ class GenerationHandler:
         cameo_ids = []
         role_context = ""
         if is_video:
-            usernames = {m.group(1) for m in re.finditer(r"@([A-Za-z0-9_\\.\\-\\u4e00-\\u9fa5]+)", prompt)}
-            cards = []
-            if usernames:
-                cards = await self.db.get_character_cards_by_usernames(list(usernames), token_id=None)
+            mentions = prompt_analyzer.analyze(prompt).mentions
+            if mentions:
+                cards = await character_directory.lookup(self.db, mentions)
                 cameo_ids = [c.get("cameo_id") for c in cards if c.get("cameo_id")]
 
             final_prompt = prompt  # 保留 @ 提及，提升 cameo 识别概率
@@ -517,10 +619,14 @@ class GenerationHandler:
 
         task_id = None
         is_first_chunk = True  # Track if this is the first chunk
+        QUEUED_REQUESTS.inc()
+        queued = True
 
         try:
             # Upload image if provided
             media_id = None
+            media_digest = None
+            media_cached = False
             if image:
                 if stream:
                     yield self._format_stream_chunk(
@@ -529,12 +635,12 @@ class GenerationHandler:
                     )
                     is_first_chunk = False
 
-                image_data = self._decode_base64_image(image)
-                media_id = await self.sora_client.upload_image(image_data, token_obj.token)
+                media_id, media_digest, media_cached = await self._upload_image_input(image, token_obj)
 
                 if stream:
                     yield self._format_stream_chunk(
-                        reasoning_content="Image uploaded successfully. Proceeding to generation...\n"
+                        reasoning_content=("Image already uploaded, reusing it. " if media_cached else
+                                           "Image uploaded successfully. ") + "Proceeding to generation...\n"
                     )
 
             # Generate
@@ -550,58 +656,27 @@ class GenerationHandler:
                         reasoning_content="**Generation Process Begins**\n\nInitializing generation request...\n"
                     )
             
-            if is_video:
-                # Get n_frames from model configuration
-                n_frames = model_config.get("n_frames", 300)  # Default to 300 frames (10s)
-
-                # Check if prompt is in storyboard format
-                if self.sora_client.is_storyboard_prompt(final_prompt):
-                    # Storyboard mode（尝试 cameo）
-                    if stream:
-                        yield self._format_stream_chunk(
-                            reasoning_content="Detected storyboard format. Converting to storyboard API format...\n"
-                        )
-
-                    formatted_prompt = self.sora_client.format_storyboard_prompt(final_prompt)
-                    debug_logger.log_info(f"Storyboard mode detected. Formatted prompt: {formatted_prompt}")
-
-                    task_id = await self.sora_client.generate_storyboard(
-                        formatted_prompt, token_obj.token,
-                        orientation=model_config["orientation"],
-                        media_id=media_id,
-                        n_frames=n_frames,
-                        cameo_ids=cameo_ids or None
-                    )
-                else:
-                    # Normal video generation，优先尝试 cameo_ids，失败则回退
-                    try:
-                        task_id = await self.sora_client.generate_video(
-                            final_prompt, token_obj.token,
-                            orientation=model_config["orientation"],
-                            media_id=media_id,
-                            n_frames=n_frames,
-                            cameo_ids=cameo_ids or None
-                        )
-                    except Exception as gen_err:
-                        if cameo_ids and "cameo" in str(gen_err).lower():
-                            debug_logger.log_info(f"Retry without cameo_ids due to error: {gen_err}")
-                            task_id = await self.sora_client.generate_video(
-                                final_prompt, token_obj.token,
-                                orientation=model_config["orientation"],
-                                media_id=media_id,
-                                n_frames=n_frames,
-                                cameo_ids=None
-                            )
-                        else:
-                            raise gen_err
-            else:
-                task_id = await self.sora_client.generate_image(
-                    final_prompt, token_obj.token,
-                    width=model_config["width"],
-                    height=model_config["height"],
-                    media_id=media_id
+            if is_video and prompt_analyzer.analyze(final_prompt).is_storyboard and stream:
+                yield self._format_stream_chunk(
+                    reasoning_content="Detected storyboard format. Converting to storyboard API format...\n"
                 )
-            
+            try:
+                task_id = await self._submit_generation(final_prompt, token_obj.token, model_config,
+                                                        is_video, media_id, cameo_ids)
+            except UnknownMediaError:
+                # Cached media_id expired upstream: upload again once
+                upload_cache.invalidate(token_obj.id, KIND_IMAGE, media_digest)
+                if not media_cached:
+                    raise
+                debug_logger.log_info("Cached media_id %s rejected, uploading image again", media_id)
+                media_id, media_digest, media_cached = await self._upload_image_input(
+                    image, token_obj, use_cache=False)
+                task_id = await self._submit_generation(final_prompt, token_obj.token, model_config,
+                                                        is_video, media_id, cameo_ids)
+
+            QUEUED_REQUESTS.dec()
+            queued = False
+
             # Save task to database
             task = Task(
                 task_id=task_id,
@@ -612,12 +687,13 @@ class GenerationHandler:
                 progress=0.0
             )
             await self.db.create_task(task)
+            task_event_hub.bind_task_id(task_id)
             
             # Record usage
             await self.token_manager.record_usage(token_obj.id, is_video=is_video)
             
             # Poll for results with timeout
-            async for chunk in self._poll_task_result(task_id, token_obj.token, is_video, stream, prompt, token_obj.id):
+            async for chunk in self._poll_task_result(task_id, token_obj.token, is_video, stream, prompt, token_obj.id, model=model):
                 yield chunk
             
             # Record success
@@ -659,7 +735,7 @@ class GenerationHandler:
 
             # Record error
             if token_obj:
-                await self.token_manager.record_error(token_obj.id)
+                await self.token_manager.record_error(token_obj.id, e)
 
             # Log failed request
             duration = time.time() - start_time
@@ -672,27 +748,107 @@ class GenerationHandler:
                 duration
             )
             raise e
+        finally:
+            if queued:
+                QUEUED_REQUESTS.dec()
     
+    async def _submit_generation(self, prompt: str, token: str, model_config: Dict, is_video: bool,
+                                 media_id: Optional[str], cameo_ids: list) -> str:
+        """Submit the generation request upstream
+
+        Returns:
+            Upstream task ID
+        """
+        if is_video:
+            # Get n_frames from model configuration
+            n_frames = model_config.get("n_frames", 300)  # Default to 300 frames (10s)
+
+            # Check if prompt is in storyboard format
+            parsed = prompt_analyzer.analyze(prompt)
+            if parsed.is_storyboard:
+                # Storyboard mode（尝试 cameo）
+                formatted_prompt = parsed.storyboard_prompt
+                debug_logger.log_info("Storyboard mode detected. Formatted prompt: %s", formatted_prompt)
+
+                return await self.sora_client.generate_storyboard(
+                    formatted_prompt, token,
+                    orientation=model_config["orientation"],
+                    media_id=media_id,
+                    n_frames=n_frames,
+                    cameo_ids=cameo_ids or None
+                )
+            else:
+                # Normal video generation，优先尝试 cameo_ids，失败则回退
+                try:
+                    return await self.sora_client.generate_video(
+                        prompt, token,
+                        orientation=model_config["orientation"],
+                        media_id=media_id,
+                        n_frames=n_frames,
+                        cameo_ids=cameo_ids or None
+                    )
+                except InvalidCameoError as gen_err:
+                    if cameo_ids:
+                        debug_logger.log_info("Retry without cameo_ids due to error: %s", gen_err)
+                        return await self.sora_client.generate_video(
+                            prompt, token,
+                            orientation=model_config["orientation"],
+                            media_id=media_id,
+                            n_frames=n_frames,
+                            cameo_ids=None
+                        )
+                    else:
+                        raise gen_err
+        else:
+            return await self.sora_client.generate_image(
+                prompt, token,
+                width=model_config["width"],
+                height=model_config["height"],
+                media_id=media_id
+            )
+
     async def _poll_task_result(self, task_id: str, token: str, is_video: bool,
-                                stream: bool, prompt: str, token_id: int = None) -> AsyncGenerator[str, None]:
+                                stream: bool, prompt: str, token_id: int = None,
+                                model: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Poll for task result with timeout, recording in-flight and completion metrics"""
+        model_label = model or ("video" if is_video else "image")
+        started = time.perf_counter()
+        outcome = "failed"
+        INFLIGHT_TASKS.inc()
+        try:
+            with tracer.span("poll", task_id=task_id, model=model_label):
+                async for chunk in self._poll_task_status(task_id, token, is_video, stream, prompt, token_id,
+                                                          model_label, started):
+                    yield chunk
+                outcome = "completed"
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "cancelled"
+            raise
+        finally:
+            INFLIGHT_TASKS.dec()
+            TIME_TO_COMPLETION.observe(time.perf_counter() - started, model_label, outcome)
+
+    async def _poll_task_status(self, task_id: str, token: str, is_video: bool, stream: bool, prompt: str,
+                                token_id: Optional[int], model_label: str, started: float) -> AsyncGenerator[str, None]:
         """Poll for task result with timeout"""
         # Get timeout from config
         timeout = config.video_timeout if is_video else config.image_timeout
         poll_interval = config.poll_interval
         max_attempts = int(timeout / poll_interval)  # Calculate max attempts based on timeout
         last_progress = 0
+        first_progress_seen = False
         start_time = time.time()
         last_heartbeat_time = start_time  # Track last heartbeat for image generation
         heartbeat_interval = 10  # Send heartbeat every 10 seconds for image generation
         last_status_output_time = start_time  # Track last status output time for video generation
         video_status_interval = 5  # Output status every 5 seconds for video generation (was 30)
 
-        debug_logger.log_info(f"Starting task polling: task_id={task_id}, is_video={is_video}, timeout={timeout}s, max_attempts={max_attempts}")
+        debug_logger.log_info("Starting task polling: task_id=%s, is_video=%s, timeout=%ss, max_attempts=%s", task_id, is_video, timeout, max_attempts)
 
         # Check and log watermark-free mode status at the beginning
         if is_video:
             watermark_free_config = await self.db.get_watermark_free_config()
-            debug_logger.log_info(f"Watermark-free mode: {'ENABLED' if watermark_free_config.watermark_free_enabled else 'DISABLED'}")
+            debug_logger.log_info("Watermark-free mode: %s", 'ENABLED' if watermark_free_config.watermark_free_enabled else 'DISABLED')
 
         for attempt in range(max_attempts):
             # Check if timeout exceeded
@@ -706,16 +862,16 @@ class GenerationHandler:
                 # Release lock if this is an image generation task
                 if not is_video and token_id:
                     await self.load_balancer.token_lock.release_lock(token_id)
-                    debug_logger.log_info(f"Released lock for token {token_id} due to timeout")
+                    debug_logger.log_info("Released lock for token %s due to timeout", token_id)
                     # Release concurrency slot for image generation
                     if self.concurrency_manager:
                         await self.concurrency_manager.release_image(token_id)
-                        debug_logger.log_info(f"Released concurrency slot for token {token_id} due to timeout")
+                        debug_logger.log_info("Released concurrency slot for token %s due to timeout", token_id)
 
                 # Release concurrency slot for video generation
                 if is_video and token_id and self.concurrency_manager:
                     await self.concurrency_manager.release_video(token_id)
-                    debug_logger.log_info(f"Released concurrency slot for token {token_id} due to timeout")
+                    debug_logger.log_info("Released concurrency slot for token %s due to timeout", token_id)
 
                 await self.db.update_task(task_id, "failed", 0, error_message=f"Generation timeout after {elapsed_time:.1f} seconds")
                 raise Exception(f"Upstream API timeout: Generation exceeded {timeout} seconds limit")
@@ -741,6 +897,11 @@ class GenerationHandler:
                             else:
                                 progress_pct = int(progress_pct * 100)
 
+                            if not first_progress_seen and progress_pct > 0:
+                                first_progress_seen = True
+                                TIME_TO_FIRST_PROGRESS.observe(time.perf_counter() - started, model_label)
+                                tracer.current_span().add_event("first_progress")
+
                             # Update last_progress for tracking
                             last_progress = progress_pct
                             status = task.get("status", "processing")
@@ -749,7 +910,7 @@ class GenerationHandler:
                             current_time = time.time()
                             if stream and (current_time - last_status_output_time >= video_status_interval):
                                 last_status_output_time = current_time
-                                debug_logger.log_info(f"Task {task_id} progress: {progress_pct}% (status: {status})")
+                                debug_logger.log_info("Task %s progress: %s%% (status: %s)", task_id, progress_pct, status)
                                 yield self._format_stream_chunk(
                                     reasoning_content=f"**Video Generation Progress**: {progress_pct}% ({status})\n"
                                 )
@@ -757,7 +918,8 @@ class GenerationHandler:
 
                     # If task not found in pending tasks, it's completed - fetch from drafts
                     if not task_found:
-                        debug_logger.log_info(f"Task {task_id} not found in pending tasks, fetching from drafts...")
+                        tracer.current_span().add_event("left_pending_queue")
+                        debug_logger.log_info("Task %s not found in pending tasks, fetching from drafts...", task_id)
                         result = await self.sora_client.get_video_drafts(token)
                         items = result.get("items", [])
 
@@ -768,7 +930,7 @@ class GenerationHandler:
                                 kind = item.get("kind")
                                 reason_str = item.get("reason_str") or item.get("markdown_reason_str")
                                 url = item.get("url") or item.get("downloadable_url")
-                                debug_logger.log_info(f"Found task {task_id} in drafts with kind: {kind}, reason_str: {reason_str}, has_url: {bool(url)}")
+                                debug_logger.log_info("Found task %s in drafts with kind: %s, reason_str: %s, has_url: %s", task_id, kind, reason_str, bool(url))
 
                                 # 违规判断：kind 标识 / 有 reason / 没有可用 URL
                                 is_violation = (
@@ -792,7 +954,7 @@ class GenerationHandler:
                                     # 释放并发
                                     if token_id and self.concurrency_manager:
                                         await self.concurrency_manager.release_video(token_id)
-                                        debug_logger.log_info(f"Released concurrency slot for token {token_id} due to content violation")
+                                        debug_logger.log_info("Released concurrency slot for token %s due to content violation", token_id)
 
                                     # 流式返回提示
                                     if stream:
@@ -803,7 +965,7 @@ class GenerationHandler:
                                             content=f"❌ 生成失败: {reason_str}",
                                             finish_reason="STOP"
                                         )
-                                        yield "data: [DONE]\n\n"
+                                        yield DONE_CHUNK
 
                                     # 违规时立即停止轮询
                                     return
@@ -815,9 +977,9 @@ class GenerationHandler:
 
                                 if watermark_free_enabled:
                                     # Watermark-free mode: keep waiting (no hard fail) until success or user cancels.
-                                    debug_logger.log_info(f"Entering watermark-free mode for task {task_id}")
+                                    debug_logger.log_info("Entering watermark-free mode for task %s", task_id)
                                     generation_id = item.get("id")
-                                    debug_logger.log_info(f"Generation ID: {generation_id}")
+                                    debug_logger.log_info("Generation ID: %s", generation_id)
                                     if not generation_id:
                                         raise Exception("Generation ID not found in video draft")
 
@@ -828,6 +990,9 @@ class GenerationHandler:
 
                                     cancel_event = await self._get_watermark_cancel_event(task_id)
                                     wm_attempt = 0  # Unified counter for UI (publish/parse/ready)
+                                    wm_started = time.perf_counter()
+                                    wm_outcome = "ok"
+                                    tracer.current_span().add_event("watermark_free_start")
 
                                     if stream:
                                         yield self._format_stream_chunk(
@@ -882,7 +1047,8 @@ class GenerationHandler:
                                                     prompt=prompt,
                                                     token=token
                                                 )
-                                                debug_logger.log_info(f"Received post_id: {post_id}")
+                                                debug_logger.log_info("Received post_id: %s", post_id)
+                                                tracer.current_span().add_event("watermark_free_published", attempt=wm_attempt)
                                                 if not post_id:
                                                     raise Exception("Failed to get post ID from publish API")
 
@@ -913,7 +1079,7 @@ class GenerationHandler:
                                                     watermark_free_url = f"https://oscdn2.dyysy.com/MP4/{post_id}.mp4"
                                                     debug_logger.log_info("Using third-party parse server")
 
-                                                debug_logger.log_info(f"Watermark-free URL: {watermark_free_url}")
+                                                debug_logger.log_info("Watermark-free URL: %s", watermark_free_url)
 
                                                 if stream:
                                                     yield self._format_stream_chunk(
@@ -975,6 +1141,8 @@ class GenerationHandler:
                                                     # Jump back to top and finish as cancelled
                                                     continue
 
+                                                tracer.current_span().add_event("watermark_free_ready", checks=ready_checks)
+
                                                 if stream:
                                                     yield self._format_stream_chunk(
                                                         reasoning_content=(
@@ -994,24 +1162,25 @@ class GenerationHandler:
                                                 # 4) Cache watermark-free video (if cache enabled)
                                                 if config.cache_enabled:
                                                     try:
-                                                        cached_filename = await self._download_with_retry(watermark_free_url, "video")
-                                                        local_url = f"{self._get_base_url()}/tmp/{cached_filename}"
+                                                        local_url = await self._download_with_retry(watermark_free_url, "video")
                                                         if stream:
                                                             yield self._format_stream_chunk(
                                                                 reasoning_content="Watermark-free video cached successfully. Preparing final response...\n"
                                                             )
 
-                                                        # Delete the published post after caching (best-effort)
-                                                        try:
-                                                            debug_logger.log_info(f"Deleting published post: {post_id}")
-                                                            await self.sora_client.delete_post(post_id, token)
-                                                            debug_logger.log_info(f"Published post deleted successfully: {post_id}")
-                                                        except Exception as delete_error:
-                                                            debug_logger.log_error(
-                                                                error_message=f"Failed to delete published post {post_id}: {str(delete_error)}",
-                                                                status_code=500,
-                                                                response_text=str(delete_error)
-                                                            )
+                                                        # Delete the published post after caching (best-effort);
+                                                        # passthrough storage still serves the post's own URL
+                                                        if self.file_cache.storage.stores_files:
+                                                            try:
+                                                                debug_logger.log_info("Deleting published post: %s", post_id)
+                                                                await self.sora_client.delete_post(post_id, token)
+                                                                debug_logger.log_info("Published post deleted successfully: %s", post_id)
+                                                            except Exception as delete_error:
+                                                                debug_logger.log_error(
+                                                                    error_message=f"Failed to delete published post {post_id}: {str(delete_error)}",
+                                                                    status_code=500,
+                                                                    response_text=str(delete_error)
+                                                                )
                                                     except Exception as cache_error:
                                                         # Fallback to watermark-free URL if caching fails
                                                         local_url = watermark_free_url
@@ -1033,10 +1202,28 @@ class GenerationHandler:
                                                 break  # success
 
                                             except Exception as publish_error:
-                                                # Any error in watermark-free follow-up becomes a "wait and retry".
+                                                if not WATERMARK_RETRY.should_retry(publish_error, wm_attempt):
+                                                    # Auth / policy / bad request: retrying cannot help, fall back to the original URL
+                                                    debug_logger.log_error(
+                                                        error_message=f"Watermark-free step failed permanently: {str(publish_error)}",
+                                                        status_code=getattr(publish_error, "status_code", None) or 500,
+                                                        response_text=str(publish_error)
+                                                    )
+                                                    local_url = original_url
+                                                    wm_outcome = "failed"
+                                                    if stream:
+                                                        yield self._format_stream_chunk(
+                                                            reasoning_content=(
+                                                                f"Watermark-free step failed: {str(publish_error)}\n"
+                                                                "Returning original (may be watermarked) video URL.\n"
+                                                            )
+                                                        )
+                                                    break
+
+                                                # Any other error in watermark-free follow-up becomes a "wait and retry".
                                                 wm_attempt += 1
-                                                backoff_s = min(2 ** min(wm_attempt - 1, 6), 30)
-                                                backoff_s += random.uniform(0, 0.5)
+                                                RETRIES_TOTAL.inc("watermark_free", classify_error(publish_error))
+                                                backoff_s = WATERMARK_RETRY.delay_for(publish_error, wm_attempt, retry_count=min(wm_attempt - 1, 6))
                                                 debug_logger.log_error(
                                                     error_message=f"Watermark-free step error (attempt={wm_attempt}): {str(publish_error)}",
                                                     status_code=500,
@@ -1063,8 +1250,11 @@ class GenerationHandler:
                                         # If user cancelled, local_url is already set to original_url.
                                         if cancel_event.is_set():
                                             local_url = original_url
+                                            wm_outcome = "cancelled"
 
                                     finally:
+                                        WATERMARK_WAIT_SECONDS.observe(time.perf_counter() - wm_started, wm_outcome)
+                                        tracer.current_span().add_event("watermark_free_done", outcome=wm_outcome)
                                         await self._cleanup_watermark_cancel_event(task_id)
                                 else:
                                     # Normal mode: use downloadable_url instead of url
@@ -1078,8 +1268,7 @@ class GenerationHandler:
                                                 )
 
                                             try:
-                                                cached_filename = await self.file_cache.download_and_cache(url, "video")
-                                                local_url = f"{self._get_base_url()}/tmp/{cached_filename}"
+                                                local_url = await self.file_cache.cache_media(url, "video")
                                                 if stream:
                                                     yield self._format_stream_chunk(
                                                         reasoning_content="Video file cached successfully. Preparing final response...\n"
@@ -1104,6 +1293,7 @@ class GenerationHandler:
                                     task_id, "completed", 100.0,
                                     result_urls=json.dumps([local_url])
                                 )
+                                await self.drive_queue.enqueue(task_id, [local_url])
 
                                 if stream:
                                     # Final response with content + 结构化 output
@@ -1118,7 +1308,7 @@ class GenerationHandler:
                                             }]
                                         }
                                     )
-                                    yield "data: [DONE]\n\n"
+                                    yield DONE_CHUNK
                                 return
                 else:
                     result = await self.sora_client.get_image_tasks(token)
@@ -1131,6 +1321,10 @@ class GenerationHandler:
                             task_found = True
                             status = task_resp.get("status")
                             progress = task_resp.get("progress_pct", 0) * 100
+                            if not first_progress_seen and progress > 0:
+                                first_progress_seen = True
+                                TIME_TO_FIRST_PROGRESS.observe(time.perf_counter() - started, model_label)
+                                tracer.current_span().add_event("first_progress")
 
                             if status == "succeeded":
                                 # Extract URLs
@@ -1144,15 +1338,14 @@ class GenerationHandler:
                                             reasoning_content=f"**Image Generation Completed**\n\nImage generation successful. Now caching {len(urls)} image(s)...\n"
                                         )
 
-                                    base_url = self._get_base_url()
                                     local_urls = []
+                                    all_cached = True
 
                                     # Check if cache is enabled
                                     if config.cache_enabled:
                                         for idx, url in enumerate(urls):
                                             try:
-                                                cached_filename = await self.file_cache.download_and_cache(url, "image")
-                                                local_url = f"{base_url}/tmp/{cached_filename}"
+                                                local_url = await self.file_cache.cache_media(url, "image")
                                                 local_urls.append(local_url)
                                                 if stream and len(urls) > 1:
                                                     yield self._format_stream_chunk(
@@ -1161,12 +1354,13 @@ class GenerationHandler:
                                             except Exception as cache_error:
                                                 # Fallback to original URL if caching fails
                                                 local_urls.append(url)
+                                                all_cached = False
                                                 if stream:
                                                     yield self._format_stream_chunk(
                                                         reasoning_content=f"Warning: Failed to cache image {idx + 1} - {str(cache_error)}\nUsing original URL instead...\n"
                                                     )
 
-                                        if stream and all(u.startswith(base_url) for u in local_urls):
+                                        if stream and all_cached:
                                             yield self._format_stream_chunk(
                                                 reasoning_content="All images cached successfully. Preparing final response...\n"
                                             )
@@ -1182,6 +1376,7 @@ class GenerationHandler:
                                         task_id, "completed", 100.0,
                                         result_urls=json.dumps(local_urls)
                                     )
+                                    await self.drive_queue.enqueue(task_id, local_urls)
 
                                     if stream:
                                         # Final response with content (Markdown format) + 结构化 output
@@ -1196,13 +1391,13 @@ class GenerationHandler:
                                                 ]
                                             }
                                         )
-                                        yield "data: [DONE]\n\n"
+                                        yield DONE_CHUNK
                                     return
 
                             elif status == "failed":
                                 error_msg = task_resp.get("error_message", "Generation failed")
                                 await self.db.update_task(task_id, "failed", progress, error_message=error_msg)
-                                raise Exception(error_msg)
+                                raise TaskFailedError(error_msg, body=task_resp)
 
                             elif status == "processing":
                                 # Update progress only if changed significantly
@@ -1245,23 +1440,24 @@ class GenerationHandler:
                         )
             
             except Exception as e:
-                if attempt >= max_attempts - 1:
+                if attempt >= max_attempts - 1 or not TASK_POLL_RETRY.should_retry(e, attempt):
                     raise e
+                RETRIES_TOTAL.inc("task_poll", classify_error(e))
                 continue
 
         # Timeout - release lock if image generation
         if not is_video and token_id:
             await self.load_balancer.token_lock.release_lock(token_id)
-            debug_logger.log_info(f"Released lock for token {token_id} due to max attempts reached")
+            debug_logger.log_info("Released lock for token %s due to max attempts reached", token_id)
             # Release concurrency slot for image generation
             if self.concurrency_manager:
                 await self.concurrency_manager.release_image(token_id)
-                debug_logger.log_info(f"Released concurrency slot for token {token_id} due to max attempts reached")
+                debug_logger.log_info("Released concurrency slot for token %s due to max attempts reached", token_id)
 
         # Release concurrency slot for video generation
         if is_video and token_id and self.concurrency_manager:
             await self.concurrency_manager.release_video(token_id)
-            debug_logger.log_info(f"Released concurrency slot for token {token_id} due to max attempts reached")
+            debug_logger.log_info("Released concurrency slot for token %s due to max attempts reached", token_id)
 
         await self.db.update_task(task_id, "failed", 0, error_message=f"Generation timeout after {timeout} seconds")
         raise Exception(f"Upstream API timeout: Generation exceeded {timeout} seconds limit")
@@ -1278,54 +1474,7 @@ class GenerationHandler:
             is_first: Whether this is the first chunk (includes role)
             extra: Optional extra payload merged进delta（例如 output / task_id）
         """
-        chunk_id = f"chatcmpl-{int(datetime.now().timestamp() * 1000)}"
-
-        delta = {}
-
-        # Add role for first chunk
-        if is_first:
-            delta["role"] = "assistant"
-
-        # Add content fields
-        if content is not None:
-            delta["content"] = content
-        else:
-            delta["content"] = None
-
-        if reasoning_content is not None:
-            delta["reasoning_content"] = reasoning_content
-        else:
-            delta["reasoning_content"] = None
-
-        delta["tool_calls"] = None
-
-        # Merge附加字段
-        if extra:
-            for k, v in extra.items():
-                delta[k] = v
-
-        response = {
-            "id": chunk_id,
-            "object": "chat.completion.chunk",
-            "created": int(datetime.now().timestamp()),
-            "model": "sora",
-            "choices": [{
-                "index": 0,
-                "delta": delta,
-                "finish_reason": finish_reason,
-                "native_finish_reason": finish_reason
-            }],
-            "usage": {
-                "prompt_tokens": 0
-            }
-        }
-
-        # Add completion tokens for final chunk
-        if finish_reason:
-            response["usage"]["completion_tokens"] = 1
-            response["usage"]["total_tokens"] = 1
-
-        return f'data: {json.dumps(response)}\n\n'
+        return stream_encoder.encode(content, reasoning_content, finish_reason, is_first, extra)
     
     def _format_non_stream_response(self, content: str, media_type: str = None, is_availability_check: bool = False) -> str:
         """Format non-streaming response
@@ -1378,6 +1527,100 @@ class GenerationHandler:
 
     # ==================== Character Creation and Remix Handlers ====================
 
+    def _build_character_graph(self, cameo_id: str, cameo_status: Dict[str, Any], username: str,
+                               display_name: str, token_obj, video_digest: str) -> StageGraph:
+        """Stages shared by the character flows after cameo processing
+
+        avatar_download -> avatar_upload -> finalize -> card
+                        -> avatar_save  --------------^
+
+        Returns:
+            StageGraph with stages avatar_download, avatar_upload, avatar_save, finalize, card
+        """
+        profile_asset_url = cameo_status.get("profile_asset_url")
+        if not profile_asset_url:
+            raise Exception("Profile asset URL not found in cameo status")
+        # instruction_set_hint is a string, but instruction_set in cameo_status might be an array
+        instruction_set = cameo_status.get("instruction_set_hint") or cameo_status.get("instruction_set")
+        desc_text = instruction_set
+        if isinstance(desc_text, list):
+            desc_text = "\n".join(str(x) for x in desc_text)
+
+        async def download_avatar(results):
+            avatar_data = await self.sora_client.download_character_image(profile_asset_url)
+            debug_logger.log_info("Avatar downloaded, size: %s bytes", len(avatar_data))
+            return avatar_data
+
+        async def upload_avatar(results):
+            asset_pointer = await self.sora_client.upload_character_image(results["avatar_download"], token_obj.token)
+            debug_logger.log_info("Avatar uploaded, asset_pointer: %s", asset_pointer)
+            return asset_pointer
+
+        async def save_avatar(results):
+            return await asyncio.to_thread(self._save_avatar_file, results["avatar_download"], username)
+
+        async def finalize(results):
+            character_id = await self.sora_client.finalize_character(
+                cameo_id=cameo_id,
+                username=username,
+                display_name=display_name,
+                profile_asset_pointer=results["avatar_upload"],
+                instruction_set=instruction_set,
+                token=token_obj.token
+            )
+            debug_logger.log_info("Character finalized, character_id: %s", character_id)
+            # A finalized cameo cannot be finalized again
+            upload_cache.invalidate(token_obj.id, KIND_CAMEO, video_digest)
+            return character_id
+
+        async def save_card(results):
+            # Persist character card locally，携带 instruction_set 作为描述，方便前端直接注入角色设定
+            cn_alias = self._generate_cn_alias(display_name, desc_text)
+            card_id = await self.db.create_character_card(CharacterCard(
+                token_id=token_obj.id,
+                username=username,
+                display_name=cn_alias,  # 保存中文别名到库
+                description=desc_text,
+                character_id=results["finalize"],
+                cameo_id=cameo_id,
+                avatar_path=results["avatar_save"],
+                source_video=None
+            ))
+            await character_directory.added(self.db, card_id)
+            return {
+                "id": card_id,
+                "token_id": token_obj.id,
+                "username": username,
+                "display_name": display_name,
+                "description": desc_text,
+                "character_id": results["finalize"],
+                "cameo_id": cameo_id,
+                "avatar_path": results["avatar_save"],
+                "created_at": datetime.now().isoformat()
+            }
+
+        graph = StageGraph("character")
+        graph.add("avatar_download", download_avatar)
+        graph.add("avatar_upload", upload_avatar, after=("avatar_download",))
+        graph.add("avatar_save", save_avatar, after=("avatar_download",))
+        graph.add("finalize", finalize, after=("avatar_upload",))
+        graph.add("card", save_card, after=("finalize", "avatar_save"))
+        return graph
+
+    def _character_stage_chunk(self, stage: str, result) -> Optional[str]:
+        """Progress chunk for a completed shared character stage"""
+        if stage == "avatar_download":
+            return self._format_stream_chunk(reasoning_content="Uploading character avatar...\n")
+        if stage == "avatar_upload":
+            return self._format_stream_chunk(reasoning_content="Finalizing character creation...\n")
+        if stage == "card":
+            # Push character card info到前端，便于即时展示
+            return self._format_stream_chunk(
+                content=json.dumps({"event": "character_card", "card": result}),
+                reasoning_content="角色卡已保存并推送到前端。\n"
+            )
+        return None
+
     async def _handle_character_creation_only(self, video_data, model_config: Dict) -> AsyncGenerator[str, None]:
         """Handle character creation only (no video generation)
 
@@ -1391,7 +1634,8 @@ class GenerationHandler:
         7. Set character as public
         8. Return success message
         """
-        token_obj = await self.load_balancer.select_token(for_video_generation=True)
+        with tracer.span("token_select"):
+            token_obj = await self.load_balancer.select_token(for_video_generation=True)
         if not token_obj:
             raise Exception("No available tokens for character creation")
 
@@ -1411,29 +1655,29 @@ class GenerationHandler:
                 is_first=True
             )
 
-            # Handle video URL or bytes
+            # Handle spooled upload, video URL or bytes
+            video_bytes = None
+            video_path = None
             if isinstance(video_data, str):
-                # It's a URL, download it
-                yield self._format_stream_chunk(
-                    reasoning_content="Downloading video file...\n"
-                )
-                video_bytes = await self._download_file(video_data)
+                if not is_upload_ref(video_data):
+                    # It's a URL: streamed into the upload spool
+                    yield self._format_stream_chunk(
+                        reasoning_content="Downloading video file...\n"
+                    )
+                # Upload ref (/v1/uploads or decoded base64) or ingested URL: stream from the spool file
+                spooled = await self._resolve_video_input(video_data)
+                video_path, video_digest = str(spooled.path), spooled.sha256
             else:
                 video_bytes = video_data
+                video_digest = hashlib.sha256(video_bytes).hexdigest()
 
-            # Step 1: Upload video
+            # Step 1 + 2: Upload video and poll for character processing
             yield self._format_stream_chunk(
-                reasoning_content="Uploading video file...\n"
+                reasoning_content="Uploading video file and extracting character...\n"
             )
-            cameo_id = await self.sora_client.upload_character_video(video_bytes, token_obj.token)
-            debug_logger.log_info(f"Video uploaded, cameo_id: {cameo_id}")
-
-            # Step 2: Poll for character processing
-            yield self._format_stream_chunk(
-                reasoning_content="Processing video to extract character...\n"
-            )
-            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token)
-            debug_logger.log_info(f"Cameo status: {cameo_status}")
+            cameo_id, cameo_status = await self._process_character_input(
+                video_bytes, video_path, video_digest, token_obj)
+            debug_logger.log_info("Cameo status: %s", cameo_status)
 
             # Extract character info immediately after polling completes
             username_hint = cameo_status.get("username_hint", "character")
@@ -1447,92 +1691,32 @@ class GenerationHandler:
                 reasoning_content=f"✨ 角色已识别: {display_name} (@{username})\n"
             )
 
-            # Step 3: Download and cache avatar
+            # Steps 3-7 run as a dependency graph: the local avatar copy and the
+            # card insert overlap with the avatar upload / set public calls
+            graph = self._build_character_graph(cameo_id, cameo_status, username, display_name,
+                                                token_obj, video_digest)
+            graph.add("set_public", lambda r: self.sora_client.set_character_public(cameo_id, token_obj.token),
+                      after=("finalize",))
             yield self._format_stream_chunk(
                 reasoning_content="Downloading character avatar...\n"
             )
-            profile_asset_url = cameo_status.get("profile_asset_url")
-            if not profile_asset_url:
-                raise Exception("Profile asset URL not found in cameo status")
-
-            avatar_data = await self.sora_client.download_character_image(profile_asset_url)
-            debug_logger.log_info(f"Avatar downloaded, size: {len(avatar_data)} bytes")
-
-            # Step 4: Upload avatar
-            yield self._format_stream_chunk(
-                reasoning_content="Uploading character avatar...\n"
-            )
-            asset_pointer = await self.sora_client.upload_character_image(avatar_data, token_obj.token)
-            debug_logger.log_info(f"Avatar uploaded, asset_pointer: {asset_pointer}")
-
-            # Step 5: Finalize character
-            yield self._format_stream_chunk(
-                reasoning_content="Finalizing character creation...\n"
-            )
-            # instruction_set_hint is a string, but instruction_set in cameo_status might be an array
-            instruction_set = cameo_status.get("instruction_set_hint") or cameo_status.get("instruction_set")
-
-            character_id = await self.sora_client.finalize_character(
-                cameo_id=cameo_id,
-                username=username,
-                display_name=display_name,
-                profile_asset_pointer=asset_pointer,
-                instruction_set=instruction_set,
-                token=token_obj.token
-            )
-            debug_logger.log_info(f"Character finalized, character_id: {character_id}")
-
-            # Step 6: Set character as public
-            yield self._format_stream_chunk(
-                reasoning_content="Setting character as public...\n"
-            )
-            await self.sora_client.set_character_public(cameo_id, token_obj.token)
-            debug_logger.log_info(f"Character set as public")
-
-            # Persist character card locally for可视化展示/复用
-            avatar_path = self._save_avatar_file(avatar_data, username)
-            # Persist character card locally，携带 instruction_set 作为描述，方便前端直接注入角色设定
-            desc_text = instruction_set
-            if isinstance(desc_text, list):
-                desc_text = "\n".join(str(x) for x in desc_text)
-            cn_alias = self._generate_cn_alias(display_name, desc_text)
-            card_id = await self.db.create_character_card(CharacterCard(
-                token_id=token_obj.id,
-                username=username,
-                display_name=cn_alias,  # 保存中文别名到库
-                description=desc_text,
-                character_id=character_id,
-                cameo_id=cameo_id,
-                avatar_path=avatar_path,
-                source_video=None
-            ))
-
-            # Push character card info到前端，便于即时展示
-            card_payload = {
-                "event": "character_card",
-                "card": {
-                    "id": card_id,
-                    "token_id": token_obj.id,
-                    "username": username,
-                    "display_name": display_name,
-                    "description": desc_text,
-                    "character_id": character_id,
-                    "cameo_id": cameo_id,
-                    "avatar_path": avatar_path,
-                    "created_at": datetime.now().isoformat()
-                }
-            }
-            yield self._format_stream_chunk(
-                content=json.dumps(card_payload),
-                reasoning_content="角色卡已保存并推送到前端。\n"
-            )
+            async for stage, result in graph.run():
+                chunk = self._character_stage_chunk(stage, result)
+                if chunk:
+                    yield chunk
+                if stage == "finalize":
+                    yield self._format_stream_chunk(
+                        reasoning_content="Setting character as public...\n"
+                    )
+                elif stage == "set_public":
+                    debug_logger.log_info("Character set as public")
 
             # Step 7: Return success message
             yield self._format_stream_chunk(
                 content=f"角色创建成功，角色名@{username}",
                 finish_reason="STOP"
             )
-            yield "data: [DONE]\n\n"
+            yield DONE_CHUNK
 
             # Record success
             await self.token_manager.record_success(token_obj.id, is_video=True)
@@ -1545,20 +1729,21 @@ class GenerationHandler:
                 response_text=str(e)
             )
             if token_obj:
-                await self.token_manager.record_error(token_obj.id)
+                await self.token_manager.record_error(token_obj.id, e)
             # 将失败原因返回前端，结束流
             yield self._format_stream_chunk(
                 content=f"❌ 角色卡创建失败：{str(e)}",
                 reasoning_content=error_message,
                 finish_reason="STOP"
             )
-            yield "data: [DONE]\n\n"
+            yield DONE_CHUNK
             return
         finally:
             if self.concurrency_manager and concurrency_acquired:
                 await self.concurrency_manager.release_video(token_obj.id)
 
-    async def _handle_character_and_video_generation(self, video_data, prompt: str, model_config: Dict) -> AsyncGenerator[str, None]:
+    async def _handle_character_and_video_generation(self, video_data, prompt: str, model_config: Dict,
+                                                     model: Optional[str] = None) -> AsyncGenerator[str, None]:
         """Handle character creation and video generation
 
         Flow:
@@ -1572,11 +1757,11 @@ class GenerationHandler:
         8. Delete character
         9. Return video result
         """
-        token_obj = await self.load_balancer.select_token(for_video_generation=True)
+        with tracer.span("token_select"):
+            token_obj = await self.load_balancer.select_token(for_video_generation=True)
         if not token_obj:
             raise Exception("No available tokens for video generation")
 
-        character_id = None
         concurrency_acquired = False
         try:
             # Acquire video concurrency slot if enabled
@@ -1593,29 +1778,29 @@ class GenerationHandler:
                 is_first=True
             )
 
-            # Handle video URL or bytes
+            # Handle spooled upload, video URL or bytes
+            video_bytes = None
+            video_path = None
             if isinstance(video_data, str):
-                # It's a URL, download it
-                yield self._format_stream_chunk(
-                    reasoning_content="Downloading video file...\n"
-                )
-                video_bytes = await self._download_file(video_data)
+                if not is_upload_ref(video_data):
+                    # It's a URL: streamed into the upload spool
+                    yield self._format_stream_chunk(
+                        reasoning_content="Downloading video file...\n"
+                    )
+                # Upload ref (/v1/uploads or decoded base64) or ingested URL: stream from the spool file
+                spooled = await self._resolve_video_input(video_data)
+                video_path, video_digest = str(spooled.path), spooled.sha256
             else:
                 video_bytes = video_data
+                video_digest = hashlib.sha256(video_bytes).hexdigest()
 
-            # Step 1: Upload video
-            yield self._format_stream_chunk(
-                reasoning_content="Uploading video file...\n"
-            )
-            cameo_id = await self.sora_client.upload_character_video(video_bytes, token_obj.token)
-            debug_logger.log_info(f"Video uploaded, cameo_id: {cameo_id}")
-
-            # Step 2: Poll for character processing
+            # Step 1 + 2: Upload video and poll for character processing
             yield self._format_stream_chunk(
-                reasoning_content="Processing video to extract character...\n"
+                reasoning_content="Uploading video file and extracting character...\n"
             )
-            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token)
-            debug_logger.log_info(f"Cameo status: {cameo_status}")
+            cameo_id, cameo_status = await self._process_character_input(
+                video_bytes, video_path, video_digest, token_obj)
+            debug_logger.log_info("Cameo status: %s", cameo_status)
 
             # Extract character info immediately after polling completes
             username_hint = cameo_status.get("username_hint", "character")
@@ -1629,96 +1814,41 @@ class GenerationHandler:
                 reasoning_content=f"✨ 角色已识别: {display_name} (@{username})\n"
             )
 
-            # Step 3: Download and cache avatar
-            yield self._format_stream_chunk(
-                reasoning_content="Downloading character avatar...\n"
-            )
-            profile_asset_url = cameo_status.get("profile_asset_url")
-            if not profile_asset_url:
-                raise Exception("Profile asset URL not found in cameo status")
-
-            avatar_data = await self.sora_client.download_character_image(profile_asset_url)
-            debug_logger.log_info(f"Avatar downloaded, size: {len(avatar_data)} bytes")
-
-            # Step 4: Upload avatar
-            yield self._format_stream_chunk(
-                reasoning_content="Uploading character avatar...\n"
-            )
-            asset_pointer = await self.sora_client.upload_character_image(avatar_data, token_obj.token)
-            debug_logger.log_info(f"Avatar uploaded, asset_pointer: {asset_pointer}")
-
-            # Step 5: Finalize character
-            yield self._format_stream_chunk(
-                reasoning_content="Finalizing character creation...\n"
-            )
-            # instruction_set_hint is a string, but instruction_set in cameo_status might be an array
-            instruction_set = cameo_status.get("instruction_set_hint") or cameo_status.get("instruction_set")
-
-            character_id = await self.sora_client.finalize_character(
-                cameo_id=cameo_id,
-                username=username,
-                display_name=display_name,
-                profile_asset_pointer=asset_pointer,
-                instruction_set=instruction_set,
-                token=token_obj.token
-            )
-            debug_logger.log_info(f"Character finalized, character_id: {character_id}")
-
-            # Persist character card for仓库展示
-            avatar_path = self._save_avatar_file(avatar_data, username)
-            desc_text = instruction_set
-            if isinstance(desc_text, list):
-                desc_text = "\n".join(str(x) for x in desc_text)
-            cn_alias = self._generate_cn_alias(display_name, desc_text)
-            card_id = await self.db.create_character_card(CharacterCard(
-                token_id=token_obj.id,
-                username=username,
-                display_name=cn_alias,  # 中文别名入库
-                description=desc_text,
-                character_id=character_id,
-                cameo_id=cameo_id,
-                avatar_path=avatar_path,
-                source_video=None
-            ))
-            # 即时推送角色卡，前端无需等待刷新
-            card_payload = {
-                "event": "character_card",
-                "card": {
-                    "id": card_id,
-                    "token_id": token_obj.id,
-                    "username": username,
-                    "display_name": display_name,
-                    "description": desc_text,
-                    "character_id": character_id,
-                    "cameo_id": cameo_id,
-                    "avatar_path": avatar_path,
-                    "created_at": datetime.now().isoformat()
-                }
-            }
-            yield self._format_stream_chunk(
-                content=json.dumps(card_payload),
-                reasoning_content="角色卡已保存并推送到前端。\n"
-            )
-
-            # Step 6: Generate video with character
-            yield self._format_stream_chunk(
-                reasoning_content="**Video Generation Process Begins**\n\nGenerating video with character...\n"
-            )
-
             # Prepend @username to prompt
             full_prompt = f"@{username} {prompt}"
-            debug_logger.log_info(f"Full prompt: {full_prompt}")
+            debug_logger.log_info("Full prompt: %s", full_prompt)
 
             # Get n_frames from model configuration
             n_frames = model_config.get("n_frames", 300)  # Default to 300 frames (10s)
 
-            task_id = await self.sora_client.generate_video(
-                full_prompt, token_obj.token,
-                orientation=model_config["orientation"],
-                n_frames=n_frames,
-                cameo_ids=[cameo_id] if cameo_id else None
+            async def submit_video(results):
+                return await self.sora_client.generate_video(
+                    full_prompt, token_obj.token,
+                    orientation=model_config["orientation"],
+                    n_frames=n_frames,
+                    cameo_ids=[cameo_id] if cameo_id else None
+                )
+
+            # Steps 3-6 run as a dependency graph: the video is submitted as soon as
+            # the character is finalized, while the avatar copy and card insert finish
+            graph = self._build_character_graph(cameo_id, cameo_status, username, display_name,
+                                                token_obj, video_digest)
+            graph.add("generate", submit_video, after=("finalize",))
+            yield self._format_stream_chunk(
+                reasoning_content="Downloading character avatar...\n"
             )
-            debug_logger.log_info(f"Video generation started, task_id: {task_id}")
+            task_id = None
+            async for stage, result in graph.run():
+                chunk = self._character_stage_chunk(stage, result)
+                if chunk:
+                    yield chunk
+                if stage == "finalize":
+                    yield self._format_stream_chunk(
+                        reasoning_content="**Video Generation Process Begins**\n\nGenerating video with character...\n"
+                    )
+                elif stage == "generate":
+                    task_id = result
+                    debug_logger.log_info("Video generation started, task_id: %s", task_id)
 
             # Save task to database
             task = Task(
@@ -1730,12 +1860,13 @@ class GenerationHandler:
                 progress=0.0
             )
             await self.db.create_task(task)
+            task_event_hub.bind_task_id(task_id)
 
             # Record usage
             await self.token_manager.record_usage(token_obj.id, is_video=True)
 
             # Poll for results
-            async for chunk in self._poll_task_result(task_id, token_obj.token, True, True, full_prompt, token_obj.id):
+            async for chunk in self._poll_task_result(task_id, token_obj.token, True, True, full_prompt, token_obj.id, model=model):
                 yield chunk
 
             # Record success
@@ -1744,7 +1875,7 @@ class GenerationHandler:
         except Exception as e:
             # Record error
             if token_obj:
-                await self.token_manager.record_error(token_obj.id)
+                await self.token_manager.record_error(token_obj.id, e)
             debug_logger.log_error(
                 error_message=f"Character and video generation failed: {str(e)}",
                 status_code=500,
@@ -1757,7 +1888,8 @@ class GenerationHandler:
             # 暂不自动删除角色，便于在前端仓库复用/查看，后续可提供手动清理接口
             pass
 
-    async def _handle_remix(self, remix_target_id: str, prompt: str, model_config: Dict) -> AsyncGenerator[str, None]:
+    async def _handle_remix(self, remix_target_id: str, prompt: str, model_config: Dict,
+                            model: Optional[str] = None) -> AsyncGenerator[str, None]:
         """Handle remix video generation
 
         Flow:
@@ -1767,7 +1899,8 @@ class GenerationHandler:
         4. Poll for results
         5. Return video result
         """
-        token_obj = await self.load_balancer.select_token(for_video_generation=True)
+        with tracer.span("token_select"):
+            token_obj = await self.load_balancer.select_token(for_video_generation=True)
         if not token_obj:
             raise Exception("No available tokens for remix generation")
 
@@ -1805,7 +1938,7 @@ class GenerationHandler:
                 orientation=model_config["orientation"],
                 n_frames=n_frames
             )
-            debug_logger.log_info(f"Remix generation started, task_id: {task_id}")
+            debug_logger.log_info("Remix generation started, task_id: %s", task_id)
 
             # Save task to database
             task = Task(
@@ -1817,12 +1950,13 @@ class GenerationHandler:
                 progress=0.0
             )
             await self.db.create_task(task)
+            task_event_hub.bind_task_id(task_id)
 
             # Record usage
             await self.token_manager.record_usage(token_obj.id, is_video=True)
 
             # Poll for results
-            async for chunk in self._poll_task_result(task_id, token_obj.token, True, True, clean_prompt, token_obj.id):
+            async for chunk in self._poll_task_result(task_id, token_obj.token, True, True, clean_prompt, token_obj.id, model=model):
                 yield chunk
 
             # Record success
@@ -1831,7 +1965,7 @@ class GenerationHandler:
         except Exception as e:
             # Record error
             if token_obj:
-                await self.token_manager.record_error(token_obj.id)
+                await self.token_manager.record_error(token_obj.id, e)
             debug_logger.log_error(
                 error_message=f"Remix generation failed: {str(e)}",
                 status_code=500,
@@ -1857,7 +1991,7 @@ class GenerationHandler:
         start_time = time.time()
         max_attempts = int(timeout / poll_interval)
         consecutive_errors = 0
-        max_consecutive_errors = 3  # Allow up to 3 consecutive errors before failing
+        max_consecutive_errors = CAMEO_POLL_RETRY.max_attempts  # Consecutive errors allowed before failing
 
         for attempt in range(max_attempts):
             elapsed_time = time.time() - start_time
@@ -1874,22 +2008,22 @@ class GenerationHandler:
                 # Reset error counter on successful request
                 consecutive_errors = 0
 
-                debug_logger.log_info(f"Cameo status: {current_status} (message: {status_message}) (attempt {attempt + 1}/{max_attempts})")
+                debug_logger.log_info("Cameo status: %s (message: %s) (attempt %s/%s)", current_status, status_message, attempt + 1, max_attempts)
 
                 # Immediate failure conditions
                 if current_status == "failed" or (status_message and status_message.lower().startswith("upload may violate")):
-                    raise Exception(f"Cameo processing failed: {status_message or current_status}")
+                    raise TaskFailedError(f"Cameo processing failed: {status_message or current_status}", body=status)
 
                 # Check if processing is complete
                 # Primary condition: status_message contains complete / finished / success (case-insensitive)
                 msg_lower = status_message.lower()
                 if any(k in msg_lower for k in ["complete", "finished", "success", "ready"]):
-                    debug_logger.log_info(f"Cameo processing completed (status: {current_status}, message: {status_message})")
+                    debug_logger.log_info("Cameo processing completed (status: %s, message: %s)", current_status, status_message)
                     return status
 
                 # Fallback condition: status in a set of completed markers
                 if current_status in {"finalized", "complete", "completed", "ready", "finished", "success", "succeeded", "done"}:
-                    debug_logger.log_info(f"Cameo processing completed (status: {current_status}, message: {status_message})")
+                    debug_logger.log_info("Cameo processing completed (status: %s, message: %s)", current_status, status_message)
                     return status
 
                 # Extra safeguard: if profile asset already给出则视为完成
@@ -1898,6 +2032,8 @@ class GenerationHandler:
                     return status
 
             except Exception as e:
+                if isinstance(e, TaskFailedError):
+                    raise
                 consecutive_errors += 1
                 error_msg = str(e)
 
@@ -1908,19 +2044,19 @@ class GenerationHandler:
                     response_text=error_msg
                 )
 
-                # Check if it's a TLS/connection error
-                is_tls_error = "TLS" in error_msg or "curl" in error_msg or "OPENSSL" in error_msg
+                # Fail if too many consecutive errors (or the error can never recover)
+                if not CAMEO_POLL_RETRY.should_retry(e, consecutive_errors - 1):
+                    if consecutive_errors < max_consecutive_errors:
+                        raise
+                    raise Exception(f"Too many consecutive errors ({consecutive_errors}) while polling cameo status: {error_msg}")
 
-                if is_tls_error:
-                    # For TLS errors, use exponential backoff
-                    backoff_time = min(poll_interval * (2 ** (consecutive_errors - 1)), 30)
-                    debug_logger.log_info(f"TLS error detected, using exponential backoff: {backoff_time}s")
+                RETRIES_TOTAL.inc("cameo_poll", classify_error(e))
+                if isinstance(e, TransientNetworkError):
+                    # For TLS/connection errors, use exponential backoff
+                    backoff_time = CAMEO_POLL_RETRY.delay_for(e, consecutive_errors - 1)
+                    debug_logger.log_info("Network error detected, using exponential backoff: %.1fs", backoff_time)
                     await asyncio.sleep(backoff_time)
 
-                # Fail if too many consecutive errors
-                if consecutive_errors >= max_consecutive_errors:
-                    raise Exception(f"Too many consecutive errors ({consecutive_errors}) while polling cameo status: {error_msg}")
-
                 # Continue polling on error
                 continue
 
@@ -1,19 +1,63 @@
 """Google Drive upload service using Gradio Client"""
 import asyncio
+import threading
 from typing import Optional
-from gradio_client import Client
 from ..core.config import config
 from ..core.logger import debug_logger
 
 
+class DriveUploadError(Exception):
+    """Upload attempt failed
+
+    Attributes:
+        retryable: False when retrying cannot help (e.g. no password configured)
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
 class GoogleDriveUploader:
-    """Handle file uploads to Google Drive via Gradio Space"""
+    """Handle file uploads to Google Drive via Gradio Space
 
-    def __init__(self):
-        self.space_url = config.google_drive_space_url
-        self.password = config.google_drive_password
+    One gradio Client is kept per uploader (the Space handshake / config
+    fetch happens once, not per upload); it is rebuilt after a transport
+    error.
+    """
 
-    async def upload_file_via_api(self, file_url: str) -> Optional[str]:
+    def __init__(self, space_url: Optional[str] = None, password: Optional[str] = None):
+        self.space_url = space_url or config.google_drive_space_url
+        self.password = password if password is not None else config.google_drive_password
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                # gradio_client is heavy; only import it when Drive upload is actually used
+                from gradio_client import Client
+
+                self._client = Client(self.space_url, verbose=False, analytics_enabled=False)
+            return self._client
+
+    def _reset_client(self):
+        with self._client_lock:
+            self._client = None
+
+    def _sync_upload(self, file_url: str) -> dict:
+        """Synchronous upload function (runs in a worker thread)"""
+        client = self._get_client()
+
+        # Call "upload" API with file URL and password
+        job = client.submit(
+            file_url,      # 参数1: URL
+            self.password,  # 参数2: 密码
+            api_name="/upload"
+        )
+        return job.result(timeout=config.google_drive_upload_timeout)
+
+    async def upload(self, file_url: str) -> str:
         """
         Upload file to Google Drive via Gradio API
 
@@ -21,66 +65,53 @@ class GoogleDriveUploader:
             file_url: URL of the file to upload
 
         Returns:
-            Google Drive direct download link, or None if failed
+            Google Drive direct download link
+
+        Raises:
+            DriveUploadError: Upload failed (see .retryable)
         """
         if not self.password:
-            debug_logger.log_error(
-                error_message="Google Drive password not configured. Please set GOOGLE_DRIVE_PASSWORD environment variable",
-                status_code=500,
-                response_text="Missing Google Drive password"
+            raise DriveUploadError(
+                "Google Drive password not configured. Please set GOOGLE_DRIVE_PASSWORD environment variable",
+                retryable=False
             )
-            return None
 
+        debug_logger.log_info("🚀 Uploading to Google Drive via %s: %s", self.space_url, file_url)
         try:
-            debug_logger.log_info(f"🚀 Uploading to Google Drive via {self.space_url}: {file_url}")
-
-            # Run in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                self._sync_upload,
-                file_url
-            )
+            result = await asyncio.to_thread(self._sync_upload, file_url)
+        except Exception as e:
+            from gradio_client.exceptions import AppError
 
-            if result and isinstance(result, dict):
-                status = result.get('status')
-                if status == 'success':
-                    download_link = result.get('download_link')
-                    debug_logger.log_info(f"✅ Google Drive upload success: {download_link}")
-                    return download_link
-                else:
-                    error_msg = result.get('message', 'Unknown error')
-                    debug_logger.log_error(
-                        error_message=f"Google Drive upload failed: {error_msg}",
-                        status_code=500,
-                        response_text=str(result)
-                    )
-                    return None
-            else:
-                debug_logger.log_error(
-                    error_message=f"Unexpected result format from Google Drive API: {result}",
-                    status_code=500,
-                    response_text=str(result)
-                )
-                return None
+            if not isinstance(e, AppError):
+                # Connection / protocol trouble: start from a fresh handshake next time
+                self._reset_client()
+            raise DriveUploadError(f"Failed to upload to Google Drive: {str(e)}")
 
-        except Exception as e:
+        if not isinstance(result, dict):
+            raise DriveUploadError(f"Unexpected result format from Google Drive API: {result}")
+        if result.get('status') != 'success' or not result.get('download_link'):
+            raise DriveUploadError(f"Google Drive upload failed: {result.get('message', 'Unknown error')}")
+
+        download_link = result['download_link']
+        debug_logger.log_info("✅ Google Drive upload success: %s", download_link)
+        return download_link
+
+    async def upload_file_via_api(self, file_url: str) -> Optional[str]:
+        """
+        Upload file to Google Drive via Gradio API
+
+        Args:
+            file_url: URL of the file to upload
+
+        Returns:
+            Google Drive direct download link, or None if failed
+        """
+        try:
+            return await self.upload(file_url)
+        except DriveUploadError as e:
             debug_logger.log_error(
-                error_message=f"Failed to upload to Google Drive: {str(e)}",
+                error_message=str(e),
                 status_code=500,
                 response_text=str(e)
             )
             return None
-
-    def _sync_upload(self, file_url: str) -> dict:
-        """Synchronous upload function (runs in executor)"""
-        client = Client(self.space_url)
-
-        # Call "upload" API with file URL and password
-        result = client.predict(
-            file_url,      # 参数1: URL
-            self.password,  # 参数2: 密码
-            api_name="/upload"
-        )
-
-        return result
@@ -1,12 +1,15 @@
 """Load balancing module"""
 import random
+import time
 from typing import Optional
 from ..core.models import Token
 from ..core.config import config
 from .token_manager import TokenManager
 from .token_lock import TokenLock
 from .concurrency_manager import ConcurrencyManager
+from .cluster import cluster
 from ..core.logger import debug_logger
+from ..core.metrics import TOKEN_SELECTION_SECONDS
 
 class LoadBalancer:
     """Token load balancer with random selection and image generation lock"""
@@ -17,19 +20,34 @@ class LoadBalancer:
         # Use image timeout from config as lock timeout
         self.token_lock = TokenLock(lock_timeout=config.image_timeout)
 
+    @property
+    def circuit_breaker(self):
+        return self.token_manager.circuit_breaker
+
+    def _pick(self, tokens: list, reserve: bool = True) -> Token:
+        """Random selection; registers the dispatch so half-open tokens only get a limited number of probes"""
+        token = random.choice(tokens)
+        if reserve:
+            self.circuit_breaker.on_dispatch(token.id)
+        return token
+
     async def select_token_by_ids(self, allowed_ids: list, for_image_generation: bool = False, for_video_generation: bool = False) -> Optional[Token]:
         """从指定 ID 列表中选择可用 Token，逻辑与 select_token 相同但多了一层 ID 过滤"""
         if not allowed_ids:
             return None
 
         # 先拿到可用列表
-        token = await self.select_token(for_image_generation=for_image_generation, for_video_generation=for_video_generation)
+        token = await self.select_token(for_image_generation=for_image_generation, for_video_generation=for_video_generation, reserve=False)
         if token and token.id in allowed_ids:
+            self.circuit_breaker.on_dispatch(token.id)
             return token
 
         # 手动过滤 active tokens
         active_tokens = await self.token_manager.get_active_tokens()
-        active_tokens = [t for t in active_tokens if t.id in allowed_ids]
+        active_tokens = [t for t in active_tokens if t.id in allowed_ids and self.circuit_breaker.allow_request(t.id)]
+        # Cluster mode: only tokens this node owns on the hash ring
+        if cluster.enabled:
+            active_tokens = [t for t in active_tokens if cluster.owns_token(t.id)]
         if not active_tokens:
             return None
 
@@ -49,24 +67,34 @@ class LoadBalancer:
 
         if not active_tokens:
             return None
-        return random.choice(active_tokens)
-
-    async def select_token(self, for_image_generation: bool = False, for_video_generation: bool = False) -> Optional[Token]:
+        return self._pick(active_tokens)
+
+    async def select_token(self, for_image_generation: bool = False, for_video_generation: bool = False, reserve: bool = True) -> Optional[Token]:
+        """Select a token (see _select_token), recording selection latency"""
+        start = time.perf_counter()
+        try:
+            return await self._select_token(for_image_generation, for_video_generation, reserve)
+        finally:
+            kind = "image" if for_image_generation else "video" if for_video_generation else "any"
+            TOKEN_SELECTION_SECONDS.observe(time.perf_counter() - start, kind)
+
+    async def _select_token(self, for_image_generation: bool = False, for_video_generation: bool = False, reserve: bool = True) -> Optional[Token]:
         """
         Select a token using random load balancing
 
         Args:
             for_image_generation: If True, only select tokens that are not locked for image generation and have image_enabled=True
             for_video_generation: If True, filter out tokens with Sora2 quota exhausted (sora2_cooldown_until not expired), tokens that don't support Sora2, and tokens with video_enabled=False
+            reserve: If False, only check availability without taking a half-open probe slot
 
         Returns:
             Selected token or None if no available tokens
         """
         # Try to auto-refresh tokens expiring within 24 hours if enabled
         if config.at_auto_refresh_enabled:
-            debug_logger.log_info(f"[LOAD_BALANCER] 🔄 自动刷新功能已启用，开始检查Token过期时间...")
+            debug_logger.log_info("[LOAD_BALANCER] 🔄 自动刷新功能已启用，开始检查Token过期时间...")
             all_tokens = await self.token_manager.get_all_tokens()
-            debug_logger.log_info(f"[LOAD_BALANCER] 📊 总Token数: {len(all_tokens)}")
+            debug_logger.log_info("[LOAD_BALANCER] 📊 总Token数: %s", len(all_tokens))
 
             refresh_count = 0
             for token in all_tokens:
@@ -76,17 +104,24 @@ class LoadBalancer:
                     hours_until_expiry = time_until_expiry.total_seconds() / 3600
                     # Refresh if expiry is within 24 hours
                     if hours_until_expiry <= 24:
-                        debug_logger.log_info(f"[LOAD_BALANCER] 🔔 Token {token.id} ({token.email}) 需要刷新，剩余时间: {hours_until_expiry:.2f} 小时")
+                        debug_logger.log_info("[LOAD_BALANCER] 🔔 Token %s (%s) 需要刷新，剩余时间: %.2f 小时", token.id, token.email, hours_until_expiry)
                         refresh_count += 1
                         await self.token_manager.auto_refresh_expiring_token(token.id)
 
             if refresh_count == 0:
-                debug_logger.log_info(f"[LOAD_BALANCER] ✅ 所有Token都无需刷新")
+                debug_logger.log_info("[LOAD_BALANCER] ✅ 所有Token都无需刷新")
             else:
-                debug_logger.log_info(f"[LOAD_BALANCER] ✅ 刷新检查完成，共检查 {refresh_count} 个Token")
+                debug_logger.log_info("[LOAD_BALANCER] ✅ 刷新检查完成，共检查 %s 个Token", refresh_count)
 
         active_tokens = await self.token_manager.get_active_tokens()
 
+        # Skip tokens whose circuit breaker is open (or half-open with probes in flight)
+        active_tokens = [t for t in active_tokens if self.circuit_breaker.allow_request(t.id)]
+
+        # Cluster mode: only tokens this node owns on the hash ring
+        if cluster.enabled:
+            active_tokens = [t for t in active_tokens if cluster.owns_token(t.id)]
+
         if not active_tokens:
             return None
 
@@ -139,7 +174,7 @@ class LoadBalancer:
                 return None
 
             # Random selection from available tokens
-            return random.choice(available_tokens)
+            return self._pick(available_tokens, reserve)
         else:
             # For video generation, check concurrency limit
             if for_video_generation and self.concurrency_manager:
@@ -149,7 +184,7 @@ class LoadBalancer:
                         available_tokens.append(token)
                 if not available_tokens:
                     return None
-                return random.choice(available_tokens)
+                return self._pick(available_tokens, reserve)
             else:
                 # For video generation without concurrency manager, no additional filtering
-                return random.choice(active_tokens)
+                return self._pick(active_tokens, reserve)
@@ -0,0 +1,396 @@
+"""Storage backends for generated media
+
+FileCache downloads every generated image/video once; the storage backend
+decides where that copy lives and which URL clients get:
+
+    local        tmp/ on this node, served by the /tmp mount (default)
+    s3           S3-compatible object store (AWS S3, MinIO, R2, ...); the
+                 local download is removed once uploaded
+    tiered       local hot tier in front of the object store: the file stays
+                 in tmp/ for this node's own reads (remix input, ZIP bundles,
+                 Drive offload) until the cache timeout, clients get the
+                 object store URL
+    passthrough  nothing is stored, clients get the upstream URL
+
+Selected with [storage] backend. Objects are keyed by the cache filename
+(md5 of the source URL), so every node maps a generation to the same
+object: a node that did not download a file itself finds it in the object
+tier (HEAD) instead of fetching it from upstream again.
+
+Uploads stream from disk in [storage.s3] part_size_mb parts (multipart
+upload above one part, a single PUT below); requests are signed with AWS
+Signature V4. Clients get URLs under public_base_url (public bucket / CDN)
+or presigned GET URLs valid for presign_expires seconds.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+from curl_cffi.requests import AsyncSession
+from fastapi.responses import RedirectResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+from ..core.config import config
+from ..core.logger import debug_logger
+
+READ_CHUNK = 1024 * 1024
+_MAX_PRESIGN_EXPIRES = 7 * 24 * 3600  # SigV4 limit
+_UNSIGNED = "UNSIGNED-PAYLOAD"
+
+CONTENT_TYPES = {".mp4": "video/mp4", ".png": "image/png", ".jpg": "image/jpeg", ".webp": "image/webp"}
+
+
+class StorageError(Exception):
+    """Object store request failed"""
+
+
+def content_type_for(key: str) -> str:
+    return CONTENT_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+def local_key_for_url(url: str, base_url: str) -> Optional[str]:
+    """Cache key of a `<base_url>/tmp/<key>` (or `/tmp/<key>`) URL"""
+    path = url.split("?", 1)[0]
+    for prefix in (f"{base_url}/tmp/", "/tmp/"):
+        if path.startswith(prefix):
+            key = path[len(prefix):]
+            return key if key and "/" not in key and key not in (".", "..") else None
+    return None
+
+
+class MediaStorage:
+    """Backend interface (the defaults are the local behaviour)"""
+
+    name = "local"
+    # False: nothing is downloaded, clients get the upstream URL
+    stores_files = True
+    # True: objects live outside this node (other nodes can find them)
+    remote = False
+    # False: the tmp/ copy is removed once it has been published
+    keep_local = True
+
+    def __init__(self, base_url: Callable[[], str]):
+        self._base_url = base_url
+
+    async def publish(self, key: str, path: Path):
+        """Make the downloaded file `path` available as `key`"""
+
+    async def exists(self, key: str) -> bool:
+        """Whether `key` is already in the (remote) store"""
+        return False
+
+    def url_for(self, key: str) -> str:
+        """URL handed to clients"""
+        return f"{self._base_url()}/tmp/{key}"
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        """Cache key of a URL previously returned by url_for (None for foreign URLs)"""
+        return local_key_for_url(url, self._base_url())
+
+    async def fetch(self, key: str, dest: Path) -> bool:
+        """Copy `key` from the remote store to `dest`; False when it is not there"""
+        return False
+
+
+class LocalStorage(MediaStorage):
+    """tmp/ on this node, served by the /tmp mount"""
+
+
+class PassThroughStorage(MediaStorage):
+    """Store nothing; clients are given the upstream URLs"""
+
+    name = "passthrough"
+    stores_files = False
+
+
+class S3Storage(MediaStorage):
+    """S3-compatible object store (AWS Signature V4, path or virtual-host addressing)"""
+
+    name = "s3"
+    remote = True
+    keep_local = False
+
+    def __init__(self, endpoint: str, bucket: str, region: str, access_key: str, secret_key: str,
+                 prefix: str = "", addressing_style: str = "path", public_base_url: str = "",
+                 presign_expires: int = 86400, part_size: int = 8 * 1024 * 1024, timeout: int = 300):
+        if not endpoint or not bucket:
+            raise ValueError("[storage.s3] endpoint and bucket are required")
+        parsed = urlparse(endpoint if "://" in endpoint else f"https://{endpoint}")
+        self.scheme = parsed.scheme
+        self.bucket = bucket
+        self.region = region or "us-east-1"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.prefix = prefix.lstrip("/")
+        if addressing_style == "virtual":
+            self.host = f"{bucket}.{parsed.netloc}"
+            self._root = parsed.path.rstrip("/")
+        else:
+            self.host = parsed.netloc
+            self._root = f"{parsed.path.rstrip('/')}/{bucket}"
+        self.public_base_url = public_base_url.rstrip("/")
+        self.presign_expires = max(1, min(int(presign_expires), _MAX_PRESIGN_EXPIRES))
+        self.part_size = part_size
+        self.timeout = timeout
+
+    # ---------- signing ----------
+
+    def _object_path(self, key: str) -> str:
+        return quote(f"{self._root}/{self.prefix}{key}", safe="/~")
+
+    @staticmethod
+    def _canonical_query(query: Dict[str, str]) -> str:
+        return "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(query.items()))
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (datestamp, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def _signature(self, amz_date: str, canonical_request: str) -> Tuple[str, str]:
+        """(credential scope, hex signature)"""
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        signature = hmac.new(self._signing_key(datestamp), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return scope, signature
+
+    def sign_headers(self, method: str, path: str, query: Dict[str, str], payload_hash: str,
+                     amz_date: Optional[str] = None, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Headers (Authorization included) for a header-signed request"""
+        amz_date = amz_date or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        headers = {"host": self.host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        headers.update({k.lower(): v.strip() for k, v in (extra or {}).items()})
+        names = sorted(headers)
+        canonical_request = "\n".join([
+            method, path, self._canonical_query(query),
+            "".join(f"{name}:{headers[name]}\n" for name in names),
+            ";".join(names), payload_hash
+        ])
+        scope, signature = self._signature(amz_date, canonical_request)
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        )
+        del headers["host"]
+        return headers
+
+    def presign(self, key: str, expires: Optional[int] = None, amz_date: Optional[str] = None) -> str:
+        """Presigned GET URL of an object"""
+        amz_date = amz_date or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        path = self._object_path(key)
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires or self.presign_expires),
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical_query = self._canonical_query(query)
+        canonical_request = "\n".join(["GET", path, canonical_query, f"host:{self.host}\n", "host", _UNSIGNED])
+        _, signature = self._signature(amz_date, canonical_request)
+        return f"{self.scheme}://{self.host}{path}?{canonical_query}&X-Amz-Signature={signature}"
+
+    # ---------- requests ----------
+
+    async def _request(self, session: AsyncSession, method: str, key: str, query: Optional[Dict[str, str]] = None,
+                       body: bytes = b"", headers: Optional[Dict[str, str]] = None, ok=(200,)):
+        query = query or {}
+        path = self._object_path(key)
+        signed = self.sign_headers(method, path, query, hashlib.sha256(body).hexdigest())
+        signed.update(headers or {})
+        url = f"{self.scheme}://{self.host}{path}"
+        if query:
+            url += "?" + self._canonical_query(query)
+        data = body if method in ("PUT", "POST") else None
+        response = await session.request(method, url, data=data, headers=signed, timeout=self.timeout)
+        if response.status_code not in ok:
+            raise StorageError(f"S3 {method} {key} failed: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    @staticmethod
+    def _xml_value(text: str, tag: str) -> Optional[str]:
+        for element in ET.fromstring(text).iter():
+            if element.tag.rsplit("}", 1)[-1] == tag:
+                return element.text
+        return None
+
+    async def upload_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str):
+        """Upload a byte stream; multipart once it exceeds one part"""
+        buffer = bytearray()
+        upload_id = None
+        etags: List[str] = []
+        async with AsyncSession() as session:
+            try:
+                async for chunk in chunks:
+                    buffer += chunk
+                    while len(buffer) >= self.part_size:
+                        if upload_id is None:
+                            response = await self._request(session, "POST", key, {"uploads": ""},
+                                                           headers={"Content-Type": content_type})
+                            upload_id = self._xml_value(response.text, "UploadId")
+                            if not upload_id:
+                                raise StorageError(f"S3 multipart upload of {key}: no UploadId returned")
+                        part = bytes(buffer[:self.part_size])
+                        del buffer[:self.part_size]
+                        etags.append(await self._upload_part(session, key, upload_id, len(etags) + 1, part))
+
+                if upload_id is None:
+                    await self._request(session, "PUT", key, body=bytes(buffer), headers={"Content-Type": content_type})
+                    return
+                if buffer:
+                    etags.append(await self._upload_part(session, key, upload_id, len(etags) + 1, bytes(buffer)))
+                body = "<CompleteMultipartUpload>" + "".join(
+                    f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                    for number, etag in enumerate(etags, 1)
+                ) + "</CompleteMultipartUpload>"
+                response = await self._request(session, "POST", key, {"uploadId": upload_id}, body=body.encode(),
+                                               headers={"Content-Type": "application/xml"})
+                # CompleteMultipartUpload can fail after the 200 status line
+                if "<Error>" in response.text:
+                    raise StorageError(f"S3 multipart upload of {key} failed: {response.text[:200]}")
+            except BaseException:
+                if upload_id is not None:
+                    try:
+                        await self._request(session, "DELETE", key, {"uploadId": upload_id}, ok=(200, 204, 404))
+                    except Exception:
+                        pass
+                raise
+
+    async def _upload_part(self, session: AsyncSession, key: str, upload_id: str, number: int, data: bytes) -> str:
+        response = await self._request(session, "PUT", key, {"partNumber": str(number), "uploadId": upload_id},
+                                       body=data)
+        etag = response.headers.get("etag")
+        if not etag:
+            raise StorageError(f"S3 part {number} of {key}: no ETag returned")
+        return etag
+
+    @staticmethod
+    async def _file_chunks(path: Path) -> AsyncIterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, READ_CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def publish(self, key: str, path: Path):
+        await self.upload_stream(key, self._file_chunks(path), content_type_for(key))
+        debug_logger.log_info("Stored %s in s3://%s/%s%s", path.name, self.bucket, self.prefix, key)
+
+    async def exists(self, key: str) -> bool:
+        async with AsyncSession() as session:
+            response = await self._request(session, "HEAD", key, ok=(200, 403, 404))
+        return response.status_code == 200
+
+    def url_for(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{quote(self.prefix + key, safe='/~')}"
+        return self.presign(key)
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        path = url.split("?", 1)[0]
+        public = f"{self.public_base_url}/{quote(self.prefix, safe='/~')}" if self.public_base_url else None
+        for base in (public, f"{self.scheme}://{self.host}{self._object_path('')}"):
+            if base and path.startswith(base):
+                key = path[len(base):]
+                return key if key and "/" not in key else None
+        return None
+
+    async def fetch(self, key: str, dest: Path) -> bool:
+        path = self._object_path(key)
+        headers = self.sign_headers("GET", path, {}, hashlib.sha256(b"").hexdigest())
+        partial = dest.with_name(dest.name + ".part")
+        async with AsyncSession() as session:
+            async with session.stream("GET", f"{self.scheme}://{self.host}{path}", headers=headers,
+                                      timeout=self.timeout) as response:
+                if response.status_code == 404:
+                    return False
+                if response.status_code != 200:
+                    raise StorageError(f"S3 GET {key} failed: HTTP {response.status_code}")
+                with open(partial, "wb") as f:
+                    async for chunk in response.aiter_content():
+                        await asyncio.to_thread(f.write, chunk)
+        os.replace(partial, dest)
+        return True
+
+
+class TieredStorage(MediaStorage):
+    """Local hot tier (tmp/, expires with the cache timeout) in front of an object store"""
+
+    name = "tiered"
+    remote = True
+    keep_local = True
+
+    def __init__(self, hot: MediaStorage, cold: S3Storage):
+        self.hot = hot
+        self.cold = cold
+
+    async def publish(self, key: str, path: Path):
+        await self.cold.publish(key, path)
+
+    async def exists(self, key: str) -> bool:
+        return await self.cold.exists(key)
+
+    def url_for(self, key: str) -> str:
+        return self.cold.url_for(key)
+
+    def key_for_url(self, url: str) -> Optional[str]:
+        return self.hot.key_for_url(url) or self.cold.key_for_url(url)
+
+    async def fetch(self, key: str, dest: Path) -> bool:
+        return await self.cold.fetch(key, dest)
+
+
+class MediaStaticFiles(StaticFiles):
+    """The /tmp mount: files no longer (or never) on this node are redirected to the object store"""
+
+    def __init__(self, *args, storage: Callable[[], MediaStorage], **kwargs):
+        super().__init__(*args, **kwargs)
+        self._storage = storage
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            storage = self._storage()
+            if e.status_code != 404 or not storage.remote or "/" in path or not path:
+                raise
+            return RedirectResponse(storage.url_for(path), status_code=302)
+
+
+def create_storage(base_url: Callable[[], str], name: Optional[str] = None) -> MediaStorage:
+    """Build the backend selected by [storage] backend"""
+    name = (name or config.storage_backend).lower()
+    if name == "passthrough":
+        return PassThroughStorage(base_url)
+    if name in ("s3", "tiered"):
+        try:
+            cold = S3Storage(
+                endpoint=config.storage_s3_endpoint,
+                bucket=config.storage_s3_bucket,
+                region=config.storage_s3_region,
+                access_key=config.storage_s3_access_key,
+                secret_key=config.storage_s3_secret_key,
+                prefix=config.storage_s3_prefix,
+                addressing_style=config.storage_s3_addressing_style,
+                public_base_url=config.storage_s3_public_base_url,
+                presign_expires=config.storage_s3_presign_expires,
+                part_size=config.storage_s3_part_size,
+            )
+        except ValueError as e:
+            debug_logger.log_info("Storage backend %r not usable (%s), using local storage", name, str(e))
+            return LocalStorage(base_url)
+        return cold if name == "s3" else TieredStorage(LocalStorage(base_url), cold)
+    if name != "local":
+        debug_logger.log_info("Unknown storage backend %r, using local storage", name)
+    return LocalStorage(base_url)
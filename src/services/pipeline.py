@@ -0,0 +1,96 @@
+"""Dependency-graph execution of multi-step flows
+
+Each stage is an async callable that receives the results of the stages
+finished so far. A stage starts as soon as all stages it depends on are
+done, so independent steps (e.g. saving the avatar locally while it is
+uploaded upstream) overlap. Completed stages are reported in completion
+order, which lets streaming handlers emit progress as they happen.
+
+Usage:
+    graph = StageGraph("character")
+    graph.add("download", lambda r: fetch())
+    graph.add("upload", lambda r: upload(r["download"]), after=("download",))
+    async for name, result in graph.run():
+        ...
+"""
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from ..core.logger import debug_logger
+from ..core.metrics import PIPELINE_STAGE_SECONDS
+from ..core.tracing import tracer
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class _Stage:
+    __slots__ = ("name", "fn", "after")
+
+    def __init__(self, name: str, fn: StageFn, after: Tuple[str, ...]):
+        self.name = name
+        self.fn = fn
+        self.after = after
+
+
+class StageGraph:
+    """Runs stages concurrently in dependency order"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, _Stage] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: StageFn, after: Iterable[str] = ()) -> "StageGraph":
+        """Register a stage
+
+        Args:
+            name: Unique stage name (also the key of its result)
+            fn: Async callable receiving the results dict
+            after: Stages that must finish first (must already be registered)
+        """
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        after = tuple(after)
+        for dep in after:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self._stages[name] = _Stage(name, fn, after)
+        return self
+
+    async def _run_stage(self, stage: _Stage, results: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"{self.name}.{stage.name}"):
+                return await stage.fn(results)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings[stage.name] = elapsed
+            PIPELINE_STAGE_SECONDS.observe(elapsed, self.name, stage.name)
+
+    async def run(self, results: Optional[Dict[str, Any]] = None) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Execute the graph, yielding (stage name, result) as stages complete
+
+        The first failing stage cancels the running ones and its exception
+        is raised. Closing the generator early cancels pending stages too.
+        """
+        results = {} if results is None else results
+        pending = dict(self._stages)
+        running: Dict[asyncio.Task, str] = {}
+        started = time.perf_counter()
+        try:
+            while pending or running:
+                for name in [n for n, s in pending.items() if all(d in results for d in s.after)]:
+                    stage = pending.pop(name)
+                    running[asyncio.ensure_future(self._run_stage(stage, results))] = name
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()
+                    yield name, results[name]
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            debug_logger.log_info("%s stages (%.2fs total): %s", self.name, time.perf_counter() - started,
+                                  ", ".join(f"{n}={t:.2f}s" for n, t in self.timings.items()))
@@ -0,0 +1,96 @@
+"""Prompt preprocessing shared by the generation paths
+
+analyze() parses a prompt once (storyboard shots, @mentions, remix ID) with
+precompiled patterns and memoizes the result by prompt hash; clients tend to
+resend the same prompt (retries, batches, UI regenerate). The mentions are
+resolved by the character directory (character_directory.py).
+"""
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from ..core.metrics import PROMPT_CACHE_LOOKUPS
+
+# [5s] / [5.0s] 分镜时间标记
+STORYBOARD_MARK_RE = re.compile(r"\[\d+(?:\.\d+)?s\]")
+STORYBOARD_SHOT_RE = re.compile(r"\[(\d+(?:\.\d+)?)s\]\s*([^\[]+)")
+# @username：字母/数字/下划线/点/短横线/中文昵称
+MENTION_RE = re.compile(r"@([A-Za-z0-9_.\-\u4e00-\u9fa5]+)")
+REMIX_URL_RE = re.compile(r"https://sora\.chatgpt\.com/p/s_[a-f0-9]{32}")
+REMIX_ID_RE = re.compile(r"s_[a-f0-9]{32}")
+
+_CACHE_MAX = 1024
+
+
+@dataclass(frozen=True)
+class ParsedPrompt:
+    """What the generation paths need to know about a prompt"""
+    mentions: Tuple[str, ...]  # unique @usernames in order of appearance
+    remix_id: str  # first s_<32 hex> ID, "" if none
+    storyboard_shots: Tuple[Tuple[str, str], ...]  # (duration, scene); empty: not a storyboard
+    storyboard_prompt: Optional[str]  # storyboard API format, None if not a storyboard
+
+    @property
+    def is_storyboard(self) -> bool:
+        return self.storyboard_prompt is not None
+
+
+def format_storyboard(prompt: str, shots: List[Tuple[str, str]]) -> str:
+    """Storyboard API format: the shots, plus the text before the first mark as instructions"""
+    first_bracket_pos = prompt.find("[")
+    instructions = prompt[:first_bracket_pos].strip() if first_bracket_pos > 0 else ""
+    timeline = "\n\n".join(
+        f"Shot {idx}:\nduration: {duration}sec\nScene: {scene.strip()}"
+        for idx, (duration, scene) in enumerate(shots, 1)
+    )
+    if instructions:
+        return f"current timeline:\n{timeline}\n\ninstructions:\n{instructions}"
+    return timeline
+
+
+def _parse(prompt: str) -> ParsedPrompt:
+    mentions = tuple(dict.fromkeys(m.group(1) for m in MENTION_RE.finditer(prompt)))
+    remix = REMIX_ID_RE.search(prompt)
+    storyboard_prompt = None
+    shots: List[Tuple[str, str]] = []
+    if STORYBOARD_MARK_RE.search(prompt):
+        shots = STORYBOARD_SHOT_RE.findall(prompt)
+        # Marks without any scene text: sent as written (previous behaviour)
+        storyboard_prompt = format_storyboard(prompt, shots) if shots else prompt
+    return ParsedPrompt(
+        mentions=mentions,
+        remix_id=remix.group(0) if remix else "",
+        storyboard_shots=tuple(shots),
+        storyboard_prompt=storyboard_prompt,
+    )
+
+
+class PromptAnalyzer:
+    """LRU of parsed prompts keyed by the prompt's BLAKE2 digest"""
+
+    def __init__(self, max_entries: int = _CACHE_MAX):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, ParsedPrompt]" = OrderedDict()
+
+    def analyze(self, prompt: Optional[str]) -> ParsedPrompt:
+        prompt = prompt or ""
+        key = hashlib.blake2b(prompt.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        parsed = self._entries.get(key)
+        if parsed is not None:
+            self._entries.move_to_end(key)
+            PROMPT_CACHE_LOOKUPS.inc("hit")
+            return parsed
+        PROMPT_CACHE_LOOKUPS.inc("miss")
+        parsed = _parse(prompt)
+        self._entries[key] = parsed
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return parsed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global analyzer instance
+prompt_analyzer = PromptAnalyzer()
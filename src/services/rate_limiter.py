@@ -0,0 +1,159 @@
+"""Upstream rate limiter (per token + endpoint class) with 429 / Retry-After feedback"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+
+# Endpoint classes
+ENDPOINT_GENERATE = "generate"
+ENDPOINT_POLL = "poll"
+ENDPOINT_PUBLISH = "publish"
+ENDPOINT_UPLOAD = "upload"
+ENDPOINT_OTHER = "other"
+
+_UPLOAD_PATHS = ("/uploads", "/characters/upload", "/project_y/file/upload")
+_GENERATE_PATHS = ("/video_gen", "/nf/create")
+_POLL_PATHS = ("/nf/pending", "/v2/recent_tasks", "/project_y/profile/drafts", "/project_y/cameos/in_progress/")
+
+
+def classify_endpoint(method: str, endpoint: str) -> str:
+    """Map a Sora API endpoint to its rate limit class"""
+    path = endpoint.split("?", 1)[0]
+    if path.startswith(_UPLOAD_PATHS):
+        return ENDPOINT_UPLOAD
+    if path.startswith(_GENERATE_PATHS):
+        return ENDPOINT_GENERATE
+    if path.startswith(_POLL_PATHS):
+        return ENDPOINT_POLL
+    if method == "DELETE" or path.startswith(("/project_y/post", "/characters/finalize", "/project_y/cameos/by_id/")):
+        return ENDPOINT_PUBLISH
+    return ENDPOINT_OTHER
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class _AdaptiveBucket:
+    """Token bucket whose refill rate shrinks on 429 and slowly recovers on success"""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_used = self.updated
+        self._lock = asyncio.Lock()  # FIFO: waiters are served in arrival order
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Wait until a request may be sent; returns the time spent waiting"""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.last_used = now
+                        return now - start
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def on_rate_limited(self, retry_after: Optional[float]):
+        """Multiplicative decrease + hold the bucket until Retry-After"""
+        now = time.monotonic()
+        min_rate = self.base_rate * config.rate_limit_min_rate_factor
+        self.rate = max(min_rate, self.rate * 0.5)
+        if retry_after is None:
+            retry_after = 1.0 / self.rate
+        retry_after = min(retry_after, config.rate_limit_max_retry_after)
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0.0
+        self.updated = now
+
+    def on_success(self):
+        """Additive increase back towards the configured rate"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+
+class RateLimiter:
+    """Token-bucket limiter keyed by (access token, endpoint class)"""
+
+    # Buckets idle for longer than this are dropped (tokens get refreshed/rotated)
+    IDLE_EVICT_SECONDS = 3600
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str], _AdaptiveBucket] = {}
+        self._created_since_sweep = 0
+
+    def _sweep(self):
+        now = time.monotonic()
+        stale = [
+            key for key, bucket in self._buckets.items()
+            if now - bucket.last_used > self.IDLE_EVICT_SECONDS and not bucket._lock.locked()
+        ]
+        for key in stale:
+            del self._buckets[key]
+
+    def _get_bucket(self, token: str, endpoint_class: str) -> _AdaptiveBucket:
+        key = (token, endpoint_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = config.get_rate_limit(endpoint_class)
+            bucket = _AdaptiveBucket(rate, burst)
+            self._buckets[key] = bucket
+            self._created_since_sweep += 1
+            if self._created_since_sweep >= 256:
+                self._created_since_sweep = 0
+                self._sweep()
+        return bucket
+
+    async def acquire(self, token: str, endpoint_class: str):
+        """Block until the (token, endpoint class) bucket admits a request"""
+        if not config.rate_limit_enabled:
+            return
+        waited = await self._get_bucket(token, endpoint_class).acquire()
+        if waited > 1.0:
+            debug_logger.log_info("[RATE_LIMIT] %s request delayed %.1fs by local rate limiter", endpoint_class, waited)
+
+    def on_response(self, token: str, endpoint_class: str, status_code: int, retry_after: Optional[str] = None):
+        """Feed an upstream response back into the bucket"""
+        if not config.rate_limit_enabled:
+            return
+        bucket = self._get_bucket(token, endpoint_class)
+        if status_code == 429:
+            seconds = parse_retry_after(retry_after)
+            bucket.on_rate_limited(seconds)
+            debug_logger.log_info(
+                "[RATE_LIMIT] Upstream 429 on %s, rate -> %.2f/s, retry after %ss",
+                endpoint_class, bucket.rate, seconds if seconds is not None else "n/a"
+            )
+        elif 200 <= status_code < 300:
+            bucket.on_success()
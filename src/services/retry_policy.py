@@ -0,0 +1,78 @@
+"""Shared retry policy for polling and download loops"""
+import random
+from typing import Optional, Tuple, Type
+from .sora_errors import NotFoundError, SoraAPIError
+
+
+class RetryPolicy:
+    """Decides whether a failed attempt should be repeated and how long to wait
+
+    Retries are decided from the exception type (see sora_errors), never from
+    message text.
+
+    Args:
+        max_attempts: Total attempts including the first one (None: unlimited)
+        base_delay: Delay for the first retry (seconds)
+        max_delay: Upper bound of the exponential backoff
+        jitter: Random extra delay added to backoff sleeps
+        retry_not_found: Treat 404 as "not ready yet" and retry with a fixed delay
+        retry_unknown: Retry exceptions that are not SoraAPIError (e.g. parse errors)
+        fatal: Error types that are never retried, even when retryable
+    """
+
+    def __init__(self, max_attempts: Optional[int] = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 jitter: float = 0.5, retry_not_found: bool = False, retry_unknown: bool = False,
+                 fatal: Tuple[Type[BaseException], ...] = ()):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_not_found = retry_not_found
+        self.retry_unknown = retry_unknown
+        self.fatal = fatal
+
+    def should_retry(self, err: BaseException, attempt: int) -> bool:
+        """Whether attempt number `attempt` (0-based) may be followed by another one"""
+        if self.max_attempts is not None and attempt >= self.max_attempts - 1:
+            return False
+        if self.fatal and isinstance(err, self.fatal):
+            return False
+        if isinstance(err, NotFoundError):
+            return self.retry_not_found
+        if isinstance(err, SoraAPIError):
+            return err.retryable
+        return self.retry_unknown
+
+    def delay_for(self, err: BaseException, attempt: int, retry_count: Optional[int] = None) -> float:
+        """Seconds to sleep before the next attempt
+
+        Args:
+            err: The error that ended the previous attempt
+            attempt: 0-based attempt number
+            retry_count: Consecutive failures so far, if different from attempt (poll loops)
+        """
+        n = attempt if retry_count is None else retry_count
+        if isinstance(err, NotFoundError):
+            # Not ready yet: poll at a steady pace
+            return self.base_delay
+        retry_after = getattr(err, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.base_delay * (2 ** n), self.max_delay)
+        return delay + random.uniform(0, self.jitter)
+
+
+# Media downloads: wait for freshly published files (404) and ride out network jitter
+DOWNLOAD_RETRY = RetryPolicy(max_attempts=15, base_delay=10, max_delay=30, retry_not_found=True)
+
+# Task status polling: the loop itself is bounded by the generation timeout and
+# paced by the poll interval; only errors that can never recover stop it early
+TASK_POLL_RETRY = RetryPolicy(max_attempts=None, retry_not_found=True, retry_unknown=True)
+
+# Cameo status polling: give up after a few consecutive failures
+CAMEO_POLL_RETRY = RetryPolicy(max_attempts=3, base_delay=2.5, max_delay=30,
+                               retry_not_found=True, retry_unknown=True)
+
+# Watermark-free follow-up (publish / parse / cache): keep trying until the user cancels
+WATERMARK_RETRY = RetryPolicy(max_attempts=None, base_delay=1, max_delay=30,
+                              retry_not_found=True, retry_unknown=True)
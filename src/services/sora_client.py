@@ -5,12 +5,27 @@ import time
 import random
 import string
 import re
+from functools import lru_cache
 from typing import Optional, Dict, Any, Tuple
 from curl_cffi.requests import AsyncSession
 from curl_cffi import CurlMime
 from .proxy_manager import ProxyManager
+from .rate_limiter import RateLimiter, classify_endpoint, parse_retry_after
+from .sora_errors import error_from_response, is_transport_error, wrap_transport_error
+from .prompt_analyzer import prompt_analyzer
 from ..core.config import config
 from ..core.logger import debug_logger
+from ..core.metrics import UPSTREAM_LATENCY, POLLS_TOTAL
+from ..core.tracing import tracer
+
+_ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[A-Za-z0-9_\-]{12,}$")
+
+
+@lru_cache(maxsize=1024)
+def _endpoint_label(endpoint: str) -> str:
+    """Metric label for an endpoint: drop the query string and replace ID path segments"""
+    path = endpoint.split("?", 1)[0]
+    return "/".join("{id}" if _ID_SEGMENT_RE.match(seg) else seg for seg in path.split("/"))
 
 class SoraClient:
     """Sora API client with proxy support"""
@@ -19,6 +34,7 @@ class SoraClient:
         self.proxy_manager = proxy_manager
         self.base_url = config.sora_base_url
         self.timeout = config.sora_timeout
+        self.rate_limiter = RateLimiter()
 
     @staticmethod
     def _generate_sentinel_token() -> str:
@@ -31,6 +47,22 @@ class SoraClient:
         random_str = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
         return random_str
 
+    @staticmethod
+    async def _send(session: AsyncSession, method: str, url: str, metric_label: str, **kwargs):
+        """Send a request, converting transport failures into TransientNetworkError"""
+        with tracer.span("sora.request", method=method, endpoint=metric_label) as span:
+            start = time.perf_counter()
+            try:
+                response = await session.request(method, url, **kwargs)
+            except Exception as e:
+                UPSTREAM_LATENCY.observe(time.perf_counter() - start, metric_label, "error")
+                if is_transport_error(e):
+                    raise wrap_transport_error(e) from e
+                raise
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, metric_label, response.status_code)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
     @staticmethod
     def is_storyboard_prompt(prompt: str) -> bool:
         """检测提示词是否为分镜模式格式
@@ -46,11 +78,8 @@ class SoraClient:
         """
         if not prompt:
             return False
-        # 匹配格式: [数字s] 或 [数字.数字s]
-        pattern = r'\[\d+(?:\.\d+)?s\]'
-        matches = re.findall(pattern, prompt)
-        # 至少包含一个时间标记才认为是分镜模式
-        return len(matches) >= 1
+        # 至少包含一个 [数字s] / [数字.数字s] 时间标记才认为是分镜模式（解析结果按提示词缓存）
+        return prompt_analyzer.analyze(prompt).is_storyboard
 
     @staticmethod
     def format_storyboard_prompt(prompt: str) -> str:
@@ -65,33 +94,7 @@ class SoraClient:
         Returns:
             格式化后的API提示词
         """
-        # 匹配 [时间]内容 的模式
-        pattern = r'\[(\d+(?:\.\d+)?)s\]\s*([^\[]+)'
-        matches = re.findall(pattern, prompt)
-
-        if not matches:
-            return prompt
-
-        # 提取总述(第一个[时间]之前的内容)
-        first_bracket_pos = prompt.find('[')
-        instructions = ""
-        if first_bracket_pos > 0:
-            instructions = prompt[:first_bracket_pos].strip()
-
-        # 格式化分镜
-        formatted_shots = []
-        for idx, (duration, scene) in enumerate(matches, 1):
-            scene = scene.strip()
-            shot = f"Shot {idx}:\nduration: {duration}sec\nScene: {scene}"
-            formatted_shots.append(shot)
-
-        timeline = "\n\n".join(formatted_shots)
-
-        # 如果有总述,添加instructions部分
-        if instructions:
-            return f"current timeline:\n{timeline}\n\ninstructions:\n{instructions}"
-        else:
-            return timeline
+        return prompt_analyzer.analyze(prompt).storyboard_prompt or prompt
 
     async def _make_request(self, method: str, endpoint: str, token: str,
                            json_data: Optional[Dict] = None,
@@ -108,6 +111,8 @@ class SoraClient:
             add_sentinel_token: Whether to add openai-sentinel-token header (only for generation requests)
         """
         proxy_url = await self.proxy_manager.get_proxy_url()
+        endpoint_class = classify_endpoint(method, endpoint)
+        await self.rate_limiter.acquire(token, endpoint_class)
 
         headers = {
             "Authorization": f"Bearer {token}"
@@ -152,15 +157,16 @@ class SoraClient:
             start_time = time.time()
 
             # Make request
-            if method == "GET":
-                response = await session.get(url, **kwargs)
-            elif method == "POST":
-                response = await session.post(url, **kwargs)
-            else:
+            if method not in ("GET", "POST"):
                 raise ValueError(f"Unsupported method: {method}")
+            metric_label = _endpoint_label(endpoint)
+            if endpoint_class == "poll":
+                POLLS_TOTAL.inc(metric_label)
+            response = await self._send(session, method, url, metric_label, **kwargs)
 
             # Calculate duration
             duration_ms = (time.time() - start_time) * 1000
+            self.rate_limiter.on_response(token, endpoint_class, response.status_code, response.headers.get("retry-after"))
 
             # Parse response
             try:
@@ -171,20 +177,23 @@ class SoraClient:
             # Log response
             debug_logger.log_response(
                 status_code=response.status_code,
-                headers=dict(response.headers),
+                headers=response.headers,
                 body=response_json if response_json else response.text,
                 duration_ms=duration_ms
             )
 
             # Check status
             if response.status_code not in [200, 201]:
-                error_msg = f"API request failed: {response.status_code} - {response.text}"
+                error = error_from_response(
+                    response.status_code, response.text, response_json,
+                    retry_after=parse_retry_after(response.headers.get("retry-after"))
+                )
                 debug_logger.log_error(
-                    error_message=error_msg,
+                    error_message=str(error),
                     status_code=response.status_code,
                     response_text=response.text
                 )
-                raise Exception(error_msg)
+                raise error
 
             return response_json if response_json else response.json()
     
@@ -192,11 +201,16 @@ class SoraClient:
         """Get user information"""
         return await self._make_request("GET", "/me", token)
     
-    async def upload_image(self, image_data: bytes, token: str, filename: str = "image.png") -> str:
+    async def upload_image(self, image_data: Optional[bytes], token: str, filename: str = "image.png",
+                           local_path: Optional[str] = None) -> str:
         """Upload image and return media_id
 
         使用 CurlMime 对象上传文件（curl_cffi 的正确方式）
         参考：https://curl-cffi.readthedocs.io/en/latest/quick_start.html#uploads
+
+        Args:
+            image_data: Image bytes (ignored when local_path is given)
+            local_path: Spooled file to stream from instead of holding the image in memory
         """
         # 检测图片类型
         mime_type = "image/png"
@@ -209,12 +223,10 @@ class SoraClient:
         mp = CurlMime()
 
         # 添加文件部分
-        mp.addpart(
-            name="file",
-            content_type=mime_type,
-            filename=filename,
-            data=image_data
-        )
+        if local_path:
+            mp.addpart(name="file", content_type=mime_type, filename=filename, local_path=local_path)
+        else:
+            mp.addpart(name="file", content_type=mime_type, filename=filename, data=image_data)
 
         # 添加文件名字段
         mp.addpart(
@@ -338,6 +350,7 @@ class SoraClient:
             True if deletion was successful
         """
         proxy_url = await self.proxy_manager.get_proxy_url()
+        await self.rate_limiter.acquire(token, "publish")
 
         headers = {
             "Authorization": f"Bearer {token}"
@@ -369,28 +382,29 @@ class SoraClient:
             start_time = time.time()
 
             # Make DELETE request
-            response = await session.delete(url, **kwargs)
+            response = await self._send(session, "DELETE", url, _endpoint_label(url[len(self.base_url):]), **kwargs)
 
             # Calculate duration
             duration_ms = (time.time() - start_time) * 1000
+            self.rate_limiter.on_response(token, "publish", response.status_code, response.headers.get("retry-after"))
 
             # Log response
             debug_logger.log_response(
                 status_code=response.status_code,
-                headers=dict(response.headers),
+                headers=response.headers,
                 body=response.text if response.text else "No content",
                 duration_ms=duration_ms
             )
 
             # Check status (DELETE typically returns 204 No Content or 200 OK)
             if response.status_code not in [200, 204]:
-                error_msg = f"Delete post failed: {response.status_code} - {response.text}"
+                error = error_from_response(response.status_code, response.text, prefix="Delete post failed")
                 debug_logger.log_error(
-                    error_message=error_msg,
+                    error_message=str(error),
                     status_code=response.status_code,
                     response_text=response.text
                 )
-                raise Exception(error_msg)
+                raise error
 
             return True
 
@@ -444,20 +458,20 @@ class SoraClient:
                 # Log response
                 debug_logger.log_response(
                     status_code=response.status_code,
-                    headers=dict(response.headers),
+                    headers=response.headers,
                     body=response.text if response.text else "No content",
                     duration_ms=duration_ms
                 )
 
                 # Check status
                 if response.status_code != 200:
-                    error_msg = f"Custom parse failed: {response.status_code} - {response.text}"
+                    error = error_from_response(response.status_code, response.text, prefix="Custom parse failed")
                     debug_logger.log_error(
-                        error_message=error_msg,
+                        error_message=str(error),
                         status_code=response.status_code,
                         response_text=response.text
                     )
-                    raise Exception(error_msg)
+                    raise error
 
                 # Parse response
                 result = response.json()
@@ -477,7 +491,7 @@ class SoraClient:
                 if not download_link:
                     raise Exception("No download_link in custom parse response")
 
-                debug_logger.log_info(f"Custom parse successful: {download_link}")
+                debug_logger.log_info("Custom parse successful: %s", download_link)
                 return download_link
 
         except Exception as e:
@@ -490,23 +504,23 @@ class SoraClient:
 
     # ==================== Character Creation Methods ====================
 
-    async def upload_character_video(self, video_data: bytes, token: str) -> str:
+    async def upload_character_video(self, video_data: Optional[bytes], token: str,
+                                     local_path: Optional[str] = None) -> str:
         """Upload character video and return cameo_id
 
         Args:
-            video_data: Video file bytes
+            video_data: Video file bytes (ignored when local_path is given)
             token: Access token
+            local_path: Spooled file to stream from instead of holding the video in memory
 
         Returns:
             cameo_id
         """
         mp = CurlMime()
-        mp.addpart(
-            name="file",
-            content_type="video/mp4",
-            filename="video.mp4",
-            data=video_data
-        )
+        if local_path:
+            mp.addpart(name="file", content_type="video/mp4", filename="video.mp4", local_path=local_path)
+        else:
+            mp.addpart(name="file", content_type="video/mp4", filename="video.mp4", data=video_data)
         mp.addpart(
             name="timestamps",
             data=b"0,3"
@@ -547,9 +561,9 @@ class SoraClient:
             kwargs["proxy"] = proxy_url
 
         async with AsyncSession() as session:
-            response = await session.get(image_url, **kwargs)
+            response = await self._send(session, "GET", image_url, "cdn:profile_asset", **kwargs)
             if response.status_code != 200:
-                raise Exception(f"Failed to download image: {response.status_code}")
+                raise error_from_response(response.status_code, response.text[:200], prefix="Failed to download image")
             return response.content
 
     async def finalize_character(self, cameo_id: str, username: str, display_name: str,
@@ -632,6 +646,7 @@ class SoraClient:
             True if successful
         """
         proxy_url = await self.proxy_manager.get_proxy_url()
+        await self.rate_limiter.acquire(token, "publish")
 
         headers = {
             "Authorization": f"Bearer {token}"
@@ -649,9 +664,10 @@ class SoraClient:
             if proxy_url:
                 kwargs["proxy"] = proxy_url
 
-            response = await session.delete(url, **kwargs)
+            response = await self._send(session, "DELETE", url, _endpoint_label(url[len(self.base_url):]), **kwargs)
+            self.rate_limiter.on_response(token, "publish", response.status_code, response.headers.get("retry-after"))
             if response.status_code not in [200, 204]:
-                raise Exception(f"Failed to delete character: {response.status_code}")
+                raise error_from_response(response.status_code, response.text[:200], prefix="Failed to delete character")
             return True
 
     async def remix_video(self, remix_target_id: str, prompt: str, token: str,
@@ -0,0 +1,137 @@
+"""Typed errors raised by the Sora client and media downloads"""
+import asyncio
+from typing import Any, Optional
+from curl_cffi import CurlError
+
+
+class SoraAPIError(Exception):
+    """Base class for upstream failures
+
+    Attributes:
+        status_code: HTTP status (None for transport failures)
+        body: Parsed JSON body if available, otherwise raw text
+        retry_after: Seconds suggested by the upstream before retrying
+        error_code: Upstream error code (error.code / error.type)
+        param: Upstream error param (e.g. "cameo_ids")
+    """
+
+    # Whether repeating the same request may succeed
+    retryable = False
+
+    def __init__(self, message: str, status_code: Optional[int] = None, body: Any = None,
+                 retry_after: Optional[float] = None, error_code: Optional[str] = None,
+                 param: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+        self.error_code = error_code
+        self.param = param
+
+
+class TransientNetworkError(SoraAPIError):
+    """Connection reset, TLS handshake failure, timeout..."""
+    retryable = True
+
+
+class RateLimitedError(SoraAPIError):
+    """HTTP 429"""
+    retryable = True
+
+
+class UpstreamServerError(SoraAPIError):
+    """HTTP 5xx"""
+    retryable = True
+
+
+class NotFoundError(SoraAPIError):
+    """HTTP 404 (also used for media that is not published yet)"""
+
+
+class AuthExpiredError(SoraAPIError):
+    """HTTP 401, or 403 with an API error body"""
+
+
+class UpstreamBlockedError(SoraAPIError):
+    """HTTP 403 without an API error body (Cloudflare challenge page, account / region block)"""
+
+
+class ContentViolationError(SoraAPIError):
+    """Request or result rejected by content moderation"""
+
+
+class BadRequestError(SoraAPIError):
+    """HTTP 4xx not covered by a more specific class"""
+
+
+class InvalidCameoError(BadRequestError):
+    """Generation request rejected because of the cameo_ids parameter"""
+
+
+class UnknownMediaError(BadRequestError):
+    """Generation request references an upload (media_id) the upstream no longer knows"""
+
+
+class TaskFailedError(SoraAPIError):
+    """Upstream task finished in the failed state"""
+
+
+_VIOLATION_MARKERS = ("moderation", "policy", "violation", "content_filter")
+_MEDIA_MARKERS = ("upload", "media", "inpaint")
+_MISSING_MARKERS = ("not found", "unknown", "invalid", "expired", "does not exist", "not_found")
+
+
+def _extract_error(body: Any):
+    """Pull (code, param, message) out of an OpenAI style error body"""
+    if not isinstance(body, dict):
+        return None, None, None
+    err = body.get("error")
+    if isinstance(err, dict):
+        return err.get("code") or err.get("type"), err.get("param"), err.get("message")
+    if isinstance(err, str):
+        return err, None, body.get("message")
+    return body.get("code"), body.get("param"), body.get("message") or body.get("detail")
+
+
+def error_from_response(status_code: int, text: str, body: Any = None,
+                        retry_after: Optional[float] = None,
+                        prefix: str = "API request failed") -> SoraAPIError:
+    """Build the matching typed error for a non-success HTTP response"""
+    message = f"{prefix}: {status_code} - {text}"
+    error_code, param, error_message = _extract_error(body)
+    kwargs = dict(status_code=status_code, body=body if body is not None else text,
+                  retry_after=retry_after, error_code=error_code, param=param)
+
+    if status_code == 429:
+        return RateLimitedError(message, **kwargs)
+    if status_code >= 500:
+        return UpstreamServerError(message, **kwargs)
+    if status_code == 404:
+        return NotFoundError(message, **kwargs)
+    if status_code == 401 or (status_code == 403 and error_code is not None):
+        return AuthExpiredError(message, **kwargs)
+    if status_code == 403:
+        return UpstreamBlockedError(message, **kwargs)
+
+    hint = " ".join(str(v) for v in (error_code, error_message) if v).lower()
+    if any(m in hint for m in _VIOLATION_MARKERS):
+        return ContentViolationError(message, **kwargs)
+    if 400 <= status_code < 500:
+        if (param and "cameo" in str(param).lower()) or "cameo" in hint:
+            return InvalidCameoError(message, **kwargs)
+        param_hint = str(param or "").lower()
+        if any(m in param_hint for m in _MEDIA_MARKERS) or (
+                any(m in hint for m in _MEDIA_MARKERS) and any(m in hint for m in _MISSING_MARKERS)):
+            return UnknownMediaError(message, **kwargs)
+        return BadRequestError(message, **kwargs)
+    return SoraAPIError(message, **kwargs)
+
+
+def is_transport_error(err: BaseException) -> bool:
+    """Whether the exception comes from the HTTP transport rather than an HTTP status"""
+    return isinstance(err, (CurlError, asyncio.TimeoutError, ConnectionError))
+
+
+def wrap_transport_error(err: BaseException) -> TransientNetworkError:
+    """Wrap a curl_cffi / socket level exception, keeping its message"""
+    return TransientNetworkError(str(err) or err.__class__.__name__)
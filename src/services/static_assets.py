@@ -0,0 +1,125 @@
+"""Serving the admin frontend (static/)
+
+tools/build_assets.py writes static/dist/: the JS (and the prebuilt Tailwind
+CSS when the Tailwind CLI is available) under content-hashed names, the HTML
+pages pointing at them, .br / .gz variants of everything, and manifest.json
+with the hashes of the sources it was built from.
+
+PrecompressedStaticFiles serves the .br / .gz variant a client accepts and
+sets Cache-Control: hashed files are immutable, everything else is
+revalidated (ETag / Last-Modified). When dist/ is missing or older than the
+sources the pages are served from static/ as before.
+"""
+import hashlib
+import json
+import re
+import stat
+from pathlib import Path
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+from ..core.logger import debug_logger
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+# name.<10 hex>.ext, as written by tools/build_assets.py
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{10}\.[a-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Preferred first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+_COMPRESSIBLE = (".js", ".css", ".html", ".json", ".svg", ".txt")
+_CONTENT_TYPES = {
+    ".js": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+def accepted_encodings(scope) -> set:
+    """Content codings the client accepts (q=0 entries excluded)"""
+    accepted = set()
+    value = Headers(scope=scope).get("accept-encoding", "")
+    for item in value.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that picks a precompressed sibling (file.br / file.gz) and sets cache headers"""
+
+    async def get_response(self, path: str, scope):
+        suffix = Path(path).suffix.lower()
+        if suffix in _COMPRESSIBLE and scope["method"] in ("GET", "HEAD"):
+            accepted = accepted_encodings(scope)
+            for coding, extension in _ENCODINGS:
+                if coding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + extension)
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    if response.status_code == 200:
+                        response.headers["content-type"] = _CONTENT_TYPES[suffix]
+                    response.headers["content-encoding"] = coding
+                    return self._finish(path, response, varies=True)
+        response = await super().get_response(path, scope)
+        return self._finish(path, response, varies=suffix in _COMPRESSIBLE)
+
+    @staticmethod
+    def _finish(path: str, response, varies: bool):
+        fingerprinted = path.startswith(DIST_DIR + "/") and FINGERPRINT_RE.search(path)
+        response.headers["cache-control"] = IMMUTABLE_CACHE if fingerprinted else REVALIDATE_CACHE
+        if varies:
+            response.headers["vary"] = "Accept-Encoding"
+        return response
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class StaticAssets:
+    """Which copy of the frontend to serve: static/dist/ when it is built and current, else static/"""
+
+    def __init__(self, static_dir: Path):
+        self.static_dir = static_dir
+        self.built = self._check_build()
+
+    def _check_build(self) -> bool:
+        manifest_path = self.static_dir / DIST_DIR / MANIFEST_NAME
+        if not manifest_path.is_file():
+            return False
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            sources = manifest["sources"]
+            stale = [name for name, digest in sources.items()
+                     if not (self.static_dir / name).is_file() or _sha256(self.static_dir / name) != digest]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            debug_logger.log_info("Ignoring static/%s/%s: %s", DIST_DIR, MANIFEST_NAME, str(e))
+            return False
+        if stale:
+            print(f"⚠ static/{DIST_DIR} is older than {', '.join(sorted(stale))}; serving static/ "
+                  f"(run python tools/build_assets.py)")
+            return False
+        return True
+
+    def page(self, name: str) -> str:
+        """Path (relative to static/) of an HTML page"""
+        if self.built and (self.static_dir / DIST_DIR / name).is_file():
+            return f"{DIST_DIR}/{name}"
+        return name
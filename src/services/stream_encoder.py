@@ -0,0 +1,114 @@
+"""SSE chunk encoder for chat.completion.chunk messages
+
+Everything except the delta and finish_reason is identical for all chunks of
+one stream, so the envelope is rendered once per stream (begin_stream) and
+each chunk only serialises its small delta dict. orjson is used when
+installed, stdlib json otherwise.
+"""
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from ..core.config import config
+
+try:
+    import orjson
+    orjson_available = True
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:  # orjson is optional
+    orjson_available = False
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+_USAGE = ',"usage":{"prompt_tokens":0}}\n\n'
+_USAGE_FINAL = ',"usage":{"prompt_tokens":0,"completion_tokens":1,"total_tokens":1}}\n\n'
+_TAIL_OPEN = ',"finish_reason":null,"native_finish_reason":null}]' + _USAGE
+
+class TerminalChunk(str):
+    """A chunk that ends a stream or reports its outcome (finish_reason set,
+    error event, [DONE]); TaskEventHub never drops these for slow subscribers"""
+    __slots__ = ()
+
+
+DONE_CHUNK = TerminalChunk("data: [DONE]\n\n")
+
+# (prefix up to and including '"delta":') of the current stream
+_stream_prefix: ContextVar[Optional[str]] = ContextVar("stream_prefix", default=None)
+
+
+def _render_prefix(chunk_id: str, created: int, model: str) -> str:
+    return (
+        f'data: {{"id":{_dumps(chunk_id)},"object":"chat.completion.chunk","created":{created},'
+        f'"model":{_dumps(model)},"choices":[{{"index":0,"delta":'
+    )
+
+
+class StreamChunkEncoder:
+    """Encodes OpenAI-style streaming chunks
+
+    Usage:
+        token = encoder.begin_stream()
+        try:
+            ... encoder.encode(content=...) ...
+        finally:
+            encoder.end_stream(token)
+
+    Outside of begin/end_stream every chunk gets a fresh id (previous behaviour).
+    """
+
+    def __init__(self, model: str = "sora"):
+        self.model = model
+        self._tails: Dict[str, str] = {}
+
+    def begin_stream(self):
+        """Fix chunk id and created timestamp for the chunks of the current task"""
+        now = time.time()
+        prefix = _render_prefix(f"chatcmpl-{int(now * 1000)}", int(now), self.model)
+        return _stream_prefix.set(prefix)
+
+    @staticmethod
+    def end_stream(token):
+        try:
+            _stream_prefix.reset(token)
+        except ValueError:
+            # Generator closed from a different context
+            pass
+
+    def _tail(self, finish_reason: str) -> str:
+        tail = self._tails.get(finish_reason)
+        if tail is None:
+            reason = _dumps(finish_reason)
+            tail = f',"finish_reason":{reason},"native_finish_reason":{reason}}}]' + _USAGE_FINAL
+            self._tails[finish_reason] = tail
+        return tail
+
+    def encode(self, content: Optional[str] = None, reasoning_content: Optional[str] = None,
+               finish_reason: Optional[str] = None, is_first: bool = False,
+               extra: Optional[dict] = None) -> str:
+        """Render one `data: {...}\\n\\n` line (a TerminalChunk when finish_reason is set)"""
+        omit_null = config.stream_omit_null_fields
+        delta: Dict[str, Any] = {"role": "assistant"} if is_first else {}
+        if content is not None or not omit_null:
+            delta["content"] = content
+        if reasoning_content is not None or not omit_null:
+            delta["reasoning_content"] = reasoning_content
+        if not omit_null:
+            delta["tool_calls"] = None
+        if extra:
+            delta.update(extra)
+
+        prefix = _stream_prefix.get()
+        if prefix is None:
+            now = time.time()
+            prefix = _render_prefix(f"chatcmpl-{int(now * 1000)}", int(now), self.model)
+        if finish_reason is None:
+            return prefix + _dumps(delta) + _TAIL_OPEN
+        return TerminalChunk(prefix + _dumps(delta) + self._tail(finish_reason))
+
+
+# Shared encoder instance
+stream_encoder = StreamChunkEncoder()
@@ -0,0 +1,224 @@
+"""Fan-out hub between generation flows and SSE subscribers
+
+A generation runs as its own asyncio task (the producer) and publishes each
+SSE chunk once. Every subscriber has a bounded buffer: when a slow client
+falls behind, the oldest intermediate (progress) chunks are dropped so the
+newest state survives, while terminal chunks (final content, errors,
+[DONE]; the producer tags them as stream_encoder.TerminalChunk) are always
+delivered. Slow clients therefore never stall upstream
+polling, and several viewers can follow the same task.
+
+Topics are created per request; once the upstream task ID is known the
+generation flow binds it (bind_task_id) so other viewers can attach with
+GET /v1/tasks/{task_id}/events.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Set
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..core.metrics import STREAM_SUBSCRIBERS, STREAM_EVENTS_DROPPED
+from .stream_encoder import TerminalChunk
+
+HEARTBEAT = ": keepalive\n\n"
+
+_current_topic: ContextVar[Optional["_Topic"]] = ContextVar("current_topic", default=None)
+
+
+class _Event:
+    __slots__ = ("data", "terminal")
+
+    def __init__(self, data: str, terminal: bool):
+        self.data = data
+        self.terminal = terminal
+
+
+class _Subscriber:
+    """Bounded per-client buffer"""
+
+    def __init__(self, max_buffer: int):
+        self.max_buffer = max(1, max_buffer)
+        self.buffer: Deque[_Event] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+
+    def push(self, event: _Event):
+        if not event.terminal and len(self.buffer) >= self.max_buffer:
+            # Laggard: drop the oldest intermediate chunk (terminal ones stay)
+            for i, pending in enumerate(self.buffer):
+                if not pending.terminal:
+                    del self.buffer[i]
+                    self.dropped += 1
+                    STREAM_EVENTS_DROPPED.inc()
+                    break
+        self.buffer.append(event)
+        self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+
+class _Topic:
+    """One generation: its producer task, subscribers and replay state"""
+
+    def __init__(self, topic_id: str):
+        self.topic_id = topic_id
+        self.task_id: Optional[str] = None
+        self.producer: Optional[asyncio.Task] = None
+        self.subscribers: Set[_Subscriber] = set()
+        self.last_progress: Optional[_Event] = None
+        self.terminal_events: List[_Event] = []
+        self.finished_at: Optional[float] = None
+        self.keep_alive = False
+        self._detach_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+
+class TaskEventHub:
+    """Publishes generation chunks to any number of SSE subscribers"""
+
+    def __init__(self):
+        self._topics: Dict[str, _Topic] = {}
+
+    # ---------- producer side ----------
+
+    def start(self, source: AsyncIterator[str], topic_id: Optional[str] = None,
+              keep_alive: bool = False) -> str:
+        """Run `source` as a background producer, returns the topic ID to subscribe to
+
+        Args:
+            source: Chunk stream of the generation
+            topic_id: Use this ID instead of a generated one
+            keep_alive: Keep producing when no subscriber is attached (background jobs)
+        """
+        self._collect_finished()
+        topic = _Topic(topic_id or f"gen_{os.urandom(12).hex()}")
+        topic.keep_alive = keep_alive
+        self._topics[topic.topic_id] = topic
+        topic.producer = asyncio.create_task(self._produce(topic, source))
+        return topic.topic_id
+
+    async def _produce(self, topic: _Topic, source: AsyncIterator[str]):
+        _current_topic.set(topic)
+        try:
+            async for chunk in source:
+                self._publish(topic, _Event(chunk, isinstance(chunk, TerminalChunk)))
+        except asyncio.CancelledError:
+            debug_logger.log_info("Generation %s cancelled (no subscribers left)", topic.task_id or topic.topic_id)
+            raise
+        except Exception as e:
+            debug_logger.log_error(
+                error_message=f"Generation stream {topic.task_id or topic.topic_id} failed: {str(e)}",
+                status_code=500,
+                response_text=str(e)
+            )
+        finally:
+            topic.finished_at = time.monotonic()
+            for subscriber in list(topic.subscribers):
+                subscriber.close()
+
+    def _publish(self, topic: _Topic, event: _Event):
+        if event.terminal:
+            topic.terminal_events.append(event)
+        else:
+            topic.last_progress = event
+        for subscriber in topic.subscribers:
+            subscriber.push(event)
+
+    def bind_task_id(self, task_id: str):
+        """Make the current generation reachable by its upstream task ID"""
+        topic = _current_topic.get()
+        if topic is None or not task_id:
+            return
+        topic.task_id = task_id
+        self._topics[task_id] = topic
+
+    # ---------- subscriber side ----------
+
+    def subscribe(self, topic_id: str, replay: bool = False) -> Optional[AsyncGenerator[str, None]]:
+        """Attach a subscriber and return its chunk stream (None for an unknown topic)
+
+        The subscriber is registered immediately, so nothing published between
+        this call and the first iteration is lost.
+
+        Args:
+            topic_id: ID returned by start() or a bound upstream task ID
+            replay: Start with the latest progress chunk and terminal chunks so far
+                    (for viewers attaching to a running task)
+        """
+        topic = self._topics.get(topic_id)
+        if topic is None:
+            return None
+
+        subscriber = _Subscriber(config.stream_subscriber_buffer)
+        if replay:
+            if topic.last_progress is not None:
+                subscriber.push(topic.last_progress)
+            for event in topic.terminal_events:
+                subscriber.push(event)
+        if topic.finished:
+            subscriber.close()
+        else:
+            topic.subscribers.add(subscriber)
+            STREAM_SUBSCRIBERS.inc()
+            if topic._detach_handle is not None:
+                topic._detach_handle.cancel()
+                topic._detach_handle = None
+        return self._iterate(topic, subscriber)
+
+    async def _iterate(self, topic: _Topic, subscriber: _Subscriber) -> AsyncGenerator[str, None]:
+        heartbeat = config.stream_heartbeat_seconds
+        try:
+            while True:
+                if subscriber.buffer:
+                    yield subscriber.buffer.popleft().data
+                    continue
+                if subscriber.closed:
+                    break
+                subscriber.wakeup.clear()
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), timeout=heartbeat if heartbeat > 0 else None)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            if subscriber in topic.subscribers:
+                topic.subscribers.discard(subscriber)
+                STREAM_SUBSCRIBERS.dec()
+            if subscriber.dropped:
+                debug_logger.log_info("Subscriber of %s fell behind, %s progress chunks dropped",
+                                      topic.task_id or topic.topic_id, subscriber.dropped)
+            if not topic.subscribers and not topic.finished and not topic.keep_alive:
+                self._schedule_detach(topic)
+
+    def _schedule_detach(self, topic: _Topic):
+        """Cancel the producer if nobody re-attaches within the grace period"""
+        def detach():
+            topic._detach_handle = None
+            if not topic.subscribers and topic.producer is not None and not topic.producer.done():
+                topic.producer.cancel()
+
+        grace = config.stream_detach_grace_seconds
+        if grace <= 0:
+            detach()
+        else:
+            topic._detach_handle = asyncio.get_running_loop().call_later(grace, detach)
+
+    def _collect_finished(self):
+        """Forget topics that finished longer than the retention period ago"""
+        cutoff = time.monotonic() - config.stream_retention_seconds
+        stale = [key for key, topic in self._topics.items()
+                 if topic.finished_at is not None and topic.finished_at < cutoff]
+        for key in stale:
+            del self._topics[key]
+
+
+# Global hub instance
+task_event_hub = TaskEventHub()
@@ -1,23 +1,34 @@
 """Token lock manager for image generation"""
-import asyncio
+import secrets
 import time
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from ..core.logger import debug_logger
+from .coordination import CoordinationBackend, coordination
 
 
 class TokenLock:
-    """Token lock manager for image generation (single-threaded per token)"""
+    """Token lock manager for image generation (single-threaded per token)
+
+    Locks live in the coordination backend, so they stay exclusive across
+    workers when a shared backend is configured.
+    """
     
-    def __init__(self, lock_timeout: int = 300):
+    def __init__(self, lock_timeout: int = 300, backend: Optional[CoordinationBackend] = None):
         """
         Initialize token lock manager
         
         Args:
             lock_timeout: Lock timeout in seconds (default: 300s = 5 minutes)
+            backend: Coordination backend (default: the configured global one)
         """
         self.lock_timeout = lock_timeout
-        self._locks: Dict[int, float] = {}  # token_id -> lock_timestamp
-        self._lock = asyncio.Lock()  # Protect _locks dict
+        self.backend = backend or coordination
+        # token_id -> (lock_timestamp, owner value) of the locks taken by this process
+        self._held: Dict[int, Tuple[float, str]] = {}
+
+    @staticmethod
+    def _key(token_id: int) -> str:
+        return f"lock:image:{token_id}"
     
     async def acquire_lock(self, token_id: int) -> bool:
         """
@@ -29,40 +40,32 @@ class TokenLock:
         Returns:
             True if lock acquired, False if already locked
         """
-        async with self._lock:
-            current_time = time.time()
-            
-            # Check if token is locked
-            if token_id in self._locks:
-                lock_time = self._locks[token_id]
-                
-                # Check if lock expired
-                if current_time - lock_time > self.lock_timeout:
-                    # Lock expired, remove it
-                    debug_logger.log_info(f"Token {token_id} lock expired, releasing")
-                    del self._locks[token_id]
-                else:
-                    # Lock still valid
-                    remaining = self.lock_timeout - (current_time - lock_time)
-                    debug_logger.log_info(f"Token {token_id} is locked, remaining: {remaining:.1f}s")
-                    return False
-            
-            # Acquire lock
-            self._locks[token_id] = current_time
-            debug_logger.log_info(f"Token {token_id} lock acquired")
-            return True
+        # An expired lock is taken over by the backend (TTL = lock_timeout)
+        owner = secrets.token_hex(8)
+        if not await self.backend.acquire(self._key(token_id), self.lock_timeout, owner):
+            debug_logger.log_info("Token %s is locked", token_id)
+            return False
+        self._held[token_id] = (time.time(), owner)
+        debug_logger.log_info("Token %s lock acquired", token_id)
+        return True
     
     async def release_lock(self, token_id: int):
         """
         Release lock for token
+
+        Only the lock this process acquired is released: after the lock
+        expired, another worker may hold it.
         
         Args:
             token_id: Token ID
         """
-        async with self._lock:
-            if token_id in self._locks:
-                del self._locks[token_id]
-                debug_logger.log_info(f"Token {token_id} lock released")
+        held = self._held.pop(token_id, None)
+        if held is None:
+            return
+        if await self.backend.release(self._key(token_id), held[1]):
+            debug_logger.log_info("Token %s lock released", token_id)
+        else:
+            debug_logger.log_info("Token %s lock had expired and is no longer ours, left in place", token_id)
     
     async def is_locked(self, token_id: int) -> bool:
         """
@@ -74,44 +77,26 @@ class TokenLock:
         Returns:
             True if locked, False otherwise
         """
-        async with self._lock:
-            if token_id not in self._locks:
-                return False
-            
-            current_time = time.time()
-            lock_time = self._locks[token_id]
-            
-            # Check if expired
-            if current_time - lock_time > self.lock_timeout:
-                # Expired, remove lock
-                del self._locks[token_id]
-                return False
-            
-            return True
+        return await self.backend.exists(self._key(token_id))
     
     async def cleanup_expired_locks(self):
-        """Clean up expired locks"""
-        async with self._lock:
-            current_time = time.time()
-            expired_tokens = []
-            
-            for token_id, lock_time in self._locks.items():
-                if current_time - lock_time > self.lock_timeout:
-                    expired_tokens.append(token_id)
-            
-            for token_id in expired_tokens:
-                del self._locks[token_id]
-                debug_logger.log_info(f"Cleaned up expired lock for token {token_id}")
-            
-            if expired_tokens:
-                debug_logger.log_info(f"Cleaned up {len(expired_tokens)} expired locks")
+        """Clean up expired locks (the backend expires them, this forgets local bookkeeping)"""
+        current_time = time.time()
+        expired_tokens = [token_id for token_id, (lock_time, _) in self._held.items()
+                          if current_time - lock_time > self.lock_timeout]
+        for token_id in expired_tokens:
+            del self._held[token_id]
+            debug_logger.log_info("Cleaned up expired lock for token %s", token_id)
+        if expired_tokens:
+            debug_logger.log_info("Cleaned up %s expired locks", len(expired_tokens))
     
     def get_locked_tokens(self) -> list:
-        """Get list of currently locked token IDs"""
-        return list(self._locks.keys())
+        """Get list of token IDs currently locked by this process"""
+        current_time = time.time()
+        return [token_id for token_id, (lock_time, _) in self._held.items()
+                if current_time - lock_time <= self.lock_timeout]
 
     def set_lock_timeout(self, timeout: int):
         """Set lock timeout in seconds"""
         self.lock_timeout = timeout
-        debug_logger.log_info(f"Lock timeout updated to {timeout} seconds")
-
+        debug_logger.log_info("Lock timeout updated to %s seconds", timeout)
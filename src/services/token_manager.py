@@ -5,12 +5,13 @@ import random
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from curl_cffi.requests import AsyncSession
-from faker import Faker
 from ..core.database import Database
 from ..core.models import Token, TokenStats
 from ..core.config import config
 from .proxy_manager import ProxyManager
+from .circuit_breaker import CircuitBreaker, classify_error, ERROR_AUTH
 from ..core.logger import debug_logger
+from ..core.metrics import ERRORS_TOTAL
 
 class TokenManager:
     """Token lifecycle manager"""
@@ -19,8 +20,16 @@ class TokenManager:
         self.db = db
         self._lock = asyncio.Lock()
         self.proxy_manager = ProxyManager(db)
-        self.fake = Faker()
+        self.circuit_breaker = CircuitBreaker()
+        self._fake = None  # Faker is slow to import/build; created on first username
     
+    @property
+    def fake(self):
+        if self._fake is None:
+            from faker import Faker
+            self._fake = Faker()
+        return self._fake
+
     async def decode_jwt(self, token: str) -> dict:
         """Decode JWT token without verification"""
         try:
@@ -108,7 +117,7 @@ class TokenManager:
         }
 
         async with AsyncSession() as session:
-            url = "https://sora.chatgpt.com/backend/billing/subscriptions"
+            url = f"{config.sora_base_url}/billing/subscriptions"
             print(f"📡 请求 URL: {url}")
             print(f"🔑 使用 Token: {token[:30]}...")
 
@@ -186,7 +195,7 @@ class TokenManager:
                 print(f"🌐 使用代理: {proxy_url}")
 
             response = await session.get(
-                "https://sora.chatgpt.com/backend/project_y/invite/mine",
+                f"{config.sora_base_url}/project_y/invite/mine",
                 **kwargs
             )
 
@@ -222,7 +231,7 @@ class TokenManager:
                         # Try to activate Sora2
                         try:
                             activate_response = await session.get(
-                                "https://sora.chatgpt.com/backend/m/bootstrap",
+                                f"{config.sora_base_url}/m/bootstrap",
                                 **kwargs
                             )
 
@@ -231,7 +240,7 @@ class TokenManager:
 
                                 # Retry getting invite code
                                 retry_response = await session.get(
-                                    "https://sora.chatgpt.com/backend/project_y/invite/mine",
+                                    f"{config.sora_base_url}/project_y/invite/mine",
                                     **kwargs
                                 )
 
@@ -294,7 +303,7 @@ class TokenManager:
                 print(f"🌐 使用代理: {proxy_url}")
 
             response = await session.get(
-                "https://sora.chatgpt.com/backend/nf/check",
+                f"{config.sora_base_url}/nf/check",
                 **kwargs
             )
 
@@ -352,7 +361,7 @@ class TokenManager:
                 print(f"🌐 使用代理: {proxy_url}")
 
             response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/profile/username/check",
+                f"{config.sora_base_url}/project_y/profile/username/check",
                 **kwargs
             )
 
@@ -400,7 +409,7 @@ class TokenManager:
                 print(f"🌐 使用代理: {proxy_url}")
 
             response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/profile/username/set",
+                f"{config.sora_base_url}/project_y/profile/username/set",
                 **kwargs
             )
 
@@ -448,7 +457,7 @@ class TokenManager:
                 print(f"🌐 使用代理: {proxy_url}")
 
             response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/invite/accept",
+                f"{config.sora_base_url}/project_y/invite/accept",
                 **kwargs
             )
 
@@ -468,7 +477,7 @@ class TokenManager:
 
     async def st_to_at(self, session_token: str) -> dict:
         """Convert Session Token to Access Token"""
-        debug_logger.log_info(f"[ST_TO_AT] 开始转换 Session Token 为 Access Token...")
+        debug_logger.log_info("[ST_TO_AT] 开始转换 Session Token 为 Access Token...")
         proxy_url = await self.proxy_manager.get_proxy_url()
 
         async with AsyncSession() as session:
@@ -487,40 +496,40 @@ class TokenManager:
 
             if proxy_url:
                 kwargs["proxy"] = proxy_url
-                debug_logger.log_info(f"[ST_TO_AT] 使用代理: {proxy_url}")
+                debug_logger.log_info("[ST_TO_AT] 使用代理: %s", proxy_url)
 
             url = "https://sora.chatgpt.com/api/auth/session"
-            debug_logger.log_info(f"[ST_TO_AT] 📡 请求 URL: {url}")
+            debug_logger.log_info("[ST_TO_AT] 📡 请求 URL: %s", url)
 
             try:
                 response = await session.get(url, **kwargs)
-                debug_logger.log_info(f"[ST_TO_AT] 📥 响应状态码: {response.status_code}")
+                debug_logger.log_info("[ST_TO_AT] 📥 响应状态码: %s", response.status_code)
 
                 if response.status_code != 200:
                     error_msg = f"Failed to convert ST to AT: {response.status_code}"
-                    debug_logger.log_info(f"[ST_TO_AT] ❌ {error_msg}")
-                    debug_logger.log_info(f"[ST_TO_AT] 响应内容: {response.text[:500]}")
+                    debug_logger.log_info("[ST_TO_AT] ❌ %s", error_msg)
+                    debug_logger.log_info("[ST_TO_AT] 响应内容: %s", response.text[:500])
                     raise ValueError(error_msg)
 
                 # 获取响应文本用于调试
                 response_text = response.text
-                debug_logger.log_info(f"[ST_TO_AT] 📄 响应内容: {response_text[:500]}")
+                debug_logger.log_info("[ST_TO_AT] 📄 响应内容: %s", response_text[:500])
 
                 # 检查响应是否为空
                 if not response_text or response_text.strip() == "":
-                    debug_logger.log_info(f"[ST_TO_AT] ❌ 响应体为空")
+                    debug_logger.log_info("[ST_TO_AT] ❌ 响应体为空")
                     raise ValueError("Response body is empty")
 
                 try:
                     data = response.json()
                 except Exception as json_err:
-                    debug_logger.log_info(f"[ST_TO_AT] ❌ JSON解析失败: {str(json_err)}")
-                    debug_logger.log_info(f"[ST_TO_AT] 原始响应: {response_text[:1000]}")
+                    debug_logger.log_info("[ST_TO_AT] ❌ JSON解析失败: %s", str(json_err))
+                    debug_logger.log_info("[ST_TO_AT] 原始响应: %s", response_text[:1000])
                     raise ValueError(f"Failed to parse JSON response: {str(json_err)}")
 
                 # 检查data是否为None
                 if data is None:
-                    debug_logger.log_info(f"[ST_TO_AT] ❌ 响应JSON为空")
+                    debug_logger.log_info("[ST_TO_AT] ❌ 响应JSON为空")
                     raise ValueError("Response JSON is empty")
 
                 access_token = data.get("accessToken")
@@ -529,13 +538,13 @@ class TokenManager:
 
                 # 检查必要字段
                 if not access_token:
-                    debug_logger.log_info(f"[ST_TO_AT] ❌ 响应中缺少 accessToken 字段")
-                    debug_logger.log_info(f"[ST_TO_AT] 响应数据: {data}")
+                    debug_logger.log_info("[ST_TO_AT] ❌ 响应中缺少 accessToken 字段")
+                    debug_logger.log_info("[ST_TO_AT] 响应数据: %s", data)
                     raise ValueError("Missing accessToken in response")
 
-                debug_logger.log_info(f"[ST_TO_AT] ✅ ST 转换成功")
-                debug_logger.log_info(f"  - Email: {email}")
-                debug_logger.log_info(f"  - 过期时间: {expires}")
+                debug_logger.log_info("[ST_TO_AT] ✅ ST 转换成功")
+                debug_logger.log_info("  - Email: %s", email)
+                debug_logger.log_info("  - 过期时间: %s", expires)
 
                 return {
                     "access_token": access_token,
@@ -543,7 +552,7 @@ class TokenManager:
                     "expires": expires
                 }
             except Exception as e:
-                debug_logger.log_info(f"[ST_TO_AT] 🔴 异常: {str(e)}")
+                debug_logger.log_info("[ST_TO_AT] 🔴 异常: %s", str(e))
                 raise
     
     async def rt_to_at(self, refresh_token: str, client_id: Optional[str] = None) -> dict:
@@ -556,8 +565,8 @@ class TokenManager:
         # Use provided client_id or default
         effective_client_id = client_id or "app_LlGpXReQgckcGGUo2JrYvtJK"
 
-        debug_logger.log_info(f"[RT_TO_AT] 开始转换 Refresh Token 为 Access Token...")
-        debug_logger.log_info(f"[RT_TO_AT] 使用 Client ID: {effective_client_id[:20]}...")
+        debug_logger.log_info("[RT_TO_AT] 开始转换 Refresh Token 为 Access Token...")
+        debug_logger.log_info("[RT_TO_AT] 使用 Client ID: %s...", effective_client_id[:20])
         proxy_url = await self.proxy_manager.get_proxy_url()
 
         async with AsyncSession() as session:
@@ -580,40 +589,40 @@ class TokenManager:
 
             if proxy_url:
                 kwargs["proxy"] = proxy_url
-                debug_logger.log_info(f"[RT_TO_AT] 使用代理: {proxy_url}")
+                debug_logger.log_info("[RT_TO_AT] 使用代理: %s", proxy_url)
 
             url = "https://auth.openai.com/oauth/token"
-            debug_logger.log_info(f"[RT_TO_AT] 📡 请求 URL: {url}")
+            debug_logger.log_info("[RT_TO_AT] 📡 请求 URL: %s", url)
 
             try:
                 response = await session.post(url, **kwargs)
-                debug_logger.log_info(f"[RT_TO_AT] 📥 响应状态码: {response.status_code}")
+                debug_logger.log_info("[RT_TO_AT] 📥 响应状态码: %s", response.status_code)
 
                 if response.status_code != 200:
                     error_msg = f"Failed to convert RT to AT: {response.status_code}"
-                    debug_logger.log_info(f"[RT_TO_AT] ❌ {error_msg}")
-                    debug_logger.log_info(f"[RT_TO_AT] 响应内容: {response.text[:500]}")
+                    debug_logger.log_info("[RT_TO_AT] ❌ %s", error_msg)
+                    debug_logger.log_info("[RT_TO_AT] 响应内容: %s", response.text[:500])
                     raise ValueError(f"{error_msg} - {response.text}")
 
                 # 获取响应文本用于调试
                 response_text = response.text
-                debug_logger.log_info(f"[RT_TO_AT] 📄 响应内容: {response_text[:500]}")
+                debug_logger.log_info("[RT_TO_AT] 📄 响应内容: %s", response_text[:500])
 
                 # 检查响应是否为空
                 if not response_text or response_text.strip() == "":
-                    debug_logger.log_info(f"[RT_TO_AT] ❌ 响应体为空")
+                    debug_logger.log_info("[RT_TO_AT] ❌ 响应体为空")
                     raise ValueError("Response body is empty")
 
                 try:
                     data = response.json()
                 except Exception as json_err:
-                    debug_logger.log_info(f"[RT_TO_AT] ❌ JSON解析失败: {str(json_err)}")
-                    debug_logger.log_info(f"[RT_TO_AT] 原始响应: {response_text[:1000]}")
+                    debug_logger.log_info("[RT_TO_AT] ❌ JSON解析失败: %s", str(json_err))
+                    debug_logger.log_info("[RT_TO_AT] 原始响应: %s", response_text[:1000])
                     raise ValueError(f"Failed to parse JSON response: {str(json_err)}")
 
                 # 检查data是否为None
                 if data is None:
-                    debug_logger.log_info(f"[RT_TO_AT] ❌ 响应JSON为空")
+                    debug_logger.log_info("[RT_TO_AT] ❌ 响应JSON为空")
                     raise ValueError("Response JSON is empty")
 
                 access_token = data.get("access_token")
@@ -622,13 +631,13 @@ class TokenManager:
 
                 # 检查必要字段
                 if not access_token:
-                    debug_logger.log_info(f"[RT_TO_AT] ❌ 响应中缺少 access_token 字段")
-                    debug_logger.log_info(f"[RT_TO_AT] 响应数据: {data}")
+                    debug_logger.log_info("[RT_TO_AT] ❌ 响应中缺少 access_token 字段")
+                    debug_logger.log_info("[RT_TO_AT] 响应数据: %s", data)
                     raise ValueError("Missing access_token in response")
 
-                debug_logger.log_info(f"[RT_TO_AT] ✅ RT 转换成功")
-                debug_logger.log_info(f"  - 新 Access Token 有效期: {expires_in} 秒")
-                debug_logger.log_info(f"  - Refresh Token 已更新: {'是' if new_refresh_token else '否'}")
+                debug_logger.log_info("[RT_TO_AT] ✅ RT 转换成功")
+                debug_logger.log_info("  - 新 Access Token 有效期: %s 秒", expires_in)
+                debug_logger.log_info("  - Refresh Token 已更新: %s", '是' if new_refresh_token else '否')
 
                 return {
                     "access_token": access_token,
@@ -636,7 +645,7 @@ class TokenManager:
                     "expires_in": expires_in
                 }
             except Exception as e:
-                debug_logger.log_info(f"[RT_TO_AT] 🔴 异常: {str(e)}")
+                debug_logger.log_info("[RT_TO_AT] 🔴 异常: %s", str(e))
                 raise
     
     async def add_token(self, token_value: str,
@@ -913,6 +922,7 @@ class TokenManager:
         await self.db.update_token_status(token_id, True)
         # Reset error count when enabling (in token_stats table)
         await self.db.reset_error_count(token_id)
+        self.circuit_breaker.reset(token_id)
 
     async def disable_token(self, token_id: int):
         """Disable a token"""
@@ -982,20 +992,31 @@ class TokenManager:
         else:
             await self.db.increment_image_count(token_id)
     
-    async def record_error(self, token_id: int):
-        """Record token error"""
+    async def record_error(self, token_id: int, error: Optional[BaseException] = None):
+        """Record token error
+
+        Transient failures (network, 5xx, 429) only trip the in-memory circuit
+        breaker, which re-admits the token after a cooldown. The token is only
+        disabled permanently after repeated authentication failures.
+        """
         await self.db.increment_error_count(token_id)
 
+        error_class = classify_error(error)
+        ERRORS_TOTAL.inc(error_class)
+        self.circuit_breaker.record_failure(token_id, error_class)
+        if error_class != ERROR_AUTH:
+            return
+
         # Check if should ban
-        stats = await self.db.get_token_stats(token_id)
         admin_config = await self.db.get_admin_config()
-
-        if stats and stats.consecutive_error_count >= admin_config.error_ban_threshold:
+        if self.circuit_breaker.consecutive_auth_failures(token_id) >= admin_config.error_ban_threshold:
             await self.db.update_token_status(token_id, False)
+            debug_logger.log_info("Token %s disabled after repeated authentication failures", token_id)
     
     async def record_success(self, token_id: int, is_video: bool = False):
         """Record successful request (reset error count)"""
         await self.db.reset_error_count(token_id)
+        self.circuit_breaker.record_success(token_id)
 
         # Update Sora2 remaining count after video generation
         if is_video:
@@ -1051,40 +1072,40 @@ class TokenManager:
         """
         try:
             # 📍 Step 1: 获取Token数据
-            debug_logger.log_info(f"[AUTO_REFRESH] 开始检查Token {token_id}...")
+            debug_logger.log_info("[AUTO_REFRESH] 开始检查Token %s...", token_id)
             token_data = await self.db.get_token(token_id)
 
             if not token_data:
-                debug_logger.log_info(f"[AUTO_REFRESH] ❌ Token {token_id} 不存在")
+                debug_logger.log_info("[AUTO_REFRESH] ❌ Token %s 不存在", token_id)
                 return False
 
             # 📍 Step 2: 检查是否有过期时间
             if not token_data.expiry_time:
-                debug_logger.log_info(f"[AUTO_REFRESH] ⏭️  Token {token_id} 无过期时间，跳过刷新")
+                debug_logger.log_info("[AUTO_REFRESH] ⏭️  Token %s 无过期时间，跳过刷新", token_id)
                 return False, "no_expiry"
 
             # 📍 Step 3: 计算剩余时间
             time_until_expiry = token_data.expiry_time - datetime.now()
             hours_until_expiry = time_until_expiry.total_seconds() / 3600
 
-            debug_logger.log_info(f"[AUTO_REFRESH] ⏰ Token {token_id} 信息:")
-            debug_logger.log_info(f"  - Email: {token_data.email}")
-            debug_logger.log_info(f"  - 过期时间: {token_data.expiry_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            debug_logger.log_info(f"  - 剩余时间: {hours_until_expiry:.2f} 小时")
-            debug_logger.log_info(f"  - 是否激活: {token_data.is_active}")
-            debug_logger.log_info(f"  - 有ST: {'是' if token_data.st else '否'}")
-            debug_logger.log_info(f"  - 有RT: {'是' if token_data.rt else '否'}")
+            debug_logger.log_info("[AUTO_REFRESH] ⏰ Token %s 信息:", token_id)
+            debug_logger.log_info("  - Email: %s", token_data.email)
+            debug_logger.log_info("  - 过期时间: %s", token_data.expiry_time.strftime('%Y-%m-%d %H:%M:%S'))
+            debug_logger.log_info("  - 剩余时间: %.2f 小时", hours_until_expiry)
+            debug_logger.log_info("  - 是否激活: %s", token_data.is_active)
+            debug_logger.log_info("  - 有ST: %s", '是' if token_data.st else '否')
+            debug_logger.log_info("  - 有RT: %s", '是' if token_data.rt else '否')
 
             # 📍 Step 4: 检查是否需要刷新
             if hours_until_expiry > 24 and not force:
-                debug_logger.log_info(f"[AUTO_REFRESH] ⏭️  Token {token_id} 剩余时间 > 24小时，无需刷新")
+                debug_logger.log_info("[AUTO_REFRESH] ⏭️  Token %s 剩余时间 > 24小时，无需刷新", token_id)
                 return False, "too_far"
 
             # 📍 Step 5: 触发刷新
             if hours_until_expiry < 0:
-                debug_logger.log_info(f"[AUTO_REFRESH] 🔴 Token {token_id} 已过期，尝试自动刷新...")
+                debug_logger.log_info("[AUTO_REFRESH] 🔴 Token %s 已过期，尝试自动刷新...", token_id)
             else:
-                debug_logger.log_info(f"[AUTO_REFRESH] 🟡 Token {token_id} 将在 {hours_until_expiry:.2f} 小时后过期，尝试自动刷新...")
+                debug_logger.log_info("[AUTO_REFRESH] 🟡 Token %s 将在 %.2f 小时后过期，尝试自动刷新...", token_id, hours_until_expiry)
 
             # Priority: ST > RT
             new_at = None
@@ -1095,33 +1116,33 @@ class TokenManager:
             # 📍 Step 6: 尝试使用ST刷新
             if token_data.st:
                 try:
-                    debug_logger.log_info(f"[AUTO_REFRESH] 📝 Token {token_id}: 尝试使用 ST 刷新...")
+                    debug_logger.log_info("[AUTO_REFRESH] 📝 Token %s: 尝试使用 ST 刷新...", token_id)
                     result = await self.st_to_at(token_data.st)
                     new_at = result.get("access_token")
                     new_st = token_data.st  # ST refresh doesn't return new ST, so keep the old one
                     refresh_method = "ST"
-                    debug_logger.log_info(f"[AUTO_REFRESH] ✅ Token {token_id}: 使用 ST 刷新成功")
+                    debug_logger.log_info("[AUTO_REFRESH] ✅ Token %s: 使用 ST 刷新成功", token_id)
                 except Exception as e:
-                    debug_logger.log_info(f"[AUTO_REFRESH] ❌ Token {token_id}: 使用 ST 刷新失败 - {str(e)}")
+                    debug_logger.log_info("[AUTO_REFRESH] ❌ Token %s: 使用 ST 刷新失败 - %s", token_id, str(e))
                     new_at = None
 
             # 📍 Step 7: 如果ST失败，尝试使用RT
             if not new_at and token_data.rt:
                 try:
-                    debug_logger.log_info(f"[AUTO_REFRESH] 📝 Token {token_id}: 尝试使用 RT 刷新...")
+                    debug_logger.log_info("[AUTO_REFRESH] 📝 Token %s: 尝试使用 RT 刷新...", token_id)
                     result = await self.rt_to_at(token_data.rt, client_id=token_data.client_id)
                     new_at = result.get("access_token")
                     new_rt = result.get("refresh_token", token_data.rt)  # RT might be updated
                     refresh_method = "RT"
-                    debug_logger.log_info(f"[AUTO_REFRESH] ✅ Token {token_id}: 使用 RT 刷新成功")
+                    debug_logger.log_info("[AUTO_REFRESH] ✅ Token %s: 使用 RT 刷新成功", token_id)
                 except Exception as e:
-                    debug_logger.log_info(f"[AUTO_REFRESH] ❌ Token {token_id}: 使用 RT 刷新失败 - {str(e)}")
+                    debug_logger.log_info("[AUTO_REFRESH] ❌ Token %s: 使用 RT 刷新失败 - %s", token_id, str(e))
                     new_at = None
 
             # 📍 Step 8: 处理刷新结果
             if new_at:
                 # 刷新成功: 更新Token
-                debug_logger.log_info(f"[AUTO_REFRESH] 💾 Token {token_id}: 保存新的 Access Token...")
+                debug_logger.log_info("[AUTO_REFRESH] 💾 Token %s: 保存新的 Access Token...", token_id)
                 await self.update_token(token_id, token=new_at, st=new_st, rt=new_rt)
 
                 # 获取更新后的Token信息
@@ -1129,25 +1150,25 @@ class TokenManager:
                 new_expiry_time = updated_token.expiry_time
                 new_hours_until_expiry = ((new_expiry_time - datetime.now()).total_seconds() / 3600) if new_expiry_time else -1
 
-                debug_logger.log_info(f"[AUTO_REFRESH] ✅ Token {token_id} 已自动刷新成功")
-                debug_logger.log_info(f"  - 刷新方式: {refresh_method}")
-                debug_logger.log_info(f"  - 新过期时间: {new_expiry_time.strftime('%Y-%m-%d %H:%M:%S') if new_expiry_time else 'N/A'}")
-                debug_logger.log_info(f"  - 新剩余时间: {new_hours_until_expiry:.2f} 小时")
+                debug_logger.log_info("[AUTO_REFRESH] ✅ Token %s 已自动刷新成功", token_id)
+                debug_logger.log_info("  - 刷新方式: %s", refresh_method)
+                debug_logger.log_info("  - 新过期时间: %s", new_expiry_time.strftime('%Y-%m-%d %H:%M:%S') if new_expiry_time else 'N/A')
+                debug_logger.log_info("  - 新剩余时间: %.2f 小时", new_hours_until_expiry)
 
                 # 📍 Step 9: 检查刷新后的过期时间
                 if new_hours_until_expiry < 0:
                     # 刷新后仍然过期，禁用Token
-                    debug_logger.log_info(f"[AUTO_REFRESH] 🔴 Token {token_id}: 刷新后仍然过期（剩余时间: {new_hours_until_expiry:.2f} 小时），已禁用")
+                    debug_logger.log_info("[AUTO_REFRESH] 🔴 Token %s: 刷新后仍然过期（剩余时间: %.2f 小时），已禁用", token_id, new_hours_until_expiry)
                     await self.disable_token(token_id)
                     return False
 
                 return True
             else:
                 # 刷新失败: 禁用Token
-                debug_logger.log_info(f"[AUTO_REFRESH] 🚫 Token {token_id}: 无法刷新（无有效的 ST 或 RT），已禁用")
+                debug_logger.log_info("[AUTO_REFRESH] 🚫 Token %s: 无法刷新（无有效的 ST 或 RT），已禁用", token_id)
                 await self.disable_token(token_id)
                 return False
 
         except Exception as e:
-            debug_logger.log_info(f"[AUTO_REFRESH] 🔴 Token {token_id}: 自动刷新异常 - {str(e)}")
+            debug_logger.log_info("[AUTO_REFRESH] 🔴 Token %s: 自动刷新异常 - %s", token_id, str(e))
             return False
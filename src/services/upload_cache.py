@@ -0,0 +1,71 @@
+"""Upload deduplication cache
+
+Maps (token, kind, content SHA-256) to the upstream ID returned for that
+content (media_id for images, cameo_id for character videos), so repeated
+image-to-video requests with the same input skip the upload round trip.
+
+Upstream IDs belong to the account that uploaded them, hence the token in
+the key. Entries expire after [upload_cache] ttl_seconds and are dropped
+as soon as upstream reports the ID as unknown (see UnknownMediaError).
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..core.metrics import UPLOAD_CACHE_LOOKUPS
+
+KIND_IMAGE = "image"
+KIND_CAMEO = "cameo"
+
+_Key = Tuple[int, str, str]
+
+
+class UploadCache:
+    """LRU of upstream upload IDs keyed by token and content hash"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[_Key, Tuple[str, float]]" = OrderedDict()
+
+    @staticmethod
+    def _enabled(token_id: Optional[int], digest: Optional[str]) -> bool:
+        return config.upload_cache_enabled and token_id is not None and bool(digest)
+
+    def get(self, token_id: Optional[int], kind: str, digest: Optional[str]) -> Optional[str]:
+        """Return the cached upstream ID, or None on miss/expiry"""
+        if not self._enabled(token_id, digest):
+            return None
+        key = (token_id, kind, digest)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            UPLOAD_CACHE_LOOKUPS.inc(kind, "miss")
+            return None
+        self._entries.move_to_end(key)
+        UPLOAD_CACHE_LOOKUPS.inc(kind, "hit")
+        debug_logger.log_info("Upload cache hit (%s, token %s): %s", kind, token_id, entry[0])
+        return entry[0]
+
+    def put(self, token_id: Optional[int], kind: str, digest: Optional[str], upstream_id: Optional[str]):
+        if not upstream_id or not self._enabled(token_id, digest):
+            return
+        key = (token_id, kind, digest)
+        self._entries[key] = (upstream_id, time.monotonic() + config.upload_cache_ttl_seconds)
+        self._entries.move_to_end(key)
+        max_entries = max(1, config.upload_cache_max_entries)
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token_id: Optional[int], kind: str, digest: Optional[str]):
+        """Forget an entry (upstream no longer accepts the ID)"""
+        if self._entries.pop((token_id, kind, digest), None) is not None:
+            debug_logger.log_info("Upload cache entry invalidated (%s, token %s)", kind, token_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global cache instance
+upload_cache = UploadCache()
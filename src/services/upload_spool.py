@@ -0,0 +1,424 @@
+"""Disk spool for uploaded media
+
+Large inputs are written to data/uploads in fixed-size chunks and uploaded
+upstream straight from the file (CurlMime local_path), so no step holds the
+whole file in memory. Base64 inputs from JSON requests are decoded
+incrementally into the same spool.
+
+Spooled files are referenced as upload://<id> in chat completion requests.
+The SHA-256 of the content is computed while writing and kept with the
+metadata (used by the upload dedup cache).
+
+Remote URLs (video_url inputs) are streamed into the spool as well; a URL
+ingested within [upload] spool_ttl is served from the existing file.
+
+An upload's age is the mtime of its metadata file: the data file may be a
+hard link to a media cache entry, whose mtime belongs to the cache.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+from curl_cffi.requests import AsyncSession
+from ..core.config import config
+from ..core.logger import debug_logger
+from .sora_errors import SoraAPIError, error_from_response, is_transport_error, wrap_transport_error
+
+UPLOAD_SCHEME = "upload://"
+CHUNK_SIZE = 1024 * 1024
+# Base64 input is sliced on a multiple of 4 characters
+_B64_SLICE = 4 * 256 * 1024
+# Content types that say nothing about the payload (sniffed instead)
+_GENERIC_TYPES = {"", "application/octet-stream", "binary/octet-stream", "application/binary", "text/plain"}
+# Most recently ingested URLs remembered for reuse
+_URL_INDEX_MAX = 1024
+
+
+class UploadTooLargeError(Exception):
+    """Upload exceeds [upload] max_bytes"""
+
+
+class UnknownUploadError(Exception):
+    """upload://<id> does not exist (never uploaded or expired)"""
+
+
+def is_upload_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(UPLOAD_SCHEME)
+
+
+@dataclass
+class SpooledUpload:
+    id: str
+    path: Path
+    size: int
+    content_type: str
+    filename: str
+    sha256: str = ""
+
+    @property
+    def ref(self) -> str:
+        return f"{UPLOAD_SCHEME}{self.id}"
+
+    @property
+    def is_video(self) -> bool:
+        return self.content_type.startswith("video/")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "object": "upload",
+            "url": self.ref,
+            "bytes": self.size,
+            "content_type": self.content_type,
+            "filename": self.filename,
+        }
+
+
+class Base64StreamDecoder:
+    """Incremental base64 decoder (tolerates whitespace and missing padding)"""
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, data) -> bytes:
+        if isinstance(data, str):
+            data = data.encode("ascii")
+        data = self._pending + b"".join(data.split())
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return base64.b64decode(data[:usable]) if usable else b""
+
+    def finish(self) -> bytes:
+        tail, self._pending = self._pending, b""
+        if not tail:
+            return b""
+        return base64.b64decode(tail + b"=" * (-len(tail) % 4))
+
+
+def _append(f, digest, data: bytes):
+    digest.update(data)
+    f.write(data)
+
+
+def file_sha256(path) -> str:
+    """SHA-256 of a file, read in CHUNK_SIZE blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Guess the media type from the first bytes of a file"""
+    if len(head) >= 12 and head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if len(head) >= 12 and head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _strip_data_uri(value: str) -> tuple:
+    """Split 'data:<type>;base64,<payload>' into (content_type, payload offset)"""
+    comma = value.find(",", 0, 256)
+    if comma == -1:
+        return None, 0
+    if value.startswith("data:"):
+        content_type = value[5:comma].split(";", 1)[0] or None
+        return content_type, comma + 1
+    return None, comma + 1
+
+
+class UploadSpool:
+    """Stores uploads on disk and resolves upload:// references"""
+
+    def __init__(self, spool_dir: Optional[str] = None):
+        if spool_dir is None:
+            spool_dir = str(Path(__file__).parent.parent.parent / "data" / "uploads")
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        # Source URL -> (upload ID, ingested at) of recently ingested URLs, oldest first
+        self._url_index: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._url_inflight: Dict[str, asyncio.Future] = {}
+
+    def _new_id(self) -> str:
+        return f"upl_{os.urandom(12).hex()}"
+
+    def _paths(self, upload_id: str) -> tuple:
+        return self.spool_dir / f"{upload_id}.bin", self.spool_dir / f"{upload_id}.json"
+
+    def _finalize(self, upload_id: str, size: int, content_type: str, filename: str,
+                  sha256: str) -> SpooledUpload:
+        data_path, meta_path = self._paths(upload_id)
+        meta = {"size": size, "content_type": content_type, "filename": filename,
+                "sha256": sha256, "created": time.time()}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        debug_logger.log_info("Spooled upload %s (%s bytes, %s)", upload_id, size, content_type)
+        return SpooledUpload(upload_id, data_path, size, content_type, filename, sha256)
+
+    def _remember_url(self, url: str, upload_id: str):
+        """Index an ingested URL, forgetting entries past spool_ttl or beyond _URL_INDEX_MAX"""
+        now = time.time()
+        self._url_index.pop(url, None)
+        self._url_index[url] = (upload_id, now)
+        ttl = config.upload_spool_ttl
+        while self._url_index:
+            _, (_, ingested_at) = next(iter(self._url_index.items()))
+            if len(self._url_index) <= _URL_INDEX_MAX and (ttl <= 0 or ingested_at >= now - ttl):
+                break
+            self._url_index.popitem(last=False)
+
+    def _discard(self, upload_id: str):
+        for path in self._paths(upload_id):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], content_type: Optional[str],
+                          filename: Optional[str] = None) -> SpooledUpload:
+        """Write an async byte stream (e.g. request.stream()) to the spool
+
+        A missing or generic content_type is sniffed from the first bytes.
+
+        Raises:
+            UploadTooLargeError: More than [upload] max_bytes were received
+        """
+        await asyncio.to_thread(self.cleanup_expired)
+        upload_id = self._new_id()
+        data_path, _ = self._paths(upload_id)
+        max_bytes = config.upload_max_bytes
+        digest = hashlib.sha256()
+        size = 0
+        # Received chunks are small; hash and write them in CHUNK_SIZE batches off the event loop
+        pending = bytearray()
+        try:
+            with open(data_path, "wb") as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if size == 0 and (content_type or "").lower() in _GENERIC_TYPES:
+                        content_type = sniff_content_type(chunk[:64]) or content_type
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                    pending += chunk
+                    if len(pending) >= CHUNK_SIZE:
+                        batch, pending = pending, bytearray()
+                        await asyncio.to_thread(_append, f, digest, batch)
+                if pending:
+                    await asyncio.to_thread(_append, f, digest, pending)
+        except BaseException:
+            self._discard(upload_id)
+            raise
+        return self._finalize(upload_id, size, content_type or "application/octet-stream",
+                              filename or upload_id, digest.hexdigest())
+
+    def lookup_url(self, url: str) -> Optional[SpooledUpload]:
+        """Spooled copy of a recently ingested URL, if still present"""
+        entry = self._url_index.get(url)
+        if entry is None:
+            return None
+        upload_id = entry[0]
+        try:
+            spooled = self.resolve(upload_id)
+        except UnknownUploadError:
+            self._url_index.pop(url, None)
+            return None
+        debug_logger.log_info("Reusing ingested %s for %s", spooled.ref, url)
+        return spooled
+
+    def save_local(self, source: Path, content_type: Optional[str] = None,
+                   source_url: Optional[str] = None) -> SpooledUpload:
+        """Add an existing local file (e.g. a media cache entry) to the spool
+
+        Hard-linked when possible, copied otherwise.
+        """
+        self.cleanup_expired()
+        upload_id = self._new_id()
+        data_path, _ = self._paths(upload_id)
+        try:
+            try:
+                os.link(source, data_path)
+            except OSError:
+                shutil.copyfile(source, data_path)
+            with open(data_path, "rb") as f:
+                head = f.read(64)
+            sha256 = file_sha256(data_path)
+        except BaseException:
+            self._discard(upload_id)
+            raise
+        if (content_type or "").lower() in _GENERIC_TYPES:
+            content_type = sniff_content_type(head) or "application/octet-stream"
+        spooled = self._finalize(upload_id, data_path.stat().st_size, content_type, source.name, sha256)
+        if source_url:
+            self._remember_url(source_url, spooled.id)
+        return spooled
+
+    async def save_url(self, url: str, expected_type: Optional[str] = None,
+                       proxy_url: Optional[str] = None) -> SpooledUpload:
+        """Stream a remote file into the spool (reused if ingested recently)
+
+        Concurrent calls for the same URL share one download.
+
+        Args:
+            url: http(s) URL
+            expected_type: Required content type prefix, e.g. "video/"
+            proxy_url: Proxy for the download
+
+        Raises:
+            UploadTooLargeError: Larger than [upload] max_bytes
+            ValueError: Content type does not match expected_type
+        """
+        spooled = self.lookup_url(url)
+        if spooled is not None:
+            return spooled
+
+        download = self._url_inflight.get(url)
+        if download is None:
+            download = asyncio.ensure_future(self._download_url(url, proxy_url))
+            self._url_inflight[url] = download
+            download.add_done_callback(lambda _: self._url_inflight.pop(url, None))
+        spooled = await asyncio.shield(download)
+        if expected_type and not spooled.content_type.startswith(expected_type):
+            raise ValueError(f"Expected {expected_type}* from {url}, got {spooled.content_type}")
+        return spooled
+
+    async def _download_url(self, url: str, proxy_url: Optional[str]) -> SpooledUpload:
+        debug_logger.log_info("Ingesting remote file: %s", url)
+        kwargs = {"timeout": config.upload_url_timeout, "impersonate": "chrome"}
+        if proxy_url:
+            kwargs["proxy"] = proxy_url
+        max_bytes = config.upload_max_bytes
+        try:
+            async with AsyncSession() as session:
+                async with session.stream("GET", url, **kwargs) as response:
+                    if response.status_code != 200:
+                        raise error_from_response(response.status_code, "", prefix="Download failed")
+                    length = response.headers.get("content-length")
+                    if max_bytes and length and length.isdigit() and int(length) > max_bytes:
+                        raise UploadTooLargeError(f"Remote file exceeds {max_bytes} bytes")
+                    content_type = (response.headers.get("content-type") or "").split(";", 1)[0].strip().lower()
+                    filename = url.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1] or None
+                    spooled = await self.save_stream(response.aiter_content(), content_type, filename)
+        except (SoraAPIError, UploadTooLargeError):
+            raise
+        except Exception as e:
+            if is_transport_error(e):
+                raise wrap_transport_error(e) from e
+            raise
+        self._remember_url(url, spooled.id)
+        return spooled
+
+    def save_base64(self, value: str, default_content_type: str,
+                    filename: Optional[str] = None) -> SpooledUpload:
+        """Decode base64 (optionally a data: URI) into the spool slice by slice
+
+        Only one slice of decoded data is held in memory at a time.
+
+        Raises:
+            ValueError: Invalid base64 payload
+            UploadTooLargeError: Decoded size exceeds [upload] max_bytes
+        """
+        self.cleanup_expired()
+        content_type, offset = _strip_data_uri(value)
+        upload_id = self._new_id()
+        data_path, _ = self._paths(upload_id)
+        max_bytes = config.upload_max_bytes
+        decoder = Base64StreamDecoder()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(data_path, "wb") as f:
+                for start in range(offset, len(value), _B64_SLICE):
+                    decoded = decoder.feed(value[start:start + _B64_SLICE])
+                    size += len(decoded)
+                    if max_bytes and size > max_bytes:
+                        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                    digest.update(decoded)
+                    f.write(decoded)
+                decoded = decoder.finish()
+                size += len(decoded)
+                digest.update(decoded)
+                f.write(decoded)
+        except (binascii.Error, UnicodeEncodeError) as e:
+            self._discard(upload_id)
+            raise ValueError(f"Invalid base64 data: {e}")
+        except BaseException:
+            self._discard(upload_id)
+            raise
+        return self._finalize(upload_id, size, content_type or default_content_type,
+                              filename or upload_id, digest.hexdigest())
+
+    def resolve(self, ref: str) -> SpooledUpload:
+        """Look up an upload:// reference (or bare upload ID)
+
+        Raises:
+            UnknownUploadError: Not found or expired
+        """
+        upload_id = ref[len(UPLOAD_SCHEME):] if is_upload_ref(ref) else ref
+        if not upload_id.startswith("upl_") or not upload_id[4:].isalnum():
+            raise UnknownUploadError(f"Unknown upload: {ref}")
+        data_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise UnknownUploadError(f"Unknown upload: {ref}")
+        if not data_path.exists():
+            raise UnknownUploadError(f"Unknown upload: {ref}")
+        sha256 = meta.get("sha256") or file_sha256(data_path)
+        return SpooledUpload(upload_id, data_path, meta["size"], meta["content_type"], meta["filename"], sha256)
+
+    def delete(self, ref: str):
+        upload_id = ref[len(UPLOAD_SCHEME):] if is_upload_ref(ref) else ref
+        self._discard(upload_id)
+
+    def cleanup_expired(self):
+        """Remove uploads whose metadata is older than [upload] spool_ttl
+
+        Data files without metadata (interrupted writes) go once neither
+        their mtime nor ctime (set by os.link) is within spool_ttl.
+        """
+        ttl = config.upload_spool_ttl
+        if ttl <= 0:
+            return
+        cutoff = time.time() - ttl
+        try:
+            entries = list(os.scandir(self.spool_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.name.endswith(".json"):
+                    if entry.stat().st_mtime < cutoff:
+                        self._discard(entry.name[:-5])
+                elif entry.name.endswith(".bin"):
+                    if self._paths(entry.name[:-4])[1].exists():
+                        continue
+                    stat = entry.stat()
+                    if max(stat.st_mtime, stat.st_ctime) < cutoff:
+                        os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+# Global spool instance
+upload_spool = UploadSpool()
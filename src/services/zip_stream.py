@@ -0,0 +1,275 @@
+"""Streaming ZIP archives built on the fly from cached files
+
+The archive is never written to disk. Entries are stored (ZIP_STORED,
+videos are already compressed) with a data descriptor after each file, so
+the CRC-32 can be computed while the file streams. Everything except the
+CRCs depends only on the names and sizes, which makes the layout (and the
+Content-Length) known before the first byte is read, and every byte range
+reproducible:
+
+    [local header][file data][data descriptor] ... [central directory][end records]
+
+A Range request that starts after a file (descriptor / central directory)
+needs that file's CRC; CRCs computed while streaming are cached, missing
+ones are computed from the file. ZIP64 records are used per entry / for
+the end records only where sizes or offsets need them.
+
+Archives are registered as manifests (names, paths, sizes) in the
+coordination backend, so any worker can serve the download URL.
+"""
+import asyncio
+import json
+import os
+import secrets
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncGenerator, List, Optional, Tuple
+from .coordination import coordination
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_TTL = 3600
+_MANIFEST_PREFIX = "zip:"
+
+_ZIP32_LIMIT = 0xFFFFFFFF
+_FLAGS = 0x08 | 0x800  # data descriptor, UTF-8 names
+_EXTERNAL_ATTR = 0o100644 << 16
+_MADE_BY = (3 << 8) | 45  # unix, spec 4.5
+
+
+class ZipSourceChanged(IOError):
+    """A file changed size or disappeared after the archive was planned"""
+
+
+@dataclass
+class ZipEntry:
+    name: str
+    path: str
+    size: int
+    mtime: float
+
+    @property
+    def zip64(self) -> bool:
+        return self.size >= _ZIP32_LIMIT
+
+
+# (path, size, mtime) -> CRC-32, filled while archives stream
+_crc_cache: "OrderedDict[Tuple[str, int, float], int]" = OrderedDict()
+_CRC_CACHE_MAX = 4096
+
+
+def _cache_crc(entry: ZipEntry, crc: int):
+    key = (entry.path, entry.size, entry.mtime)
+    _crc_cache[key] = crc
+    _crc_cache.move_to_end(key)
+    while len(_crc_cache) > _CRC_CACHE_MAX:
+        _crc_cache.popitem(last=False)
+
+
+def _file_crc(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class StreamingZip:
+    """Byte layout of one archive plus range rendering"""
+
+    def __init__(self, entries: List[ZipEntry]):
+        self.entries = entries
+        # (offset, length, kind, entry index)
+        self._parts: List[Tuple[int, int, str, int]] = []
+        self._offsets: List[int] = []
+        offset = 0
+        for index, entry in enumerate(entries):
+            self._offsets.append(offset)
+            for kind, length in (("local", len(self._local_header(entry))), ("data", entry.size),
+                                 ("descriptor", 24 if entry.zip64 else 16)):
+                if length:
+                    self._parts.append((offset, length, kind, index))
+                offset += length
+        self._central_offset = offset
+        central_length = len(self._central_directory([0] * len(entries)))
+        self._parts.append((offset, central_length, "central", -1))
+        self.size = offset + central_length
+
+    # ---------- records ----------
+
+    @staticmethod
+    def _local_header(entry: ZipEntry) -> bytes:
+        name = entry.name.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry.mtime)
+        if entry.zip64:
+            # Sizes follow in the data descriptor; the zip64 extra announces 8-byte fields
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            version, sizes = 45, _ZIP32_LIMIT
+        else:
+            extra = b""
+            version, sizes = 20, 0
+        return struct.pack("<IHHHHHIIIHH", 0x04034B50, version, _FLAGS, 0, dos_time, dos_date,
+                           0, sizes, sizes, len(name), len(extra)) + name + extra
+
+    @staticmethod
+    def _descriptor(entry: ZipEntry, crc: int) -> bytes:
+        if entry.zip64:
+            return struct.pack("<IIQQ", 0x08074B50, crc, entry.size, entry.size)
+        return struct.pack("<IIII", 0x08074B50, crc, entry.size, entry.size)
+
+    def _central_directory(self, crcs: List[int]) -> bytes:
+        records = []
+        for entry, offset, crc in zip(self.entries, self._offsets, crcs):
+            name = entry.name.encode("utf-8")
+            dos_time, dos_date = _dos_datetime(entry.mtime)
+            zip64_fields = []
+            size32 = entry.size
+            offset32 = offset
+            if entry.size >= _ZIP32_LIMIT:
+                zip64_fields += [entry.size, entry.size]
+                size32 = _ZIP32_LIMIT
+            if offset >= _ZIP32_LIMIT:
+                zip64_fields.append(offset)
+                offset32 = _ZIP32_LIMIT
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = 45 if zip64_fields else 20
+            records.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, _MADE_BY, version, _FLAGS, 0, dos_time, dos_date,
+                crc, size32, size32, len(name), len(extra), 0, 0, 0, _EXTERNAL_ATTR, offset32
+            ) + name + extra)
+        central = b"".join(records)
+
+        count = len(self.entries)
+        central_size = len(central)
+        central_offset = self._central_offset
+        end = b""
+        if count >= 0xFFFF or central_size >= _ZIP32_LIMIT or central_offset >= _ZIP32_LIMIT:
+            zip64_end_offset = central_offset + central_size
+            end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                               count, count, central_size, central_offset)
+            end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        end += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                           min(central_size, _ZIP32_LIMIT), min(central_offset, _ZIP32_LIMIT), 0)
+        return central + end
+
+    async def _crc(self, index: int) -> int:
+        entry = self.entries[index]
+        crc = _crc_cache.get((entry.path, entry.size, entry.mtime))
+        if crc is None:
+            self._check_source(entry)
+            crc = await asyncio.to_thread(_file_crc, entry.path)
+            _cache_crc(entry, crc)
+        return crc
+
+    @staticmethod
+    def _check_source(entry: ZipEntry):
+        """Same size and mtime as when the archive was planned (the key of the CRC cache)"""
+        try:
+            stat = os.stat(entry.path)
+        except OSError:
+            raise ZipSourceChanged(f"{entry.name}: source file is gone")
+        if stat.st_size != entry.size:
+            raise ZipSourceChanged(f"{entry.name}: source file changed size")
+        if stat.st_mtime != entry.mtime:
+            raise ZipSourceChanged(f"{entry.name}: source file was modified")
+
+    # ---------- streaming ----------
+
+    async def _file_range(self, index: int, start: int, end: int) -> AsyncGenerator[bytes, None]:
+        """Bytes [start, end) of an entry's file; caches the CRC on full reads"""
+        entry = self.entries[index]
+        self._check_source(entry)
+        full = start == 0 and end == entry.size
+        crc = 0
+        with open(entry.path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ZipSourceChanged(f"{entry.name}: source file shrank")
+                if full:
+                    crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        if full:
+            _cache_crc(entry, crc)
+
+    async def iter_range(self, start: int = 0, end: Optional[int] = None) -> AsyncGenerator[bytes, None]:
+        """Archive bytes [start, end] (inclusive, like an HTTP byte range)"""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        for offset, length, kind, index in self._parts:
+            part_end = offset + length
+            if part_end <= start or offset > end:
+                continue
+            lo = max(start, offset) - offset
+            hi = min(end + 1, part_end) - offset
+            if kind == "data":
+                async for chunk in self._file_range(index, lo, hi):
+                    yield chunk
+            elif kind == "local":
+                yield self._local_header(self.entries[index])[lo:hi]
+            elif kind == "descriptor":
+                yield self._descriptor(self.entries[index], await self._crc(index))[lo:hi]
+            else:
+                crcs = [await self._crc(i) for i in range(len(self.entries))]
+                yield self._central_directory(crcs)[lo:hi]
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """First range of a `Range: bytes=...` header as inclusive (start, end)
+
+    Returns None without a (usable) header; raises ValueError when the range
+    cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[6:].split(",")[0].strip()
+    first, _, last = spec.partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = size - int(last)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise ValueError(spec)
+    return max(0, start), min(end, size - 1)
+
+
+async def register_archive(filename: str, entries: List[ZipEntry]) -> str:
+    """Store a manifest and return its ID (valid for MANIFEST_TTL seconds)"""
+    zip_id = secrets.token_urlsafe(18)
+    manifest = {"filename": filename,
+                "entries": [[e.name, e.path, e.size, e.mtime] for e in entries]}
+    await coordination.set_value(_MANIFEST_PREFIX + zip_id, json.dumps(manifest), MANIFEST_TTL)
+    return zip_id
+
+
+async def load_archive(zip_id: str) -> Optional[Tuple[str, StreamingZip]]:
+    """(filename, archive) of a registered manifest, None when unknown / expired"""
+    raw = await coordination.get_value(_MANIFEST_PREFIX + zip_id)
+    if raw is None:
+        return None
+    manifest = json.loads(raw)
+    entries = [ZipEntry(name, path, int(size), float(mtime)) for name, path, size, mtime in manifest["entries"]]
+    return manifest["filename"], StreamingZip(entries)
@@ -0,0 +1,217 @@
+"""Build the admin frontend into static/dist/
+
+Usage:
+    python tools/build_assets.py [--tailwind-cli PATH] [--check]
+
+Writes:
+    static/dist/js/<name>.<hash>.js     scripts (minified when rjsmin is installed)
+    static/dist/css/tailwind.<hash>.css Tailwind CSS prebuilt for the pages that
+                                        use tailwind-cdn.js, when the Tailwind v3
+                                        CLI is available (--tailwind-cli, $TAILWIND_BIN
+                                        or tailwindcss on PATH); otherwise the pages
+                                        keep compiling Tailwind in the browser
+    static/dist/<page>.html             the pages, pointing at the files above
+    *.gz (and *.br when the brotli module is installed) next to each of them
+    static/dist/manifest.json           source -> built file, and source hashes
+
+The server (src/services/static_assets.py) serves dist/ only while the
+hashes in the manifest match static/, so editing a source file without
+rebuilding falls back to the unbuilt pages instead of serving stale ones.
+
+--check exits with status 1 when dist/ is missing or out of date.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+try:
+    import brotli  # optional: .br variants
+except ImportError:
+    brotli = None
+try:
+    import rjsmin  # optional: JS minification
+except ImportError:
+    rjsmin = None
+
+ROOT = Path(__file__).resolve().parent.parent
+STATIC = ROOT / "static"
+DIST = STATIC / "dist"
+URL_PREFIX = "/static"
+
+TAILWIND_RUNTIME = "js/tailwind-cdn.js"
+# <script src="/static/js/tailwind-cdn.js?v=..."></script>
+TAILWIND_TAG_RE = re.compile(r'<script\s+src="/static/js/tailwind-cdn\.js(?:\?[^"]*)?"\s*>\s*</script>')
+# tailwind.config={...} (one line, as in the pages)
+TAILWIND_CONFIG_RE = re.compile(r"tailwind\.config\s*=\s*(\{.*\})\s*;?\s*$", re.MULTILINE)
+# /static/<path>.js|.html with an optional ?v= cache buster
+ASSET_REF_RE = re.compile(r"/static/([A-Za-z0-9_./-]+\.(?:js|css|html))(?:\?v=[A-Za-z0-9_.-]*)?")
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _fingerprint(relpath: str, data: bytes) -> str:
+    stem, dot, ext = Path(relpath).name.rpartition(".")
+    return str(Path(relpath).parent / f"{stem}.{_sha256(data)[:10]}.{ext}")
+
+
+def _sources():
+    return sorted(p.relative_to(STATIC).as_posix() for p in list(STATIC.glob("*.html")) + list(STATIC.glob("js/*.js")))
+
+
+def _find_tailwind_cli(explicit):
+    candidate = explicit or os.getenv("TAILWIND_BIN") or shutil.which("tailwindcss")
+    return candidate if candidate and (os.path.isfile(candidate) or shutil.which(candidate)) else None
+
+
+def build_tailwind(cli: str, pages, scripts, out_dir: Path) -> bytes:
+    """Run the Tailwind CLI over the pages/scripts with the theme the pages configure at runtime"""
+    theme = "{}"
+    for page in pages:
+        match = TAILWIND_CONFIG_RE.search((STATIC / page).read_text(encoding="utf-8-sig"))
+        if match:
+            theme = match.group(1)
+            break
+    content = [str(STATIC / name) for name in list(pages) + list(scripts)]
+    config_path = out_dir / "tailwind.config.js"
+    config_path.write_text(f"module.exports = Object.assign({{content: {json.dumps(content)}}}, {theme});\n",
+                           encoding="utf-8")
+    input_path = out_dir / "tailwind.input.css"
+    input_path.write_text("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n", encoding="utf-8")
+    output_path = out_dir / "tailwind.css"
+    subprocess.run([cli, "-c", str(config_path), "-i", str(input_path), "-o", str(output_path), "--minify"],
+                   check=True, cwd=str(out_dir))
+    return output_path.read_bytes()
+
+
+def compress(path: Path, data: bytes) -> dict:
+    """Write path.gz / path.br when smaller than data; returns their sizes"""
+    sizes = {}
+    variants = [("gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", brotli.compress(data, quality=11)))
+    for extension, encoded in variants:
+        if len(encoded) < len(data):
+            path.with_name(path.name + "." + extension).write_bytes(encoded)
+            sizes[extension] = len(encoded)
+    return sizes
+
+
+def build(tailwind_cli=None) -> dict:
+    sources = _sources()
+    pages = [name for name in sources if name.endswith(".html")]
+    scripts = [name for name in sources if name.endswith(".js")]
+    staging = Path(tempfile.mkdtemp(prefix="dist.", dir=STATIC))
+    try:
+        files, report = {}, []
+
+        def emit(source: str, target: str, data: bytes, original_size: int):
+            path = staging / target
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            files[source] = target
+            sizes = compress(path, data)
+            report.append((target, original_size, len(data), sizes.get("gz"), sizes.get("br")))
+
+        for name in scripts:
+            raw = (STATIC / name).read_bytes()
+            data = raw
+            if rjsmin is not None and name != TAILWIND_RUNTIME:
+                data = rjsmin.jsmin(raw.decode("utf-8-sig")).encode("utf-8")
+            emit(name, _fingerprint(name, data), data, len(raw))
+
+        tailwind_css = None
+        cli = _find_tailwind_cli(tailwind_cli)
+        tailwind_pages = [name for name in pages
+                          if TAILWIND_TAG_RE.search((STATIC / name).read_text(encoding="utf-8-sig"))]
+        if cli and tailwind_pages:
+            work = Path(tempfile.mkdtemp(prefix="tailwind."))
+            try:
+                css = build_tailwind(cli, tailwind_pages, [s for s in scripts if s != TAILWIND_RUNTIME], work)
+            finally:
+                shutil.rmtree(work, ignore_errors=True)
+            tailwind_css = _fingerprint("css/tailwind.css", css)
+            emit("css/tailwind.css", tailwind_css, css, len((STATIC / TAILWIND_RUNTIME).read_bytes()))
+        elif tailwind_pages:
+            print("Tailwind CLI not found (--tailwind-cli / $TAILWIND_BIN): pages keep the in-browser compiler")
+
+        def rewrite(match):
+            target = files.get(match.group(1))
+            if target is None and match.group(1) in pages:
+                target = match.group(1)  # pages keep their names
+            return f"{URL_PREFIX}/dist/{target}" if target else match.group(0)
+
+        for name in pages:
+            raw = (STATIC / name).read_bytes()
+            text = raw.decode("utf-8-sig")
+            if tailwind_css and name in tailwind_pages:
+                text = TAILWIND_TAG_RE.sub(f'<link rel="stylesheet" href="{URL_PREFIX}/dist/{tailwind_css}">', text)
+            text = ASSET_REF_RE.sub(rewrite, text)
+            data = text.encode("utf-8")
+            emit(name, name, data, len(raw))
+
+        manifest = {
+            "files": files,
+            "sources": {name: _sha256((STATIC / name).read_bytes()) for name in sources},
+        }
+        (staging / "manifest.json").write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+
+        # Swap in the new build
+        old = None
+        if DIST.exists():
+            old = DIST.with_name(f"{DIST.name}.old.{os.getpid()}")
+            DIST.rename(old)
+        staging.rename(DIST)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    width = max(len(row[0]) for row in report)
+    print(f"{'file'.ljust(width)}  {'source':>9}  {'built':>9}  {'gzip':>9}  {'brotli':>9}")
+    for target, original, built, gz, br in report:
+        print(f"{target.ljust(width)}  {original:>9}  {built:>9}  {gz or '-':>9}  {br or '-':>9}")
+    if rjsmin is None:
+        print("rjsmin not installed: scripts are not minified")
+    if brotli is None:
+        print("brotli not installed: only .gz variants written")
+    return manifest
+
+
+def check() -> bool:
+    manifest_path = DIST / "manifest.json"
+    if not manifest_path.is_file():
+        print("static/dist is not built")
+        return False
+    sources = json.loads(manifest_path.read_text(encoding="utf-8")).get("sources", {})
+    current = {name: _sha256((STATIC / name).read_bytes()) for name in _sources()}
+    if sources != current:
+        changed = sorted(set(sources.items()) ^ set(current.items()))
+        print("static/dist is out of date: " + ", ".join(sorted({name for name, _ in changed})))
+        return False
+    print("static/dist is up to date")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed frontend assets")
+    parser.add_argument("--tailwind-cli", help="Tailwind v3 CLI executable (default: $TAILWIND_BIN or tailwindcss)")
+    parser.add_argument("--check", action="store_true", help="Only report whether static/dist is current")
+    args = parser.parse_args(argv)
+    if args.check:
+        sys.exit(0 if check() else 1)
+    build(args.tailwind_cli)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Check that every historical database layout migrates to the current schema
+
+Usage:
+    python tools/check_migrations.py [--workers 8]
+
+For each layout below a database is built (current schema with the
+columns/tables/rows that layout lacked taken away, schema_version set as that
+layout had it), a token row is written, and Database.migrate() is run. The
+result must match a freshly created database: same tables, same columns
+(name, type, NOT NULL, default, primary key), same indexes, all config rows
+present, the token row preserved, and schema_version at SCHEMA_VERSION.
+
+Also boots --workers concurrent migrate() calls on one empty file (exactly
+one may apply the migrations) and times a migrate() on an up-to-date
+database. Exits with status 1 on any mismatch.
+"""
+import argparse
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.database import Database
+from src.core.migrations import SCHEMA_VERSION
+
+CONFIG_TABLES = ("admin_config", "proxy_config", "watermark_free_config", "cache_config",
+                 "generation_config", "token_refresh_config")
+
+# name -> (dropped columns per table, dropped tables, emptied tables, recorded schema version)
+LAYOUTS = {
+    "original (before sora2 / concurrency / parse settings / character cards)": (
+        {
+            "tokens": ["sora2_supported", "sora2_invite_code", "sora2_redeemed_count", "sora2_total_count",
+                       "sora2_remaining_count", "sora2_cooldown_until", "image_enabled", "video_enabled",
+                       "image_concurrency", "video_concurrency", "client_id"],
+            "token_stats": ["today_image_count", "today_video_count", "today_error_count", "today_date",
+                            "consecutive_error_count"],
+            "admin_config": ["admin_username", "admin_password", "api_key"],
+            "watermark_free_config": ["parse_method", "custom_parse_url", "custom_parse_token"],
+        },
+        ["character_cards"], [], None,
+    ),
+    "daily token stats, no error streak column": (
+        {"token_stats": ["consecutive_error_count"], "tokens": ["client_id"]},
+        ["character_cards"], [], None,
+    ),
+    "character cards without description": (
+        {"character_cards": ["description"]}, [], [], None,
+    ),
+    "all columns, not versioned yet": ({}, [], [], None),
+    "config rows missing": ({}, [], list(CONFIG_TABLES), None),
+    "stamped v1 by the schema-version fast path": ({}, [], [], 1),
+}
+
+
+def snapshot(path: str) -> dict:
+    """Comparable description of the schema"""
+    conn = sqlite3.connect(path)
+    try:
+        tables = {}
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        for name in names:
+            # Columns added by ALTER TABLE land at the end: compare as a set
+            tables[name] = sorted((col[1], col[2].upper(), col[3], col[4], col[5])
+                                  for col in conn.execute(f"PRAGMA table_info({name})"))
+        indexes = sorted(row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'"))
+        return {"tables": tables, "indexes": indexes}
+    finally:
+        conn.close()
+
+
+def build_layout(path: str, dropped_columns: dict, dropped_tables: list, emptied_tables: list, version):
+    conn = sqlite3.connect(path)
+    try:
+        for table in dropped_tables:
+            conn.execute(f"DROP TABLE {table}")
+        for table, columns in dropped_columns.items():
+            for column in columns:
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+        for table in emptied_tables:
+            conn.execute(f"DELETE FROM {table}")
+        if version is None:
+            conn.execute("DROP TABLE schema_version")
+        else:
+            conn.execute("UPDATE schema_version SET version = ? WHERE id = 1", (version,))
+        conn.execute("INSERT INTO tokens (token, email, username, name) VALUES ('t-legacy', 'a@b.c', 'u', 'n')")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def problems_after_migration(path: str, reference: dict) -> list:
+    problems = []
+    current = snapshot(path)
+    for table in sorted(set(reference["tables"]) | set(current["tables"])):
+        expected = reference["tables"].get(table)
+        actual = current["tables"].get(table)
+        if expected is None or actual is None:
+            problems.append(f"table {table}: {'unexpected' if expected is None else 'missing'}")
+        elif expected != actual:
+            diff = sorted(set(expected) ^ set(actual))
+            problems.append(f"table {table}: columns differ {diff}")
+    if current["indexes"] != reference["indexes"]:
+        problems.append(f"indexes differ: {current['indexes']} != {reference['indexes']}")
+
+    conn = sqlite3.connect(path)
+    try:
+        for table in CONFIG_TABLES:
+            if conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] != 1:
+                problems.append(f"{table}: config row missing")
+        if conn.execute("SELECT COUNT(*) FROM tokens WHERE token = 't-legacy'").fetchone()[0] != 1:
+            problems.append("existing token row lost")
+        version = conn.execute("SELECT version FROM schema_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            problems.append(f"schema_version is {version}, expected {SCHEMA_VERSION}")
+    finally:
+        conn.close()
+    return problems
+
+
+async def check_concurrent_boot(tmp: Path, workers: int) -> list:
+    path = str(tmp / "concurrent.db")
+    results = await asyncio.gather(*(Database(path).migrate() for _ in range(workers)))
+    applied = [r for r in results if r[0] != r[1]]
+    problems = []
+    if len(applied) != 1:
+        problems.append(f"{len(applied)} of {workers} concurrent workers applied migrations (expected 1)")
+    if any(r[1] != SCHEMA_VERSION for r in results):
+        problems.append(f"concurrent workers ended at versions {sorted(set(r[1] for r in results))}")
+    return problems
+
+
+async def run(workers: int) -> int:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        reference_path = str(tmp / "reference.db")
+        await Database(reference_path).migrate()
+        reference = snapshot(reference_path)
+
+        for index, (name, (columns, tables, emptied, version)) in enumerate(LAYOUTS.items()):
+            path = str(tmp / f"layout{index}.db")
+            await Database(path).migrate()
+            build_layout(path, columns, tables, emptied, version)
+            before, after = await Database(path).migrate()
+            problems = problems_after_migration(path, reference)
+            failures += bool(problems)
+            print(f"{'FAIL' if problems else 'ok  '}  {name}: v{before} -> v{after}")
+            for problem in problems:
+                print(f"        {problem}")
+
+        problems = await check_concurrent_boot(tmp, workers)
+        failures += bool(problems)
+        print(f"{'FAIL' if problems else 'ok  '}  {workers} workers booting one empty database")
+        for problem in problems:
+            print(f"        {problem}")
+
+        db = Database(reference_path)
+        runs = 50
+        started = time.perf_counter()
+        for _ in range(runs):
+            await db.migrate()
+        print(f"up-to-date migrate(): {(time.perf_counter() - started) / runs * 1000:.2f} ms")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate every historical layout and compare with a fresh schema")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.workers))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
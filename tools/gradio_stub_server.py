@@ -0,0 +1,192 @@
+"""Stand-in for the url2drive Gradio Space, for exercising the Drive upload queue
+
+Speaks just enough of the Gradio queue protocol (sse_v3) for gradio_client:
+GET /config, GET /info, POST /queue/join and the GET /queue/data event
+stream. The single endpoint `/upload(url, password)` returns what the real
+Space returns ({"status": "success", "download_link": ...} or
+{"status": "error", "message": ...}); nothing is downloaded.
+
+GET /stats reports how often the config was fetched (one per Client
+handshake) and how many uploads were served / failed.
+
+Usage:
+    python tools/gradio_stub_server.py --port 7861 --password secret --fail-first 2
+    [google_drive] space_url = "http://127.0.0.1:7861", password = "secret", enabled = true
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+_TEXTBOX = {"type": "string"}
+_CONFIG = {
+    "version": "5.0.0",
+    "protocol": "sse_v3",
+    "api_prefix": "",
+    "connect_heartbeat": False,
+    "components": [
+        {"id": 1, "type": "textbox", "props": {"label": "url"}, "api_info": _TEXTBOX},
+        {"id": 2, "type": "textbox", "props": {"label": "password"}, "api_info": _TEXTBOX},
+        {"id": 3, "type": "json", "props": {"label": "result"}, "api_info": {"type": "object"}},
+    ],
+    "dependencies": [
+        {"id": 0, "api_name": "upload", "inputs": [1, 2], "outputs": [3], "backend_fn": True},
+    ],
+}
+_INFO = {
+    "named_endpoints": {
+        "/upload": {
+            "parameters": [
+                {"label": "url", "parameter_name": "url", "parameter_has_default": False,
+                 "type": _TEXTBOX, "python_type": {"type": "str", "description": ""}, "component": "Textbox"},
+                {"label": "password", "parameter_name": "password", "parameter_has_default": False,
+                 "type": _TEXTBOX, "python_type": {"type": "str", "description": ""}, "component": "Textbox"},
+            ],
+            "returns": [
+                {"label": "result", "type": {"type": "object"},
+                 "python_type": {"type": "Dict[Any, Any]", "description": ""}, "component": "Json"},
+            ],
+        }
+    },
+    "unnamed_endpoints": {},
+}
+
+
+class Space:
+    """Upload behaviour plus the per-session message queues"""
+
+    def __init__(self, password: str, fail_first: int, delay: float):
+        self.password = password
+        self.fail_first = fail_first
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.stats = {"config_fetches": 0, "uploads": 0, "failures": 0}
+        # session_hash -> messages / number of events not completed yet
+        self.sessions: Dict[str, "queue.Queue[dict]"] = {}
+        self.pending: Dict[str, int] = {}
+
+    def session(self, session_hash: str) -> "queue.Queue[dict]":
+        with self.lock:
+            return self.sessions.setdefault(session_hash, queue.Queue())
+
+    def join(self, session_hash: str, data: list) -> str:
+        event_id = uuid.uuid4().hex
+        with self.lock:
+            self.pending[session_hash] = self.pending.get(session_hash, 0) + 1
+        messages = self.session(session_hash)
+        threading.Thread(target=self._run, args=(event_id, messages, data), daemon=True).start()
+        return event_id
+
+    def _run(self, event_id: str, messages: "queue.Queue[dict]", data: list):
+        messages.put({"msg": "process_starts", "event_id": event_id})
+        time.sleep(self.delay)
+        with self.lock:
+            self.stats["uploads"] += 1
+            fail = self.stats["uploads"] <= self.fail_first
+            if fail:
+                self.stats["failures"] += 1
+        if fail:
+            messages.put({"msg": "process_completed", "event_id": event_id, "success": False,
+                          "output": {"error": "Simulated Space failure"}})
+            return
+        url, password = (list(data) + [None, None])[:2]
+        if password != self.password:
+            result = {"status": "error", "message": "Invalid password"}
+        else:
+            name = (url or "").rstrip("/").rsplit("/", 1)[-1] or "file"
+            result = {"status": "success", "download_link": f"https://drive.example/{event_id}/{name}"}
+        messages.put({"msg": "process_completed", "event_id": event_id, "success": True,
+                      "output": {"data": [result], "is_generating": False}})
+
+    def completed(self, session_hash: str) -> bool:
+        """Count one finished event; True when the session has nothing in flight"""
+        with self.lock:
+            self.pending[session_hash] -= 1
+            return self.pending[session_hash] <= 0
+
+
+def make_handler(space: Space):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, payload, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/config":
+                with space.lock:
+                    space.stats["config_fetches"] += 1
+                self._json(_CONFIG)
+            elif url.path == "/info":
+                self._json(_INFO)
+            elif url.path == "/stats":
+                with space.lock:
+                    self._json(dict(space.stats))
+            elif url.path == "/queue/data":
+                session_hash = parse_qs(url.query).get("session_hash", [""])[0]
+                self._stream(session_hash)
+            else:
+                self._json({"detail": "Not Found"}, 404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if url.path == "/queue/join" and body.get("fn_index") == 0:
+                self._json({"event_id": space.join(body["session_hash"], body.get("data") or [])})
+            else:
+                self._json({"detail": "Not Found"}, 404)
+
+        def _stream(self, session_hash: str):
+            messages = space.session(session_hash)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            while True:
+                try:
+                    message = messages.get(timeout=15)
+                except queue.Empty:
+                    message = {"msg": "heartbeat"}
+                self.wfile.write(b"data: " + json.dumps(message).encode() + b"\n\n")
+                self.wfile.flush()
+                if message["msg"] == "process_completed" and space.completed(session_hash):
+                    self.wfile.write(b'data: {"msg": "close_stream"}\n\n')
+                    self.wfile.flush()
+                    return
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake url2drive Gradio Space")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--password", default="secret", help="Password the upload endpoint accepts")
+    parser.add_argument("--fail-first", type=int, default=0, help="Fail the first N uploads (Space error)")
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds each upload takes")
+    args = parser.parse_args(argv)
+
+    space = Space(args.password, args.fail_first, args.delay)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(space))
+    server.daemon_threads = True
+    print(f"Gradio stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
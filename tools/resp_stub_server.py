@@ -0,0 +1,231 @@
+"""Minimal Redis-protocol server for testing the resp coordination backend
+
+Keeps everything in memory and implements only the commands RespBackend
+uses (plus a few for poking at it with redis-cli): PING, AUTH, SELECT,
+SET [NX] [PX ms | EX s], GET, MGET, DEL, EXISTS, INCR, DECR, SCAN, KEYS, TTL,
+FLUSHALL, QUIT.
+
+Usage:
+    python tools/resp_stub_server.py --port 6390
+    COORDINATION_BACKEND=resp COORDINATION_RESP_URL=redis://127.0.0.1:6390/0 python main.py
+"""
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class Store:
+    """Key -> (value, expires_at or None), one namespace per SELECT db"""
+
+    def __init__(self):
+        self.dbs: Dict[int, Dict[bytes, Tuple[bytes, Optional[float]]]] = {}
+
+    def db(self, index: int) -> Dict[bytes, Tuple[bytes, Optional[float]]]:
+        return self.dbs.setdefault(index, {})
+
+    @staticmethod
+    def get(data: dict, key: bytes) -> Optional[bytes]:
+        entry = data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del data[key]
+            return None
+        return value
+
+
+class WrongArgs(Exception):
+    pass
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(_bulk(item) for item in items)
+
+
+def _int(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+class Connection:
+    def __init__(self, store: Store, password: Optional[str]):
+        self.store = store
+        self.password = password
+        self.authenticated = password is None
+        self.db_index = 0
+
+    @property
+    def data(self):
+        return self.store.db(self.db_index)
+
+    def _incr(self, key: bytes, amount: int) -> bytes:
+        current = Store.get(self.data, key)
+        try:
+            value = int(current or b"0") + amount
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+        expires_at = self.data[key][1] if key in self.data else None
+        self.data[key] = (str(value).encode(), expires_at)
+        return _int(value)
+
+    def execute(self, args: List[bytes]) -> bytes:
+        if not args:
+            return b"-ERR empty command\r\n"
+        command = args[0].upper().decode()
+        if command == "AUTH":
+            if self.password is None or args[-1].decode() == self.password:
+                self.authenticated = True
+                return b"+OK\r\n"
+            return b"-WRONGPASS invalid password\r\n"
+        if not self.authenticated:
+            return b"-NOAUTH Authentication required.\r\n"
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            return b"-ERR unknown command '%s'\r\n" % args[0]
+        try:
+            return handler(args[1:])
+        except (WrongArgs, IndexError, ValueError):
+            return b"-ERR wrong number of arguments or syntax error for '%s'\r\n" % args[0]
+
+    def cmd_ping(self, args):
+        return _bulk(args[0]) if args else b"+PONG\r\n"
+
+    def cmd_select(self, args):
+        self.db_index = int(args[0])
+        return b"+OK\r\n"
+
+    def cmd_set(self, args):
+        key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+        expires_at = None
+        nx = False
+        i = 0
+        while i < len(options):
+            option = options[i]
+            if option == b"NX":
+                nx = True
+            elif option in (b"PX", b"EX"):
+                amount = float(args[2 + i + 1])
+                expires_at = time.monotonic() + (amount / 1000 if option == b"PX" else amount)
+                i += 1
+            else:
+                raise WrongArgs()
+            i += 1
+        if nx and Store.get(self.data, key) is not None:
+            return b"$-1\r\n"
+        self.data[key] = (value, expires_at)
+        return b"+OK\r\n"
+
+    def cmd_get(self, args):
+        return _bulk(Store.get(self.data, args[0]))
+
+    def cmd_mget(self, args):
+        return _array([Store.get(self.data, key) for key in args])
+
+    def cmd_del(self, args):
+        removed = 0
+        for key in args:
+            if Store.get(self.data, key) is not None:
+                del self.data[key]
+                removed += 1
+        return _int(removed)
+
+    def cmd_exists(self, args):
+        return _int(sum(1 for key in args if Store.get(self.data, key) is not None))
+
+    def cmd_incr(self, args):
+        return self._incr(args[0], 1)
+
+    def cmd_decr(self, args):
+        return self._incr(args[0], -1)
+
+    def cmd_ttl(self, args):
+        if Store.get(self.data, args[0]) is None:
+            return _int(-2)
+        expires_at = self.data[args[0]][1]
+        return _int(-1 if expires_at is None else int(expires_at - time.monotonic()))
+
+    def _matching(self, pattern: bytes) -> List[bytes]:
+        pattern_text = pattern.decode()
+        return [key for key in list(self.data)
+                if Store.get(self.data, key) is not None and fnmatch.fnmatchcase(key.decode(), pattern_text)]
+
+    def cmd_keys(self, args):
+        return _array(self._matching(args[0]))
+
+    def cmd_scan(self, args):
+        # Everything in one page: cursor is always 0 afterwards
+        pattern = b"*"
+        options = [a.upper() for a in args[1:]]
+        if b"MATCH" in options:
+            pattern = args[1 + options.index(b"MATCH") + 1]
+        return b"*2\r\n" + _bulk(b"0") + _array(self._matching(pattern))
+
+    def cmd_flushall(self, args):
+        self.store.dbs.clear()
+        return b"+OK\r\n"
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command (e.g. typed into telnet)
+        return line.split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def make_handler(store: Store, password: Optional[str]):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = Connection(store, password)
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None:
+                    break
+                if args and args[0].upper() == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                writer.write(connection.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(host: str, port: int, password: Optional[str] = None):
+    server = await asyncio.start_server(make_handler(Store(), password), host, port)
+    print(f"RESP stub listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-memory Redis protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password", default=None, help="Require AUTH with this password")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Minimal S3-compatible server for testing the s3 / tiered storage backends
+
+Keeps objects in memory and implements what S3Storage uses (path-style
+addressing only): PUT / GET / HEAD / DELETE object and multipart uploads
+(initiate, upload part, complete, abort). Requests are checked the way S3
+checks them: AWS Signature V4 in the Authorization header or in a presigned
+query string (including expiry), and x-amz-content-sha256 against the body.
+Buckets are created on first use.
+
+GET /_stats reports request counters (puts, parts, completed multipart
+uploads, aborts, presigned GETs).
+
+Usage:
+    python tools/s3_stub_server.py --port 9010 --access-key test --secret-key testsecret
+    STORAGE_BACKEND=tiered S3_ENDPOINT=http://127.0.0.1:9010 S3_BUCKET=media \\
+        S3_ACCESS_KEY_ID=test S3_SECRET_ACCESS_KEY=testsecret python main.py
+"""
+import argparse
+import calendar
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class Store:
+    """(bucket, key) -> (body, content type, etag); uploads in progress"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str, str]] = {}
+        self.uploads: Dict[str, dict] = {}
+        self.stats = {"puts": 0, "parts": 0, "multipart_completed": 0, "aborts": 0, "presigned_gets": 0}
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class AuthError(Exception):
+    def __init__(self, code: str, message: str, status: int = 403):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+def _signing_key(secret: str, datestamp: str, region: str) -> bytes:
+    key = ("AWS4" + secret).encode()
+    for part in (datestamp, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def _canonical_query(pairs: List[Tuple[str, str]]) -> str:
+    encoded = sorted((quote(k, safe="-_.~"), quote(v, safe="-_.~")) for k, v in pairs)
+    return "&".join(f"{k}={v}" for k, v in encoded)
+
+
+def verify_signature(method: str, raw_path: str, query: List[Tuple[str, str]], headers, body: bytes,
+                     access_key: str, secret_key: str):
+    """Raise AuthError unless the request carries a valid SigV4 signature"""
+    params = dict(query)
+    if "X-Amz-Signature" in params:
+        presigned = True
+        credential = params.get("X-Amz-Credential", "")
+        amz_date = params.get("X-Amz-Date", "")
+        signed_headers = params.get("X-Amz-SignedHeaders", "")
+        signature = params["X-Amz-Signature"]
+        payload_hash = "UNSIGNED-PAYLOAD"
+        query = [(k, v) for k, v in query if k != "X-Amz-Signature"]
+        try:
+            issued = calendar.timegm(time.strptime(amz_date, "%Y%m%dT%H%M%SZ"))
+        except ValueError:
+            raise AuthError("AuthorizationQueryParametersError", "bad X-Amz-Date", 400)
+        if time.time() > issued + int(params.get("X-Amz-Expires", "0")):
+            raise AuthError("AccessDenied", "Request has expired")
+    else:
+        presigned = False
+        match = re.match(r"AWS4-HMAC-SHA256 Credential=([^,]+),\s*SignedHeaders=([^,]+),\s*Signature=(\w+)",
+                         headers.get("Authorization", ""))
+        if not match:
+            raise AuthError("AccessDenied", "missing or malformed Authorization header")
+        credential, signed_headers, signature = match.groups()
+        amz_date = headers.get("x-amz-date", "")
+        payload_hash = headers.get("x-amz-content-sha256", "")
+        if payload_hash != "UNSIGNED-PAYLOAD" and payload_hash != hashlib.sha256(body).hexdigest():
+            raise AuthError("XAmzContentSHA256Mismatch", "body does not match x-amz-content-sha256", 400)
+
+    parts = credential.split("/")
+    if len(parts) != 5 or parts[0] != access_key:
+        raise AuthError("InvalidAccessKeyId", "unknown access key")
+    _, datestamp, region, _, _ = parts
+    names = signed_headers.split(";")
+    if "host" not in names:
+        raise AuthError("AccessDenied", "host must be signed")
+    canonical_headers = "".join(
+        f"{name}:{' '.join((headers.get(name) or '').split())}\n" for name in names
+    )
+    canonical_request = "\n".join([method, raw_path, _canonical_query(query), canonical_headers,
+                                   signed_headers, payload_hash])
+    scope = f"{datestamp}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                hashlib.sha256(canonical_request.encode()).hexdigest()])
+    expected = hmac.new(_signing_key(secret_key, datestamp, region), string_to_sign.encode(),
+                        hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        raise AuthError("SignatureDoesNotMatch", "signature mismatch")
+    return presigned
+
+
+def make_handler(store: Store, access_key: Optional[str], secret_key: Optional[str]):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None, head: bool = False):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+
+        def _error(self, status: int, code: str, message: str):
+            body = (f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code>"
+                    f"<Message>{message}</Message></Error>").encode()
+            self._send(status, body, {"Content-Type": "application/xml"}, head=self.command == "HEAD")
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            query = parse_qsl(url.query, keep_blank_values=True)
+            params = dict(query)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+
+            if url.path == "/_stats" and self.command == "GET":
+                with store.lock:
+                    return self._send(200, json.dumps(store.stats).encode(), {"Content-Type": "application/json"})
+
+            presigned = False
+            if access_key is not None:
+                try:
+                    presigned = verify_signature(self.command, url.path, query, self.headers, body,
+                                                 access_key, secret_key)
+                except AuthError as e:
+                    return self._error(e.status, e.code, str(e))
+
+            bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+            if not bucket or not key:
+                return self._error(400, "InvalidRequest", "path-style /bucket/key expected")
+            object_id = (bucket, key)
+
+            if self.command == "PUT" and "uploadId" in params:
+                with store.lock:
+                    upload = store.uploads.get(params["uploadId"])
+                    if upload is None or upload["id"] != object_id:
+                        return self._error(404, "NoSuchUpload", "unknown upload")
+                    etag = f'"{hashlib.md5(body).hexdigest()}"'
+                    upload["parts"][int(params["partNumber"])] = (body, etag)
+                store.count("parts")
+                return self._send(200, headers={"ETag": etag})
+            if self.command == "PUT":
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                with store.lock:
+                    store.objects[object_id] = (body, self.headers.get("Content-Type", "binary/octet-stream"), etag)
+                store.count("puts")
+                return self._send(200, headers={"ETag": etag})
+            if self.command == "POST" and "uploads" in params:
+                upload_id = uuid.uuid4().hex
+                with store.lock:
+                    store.uploads[upload_id] = {"id": object_id, "parts": {},
+                                                "content_type": self.headers.get("Content-Type", "binary/octet-stream")}
+                return self._send(200, (
+                    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                    "<InitiateMultipartUploadResult xmlns=\"http://s3.amazonaws.com/doc/2006-03-01/\">"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>").encode(), {"Content-Type": "application/xml"})
+            if self.command == "POST" and "uploadId" in params:
+                requested = [(int(part.findtext("PartNumber")), part.findtext("ETag"))
+                             for part in ET.fromstring(body).iter("Part")]
+                with store.lock:
+                    upload = store.uploads.get(params["uploadId"])
+                    if upload is None or upload["id"] != object_id:
+                        return self._error(404, "NoSuchUpload", "unknown upload")
+                    numbers = [number for number, _ in requested]
+                    if numbers != sorted(numbers) or any(
+                            upload["parts"].get(number, (None, None))[1] != etag for number, etag in requested):
+                        return self._error(400, "InvalidPart", "parts missing, out of order or ETag mismatch")
+                    data = b"".join(upload["parts"][number][0] for number in numbers)
+                    etag = f'"{hashlib.md5(data).hexdigest()}-{len(numbers)}"'
+                    store.objects[object_id] = (data, upload["content_type"], etag)
+                    del store.uploads[params["uploadId"]]
+                store.count("multipart_completed")
+                return self._send(200, (
+                    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                    "<CompleteMultipartUploadResult xmlns=\"http://s3.amazonaws.com/doc/2006-03-01/\">"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>{etag}</ETag>"
+                    "</CompleteMultipartUploadResult>").encode(), {"Content-Type": "application/xml"})
+            if self.command == "DELETE" and "uploadId" in params:
+                with store.lock:
+                    store.uploads.pop(params["uploadId"], None)
+                store.count("aborts")
+                return self._send(204)
+            if self.command == "DELETE":
+                with store.lock:
+                    store.objects.pop(object_id, None)
+                return self._send(204)
+            if self.command in ("GET", "HEAD"):
+                with store.lock:
+                    entry = store.objects.get(object_id)
+                if entry is None:
+                    return self._error(404, "NoSuchKey", "The specified key does not exist.")
+                if presigned:
+                    store.count("presigned_gets")
+                data, content_type, etag = entry
+                headers = {"Content-Type": content_type, "ETag": etag}
+                if self.command == "HEAD":
+                    self.send_response(200)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    return
+                return self._send(200, data, headers)
+            return self._error(405, "MethodNotAllowed", self.command)
+
+        do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _handle
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="In-memory S3-compatible stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--access-key", default="test")
+    parser.add_argument("--secret-key", default="testsecret")
+    parser.add_argument("--no-auth", action="store_true", help="Accept unsigned requests")
+    args = parser.parse_args(argv)
+
+    store = Store()
+    access_key = None if args.no_auth else args.access_key
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store, access_key, args.secret_key))
+    server.daemon_threads = True
+    print(f"S3 stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()